@@ -40,6 +40,8 @@ setup(
     entry_points={
         "console_scripts": [
             "idc-metrics-help=idc.metrics.tool.help:sys_main",
+            "idc-metrics-benchmark=idc.metrics.tool.benchmark:sys_main",
+            "idc-metrics-server=idc.metrics.tool.server:sys_main",
         ],
         "class_lister": [
             "idc.metrics=idc.metrics.class_lister",
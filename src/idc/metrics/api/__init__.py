@@ -1 +1,23 @@
-from ._data import ImagePair, ImagePairList
+from ._data import ImagePair, ImagePairList, to_batches, split_pairs, MultiImagePair, MultiImagePairList, to_multi_batches
+from ._encoded import ENCODED_VERSION, EncodedPairs, EncodedPairsOutput, load_encoded_pairs
+from ._labels import LabelEncoder
+from ._scores import SCORES_KEY, NUM_BINS, CURVE_ROC, CURVE_PR, CURVES, parse_scores, ScoreAccumulator, pad_scores, one_hot
+from ._scores import auroc_from_scores, average_precision_from_scores, top_k_accuracy_from_scores, calibration_error_from_scores
+from ._scores import binary_curve, roc_curve, precision_recall_curve, curves_from_scores
+from ._confusion import AVERAGE_MICRO, AVERAGE_MACRO, AVERAGE_WEIGHTED, AVERAGE_NONE, AVERAGES
+from ._confusion import confusion_matrix, confusion_counts, safe_divide, pairs_from_confusion, ConfusionMatrix
+from ._confusion import accuracy_from_confusion, precision_from_confusion, recall_from_confusion, cohen_kappa_from_confusion
+from ._objdet import IOU_THRESHOLDS_COCO, RECALL_THRESHOLDS_COCO, MAX_DETECTIONS, SCORE_KEY
+from ._objdet import box_iou, image_box_iou, DetectionArrays, detection_arrays_from_pairs, DetectionMatches, match_detections, DetectionEvaluation, DetectionEvaluator
+from ._imgseg import BACKGROUND_LABEL, segmentation_encoder, label_map_from_layers, SegmentationConfusion, register_segmentation_labels, segmentation_confusion_from_pairs, sorted_label_order, image_confusion_matrices, image_mean_iou
+from ._imgseg import iou_from_confusion, dice_from_confusion, pixel_accuracy_from_confusion
+from ._depth import MIN_DEPTH, CHUNK_SIZE, DELTA_BASE, DELTA_POWERS, DepthAccumulator, depth_accumulator_from_pairs, image_rmse
+from ._bootstrap import NUM_SAMPLES, CONFIDENCE, bootstrap_confusion_matrices, bootstrap_rows, bootstrap_interval, bootstrap_names
+from ._comparison import NUM_PERMUTATIONS, MCNEMAR_EXACT_THRESHOLD, model_confusion_matrices, mcnemar_test, permutation_test_from_confusion, permutation_test_rows, comparison_names
+from ._cache import CACHE_MAX_SIZE, CACHE_CHUNK_SIZE, expand_source_files, cache_key, AnnotationCache, AnnotationCacheWriter
+from ._state import STATE_VERSION, StatisticState, save_state, load_state, state_mapping, remap_confusion, remap_scores, remap_counts
+from ._shard import parse_shard, shard_of
+from ._synthetic import SYNTHETIC_IC, SYNTHETIC_OD, SYNTHETIC_IS, SYNTHETIC_DP, SYNTHETIC_TYPES, BLOCK_SIZE, SyntheticDataGenerator
+from ._profile import ENV_IDC_METRICS_PROFILE, PROFILE_VERSION, PROFILE_PREFIX, peak_rss, ProfileEntry, Measurement, NULL_MEASUREMENT, Profiler, active_profiler, start_profiling, stop_profiling, measure
+from ._matching import MATCH_AUTO, MATCH_HASH, MATCH_MERGE, MATCH_STRATEGIES, UNMATCHED_COUNT, UNMATCHED_LIST, UNMATCHED_REPORTS, NotSortedError, MatchResult, PairMatcher
+from ._evaluate import EVALUATE_IC, EVALUATE_OD, EVALUATE_IS, EVALUATE_DP, EVALUATE_TYPES, parse_statistics, label_indices, evaluate_classification, evaluate_detection, evaluate_segmentation, evaluate_depth
@@ -0,0 +1,121 @@
+import warnings
+from concurrent.futures import Executor
+from typing import Tuple, Callable, List
+
+import numpy as np
+
+NUM_SAMPLES = 1000
+
+CONFIDENCE = 0.95
+
+
+def bootstrap_confusion_matrices(matrix: np.ndarray, num_samples: int, rng: np.random.Generator) -> np.ndarray:
+    """
+    Generates the confusion matrices of bootstrap resamples of the pairs. Resampling
+    the pairs with replacement is equivalent to drawing the cell counts from a
+    multinomial distribution with the observed cell frequencies, hence all the
+    resamples get drawn at once without touching the individual pairs.
+
+    :param matrix: the confusion matrix of the pairs
+    :type matrix: np.ndarray
+    :param num_samples: the number of resamples
+    :type num_samples: int
+    :param rng: the random number generator to use
+    :type rng: np.random.Generator
+    :return: the stack of confusion matrices (num_samples, num_classes, num_classes)
+    :rtype: np.ndarray
+    """
+    total = int(matrix.sum())
+    if total == 0:
+        return np.zeros((num_samples,) + matrix.shape, dtype=np.int64)
+    cells = matrix.ravel().astype(np.float64) / total
+    return rng.multinomial(total, cells, size=num_samples).reshape((num_samples,) + matrix.shape)
+
+
+def _bootstrap_indices(args) -> list:
+    """
+    Evaluates the function on bootstrap resamples of the rows, used by the worker processes.
+
+    :param args: the tuple of function, arrays, number of resamples and seed
+    :type args: tuple
+    :return: the values, one per resample
+    :rtype: list
+    """
+    function, arrays, num_samples, seed = args
+    rng = np.random.default_rng(seed)
+    n = len(arrays[0])
+    result = []
+    for _ in range(num_samples):
+        indices = rng.integers(0, n, size=n)
+        result.append(function(*[x[indices] for x in arrays]))
+    return result
+
+
+def bootstrap_rows(function: Callable, arrays: Tuple[np.ndarray, ...], num_samples: int, seed: int = None,
+                   num_chunks: int = 1, executor: Executor = None) -> np.ndarray:
+    """
+    Evaluates the function on bootstrap resamples of the rows of the arrays, for statistics
+    that cannot be derived from a confusion matrix. The resamples get split into chunks
+    with independent random streams (derived from the seed), which get evaluated
+    in the executor if provided.
+
+    :param function: the (picklable) function to evaluate, receives the resampled arrays
+    :type function: callable
+    :param arrays: the arrays to resample, same number of rows
+    :type arrays: tuple
+    :param num_samples: the number of resamples
+    :type num_samples: int
+    :param seed: the seed for the random number generators, None for a random one
+    :type seed: int
+    :param num_chunks: the number of chunks to split the resamples into
+    :type num_chunks: int
+    :param executor: the executor for evaluating the chunks, evaluates them sequentially if None
+    :type executor: Executor
+    :return: the values (num_samples, ...)
+    :rtype: np.ndarray
+    """
+    num_chunks = max(1, min(num_chunks, num_samples))
+    seeds = np.random.SeedSequence(seed).spawn(num_chunks)
+    sizes = [len(x) for x in np.array_split(np.arange(num_samples), num_chunks)]
+    tasks = [(function, arrays, size, s) for size, s in zip(sizes, seeds)]
+    if executor is None:
+        chunks = [_bootstrap_indices(task) for task in tasks]
+    else:
+        chunks = list(executor.map(_bootstrap_indices, tasks))
+    result = []
+    for chunk in chunks:
+        result.extend(chunk)
+    return np.array(result, dtype=np.float64)
+
+
+def bootstrap_interval(values: np.ndarray, confidence: float = CONFIDENCE) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Computes mean and percentile interval from the bootstrap values, ignoring NaNs.
+
+    :param values: the values of the resamples (num_samples, ...)
+    :type values: np.ndarray
+    :param confidence: the confidence level of the interval, e.g., 0.95
+    :type confidence: float
+    :return: the tuple of mean, lower and upper bound
+    :rtype: tuple
+    """
+    values = np.asarray(values, dtype=np.float64)
+    alpha = (1.0 - confidence) / 2.0
+    # slices without any valid values result in NaN
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        lower, upper = np.nanquantile(values, [alpha, 1.0 - alpha], axis=0)
+        mean = np.nanmean(values, axis=0)
+    return mean, lower, upper
+
+
+def bootstrap_names(name: str) -> List[str]:
+    """
+    Returns the names of the mean, lower and upper bound statistics.
+
+    :param name: the name of the statistic
+    :type name: str
+    :return: the names
+    :rtype: list
+    """
+    return ["%s (mean)" % name, "%s (lower)" % name, "%s (upper)" % name]
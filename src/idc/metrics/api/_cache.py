@@ -0,0 +1,476 @@
+import glob
+import hashlib
+import importlib
+import json
+import os
+import pickle
+import shutil
+import tempfile
+from typing import List, Optional, Iterable
+
+import numpy as np
+
+from idc.api import ImageData, ImageClassificationData
+
+CACHE_VERSION = 2
+
+CACHE_MAX_SIZE = 1024
+
+CACHE_CHUNK_SIZE = 10000
+
+CACHE_INDEX = "index.json"
+
+CACHE_NAMES = "names-%05d.npy"
+
+CACHE_SIZES = "sizes-%05d.npy"
+
+CACHE_LABELS = "labels-%05d.npy"
+
+CACHE_ANNOTATIONS = "annotations-%05d.pkl"
+
+CACHE_METADATA = "metadata-%05d.pkl"
+
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+def expand_source_files(paths: List[str]) -> List[str]:
+    """
+    Expands the paths into a sorted list of files: directories get traversed
+    recursively, globs get expanded.
+
+    :param paths: the files, directories or globs
+    :type paths: list
+    :return: the files
+    :rtype: list
+    """
+    result = set()
+    for path in paths:
+        for match in sorted(glob.glob(path, recursive=True)) if glob.has_magic(path) else [path]:
+            if os.path.isdir(match):
+                for root, _, files in os.walk(match):
+                    for f in files:
+                        result.add(os.path.join(root, f))
+            elif os.path.exists(match):
+                result.add(match)
+    return sorted(result)
+
+
+def _hash_file(path: str) -> str:
+    """
+    Computes the SHA-256 of the file's content.
+
+    :param path: the file to hash
+    :type path: str
+    :return: the hex digest
+    :rtype: str
+    """
+    result = hashlib.sha256()
+    with open(path, "rb") as fp:
+        while True:
+            block = fp.read(HASH_BLOCK_SIZE)
+            if not block:
+                break
+            result.update(block)
+    return result.hexdigest()
+
+
+def cache_key(parts: List[str], files: List[str], hash_contents: bool = False) -> str:
+    """
+    Generates the key for a cache entry from the parts (e.g., the sub-flow's command-line)
+    and the fingerprint of the files, i.e., path, modification time and size (or the
+    hash of the content) of each file.
+
+    :param parts: the strings that identify the entry
+    :type parts: list
+    :param files: the source files of the entry
+    :type files: list
+    :param hash_contents: whether to hash the file contents rather than using modification time and size
+    :type hash_contents: bool
+    :return: the key
+    :rtype: str
+    """
+    result = hashlib.sha256()
+    result.update(json.dumps([CACHE_VERSION] + list(parts)).encode("utf-8"))
+    for path in files:
+        if hash_contents:
+            fingerprint = [os.path.abspath(path), _hash_file(path)]
+        else:
+            stat = os.stat(path)
+            fingerprint = [os.path.abspath(path), stat.st_mtime_ns, stat.st_size]
+        result.update(json.dumps(fingerprint).encode("utf-8"))
+    return result.hexdigest()
+
+
+def _class_path(cls) -> str:
+    """
+    Returns the fully qualified name of the class.
+
+    :param cls: the class
+    :return: the name
+    :rtype: str
+    """
+    return cls.__module__ + "." + cls.__name__
+
+
+def _load_class(path: str):
+    """
+    Returns the class for the fully qualified name.
+
+    :param path: the name of the class
+    :type path: str
+    :return: the class
+    """
+    module, name = path.rsplit(".", 1)
+    return getattr(importlib.import_module(module), name)
+
+
+class AnnotationCache:
+    """
+    Persistent on-disk cache for annotation items, stored without their image data.
+    Each entry is a directory with chunks of the image names and sizes as numpy arrays
+    that get memory-mapped when loading. Classification labels get stored as int32 indices
+    into the class table of the index file, other annotations get pickled.
+    Entries that have not been used for the longest time get evicted once the
+    cache exceeds its maximum size.
+    """
+
+    def __init__(self, cache_dir: str, max_size: float = CACHE_MAX_SIZE):
+        """
+        Initializes the cache.
+
+        :param cache_dir: the directory for the cache entries
+        :type cache_dir: str
+        :param max_size: the maximum size of the cache in MB
+        :type max_size: float
+        """
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+
+    def _entry_dir(self, key: str) -> str:
+        """
+        Returns the directory of the entry.
+
+        :param key: the key of the entry
+        :type key: str
+        :return: the directory
+        :rtype: str
+        """
+        return os.path.join(self.cache_dir, key)
+
+    def has(self, key: str) -> bool:
+        """
+        Returns whether an entry is stored under the key.
+
+        :param key: the key of the entry
+        :type key: str
+        :return: True if available
+        :rtype: bool
+        """
+        return os.path.exists(os.path.join(self._entry_dir(key), CACHE_INDEX))
+
+    def invalidate(self, key: str) -> bool:
+        """
+        Removes the entry stored under the key.
+
+        :param key: the key of the entry
+        :type key: str
+        :return: True if an entry was removed
+        :rtype: bool
+        """
+        path = self._entry_dir(key)
+        if not os.path.exists(path):
+            return False
+        shutil.rmtree(path, ignore_errors=True)
+        return True
+
+    def clear(self):
+        """
+        Removes all the entries.
+        """
+        for key in self.keys():
+            self.invalidate(key)
+
+    def keys(self) -> List[str]:
+        """
+        Returns the keys of all the entries.
+
+        :return: the keys
+        :rtype: list
+        """
+        if not os.path.isdir(self.cache_dir):
+            return []
+        return [x for x in os.listdir(self.cache_dir) if self.has(x)]
+
+    def writer(self, key: str) -> "AnnotationCacheWriter":
+        """
+        Returns a writer for adding the items for the key incrementally.
+
+        :param key: the key of the entry
+        :type key: str
+        :return: the writer
+        :rtype: AnnotationCacheWriter
+        """
+        return AnnotationCacheWriter(self, key)
+
+    def store(self, key: str, items: List[ImageData]):
+        """
+        Stores the items under the key, replacing any existing entry.
+        Evicts old entries afterwards if the cache has grown too large.
+
+        :param key: the key of the entry
+        :type key: str
+        :param items: the items to store, all of the same type
+        :type items: list
+        """
+        writer = self.writer(key)
+        try:
+            for item in items:
+                writer.append(item)
+        except:
+            writer.abort()
+            raise
+        writer.close()
+
+    def iterate(self, key: str) -> Optional[Iterable[ImageData]]:
+        """
+        Returns the items stored under the key, loading them one chunk at a time.
+
+        :param key: the key of the entry
+        :type key: str
+        :return: the items, None if no entry available
+        :rtype: Iterable
+        """
+        if not self.has(key):
+            return None
+        path = self._entry_dir(key)
+        with open(os.path.join(path, CACHE_INDEX), "r") as fp:
+            index = json.load(fp)
+        if index.get("version") != CACHE_VERSION:
+            return None
+        # marks the entry as recently used for the eviction
+        os.utime(os.path.join(path, CACHE_INDEX))
+        return self._iterate(path, index)
+
+    def _iterate(self, path: str, index: dict) -> Iterable[ImageData]:
+        """
+        Generates the items of the entry.
+
+        :param path: the directory of the entry
+        :type path: str
+        :param index: the index of the entry
+        :type index: dict
+        :return: the items
+        :rtype: Iterable
+        """
+        if index["count"] == 0:
+            return
+        cls = _load_class(index["type"])
+        for chunk in range(index["chunks"]):
+            names = np.load(os.path.join(path, CACHE_NAMES % chunk), mmap_mode="r")
+            sizes = np.load(os.path.join(path, CACHE_SIZES % chunk), mmap_mode="r")
+            if "classes" in index:
+                classes = index["classes"]
+                annotations = [None if x < 0 else classes[x] for x in np.load(os.path.join(path, CACHE_LABELS % chunk), mmap_mode="r").tolist()]
+            else:
+                with open(os.path.join(path, CACHE_ANNOTATIONS % chunk), "rb") as fp:
+                    annotations = pickle.load(fp)
+            metadata = None
+            if os.path.exists(os.path.join(path, CACHE_METADATA % chunk)):
+                with open(os.path.join(path, CACHE_METADATA % chunk), "rb") as fp:
+                    metadata = pickle.load(fp)
+            for i, (name, size) in enumerate(zip(names.tolist(), sizes.tolist())):
+                yield cls(image_name=name, image_size=None if size[0] < 0 else tuple(size),
+                          metadata=None if metadata is None else metadata[i], annotation=annotations[i])
+
+    def load(self, key: str) -> Optional[List[ImageData]]:
+        """
+        Loads the items stored under the key.
+
+        :param key: the key of the entry
+        :type key: str
+        :return: the items, None if no entry available
+        :rtype: list
+        """
+        items = self.iterate(key)
+        if items is None:
+            return None
+        return list(items)
+
+    def _size(self, key: str) -> int:
+        """
+        Returns the size of the entry in bytes.
+
+        :param key: the key of the entry
+        :type key: str
+        :return: the size
+        :rtype: int
+        """
+        path = self._entry_dir(key)
+        return sum(os.path.getsize(os.path.join(path, x)) for x in os.listdir(path))
+
+    def size(self) -> int:
+        """
+        Returns the size of all the entries in bytes.
+
+        :return: the size
+        :rtype: int
+        """
+        return sum(self._size(x) for x in self.keys())
+
+    def evict(self, keep: str = None) -> List[str]:
+        """
+        Removes the least recently used entries until the cache no longer exceeds its maximum size.
+
+        :param keep: the key of the entry that must not be removed, ignored if None
+        :type keep: str
+        :return: the keys of the removed entries
+        :rtype: list
+        """
+        if self.max_size is None:
+            return []
+        limit = self.max_size * 1024 * 1024
+        entries = []
+        for key in self.keys():
+            try:
+                used = os.path.getmtime(os.path.join(self._entry_dir(key), CACHE_INDEX))
+                entries.append((used, key, self._size(key)))
+            except OSError:
+                # removed concurrently
+                pass
+        total = sum(x[2] for x in entries)
+        result = []
+        for used, key, size in sorted(entries):
+            if total <= limit:
+                break
+            if key == keep:
+                continue
+            self.invalidate(key)
+            total -= size
+            result.append(key)
+        return result
+
+
+class AnnotationCacheWriter:
+    """
+    Adds the items of a cache entry incrementally, writing them to disk in chunks,
+    so that only the current chunk is held in memory. The entry only becomes
+    available once the writer is closed.
+    """
+
+    def __init__(self, cache: AnnotationCache, key: str, chunk_size: int = CACHE_CHUNK_SIZE):
+        """
+        Initializes the writer.
+
+        :param cache: the cache to write to
+        :type cache: AnnotationCache
+        :param key: the key of the entry
+        :type key: str
+        :param chunk_size: the number of items per chunk
+        :type chunk_size: int
+        """
+        self.cache = cache
+        self.key = key
+        self.chunk_size = chunk_size
+        os.makedirs(cache.cache_dir, exist_ok=True)
+        self._tmp_dir = tempfile.mkdtemp(prefix=".tmp-", dir=cache.cache_dir)
+        self._type = None
+        self._classes = None
+        self._count = 0
+        self._chunks = 0
+        self._items = []
+
+    @property
+    def count(self) -> int:
+        """
+        Returns the number of items added so far.
+
+        :return: the number of items
+        :rtype: int
+        """
+        return self._count
+
+    def append(self, item: ImageData):
+        """
+        Adds the item, all items must be of the same type.
+
+        :param item: the item to add
+        :type item: ImageData
+        """
+        if self._tmp_dir is None:
+            raise Exception("Writer has already been closed!")
+        if self._type is None:
+            self._type = type(item)
+            if isinstance(item, ImageClassificationData):
+                self._classes = dict()
+        elif type(item) is not self._type:
+            raise Exception("Cannot cache items of different types: %s" % ", ".join(sorted(_class_path(x) for x in [self._type, type(item)])))
+        self._items.append(item)
+        self._count += 1
+        if len(self._items) >= self.chunk_size:
+            self._flush()
+
+    def _flush(self):
+        """
+        Writes the buffered items to disk as the next chunk.
+        """
+        if len(self._items) == 0:
+            return
+        items = self._items
+        chunk = self._chunks
+        np.save(os.path.join(self._tmp_dir, CACHE_NAMES % chunk), np.array([x.image_name for x in items], dtype=np.str_))
+        sizes = np.full((len(items), 2), -1, dtype=np.int32)
+        for i, item in enumerate(items):
+            size = None if isinstance(item, ImageClassificationData) else item.image_size
+            if size is not None:
+                sizes[i] = size
+        np.save(os.path.join(self._tmp_dir, CACHE_SIZES % chunk), sizes)
+        if self._classes is not None:
+            labels = np.array([-1 if not x.annotation else self._classes.setdefault(x.annotation, len(self._classes)) for x in items], dtype=np.int32)
+            np.save(os.path.join(self._tmp_dir, CACHE_LABELS % chunk), labels)
+        else:
+            with open(os.path.join(self._tmp_dir, CACHE_ANNOTATIONS % chunk), "wb") as fp:
+                pickle.dump([x.annotation for x in items], fp, protocol=pickle.HIGHEST_PROTOCOL)
+        metadata = [x.get_metadata() for x in items]
+        if any(x for x in metadata):
+            with open(os.path.join(self._tmp_dir, CACHE_METADATA % chunk), "wb") as fp:
+                pickle.dump(metadata, fp, protocol=pickle.HIGHEST_PROTOCOL)
+        self._chunks += 1
+        self._items = []
+
+    def close(self):
+        """
+        Writes any remaining items and the index, then moves the entry into place.
+        Evicts old entries afterwards if the cache has grown too large.
+        """
+        if self._tmp_dir is None:
+            return
+        try:
+            self._flush()
+            index = {
+                "version": CACHE_VERSION,
+                "type": None if self._type is None else _class_path(self._type),
+                "count": self._count,
+                "chunks": self._chunks,
+            }
+            if self._classes is not None:
+                index["classes"] = list(self._classes.keys())
+            # the index gets written last, marking the entry as complete
+            with open(os.path.join(self._tmp_dir, CACHE_INDEX), "w") as fp:
+                json.dump(index, fp)
+            self.cache.invalidate(self.key)
+            os.replace(self._tmp_dir, self.cache._entry_dir(self.key))
+            self._tmp_dir = None
+        except:
+            self.abort()
+            raise
+        self.cache.evict(keep=self.key)
+
+    def abort(self):
+        """
+        Discards the items written so far.
+        """
+        if self._tmp_dir is None:
+            return
+        shutil.rmtree(self._tmp_dir, ignore_errors=True)
+        self._tmp_dir = None
+        self._items = []
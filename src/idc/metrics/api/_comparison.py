@@ -0,0 +1,213 @@
+import math
+import warnings
+from typing import Callable, Tuple
+
+import numpy as np
+
+NUM_PERMUTATIONS = 1000
+
+MCNEMAR_EXACT_THRESHOLD = 25
+
+CHUNK_ELEMENTS = 1 << 22
+
+
+def model_confusion_matrices(anns: np.ndarray, preds: np.ndarray, num_classes: int) -> np.ndarray:
+    """
+    Computes the confusion matrices of several models on the same pairs with a single bincount.
+
+    :param anns: the label indices of the annotations (num_pairs)
+    :type anns: np.ndarray
+    :param preds: the label indices of the predictions (num_models, num_pairs)
+    :type preds: np.ndarray
+    :param num_classes: the number of classes
+    :type num_classes: int
+    :return: the stack of confusion matrices (num_models, num_classes, num_classes)
+    :rtype: np.ndarray
+    """
+    preds = np.asarray(preds, dtype=np.int64)
+    num_models, num_pairs = preds.shape
+    models = np.repeat(np.arange(num_models, dtype=np.int64), num_pairs)
+    combined = (models * num_classes + np.tile(np.asarray(anns, dtype=np.int64), num_models)) * num_classes + preds.ravel()
+    counts = np.bincount(combined, minlength=num_models * num_classes * num_classes)
+    return counts.reshape((num_models, num_classes, num_classes))
+
+
+def mcnemar_test(correct_a: np.ndarray, correct_b: np.ndarray, exact: bool = None) -> Tuple[float, float]:
+    """
+    Performs McNemar's test on the paired correctness of two models. The statistic is the
+    continuity-corrected chi-square one. The p-value stems from the exact binomial test
+    if requested (or, if None, when there are fewer discordant pairs than MCNEMAR_EXACT_THRESHOLD),
+    otherwise from the chi-square distribution with one degree of freedom.
+
+    :param correct_a: the flags whether the first model predicted the pairs correctly
+    :type correct_a: np.ndarray
+    :param correct_b: the flags whether the second model predicted the pairs correctly
+    :type correct_b: np.ndarray
+    :param exact: whether to use the exact binomial test, automatic if None
+    :type exact: bool
+    :return: the tuple of statistic and p-value
+    :rtype: tuple
+    """
+    correct_a = np.asarray(correct_a, dtype=bool)
+    correct_b = np.asarray(correct_b, dtype=bool)
+    b = int(np.count_nonzero(correct_a & ~correct_b))
+    c = int(np.count_nonzero(~correct_a & correct_b))
+    n = b + c
+    if n == 0:
+        return 0.0, 1.0
+    statistic = (abs(b - c) - 1) ** 2 / n
+    if exact is None:
+        exact = n < MCNEMAR_EXACT_THRESHOLD
+    if exact:
+        tail = sum(math.comb(n, i) for i in range(min(b, c) + 1))
+        p_value = min(1.0, 2 * tail / 2 ** n)
+    else:
+        p_value = math.erfc(math.sqrt(statistic / 2))
+    return float(statistic), float(p_value)
+
+
+def _count_extreme(observed: np.ndarray, permuted: np.ndarray) -> np.ndarray:
+    """
+    Counts the permuted differences that are at least as extreme as the observed one.
+
+    :param observed: the observed difference
+    :type observed: np.ndarray
+    :param permuted: the differences of the permutations (num_permutations, ...)
+    :type permuted: np.ndarray
+    :return: the counts
+    :rtype: np.ndarray
+    """
+    # tolerance for differences that are equal, but suffer from rounding errors
+    return np.count_nonzero(np.abs(permuted) >= np.abs(observed) - 1e-12, axis=0)
+
+
+def _p_value(observed: np.ndarray, count: np.ndarray, num_permutations: int) -> np.ndarray:
+    """
+    Turns the number of extreme permutations into a p-value (including the observed one).
+
+    :param observed: the observed difference
+    :type observed: np.ndarray
+    :param count: the number of permutations that were at least as extreme
+    :type count: np.ndarray
+    :param num_permutations: the number of permutations
+    :type num_permutations: int
+    :return: the p-value(s), NaN where the observed difference is NaN
+    :rtype: np.ndarray
+    """
+    result = (count + 1.0) / (num_permutations + 1.0)
+    return np.where(np.isnan(observed), np.nan, result)
+
+
+def permutation_test_from_confusion(function: Callable, anns: np.ndarray, preds_a: np.ndarray, preds_b: np.ndarray,
+                                    num_classes: int, num_permutations: int = NUM_PERMUTATIONS,
+                                    seed: int = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Performs a paired permutation test on the difference of a statistic that gets derived from
+    the confusion matrix, randomly swapping the predictions of the two models per pair.
+    Only pairs where the models disagree can change the matrices, hence the permuted matrices
+    are built from the matrix of the agreeing pairs plus a batched bincount of the others.
+
+    :param function: the function that computes the statistic from a stack of confusion matrices
+    :type function: callable
+    :param anns: the label indices of the annotations
+    :type anns: np.ndarray
+    :param preds_a: the label indices predicted by the first model
+    :type preds_a: np.ndarray
+    :param preds_b: the label indices predicted by the second model
+    :type preds_b: np.ndarray
+    :param num_classes: the number of classes
+    :type num_classes: int
+    :param num_permutations: the number of permutations
+    :type num_permutations: int
+    :param seed: the seed for the random number generator, None for a random one
+    :type seed: int
+    :return: the tuple of observed difference (first - second) and p-value
+    :rtype: tuple
+    """
+    anns = np.asarray(anns, dtype=np.int64)
+    preds_a = np.asarray(preds_a, dtype=np.int64)
+    preds_b = np.asarray(preds_b, dtype=np.int64)
+    matrices = model_confusion_matrices(anns, np.stack([preds_a, preds_b]), num_classes)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        values = np.asarray(function(matrices), dtype=np.float64)
+    observed = values[0] - values[1]
+
+    differ = preds_a != preds_b
+    base = model_confusion_matrices(anns[~differ], preds_a[~differ][np.newaxis], num_classes)[0]
+    anns = anns[differ]
+    preds_a = preds_a[differ]
+    preds_b = preds_b[differ]
+    num_pairs = len(anns)
+    rng = np.random.default_rng(seed)
+    count = np.zeros(observed.shape, dtype=np.int64)
+    chunk_size = max(1, CHUNK_ELEMENTS // max(1, num_pairs))
+    for start in range(0, num_permutations, chunk_size):
+        size = min(chunk_size, num_permutations - start)
+        swap = rng.random((size, num_pairs)) < 0.5
+        offsets = np.arange(size, dtype=np.int64)[:, np.newaxis] * (num_classes * num_classes) + anns * num_classes
+        minlength = size * num_classes * num_classes
+        perm_a = np.bincount((offsets + np.where(swap, preds_b, preds_a)).ravel(), minlength=minlength)
+        perm_b = np.bincount((offsets + np.where(swap, preds_a, preds_b)).ravel(), minlength=minlength)
+        perm_a = perm_a.reshape((size, num_classes, num_classes)) + base
+        perm_b = perm_b.reshape((size, num_classes, num_classes)) + base
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", category=RuntimeWarning)
+            permuted = np.asarray(function(perm_a), dtype=np.float64) - np.asarray(function(perm_b), dtype=np.float64)
+        count += _count_extreme(observed, permuted)
+    return observed, _p_value(observed, count, num_permutations)
+
+
+def permutation_test_rows(function: Callable, anns: np.ndarray, values_a: np.ndarray, values_b: np.ndarray,
+                          num_permutations: int = NUM_PERMUTATIONS, seed: int = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Performs a paired permutation test on the difference of a statistic that cannot be
+    derived from a confusion matrix (e.g., from scores), randomly swapping the rows of
+    the two models per pair and evaluating the function for each permutation.
+
+    :param function: the function that computes the statistic, receives annotations and the model's values
+    :type function: callable
+    :param anns: the label indices of the annotations
+    :type anns: np.ndarray
+    :param values_a: the values of the first model (num_pairs, ...), e.g., the score matrix
+    :type values_a: np.ndarray
+    :param values_b: the values of the second model (num_pairs, ...)
+    :type values_b: np.ndarray
+    :param num_permutations: the number of permutations
+    :type num_permutations: int
+    :param seed: the seed for the random number generator, None for a random one
+    :type seed: int
+    :return: the tuple of observed difference (first - second) and p-value
+    :rtype: tuple
+    """
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        observed = np.asarray(function(anns, values_a), dtype=np.float64) - np.asarray(function(anns, values_b), dtype=np.float64)
+    rng = np.random.default_rng(seed)
+    shape = (len(anns),) + (1,) * (np.ndim(values_a) - 1)
+    count = np.zeros(observed.shape, dtype=np.int64)
+    for _ in range(num_permutations):
+        swap = (rng.random(len(anns)) < 0.5).reshape(shape)
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", category=RuntimeWarning)
+            permuted = np.asarray(function(anns, np.where(swap, values_b, values_a)), dtype=np.float64) \
+                - np.asarray(function(anns, np.where(swap, values_a, values_b)), dtype=np.float64)
+        count += _count_extreme(observed, permuted[np.newaxis])
+    return observed, _p_value(observed, count, num_permutations)
+
+
+def comparison_names(name: str, model_a: str, model_b: str) -> Tuple[str, str]:
+    """
+    Returns the names of the difference and p-value statistics of the comparison of two models.
+
+    :param name: the name of the statistic
+    :type name: str
+    :param model_a: the name of the first model
+    :type model_a: str
+    :param model_b: the name of the second model
+    :type model_b: str
+    :return: the tuple of names
+    :rtype: tuple
+    """
+    prefix = "%s [%s vs %s]" % (name, model_a, model_b)
+    return "%s (difference)" % prefix, "%s (p-value)" % prefix
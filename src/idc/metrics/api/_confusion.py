@@ -0,0 +1,266 @@
+import numpy as np
+
+AVERAGE_MICRO = "micro"
+AVERAGE_MACRO = "macro"
+AVERAGE_WEIGHTED = "weighted"
+AVERAGE_NONE = "none"
+AVERAGES = [
+    AVERAGE_MICRO,
+    AVERAGE_MACRO,
+    AVERAGE_WEIGHTED,
+    AVERAGE_NONE,
+]
+
+
+def confusion_matrix(anns: np.ndarray, preds: np.ndarray, num_classes: int) -> np.ndarray:
+    """
+    Computes the confusion matrix from the label indices with a single bincount.
+    Rows represent the annotations (actual), columns the predictions.
+
+    :param anns: the label indices of the annotations
+    :type anns: np.ndarray
+    :param preds: the label indices of the predictions
+    :type preds: np.ndarray
+    :param num_classes: the number of classes
+    :type num_classes: int
+    :return: the num_classes x num_classes matrix with the counts
+    :rtype: np.ndarray
+    """
+    combined = np.asarray(anns, dtype=np.int64) * num_classes + np.asarray(preds, dtype=np.int64)
+    return np.bincount(combined, minlength=num_classes * num_classes).reshape((num_classes, num_classes))
+
+
+def safe_divide(num: np.ndarray, denom: np.ndarray) -> np.ndarray:
+    """
+    Divides the two arrays, returning 0 where the denominator is 0.
+
+    :param num: the numerator
+    :type num: np.ndarray
+    :param denom: the denominator
+    :type denom: np.ndarray
+    :return: the result
+    :rtype: np.ndarray
+    """
+    num = np.asarray(num, dtype=np.float64)
+    denom = np.asarray(denom, dtype=np.float64)
+    num, denom = np.broadcast_arrays(num, denom)
+    return np.divide(num, denom, out=np.zeros(num.shape, dtype=np.float64), where=denom != 0)
+
+
+def confusion_counts(matrix: np.ndarray):
+    """
+    Determines true positives, false positives and false negatives per class.
+    Supports stacks of matrices, i.e., (..., num_classes, num_classes).
+
+    :param matrix: the confusion matrix (or matrices)
+    :type matrix: np.ndarray
+    :return: the tuple of tp, fp, fn arrays
+    :rtype: tuple
+    """
+    tp = np.diagonal(matrix, axis1=-2, axis2=-1)
+    fp = matrix.sum(axis=-2) - tp
+    fn = matrix.sum(axis=-1) - tp
+    return tp, fp, fn
+
+
+def _average(scores: np.ndarray, tp: np.ndarray, fp: np.ndarray, fn: np.ndarray, average: str) -> np.ndarray:
+    """
+    Averages the per-class scores. Macro averaging ignores classes that
+    neither occur in the annotations nor in the predictions.
+
+    :param scores: the per-class scores
+    :type scores: np.ndarray
+    :param tp: the true positives per class
+    :type tp: np.ndarray
+    :param fp: the false positives per class
+    :type fp: np.ndarray
+    :param fn: the false negatives per class
+    :type fn: np.ndarray
+    :param average: the type of average (macro/weighted/none)
+    :type average: str
+    :return: the averaged score(s)
+    :rtype: np.ndarray
+    """
+    if (average is None) or (average == AVERAGE_NONE):
+        return scores
+    if average == AVERAGE_WEIGHTED:
+        weights = (tp + fn).astype(np.float64)
+    elif average == AVERAGE_MACRO:
+        weights = ((tp + fp + fn) > 0).astype(np.float64)
+    else:
+        raise Exception("Unsupported average: %s" % average)
+    return safe_divide((weights * scores).sum(axis=-1), weights.sum(axis=-1))
+
+
+def _micro(matrix: np.ndarray) -> np.ndarray:
+    """
+    Computes the micro average, which is identical for accuracy, precision and recall
+    in the multi-class case (single label per image).
+
+    :param matrix: the confusion matrix (or matrices)
+    :type matrix: np.ndarray
+    :return: the micro average(s)
+    :rtype: np.ndarray
+    """
+    return safe_divide(np.trace(matrix, axis1=-2, axis2=-1), matrix.sum(axis=(-2, -1)))
+
+
+def accuracy_from_confusion(matrix: np.ndarray, average: str = AVERAGE_MICRO) -> np.ndarray:
+    """
+    Computes the (top-1) accuracy from the confusion matrix.
+
+    :param matrix: the confusion matrix (or matrices)
+    :type matrix: np.ndarray
+    :param average: the type of average to use
+    :type average: str
+    :return: the accuracy
+    :rtype: np.ndarray
+    """
+    if average == AVERAGE_MICRO:
+        return _micro(matrix)
+    tp, fp, fn = confusion_counts(matrix)
+    return _average(safe_divide(tp, tp + fn), tp, fp, fn, average)
+
+
+def precision_from_confusion(matrix: np.ndarray, average: str = AVERAGE_MICRO) -> np.ndarray:
+    """
+    Computes the precision from the confusion matrix.
+
+    :param matrix: the confusion matrix (or matrices)
+    :type matrix: np.ndarray
+    :param average: the type of average to use
+    :type average: str
+    :return: the precision
+    :rtype: np.ndarray
+    """
+    if average == AVERAGE_MICRO:
+        return _micro(matrix)
+    tp, fp, fn = confusion_counts(matrix)
+    return _average(safe_divide(tp, tp + fp), tp, fp, fn, average)
+
+
+def recall_from_confusion(matrix: np.ndarray, average: str = AVERAGE_MICRO) -> np.ndarray:
+    """
+    Computes the recall from the confusion matrix.
+
+    :param matrix: the confusion matrix (or matrices)
+    :type matrix: np.ndarray
+    :param average: the type of average to use
+    :type average: str
+    :return: the recall
+    :rtype: np.ndarray
+    """
+    if average == AVERAGE_MICRO:
+        return _micro(matrix)
+    tp, fp, fn = confusion_counts(matrix)
+    return _average(safe_divide(tp, tp + fn), tp, fp, fn, average)
+
+
+def cohen_kappa_from_confusion(matrix: np.ndarray) -> np.ndarray:
+    """
+    Computes Cohen's Kappa from the confusion matrix.
+
+    :param matrix: the confusion matrix (or matrices)
+    :type matrix: np.ndarray
+    :return: the kappa
+    :rtype: np.ndarray
+    """
+    total = matrix.sum(axis=(-2, -1)).astype(np.float64)
+    observed = safe_divide(np.trace(matrix, axis1=-2, axis2=-1), total)
+    expected = safe_divide((matrix.sum(axis=-1) * matrix.sum(axis=-2)).sum(axis=-1), total * total)
+    return 1.0 - safe_divide(1.0 - observed, 1.0 - expected)
+
+
+def pairs_from_confusion(matrix: np.ndarray):
+    """
+    Expands the confusion matrix into the label indices of the annotation/prediction
+    pairs it was built from (in the order of the cells).
+
+    :param matrix: the confusion matrix (num_classes, num_classes)
+    :type matrix: np.ndarray
+    :return: the tuple of int32 arrays with the label indices of annotations and predictions
+    :rtype: tuple
+    """
+    num_classes = matrix.shape[0]
+    cells = np.repeat(np.arange(num_classes * num_classes, dtype=np.int64), matrix.ravel())
+    return (cells // num_classes).astype(np.int32), (cells % num_classes).astype(np.int32)
+
+
+class ConfusionMatrix:
+    """
+    Confusion matrix that accumulates counts across batches.
+    Grows automatically when the number of classes increases.
+    """
+
+    def __init__(self, num_classes: int = 0):
+        """
+        Initializes the matrix.
+
+        :param num_classes: the initial number of classes
+        :type num_classes: int
+        """
+        self.matrix = np.zeros((num_classes, num_classes), dtype=np.int64)
+
+    @property
+    def num_classes(self) -> int:
+        """
+        Returns the current number of classes.
+
+        :return: the number of classes
+        :rtype: int
+        """
+        return self.matrix.shape[0]
+
+    @property
+    def total(self) -> int:
+        """
+        Returns the number of pairs that have been accumulated.
+
+        :return: the number of pairs
+        :rtype: int
+        """
+        return int(self.matrix.sum())
+
+    def grow(self, num_classes: int):
+        """
+        Enlarges the matrix to the specified number of classes, retaining the counts.
+
+        :param num_classes: the new number of classes
+        :type num_classes: int
+        """
+        if num_classes <= self.num_classes:
+            return
+        matrix = np.zeros((num_classes, num_classes), dtype=np.int64)
+        matrix[:self.num_classes, :self.num_classes] = self.matrix
+        self.matrix = matrix
+
+    def update(self, anns: np.ndarray, preds: np.ndarray, num_classes: int = None):
+        """
+        Adds the label indices of the batch to the counts.
+
+        :param anns: the label indices of the annotations
+        :type anns: np.ndarray
+        :param preds: the label indices of the predictions
+        :type preds: np.ndarray
+        :param num_classes: the number of classes, uses the current one if None
+        :type num_classes: int
+        """
+        if num_classes is not None:
+            self.grow(num_classes)
+        self.matrix += confusion_matrix(anns, preds, self.num_classes)
+
+    def merge(self, matrix: np.ndarray):
+        """
+        Adds the counts of the other confusion matrix, which uses the same label indices.
+
+        :param matrix: the confusion matrix to add
+        :type matrix: np.ndarray
+        """
+        self.grow(matrix.shape[0])
+        self.matrix[:matrix.shape[0], :matrix.shape[0]] += matrix
+
+    def reset(self):
+        """
+        Clears the counts.
+        """
+        self.matrix = np.zeros_like(self.matrix)
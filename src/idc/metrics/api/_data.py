@@ -1,7 +1,10 @@
 from dataclasses import dataclass
-from typing import List
+from typing import List, Any
 from idc.api import ImageData
 
+from ._encoded import EncodedPairs
+from ._state import StatisticState
+
 
 @dataclass
 class ImagePair:
@@ -18,9 +21,12 @@ class ImagePair:
 
 class ImagePairList(List[ImagePair]):
     """
-    Simple list of ImagePair objects.
+    Simple list of ImagePair objects. The last flag indicates that
+    no further pairs will follow this batch.
     """
 
+    last: bool = False
+
     def _check_type(self, item):
         if not isinstance(item, ImagePair):
             raise Exception("Only accepts objects of type: %s" % str(type(ImagePair)))
@@ -30,10 +36,155 @@ class ImagePairList(List[ImagePair]):
         super().append(item)
 
     def extend(self, iterable):
-        for item in iterable:
+        items = list(iterable)
+        for item in items:
+            self._check_type(item)
+        super().extend(items)
+
+    def insert(self, index, object):
+        self._check_type(object)
+        super().insert(index, object)
+
+
+def split_pairs(pairs: List[ImagePair], num_chunks: int) -> List[ImagePairList]:
+    """
+    Splits the pairs into contiguous chunks of (almost) equal size, e.g., for
+    distributing them across worker processes. Empty chunks get omitted.
+
+    :param pairs: the pairs to split
+    :type pairs: list
+    :param num_chunks: the number of chunks to generate
+    :type num_chunks: int
+    :return: the chunks
+    :rtype: list
+    """
+    result = []
+    num_chunks = max(1, min(num_chunks, len(pairs)))
+    for i in range(num_chunks):
+        chunk = ImagePairList()
+        chunk.extend(pairs[i * len(pairs) // num_chunks:(i + 1) * len(pairs) // num_chunks])
+        if len(chunk) > 0:
+            result.append(chunk)
+    return result
+
+
+def to_batches(data: Any) -> List[ImagePairList]:
+    """
+    Turns the data that a filter received into a list of batches of pairs:
+    a single ImagePairList, a list of ImagePairList objects or a list of ImagePair objects.
+    EncodedPairs and StatisticState objects get passed through as batches.
+
+    :param data: the data to convert
+    :return: the list of batches
+    :rtype: list
+    """
+    if isinstance(data, (ImagePairList, EncodedPairs, StatisticState)):
+        return [data]
+    if isinstance(data, ImagePair):
+        data = [data]
+    if all(isinstance(x, (ImagePairList, EncodedPairs, StatisticState)) for x in data):
+        return list(data)
+    result = ImagePairList()
+    result.extend(data)
+    return [result]
+
+
+@dataclass
+class MultiImagePair:
+    """
+    Container for an annotation and the predictions of several models for the same image.
+    """
+    image_name: str = None
+    annotation: ImageData = None
+    predictions: List[ImageData] = None
+
+    def pair(self, index: int) -> ImagePair:
+        """
+        Returns the annotation/prediction pair of the specified model.
+
+        :param index: the 0-based index of the model
+        :type index: int
+        :return: the pair
+        :rtype: ImagePair
+        """
+        return ImagePair(image_name=self.image_name, annotation=self.annotation, prediction=self.predictions[index])
+
+    def __str__(self):
+        return self.image_name
+
+
+class MultiImagePairList(List[MultiImagePair]):
+    """
+    Simple list of MultiImagePair objects, sharing the same models. The last flag
+    indicates that no further pairs will follow this batch.
+    """
+
+    last: bool = False
+
+    models: List[str] = None
+
+    def _check_type(self, item):
+        if not isinstance(item, MultiImagePair):
+            raise Exception("Only accepts objects of type: %s" % str(type(MultiImagePair)))
+
+    def append(self, item):
+        self._check_type(item)
+        super().append(item)
+
+    def extend(self, iterable):
+        items = list(iterable)
+        for item in items:
             self._check_type(item)
-        super().extend(iterable)
+        super().extend(items)
 
     def insert(self, index, object):
         self._check_type(object)
         super().insert(index, object)
+
+    @property
+    def num_models(self) -> int:
+        """
+        Returns the number of models, determined from the first pair if no model names set.
+
+        :return: the number of models
+        :rtype: int
+        """
+        if self.models is not None:
+            return len(self.models)
+        if len(self) > 0:
+            return len(self[0].predictions)
+        return 0
+
+    def pairs(self, index: int) -> ImagePairList:
+        """
+        Returns the annotation/prediction pairs of the specified model.
+
+        :param index: the 0-based index of the model
+        :type index: int
+        :return: the pairs
+        :rtype: ImagePairList
+        """
+        result = ImagePairList()
+        result.extend(x.pair(index) for x in self)
+        result.last = self.last
+        return result
+
+
+def to_multi_batches(data: Any) -> List[MultiImagePairList]:
+    """
+    Turns the data that a filter received into a list of batches of multi-pairs:
+    a single MultiImagePairList, a list of MultiImagePairList objects or a list of MultiImagePair objects.
+
+    :param data: the data to convert
+    :return: the list of batches
+    :rtype: list
+    """
+    if isinstance(data, MultiImagePairList):
+        return [data]
+    if isinstance(data, MultiImagePair):
+        data = [data]
+    if all(isinstance(x, MultiImagePairList) for x in data):
+        return list(data)
+    result = MultiImagePairList()
+    result.extend(data)
+    return [result]
@@ -0,0 +1,257 @@
+from typing import List, Tuple
+
+import numpy as np
+
+from ._data import ImagePair
+
+MIN_DEPTH = 1e-3
+CHUNK_SIZE = 1024 * 1024
+DELTA_BASE = 1.25
+DELTA_POWERS = [1, 2, 3]
+
+
+class DepthAccumulator:
+    """
+    Accumulates the running sums for depth estimation error metrics, processing
+    the depth maps in fixed-size chunks of pixels (float32 math, float64 sums).
+    Only pixels with a finite ground truth within [min_depth, max_depth] are valid,
+    predictions get clipped to that range.
+    """
+
+    def __init__(self, min_depth: float = MIN_DEPTH, max_depth: float = None, chunk_size: int = CHUNK_SIZE):
+        """
+        Initializes the accumulator.
+
+        :param min_depth: the minimum valid depth
+        :type min_depth: float
+        :param max_depth: the maximum valid depth, no limit if None
+        :type max_depth: float
+        :param chunk_size: the number of pixels to process at a time
+        :type chunk_size: int
+        """
+        self.min_depth = min_depth
+        self.max_depth = max_depth
+        self.chunk_size = chunk_size
+        self.reset()
+
+    def reset(self):
+        """
+        Clears the running sums.
+        """
+        self.count = 0
+        self.sum_abs_rel = 0.0
+        self.sum_sq_rel = 0.0
+        self.sum_sq = 0.0
+        self.sum_sq_log = 0.0
+        self.sum_delta = np.zeros(len(DELTA_POWERS), dtype=np.int64)
+
+    def _update_chunk(self, gt: np.ndarray, pred: np.ndarray):
+        """
+        Adds a chunk of pixels to the running sums.
+
+        :param gt: the ground truth depths
+        :type gt: np.ndarray
+        :param pred: the predicted depths
+        :type pred: np.ndarray
+        """
+        valid = np.isfinite(gt) & (gt >= self.min_depth)
+        if self.max_depth is not None:
+            valid &= gt <= self.max_depth
+        if not valid.all():
+            gt = gt[valid]
+            pred = pred[valid]
+        if len(gt) == 0:
+            return
+        pred = np.nan_to_num(pred, nan=self.min_depth)
+        pred = np.clip(pred, self.min_depth, self.max_depth if self.max_depth is not None else np.inf)
+        diff = gt - pred
+        sq = diff * diff
+        log_diff = np.log(gt) - np.log(pred)
+        ratio = np.maximum(gt / pred, pred / gt)
+        self.count += len(gt)
+        self.sum_abs_rel += float(np.sum(np.abs(diff) / gt, dtype=np.float64))
+        self.sum_sq_rel += float(np.sum(sq / gt, dtype=np.float64))
+        self.sum_sq += float(np.sum(sq, dtype=np.float64))
+        self.sum_sq_log += float(np.sum(log_diff * log_diff, dtype=np.float64))
+        for i, power in enumerate(DELTA_POWERS):
+            self.sum_delta[i] += int(np.count_nonzero(ratio < DELTA_BASE ** power))
+
+    def update(self, gt: np.ndarray, pred: np.ndarray):
+        """
+        Adds the depth maps to the running sums.
+
+        :param gt: the ground truth depth map
+        :type gt: np.ndarray
+        :param pred: the predicted depth map
+        :type pred: np.ndarray
+        """
+        gt = np.asarray(gt)
+        pred = np.asarray(pred)
+        if gt.shape != pred.shape:
+            raise Exception("Annotation and prediction differ in size: %s != %s" % (str(gt.shape), str(pred.shape)))
+        gt = gt.reshape(-1)
+        pred = pred.reshape(-1)
+        for start in range(0, len(gt), self.chunk_size):
+            end = start + self.chunk_size
+            self._update_chunk(gt[start:end].astype(np.float32, copy=False), pred[start:end].astype(np.float32, copy=False))
+
+    def update_pair(self, pair: ImagePair) -> bool:
+        """
+        Adds the depth maps of the pair to the running sums.
+
+        :param pair: the pair to add
+        :type pair: ImagePair
+        :return: False if either annotation or prediction has no depth information
+        :rtype: bool
+        """
+        ann = pair.annotation.annotation
+        pred = pair.prediction.annotation
+        if (ann is None) or (pred is None) or (ann.data is None) or (pred.data is None):
+            return False
+        self.update(ann.data, pred.data)
+        return True
+
+    def merge(self, other: 'DepthAccumulator'):
+        """
+        Adds the running sums of the other accumulator, which must use the same depth range.
+
+        :param other: the accumulator to add
+        :type other: DepthAccumulator
+        """
+        if (other.min_depth != self.min_depth) or (other.max_depth != self.max_depth):
+            raise Exception("Cannot merge depth accumulators with different depth ranges: [%s, %s] != [%s, %s]"
+                            % (str(other.min_depth), str(other.max_depth), str(self.min_depth), str(self.max_depth)))
+        self.count += other.count
+        self.sum_abs_rel += other.sum_abs_rel
+        self.sum_sq_rel += other.sum_sq_rel
+        self.sum_sq += other.sum_sq
+        self.sum_sq_log += other.sum_sq_log
+        self.sum_delta += other.sum_delta
+
+    def _mean(self, total: float) -> float:
+        """
+        Divides the sum by the number of valid pixels.
+
+        :param total: the sum
+        :type total: float
+        :return: the mean, NaN if no valid pixels
+        :rtype: float
+        """
+        if self.count == 0:
+            return float("nan")
+        return total / self.count
+
+    def abs_rel(self) -> float:
+        """
+        Returns the mean absolute relative error.
+
+        :return: the error
+        :rtype: float
+        """
+        return self._mean(self.sum_abs_rel)
+
+    def sq_rel(self) -> float:
+        """
+        Returns the mean squared relative error.
+
+        :return: the error
+        :rtype: float
+        """
+        return self._mean(self.sum_sq_rel)
+
+    def rmse(self) -> float:
+        """
+        Returns the root mean squared error.
+
+        :return: the error
+        :rtype: float
+        """
+        return float(np.sqrt(self._mean(self.sum_sq)))
+
+    def rmse_log(self) -> float:
+        """
+        Returns the root mean squared error of the log depths.
+
+        :return: the error
+        :rtype: float
+        """
+        return float(np.sqrt(self._mean(self.sum_sq_log)))
+
+    def delta(self, power: int = 1) -> float:
+        """
+        Returns the fraction of pixels with max(gt/pred, pred/gt) < 1.25^power.
+
+        :param power: the power of the threshold (1, 2 or 3)
+        :type power: int
+        :return: the fraction
+        :rtype: float
+        """
+        if power not in DELTA_POWERS:
+            raise Exception("Unsupported power for delta threshold: %s" % str(power))
+        return self._mean(float(self.sum_delta[DELTA_POWERS.index(power)]))
+
+
+def depth_accumulator_from_pairs(pairs: List[ImagePair], min_depth: float = MIN_DEPTH, max_depth: float = None,
+                                chunk_size: int = CHUNK_SIZE) -> Tuple[DepthAccumulator, List[str]]:
+    """
+    Accumulates the running sums of the pairs. Used for processing chunks of pairs
+    in worker processes, the accumulators get merged afterwards.
+
+    :param pairs: the depth pairs to process
+    :type pairs: list
+    :param min_depth: the minimum valid depth
+    :type min_depth: float
+    :param max_depth: the maximum valid depth, no limit if None
+    :type max_depth: float
+    :param chunk_size: the number of pixels to process at a time
+    :type chunk_size: int
+    :return: the tuple of accumulator and names of the images without depth information
+    :rtype: tuple
+    """
+    accumulator = DepthAccumulator(min_depth=min_depth, max_depth=max_depth, chunk_size=chunk_size)
+    failed = []
+    for pair in pairs:
+        if not accumulator.update_pair(pair):
+            failed.append(pair.image_name)
+    return accumulator, failed
+
+
+def image_rmse(gts: List[np.ndarray], preds: List[np.ndarray], min_depth: float = MIN_DEPTH, max_depth: float = None) -> np.ndarray:
+    """
+    Computes the RMSE per image, using the same validity mask and clipping as
+    DepthAccumulator. All images get evaluated at once via weighted bincounts.
+    Images without valid pixels get NaN.
+
+    :param gts: the ground truth depth maps
+    :type gts: list
+    :param preds: the predicted depth maps
+    :type preds: list
+    :param min_depth: the minimum valid depth
+    :type min_depth: float
+    :param max_depth: the maximum valid depth, no limit if None
+    :type max_depth: float
+    :return: the RMSE per image
+    :rtype: np.ndarray
+    """
+    num_images = len(gts)
+    if num_images == 0:
+        return np.zeros(0, dtype=np.float64)
+    for gt, pred in zip(gts, preds):
+        if np.shape(gt) != np.shape(pred):
+            raise Exception("Annotation and prediction differ in size: %s != %s" % (str(np.shape(gt)), str(np.shape(pred))))
+    sizes = np.array([np.size(x) for x in gts], dtype=np.int64)
+    images = np.repeat(np.arange(num_images, dtype=np.int64), sizes)
+    gt = np.concatenate([np.ravel(x) for x in gts]).astype(np.float32, copy=False)
+    pred = np.concatenate([np.ravel(x) for x in preds]).astype(np.float32, copy=False)
+    valid = np.isfinite(gt) & (gt >= min_depth)
+    if max_depth is not None:
+        valid &= gt <= max_depth
+    images = images[valid]
+    gt = gt[valid]
+    pred = np.clip(np.nan_to_num(pred[valid], nan=min_depth), min_depth, max_depth if max_depth is not None else np.inf)
+    diff = (gt - pred).astype(np.float64)
+    counts = np.bincount(images, minlength=num_images)
+    sums = np.bincount(images, weights=diff * diff, minlength=num_images)
+    result = np.full(num_images, np.nan)
+    result[counts > 0] = np.sqrt(sums[counts > 0] / counts[counts > 0])
+    return result
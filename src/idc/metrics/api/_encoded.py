@@ -0,0 +1,297 @@
+import json
+import os
+from typing import List, Optional
+
+import numpy as np
+
+ENCODED_VERSION = 1
+
+ENCODED_INDEX = "index.json"
+
+ENCODED_LABELS = "labels.i32"
+
+ENCODED_SCORES = "scores.f32"
+
+ENCODED_NAMES = "names.bin"
+
+ENCODED_NAME_OFFSETS = "names.i64"
+
+
+class EncodedPairs:
+    """
+    Classification pairs in encoded form: the class table, the int32 label indices of
+    annotations and predictions, an optional float32 score matrix and the image names
+    (UTF-8 bytes plus offsets). The arrays are usually memory-mapped from disk.
+    The last flag indicates that no further pairs will follow.
+    """
+
+    def __init__(self, classes: List[str], anns: np.ndarray, preds: np.ndarray, scores: np.ndarray = None,
+                 name_data: np.ndarray = None, name_offsets: np.ndarray = None, last: bool = False):
+        """
+        Initializes the pairs.
+
+        :param classes: the class table, the label indices refer to it
+        :type classes: list
+        :param anns: the label indices of the annotations (num_pairs)
+        :type anns: np.ndarray
+        :param preds: the label indices of the predictions (num_pairs)
+        :type preds: np.ndarray
+        :param scores: the score matrix (num_pairs, num_classes), None if not available
+        :type scores: np.ndarray
+        :param name_data: the UTF-8 bytes of all the image names, None if not available
+        :type name_data: np.ndarray
+        :param name_offsets: the start offsets of the names in name_data (num_pairs + 1)
+        :type name_offsets: np.ndarray
+        :param last: whether no further pairs will follow
+        :type last: bool
+        """
+        self.classes = classes
+        self.anns = anns
+        self.preds = preds
+        self.scores = scores
+        self.name_data = name_data
+        self.name_offsets = name_offsets
+        self.last = last
+
+    def __len__(self):
+        return len(self.anns)
+
+    @property
+    def num_classes(self) -> int:
+        """
+        Returns the number of classes in the class table.
+
+        :return: the number of classes
+        :rtype: int
+        """
+        return len(self.classes)
+
+    def name(self, index: int) -> Optional[str]:
+        """
+        Returns the image name of the pair.
+
+        :param index: the 0-based index of the pair
+        :type index: int
+        :return: the name, None if no names available
+        :rtype: str
+        """
+        if self.name_data is None:
+            return None
+        return bytes(self.name_data[self.name_offsets[index]:self.name_offsets[index + 1]]).decode("utf-8")
+
+    def names(self) -> Optional[List[str]]:
+        """
+        Returns the image names of all the pairs.
+
+        :return: the names, None if not available
+        :rtype: list
+        """
+        if self.name_data is None:
+            return None
+        return [self.name(i) for i in range(len(self))]
+
+    def slice(self, start: int, end: int) -> 'EncodedPairs':
+        """
+        Returns the pairs in the range, sharing the underlying arrays.
+
+        :param start: the 0-based index of the first pair
+        :type start: int
+        :param end: the 0-based index after the last pair
+        :type end: int
+        :return: the pairs, without the last flag
+        :rtype: EncodedPairs
+        """
+        return EncodedPairs(self.classes, self.anns[start:end], self.preds[start:end],
+                            scores=None if self.scores is None else self.scores[start:end],
+                            name_data=self.name_data,
+                            name_offsets=None if self.name_offsets is None else self.name_offsets[start:end + 1])
+
+
+class EncodedPairsOutput:
+    """
+    Appends encoded pairs to the binary files in the output directory. The files are raw
+    little-endian arrays that get described by the JSON index, which is written when closing.
+    Since the class table can grow over time, score rows written before new classes
+    appeared get padded when closing.
+    """
+
+    def __init__(self, output_dir: str, with_scores: bool = False):
+        """
+        Initializes the output.
+
+        :param output_dir: the directory to write the files to
+        :type output_dir: str
+        :param with_scores: whether to write the score matrix
+        :type with_scores: bool
+        """
+        self.output_dir = output_dir
+        self.with_scores = with_scores
+        self._labels = None
+        self._scores = None
+        self._names = None
+        self._offsets = None
+        self._offset = 0
+        self._count = 0
+        # the number of rows and columns of the written score chunks
+        self._score_chunks = []
+
+    def _path(self, name: str) -> str:
+        """
+        Returns the path of the file in the output directory.
+
+        :param name: the name of the file
+        :type name: str
+        :return: the path
+        :rtype: str
+        """
+        return os.path.join(self.output_dir, name)
+
+    def open(self):
+        """
+        Creates the output directory and opens the files.
+        """
+        os.makedirs(self.output_dir, exist_ok=True)
+        # remove the index of any previous data, the directory is incomplete until closed
+        if os.path.exists(self._path(ENCODED_INDEX)):
+            os.remove(self._path(ENCODED_INDEX))
+        self._labels = open(self._path(ENCODED_LABELS), "wb")
+        self._names = open(self._path(ENCODED_NAMES), "wb")
+        self._offsets = open(self._path(ENCODED_NAME_OFFSETS), "wb")
+        self._offsets.write(np.zeros(1, dtype="<i8").tobytes())
+        if self.with_scores:
+            self._scores = open(self._path(ENCODED_SCORES), "wb")
+        elif os.path.exists(self._path(ENCODED_SCORES)):
+            os.remove(self._path(ENCODED_SCORES))
+        self._offset = 0
+        self._count = 0
+        self._score_chunks = []
+
+    def append(self, names: List[str], anns: np.ndarray, preds: np.ndarray, scores: np.ndarray = None):
+        """
+        Appends the encoded pairs.
+
+        :param names: the image names
+        :type names: list
+        :param anns: the label indices of the annotations
+        :type anns: np.ndarray
+        :param preds: the label indices of the predictions
+        :type preds: np.ndarray
+        :param scores: the score matrix, required if writing scores
+        :type scores: np.ndarray
+        """
+        if self._labels is None:
+            self.open()
+        if len(anns) == 0:
+            return
+        labels = np.empty((len(anns), 2), dtype="<i4")
+        labels[:, 0] = anns
+        labels[:, 1] = preds
+        self._labels.write(labels.tobytes())
+        encoded = [x.encode("utf-8") for x in names]
+        lengths = np.fromiter((len(x) for x in encoded), dtype=np.int64, count=len(encoded))
+        self._names.write(b"".join(encoded))
+        self._offsets.write((self._offset + np.cumsum(lengths)).astype("<i8").tobytes())
+        self._offset += int(lengths.sum())
+        if self.with_scores:
+            if scores is None:
+                raise Exception("No scores provided!")
+            self._scores.write(np.ascontiguousarray(scores, dtype="<f4").tobytes())
+            self._score_chunks.append(scores.shape)
+        self._count += len(anns)
+
+    def _pad_scores(self, num_classes: int):
+        """
+        Rewrites the score matrix if earlier chunks have fewer columns than classes.
+
+        :param num_classes: the final number of classes
+        :type num_classes: int
+        """
+        if all(x[1] == num_classes for x in self._score_chunks):
+            return
+        path = self._path(ENCODED_SCORES)
+        tmp = path + ".tmp"
+        with open(path, "rb") as fin, open(tmp, "wb") as fout:
+            for rows, cols in self._score_chunks:
+                chunk = np.frombuffer(fin.read(rows * cols * 4), dtype="<f4").reshape((rows, cols))
+                if cols < num_classes:
+                    chunk = np.pad(chunk, ((0, 0), (0, num_classes - cols)))
+                fout.write(chunk.tobytes())
+        os.replace(tmp, path)
+
+    def close(self, classes: List[str], score_key: str = None):
+        """
+        Closes the files and writes the index.
+
+        :param classes: the class table
+        :type classes: list
+        :param score_key: the meta-data key the scores stem from, for information
+        :type score_key: str
+        """
+        if self._labels is None:
+            self.open()
+        for fp in [self._labels, self._names, self._offsets, self._scores]:
+            if fp is not None:
+                fp.close()
+        self._labels = None
+        self._names = None
+        self._offsets = None
+        self._scores = None
+        if self.with_scores:
+            self._pad_scores(len(classes))
+        index = {
+            "version": ENCODED_VERSION,
+            "num_pairs": self._count,
+            "classes": list(classes),
+            "scores": self.with_scores,
+        }
+        if self.with_scores and (score_key is not None):
+            index["score_key"] = score_key
+        with open(self._path(ENCODED_INDEX), "w") as fp:
+            json.dump(index, fp, indent=2)
+
+
+def _map(path: str, dtype: str, shape: tuple) -> np.ndarray:
+    """
+    Memory-maps the raw array, returns an empty one if there is no data.
+
+    :param path: the file to map
+    :type path: str
+    :param dtype: the data type of the values
+    :type dtype: str
+    :param shape: the shape of the array
+    :type shape: tuple
+    :return: the array
+    :rtype: np.ndarray
+    """
+    if int(np.prod(shape)) == 0:
+        return np.zeros(shape, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r", shape=shape)
+
+
+def load_encoded_pairs(input_dir: str, load_scores: bool = True) -> EncodedPairs:
+    """
+    Memory-maps the encoded pairs written by EncodedPairsOutput.
+
+    :param input_dir: the directory with the files
+    :type input_dir: str
+    :param load_scores: whether to map the score matrix (if available)
+    :type load_scores: bool
+    :return: the pairs, flagged as last
+    :rtype: EncodedPairs
+    """
+    path = os.path.join(input_dir, ENCODED_INDEX)
+    if not os.path.exists(path):
+        raise Exception("No index found, incomplete or no encoded pairs: %s" % input_dir)
+    with open(path, "r") as fp:
+        index = json.load(fp)
+    if index.get("version") != ENCODED_VERSION:
+        raise Exception("Unsupported version of encoded pairs: %s" % str(index.get("version")))
+    num_pairs = index["num_pairs"]
+    classes = index["classes"]
+    labels = _map(os.path.join(input_dir, ENCODED_LABELS), "<i4", (num_pairs, 2))
+    scores = None
+    if load_scores and index.get("scores", False):
+        scores = _map(os.path.join(input_dir, ENCODED_SCORES), "<f4", (num_pairs, len(classes)))
+    offsets = _map(os.path.join(input_dir, ENCODED_NAME_OFFSETS), "<i8", (num_pairs + 1,))
+    name_data = _map(os.path.join(input_dir, ENCODED_NAMES), "u1", (int(offsets[-1]),))
+    return EncodedPairs(classes, labels[:, 0], labels[:, 1], scores=scores, name_data=name_data, name_offsets=offsets, last=True)
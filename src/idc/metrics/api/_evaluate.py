@@ -0,0 +1,320 @@
+from typing import List, Dict, Any, Union, Optional, Sequence, Tuple
+
+import numpy as np
+
+from ._confusion import confusion_matrix
+from ._depth import MIN_DEPTH, DepthAccumulator
+from ._imgseg import SegmentationConfusion
+from ._objdet import MAX_DETECTIONS, DetectionArrays, DetectionEvaluator
+from ._scores import pad_scores
+
+EVALUATE_IC = "ic"
+EVALUATE_OD = "od"
+EVALUATE_IS = "is"
+EVALUATE_DP = "dp"
+EVALUATE_TYPES = [
+    EVALUATE_IC,
+    EVALUATE_OD,
+    EVALUATE_IS,
+    EVALUATE_DP,
+]
+
+
+def _available_statistics(data_type: str) -> Tuple[Dict, type]:
+    """
+    Returns the available summary statistics and their superclass for the data type.
+
+    :param data_type: the data type (ic|od|is|dp)
+    :type data_type: str
+    :return: the tuple of statistics and superclass
+    :rtype: tuple
+    """
+    # the statistics themselves rely on the api module
+    from idc.metrics.registry import available_imgcls_statistics, available_objdet_statistics, available_imgseg_statistics, available_depth_statistics
+    if data_type == EVALUATE_IC:
+        from idc.metrics.statistic.imgcls import ClassificationStatistic
+        return available_imgcls_statistics(), ClassificationStatistic
+    elif data_type == EVALUATE_OD:
+        from idc.metrics.statistic.objdet import ObjectDetectionStatistic
+        return available_objdet_statistics(), ObjectDetectionStatistic
+    elif data_type == EVALUATE_IS:
+        from idc.metrics.statistic.imgseg import SegmentationStatistic
+        return available_imgseg_statistics(), SegmentationStatistic
+    elif data_type == EVALUATE_DP:
+        from idc.metrics.statistic.depth import DepthStatistic
+        return available_depth_statistics(), DepthStatistic
+    else:
+        raise Exception("Unsupported data type: %s" % data_type)
+
+
+def parse_statistics(statistics: str, data_type: str) -> List:
+    """
+    Parses and initializes the summary statistics (same format as the --statistics
+    option of the summary statistics filters). Parsing them once and passing the
+    list to the evaluate_* functions avoids the parsing overhead on repeated calls.
+
+    :param statistics: the statistics (and their options) to parse, e.g., "accuracy-ic precision-ic -a macro"
+    :type statistics: str
+    :param data_type: the data type (ic|od|is|dp)
+    :type data_type: str
+    :return: the statistics
+    :rtype: list
+    """
+    from seppl import split_args, split_cmdline, args_to_objects, Initializable, init_initializable
+    valid, superclass = _available_statistics(data_type)
+    args = split_args(split_cmdline(statistics), list(valid.keys()))
+    result = args_to_objects(args, valid, allow_global_options=False)
+    for statistic in result:
+        if not isinstance(statistic, superclass):
+            raise Exception("Not a %s statistic: %s" % (data_type, str(type(statistic))))
+        if isinstance(statistic, Initializable):
+            init_initializable(statistic, "statistic")
+    return result
+
+
+def _statistics(statistics: Union[str, List], data_type: str) -> List:
+    """
+    Returns the statistics, parsing them if necessary.
+
+    :param statistics: the statistics string or the already parsed statistics
+    :param data_type: the data type (ic|od|is|dp)
+    :type data_type: str
+    :return: the statistics
+    :rtype: list
+    """
+    if isinstance(statistics, str):
+        return parse_statistics(statistics, data_type)
+    return statistics
+
+
+def label_indices(anns: np.ndarray, preds: np.ndarray = None, classes: Sequence[str] = None) -> Tuple[np.ndarray, Optional[np.ndarray], List[str]]:
+    """
+    Turns the string labels into label indices, in the order of the classes or
+    alphabetically if no classes provided. Integer labels get returned as is.
+
+    :param anns: the labels of the annotations
+    :type anns: np.ndarray
+    :param preds: the labels of the predictions, can be None
+    :type preds: np.ndarray
+    :param classes: the classes that determine the indices, None to determine from the labels
+    :type classes: list
+    :return: the tuple of annotation indices, prediction indices and the classes (None for integer labels)
+    :rtype: tuple
+    """
+    anns = np.asarray(anns)
+    preds = None if preds is None else np.asarray(preds)
+    if np.issubdtype(anns.dtype, np.integer) and ((preds is None) or np.issubdtype(preds.dtype, np.integer)):
+        return anns, preds, None if classes is None else list(classes)
+    if classes is None:
+        classes = np.unique(anns if preds is None else np.concatenate([anns, preds]))
+    classes = np.asarray(classes)
+    sorter = np.argsort(classes, kind="stable")
+    result = []
+    for labels in [anns, preds]:
+        if labels is None:
+            result.append(None)
+            continue
+        pos = np.searchsorted(classes, labels, sorter=sorter).clip(max=len(classes) - 1)
+        indices = sorter[pos]
+        unknown = classes[indices] != labels
+        if unknown.any():
+            raise Exception("Unknown label(s): %s" % ", ".join(str(x) for x in np.unique(labels[unknown])))
+        result.append(indices.astype(np.int64))
+    return result[0], result[1], [str(x) for x in classes]
+
+
+def _to_list(stats: List) -> List[Tuple[str, Any]]:
+    """
+    Turns the statistics into a list of (name, value) tuples, in the order of the
+    statistics. Statistics with the same name (e.g., the same statistic with
+    different options) are all retained.
+
+    :param stats: the statistics to convert
+    :type stats: list
+    :return: the list of statistic name/value tuples
+    :rtype: list
+    """
+    return [(stat.statistic, stat.value) for stat in stats]
+
+
+def evaluate_classification(anns: np.ndarray, preds: np.ndarray = None, scores: np.ndarray = None,
+                            statistics: Union[str, List] = "accuracy-ic", num_classes: int = None,
+                            classes: Sequence[str] = None) -> List[Tuple[str, Any]]:
+    """
+    Calculates the classification statistics directly from the label arrays, using
+    the same engines as summary-statistics-ic: the confusion matrix gets computed
+    once and shared by all the statistics that can be derived from it.
+
+    :param anns: the labels of the annotations (N,), either label indices or strings
+    :type anns: np.ndarray
+    :param preds: the labels of the predictions (N,), determined from the scores if None
+    :type preds: np.ndarray
+    :param scores: the per-class scores of the predictions (N, num_classes), only required by score-based statistics
+    :type scores: np.ndarray
+    :param statistics: the statistics (see parse_statistics) or the list of already parsed ones
+    :param num_classes: the number of classes, determined from the labels/scores if None
+    :type num_classes: int
+    :param classes: the classes in the order of the score columns, for string labels (alphabetical order if None)
+    :type classes: list
+    :return: the statistics as (name, value) tuples, use dict() on them if the names are unique
+    :rtype: list
+    """
+    if (preds is None) and (scores is None):
+        raise Exception("Either predictions or scores are required!")
+    if scores is not None:
+        scores = np.asarray(scores, dtype=np.float32)
+    anns, preds, classes = label_indices(anns, preds, classes=classes)
+    if preds is None:
+        # the score columns are in the order of the classes, i.e., in index space
+        if (classes is not None) and (len(classes) != scores.shape[1]):
+            raise Exception("Number of classes and score columns differ: %d != %d (provide the classes of the score columns)" % (len(classes), scores.shape[1]))
+        preds = scores.argmax(axis=1)
+    if len(anns) != len(preds):
+        raise Exception("Annotations and predictions differ in length: %d != %d" % (len(anns), len(preds)))
+    if len(anns) == 0:
+        raise Exception("No annotations and predictions to evaluate!")
+    if num_classes is None:
+        if classes is not None:
+            num_classes = len(classes)
+        else:
+            num_classes = int(max(anns.max(initial=-1), preds.max(initial=-1))) + 1
+        if scores is not None:
+            num_classes = max(num_classes, scores.shape[1])
+    if scores is not None:
+        scores = pad_scores(scores, num_classes)
+
+    matrix = None
+    result = []
+    for statistic in _statistics(statistics, EVALUATE_IC):
+        statistic.set_num_classes(num_classes)
+        if statistic.requires_scores() and (scores is None):
+            raise Exception("Statistic requires scores: %s" % statistic.name())
+        if statistic.supports_confusion_matrix():
+            if matrix is None:
+                matrix = confusion_matrix(anns, preds, num_classes)
+            result.append(statistic.calculate_from_confusion_matrix(matrix))
+        elif statistic.supports_score_matrix():
+            result.append(statistic.calculate_from_scores(anns, scores))
+        elif statistic.requires_scores():
+            result.append(statistic.calculate(anns, scores))
+        else:
+            result.append(statistic.calculate(anns, preds))
+    return _to_list(result)
+
+
+def evaluate_detection(gt_boxes: np.ndarray, gt_labels: np.ndarray, gt_images: np.ndarray,
+                       det_boxes: np.ndarray, det_labels: np.ndarray, det_images: np.ndarray, det_scores: np.ndarray = None,
+                       statistics: Union[str, List] = "map-od", num_images: int = None, num_classes: int = None,
+                       iou_thresholds: np.ndarray = None, max_detections: int = MAX_DETECTIONS,
+                       workers: int = 1) -> List[Tuple[str, Any]]:
+    """
+    Calculates the object detection statistics directly from the flat box arrays
+    of all images, using the same engines as summary-statistics-od (COCO protocol).
+
+    :param gt_boxes: the boxes of the ground truth (N, 4) in absolute (x0, y0, x1, y1) format
+    :type gt_boxes: np.ndarray
+    :param gt_labels: the label indices of the ground truth (N,)
+    :type gt_labels: np.ndarray
+    :param gt_images: the image indices of the ground truth (N,)
+    :type gt_images: np.ndarray
+    :param det_boxes: the boxes of the detections (M, 4) in absolute (x0, y0, x1, y1) format
+    :type det_boxes: np.ndarray
+    :param det_labels: the label indices of the detections (M,)
+    :type det_labels: np.ndarray
+    :param det_images: the image indices of the detections (M,)
+    :type det_images: np.ndarray
+    :param det_scores: the scores of the detections (M,), 1.0 for all if None
+    :type det_scores: np.ndarray
+    :param statistics: the statistics (see parse_statistics) or the list of already parsed ones
+    :param num_images: the number of images, determined from the image indices if None
+    :type num_images: int
+    :param num_classes: the number of classes, determined from the labels if None
+    :type num_classes: int
+    :param iou_thresholds: the IoU thresholds, COCO ones if None
+    :type iou_thresholds: np.ndarray
+    :param max_detections: the maximum number of detections per image and label
+    :type max_detections: int
+    :param workers: the number of worker processes to use for matching, <= 1 for none
+    :type workers: int
+    :return: the statistics as (name, value) tuples, use dict() on them if the names are unique
+    :rtype: list
+    """
+    if det_scores is None:
+        det_scores = np.ones(len(det_labels), dtype=np.float32)
+    if num_images is None:
+        num_images = int(max(np.max(gt_images, initial=-1), np.max(det_images, initial=-1))) + 1
+    if num_images == 0:
+        raise Exception("No images to evaluate!")
+    arrays = DetectionArrays(num_images=num_images,
+                             gt_boxes=gt_boxes, gt_labels=gt_labels, gt_images=gt_images,
+                             det_boxes=det_boxes, det_labels=det_labels, det_scores=det_scores, det_images=det_images)
+    evaluator = DetectionEvaluator(iou_thresholds=iou_thresholds, max_detections=max_detections, workers=workers)
+    evaluator.update(arrays)
+    evaluation = evaluator.compute(num_classes)
+    return _to_list([statistic.calculate_from_evaluation(evaluation) for statistic in _statistics(statistics, EVALUATE_OD)])
+
+
+def evaluate_segmentation(ann_maps: Union[np.ndarray, List[np.ndarray]], pred_maps: Union[np.ndarray, List[np.ndarray]],
+                          statistics: Union[str, List] = "miou-is", num_classes: int = None) -> List[Tuple[str, Any]]:
+    """
+    Calculates the image segmentation statistics directly from label maps, using
+    the same engines as summary-statistics-is. The label maps contain the label
+    index per pixel, with 0 being the background.
+
+    :param ann_maps: the label maps of the annotations, either a single map (H, W), a stack (N, H, W) or a list of maps
+    :param pred_maps: the label maps of the predictions, same layout as the annotations
+    :param statistics: the statistics (see parse_statistics) or the list of already parsed ones
+    :param num_classes: the number of classes (including the background), determined from the maps if None
+    :type num_classes: int
+    :return: the statistics as (name, value) tuples, use dict() on them if the names are unique
+    :rtype: list
+    """
+    if isinstance(ann_maps, np.ndarray) and (ann_maps.ndim == 2):
+        ann_maps = [ann_maps]
+        pred_maps = [pred_maps]
+    if len(ann_maps) != len(pred_maps):
+        raise Exception("Annotations and predictions differ in number of maps: %d != %d" % (len(ann_maps), len(pred_maps)))
+    if len(ann_maps) == 0:
+        raise Exception("No maps to evaluate!")
+    if num_classes is None:
+        num_classes = 0
+        for maps in [ann_maps, pred_maps]:
+            for m in maps:
+                num_classes = max(num_classes, int(np.max(m, initial=0)) + 1)
+    confusion = SegmentationConfusion(num_classes)
+    # one map at a time limits the size of the temporary arrays
+    for ann_map, pred_map in zip(ann_maps, pred_maps):
+        confusion.update_maps(np.asarray(ann_map), np.asarray(pred_map))
+    return _to_list([statistic.calculate_from_confusion_matrix(confusion.matrix) for statistic in _statistics(statistics, EVALUATE_IS)])
+
+
+def evaluate_depth(gt: Union[np.ndarray, List[np.ndarray]], pred: Union[np.ndarray, List[np.ndarray]],
+                   statistics: Union[str, List] = "rmse-dp", min_depth: float = MIN_DEPTH,
+                   max_depth: float = None) -> List[Tuple[str, Any]]:
+    """
+    Calculates the depth estimation statistics directly from the depth maps, using
+    the same engines as summary-statistics-dp.
+
+    :param gt: the ground truth depths, either an array of any shape (e.g., (N, H, W)) or a list of maps
+    :param pred: the predicted depths, same layout as the ground truth
+    :param statistics: the statistics (see parse_statistics) or the list of already parsed ones
+    :param min_depth: the minimum valid depth
+    :type min_depth: float
+    :param max_depth: the maximum valid depth, no limit if None
+    :type max_depth: float
+    :return: the statistics as (name, value) tuples, use dict() on them if the names are unique
+    :rtype: list
+    """
+    accumulator = DepthAccumulator(min_depth=min_depth, max_depth=max_depth)
+    if isinstance(gt, np.ndarray):
+        if gt.size == 0:
+            raise Exception("No depths to evaluate!")
+        accumulator.update(gt, pred)
+    else:
+        if len(gt) != len(pred):
+            raise Exception("Annotations and predictions differ in number of maps: %d != %d" % (len(gt), len(pred)))
+        if len(gt) == 0:
+            raise Exception("No maps to evaluate!")
+        for g, p in zip(gt, pred):
+            accumulator.update(g, p)
+    return _to_list([statistic.calculate_from_accumulator(accumulator) for statistic in _statistics(statistics, EVALUATE_DP)])
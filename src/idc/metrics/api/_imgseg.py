@@ -0,0 +1,324 @@
+from typing import Optional, Tuple, List
+
+import numpy as np
+
+from ._confusion import ConfusionMatrix, confusion_counts, safe_divide
+from ._data import ImagePair
+from ._labels import LabelEncoder
+
+BACKGROUND_LABEL = "background"
+
+
+def segmentation_encoder(classes=None) -> LabelEncoder:
+    """
+    Creates a label encoder for segmentation data, which reserves index 0
+    for the background (i.e., pixels not covered by any layer).
+
+    :param classes: the fixed list of labels to use, determined from the data if None
+    :type classes: list
+    :return: the encoder
+    :rtype: LabelEncoder
+    """
+    if (classes is not None) and (len(classes) > 0):
+        return LabelEncoder(classes=[BACKGROUND_LABEL] + [x for x in classes if x != BACKGROUND_LABEL], fixed=True)
+    return LabelEncoder(classes=[BACKGROUND_LABEL])
+
+
+def label_map_from_layers(annotation, encoder: LabelEncoder, shape: Tuple[int, int] = None) -> Optional[np.ndarray]:
+    """
+    Turns the layers of the segmentation annotations into a single map of label indices.
+    Pixels not covered by any layer get the background index 0. Overlapping layers get
+    resolved in favor of the layer that comes last in the annotation's labels. Layers
+    with labels unknown to a fixed encoder count as background.
+
+    :param annotation: the ImageSegmentationAnnotations to convert
+    :param encoder: the encoder for the labels (see segmentation_encoder)
+    :type encoder: LabelEncoder
+    :param shape: the (height, width) to use if there are no layers
+    :type shape: tuple
+    :return: the label map (height, width), None if neither layers nor shape available
+    :rtype: np.ndarray
+    """
+    layers = dict() if (annotation is None) or (annotation.layers is None) else annotation.layers
+    if shape is None:
+        for layer in layers.values():
+            shape = layer.shape[:2]
+            break
+    if shape is None:
+        return None
+    dtype = np.uint8 if encoder.num_classes < 256 else np.int32
+    result = np.zeros(shape, dtype=dtype)
+    labels = annotation.labels if (annotation is not None) and (annotation.labels is not None) else list(layers.keys())
+    for label in labels:
+        if label not in layers:
+            continue
+        index = encoder.index_of(label)
+        if index is None:
+            encoder.num_skipped += 1
+            continue
+        if result.dtype == np.uint8 and index > 255:
+            result = result.astype(np.int32)
+        layer = layers[label]
+        if layer.ndim > 2:
+            layer = layer[..., 0]
+        result[layer > 0] = index
+    return result
+
+
+class SegmentationConfusion(ConfusionMatrix):
+    """
+    Pixel-level confusion matrix that gets updated image by image from label maps,
+    so that the masks never have to be held in memory all at once.
+    Intersection (diagonal), union and area per class are derived from it.
+    """
+
+    def update_maps(self, ann_map: np.ndarray, pred_map: np.ndarray, num_classes: int = None):
+        """
+        Adds the pixels of the annotation/prediction label maps to the counts.
+
+        :param ann_map: the label map of the annotation
+        :type ann_map: np.ndarray
+        :param pred_map: the label map of the prediction
+        :type pred_map: np.ndarray
+        :param num_classes: the number of classes, uses the current one if None
+        :type num_classes: int
+        """
+        if ann_map.shape != pred_map.shape:
+            raise Exception("Annotation and prediction differ in size: %s != %s" % (str(ann_map.shape), str(pred_map.shape)))
+        self.update(ann_map.ravel(), pred_map.ravel(), num_classes=num_classes)
+
+    def update_pair(self, pair: ImagePair, encoder: LabelEncoder) -> bool:
+        """
+        Converts the layers of the segmentation pair into label maps and adds their pixels
+        to the counts. The size of images without any layers gets determined from the image.
+
+        :param pair: the pair to add
+        :type pair: ImagePair
+        :param encoder: the encoder for the labels (see segmentation_encoder)
+        :type encoder: LabelEncoder
+        :return: False if the size of the label maps could not be determined
+        :rtype: bool
+        """
+        ann_map = label_map_from_layers(pair.annotation.annotation, encoder)
+        shape = None if ann_map is None else ann_map.shape
+        if shape is None:
+            size = pair.annotation.image_size
+            if size is None:
+                size = pair.prediction.image_size
+            if size is None:
+                return False
+            shape = (size[1], size[0])
+            ann_map = label_map_from_layers(pair.annotation.annotation, encoder, shape=shape)
+        pred_map = label_map_from_layers(pair.prediction.annotation, encoder, shape=shape)
+        self.update_maps(ann_map, pred_map, num_classes=encoder.num_classes)
+        return True
+
+
+def register_segmentation_labels(pairs: List[ImagePair], encoder: LabelEncoder):
+    """
+    Adds the labels of all the layers of annotations and predictions to the encoder
+    (unless fixed), so that copies of the encoder assign the same label indices,
+    e.g., when computing the confusion matrices in worker processes.
+
+    :param pairs: the segmentation pairs to get the labels from
+    :type pairs: list
+    :param encoder: the encoder to add the labels to (see segmentation_encoder)
+    :type encoder: LabelEncoder
+    """
+    if encoder.fixed:
+        return
+    for pair in pairs:
+        for data in [pair.annotation, pair.prediction]:
+            annotation = data.annotation
+            if (annotation is None) or (annotation.layers is None):
+                continue
+            labels = annotation.labels if annotation.labels is not None else list(annotation.layers.keys())
+            for label in labels:
+                if label in annotation.layers:
+                    encoder.index_of(label)
+
+
+def segmentation_confusion_from_pairs(pairs: List[ImagePair], classes: List[str]) -> Tuple[np.ndarray, int, List[str]]:
+    """
+    Computes the pixel confusion matrix of the pairs, using the fixed class labels.
+    Used for processing chunks of pairs in worker processes.
+
+    :param pairs: the segmentation pairs to process
+    :type pairs: list
+    :param classes: the class labels, including the background as first label
+    :type classes: list
+    :return: the tuple of confusion matrix, number of skipped layers and names of the images whose size could not be determined
+    :rtype: tuple
+    """
+    encoder = LabelEncoder(classes=classes, fixed=True)
+    confusion = SegmentationConfusion(len(classes))
+    failed = []
+    for pair in pairs:
+        if not confusion.update_pair(pair, encoder):
+            failed.append(pair.image_name)
+    return confusion.matrix, encoder.num_skipped, failed
+
+
+def image_confusion_matrices(ann_maps: List[np.ndarray], pred_maps: List[np.ndarray], num_classes: int) -> np.ndarray:
+    """
+    Computes the pixel confusion matrix of each image with a single bincount
+    across all the label maps.
+
+    :param ann_maps: the label maps of the annotations
+    :type ann_maps: list
+    :param pred_maps: the label maps of the predictions
+    :type pred_maps: list
+    :param num_classes: the number of classes
+    :type num_classes: int
+    :return: the stack of confusion matrices (images, num_classes, num_classes)
+    :rtype: np.ndarray
+    """
+    num_images = len(ann_maps)
+    if num_images == 0:
+        return np.zeros((0, num_classes, num_classes), dtype=np.int64)
+    for ann_map, pred_map in zip(ann_maps, pred_maps):
+        if ann_map.shape != pred_map.shape:
+            raise Exception("Annotation and prediction differ in size: %s != %s" % (str(ann_map.shape), str(pred_map.shape)))
+    sizes = np.array([m.size for m in ann_maps], dtype=np.int64)
+    images = np.repeat(np.arange(num_images, dtype=np.int64), sizes)
+    anns = np.concatenate([m.ravel() for m in ann_maps]).astype(np.int64)
+    preds = np.concatenate([m.ravel() for m in pred_maps]).astype(np.int64)
+    combined = (images * num_classes + anns) * num_classes + preds
+    counts = np.bincount(combined, minlength=num_images * num_classes * num_classes)
+    return counts.reshape((num_images, num_classes, num_classes))
+
+
+def image_mean_iou(ann_maps: List[np.ndarray], pred_maps: List[np.ndarray], num_classes: int, exclude_background: bool = False) -> np.ndarray:
+    """
+    Computes the mean IoU per image. Images without pixels get NaN.
+
+    :param ann_maps: the label maps of the annotations
+    :type ann_maps: list
+    :param pred_maps: the label maps of the predictions
+    :type pred_maps: list
+    :param num_classes: the number of classes
+    :type num_classes: int
+    :param exclude_background: whether to ignore the background class (index 0)
+    :type exclude_background: bool
+    :return: the mean IoU per image
+    :rtype: np.ndarray
+    """
+    matrices = image_confusion_matrices(ann_maps, pred_maps, num_classes)
+    result = iou_from_confusion(matrices, exclude_background=exclude_background)
+    result[matrices.sum(axis=(-2, -1)) == 0] = np.nan
+    return result
+
+
+def sorted_label_order(encoder: LabelEncoder) -> np.ndarray:
+    """
+    Returns the label indices sorted alphabetically by label, keeping the background first.
+
+    :param encoder: the encoder to get the order for
+    :type encoder: LabelEncoder
+    :return: the label indices
+    :rtype: np.ndarray
+    """
+    classes = encoder.classes
+    return np.array([0] + sorted(range(1, len(classes)), key=lambda i: classes[i]), dtype=np.int64)
+
+
+def _counts(matrix: np.ndarray, exclude_background: bool):
+    """
+    Determines true positives, false positives and false negatives per class,
+    dropping the background class (index 0) afterwards if requested.
+
+    :param matrix: the confusion matrix
+    :type matrix: np.ndarray
+    :param exclude_background: whether to drop the background
+    :type exclude_background: bool
+    :return: the tuple of tp, fp, fn arrays
+    :rtype: tuple
+    """
+    tp, fp, fn = confusion_counts(matrix)
+    if exclude_background:
+        return tp[..., 1:], fp[..., 1:], fn[..., 1:]
+    return tp, fp, fn
+
+
+def _mean_present(values: np.ndarray, present: np.ndarray) -> np.ndarray:
+    """
+    Averages the per-class values over the classes that are present.
+
+    :param values: the per-class values
+    :type values: np.ndarray
+    :param present: the flags whether a class is present
+    :type present: np.ndarray
+    :return: the mean
+    :rtype: np.ndarray
+    """
+    return safe_divide((values * present).sum(axis=-1), present.sum(axis=-1))
+
+
+def iou_from_confusion(matrix: np.ndarray, per_class: bool = False, exclude_background: bool = False) -> np.ndarray:
+    """
+    Computes the intersect-over-union from the pixel confusion matrix. The mean
+    only considers classes that occur in annotations or predictions.
+
+    :param matrix: the confusion matrix (rows: annotations, columns: predictions)
+    :type matrix: np.ndarray
+    :param per_class: whether to return the per-class IoU rather than the mean
+    :type per_class: bool
+    :param exclude_background: whether to ignore the background class (index 0)
+    :type exclude_background: bool
+    :return: the (mean) IoU
+    :rtype: np.ndarray
+    """
+    tp, fp, fn = _counts(matrix, exclude_background)
+    union = tp + fp + fn
+    iou = safe_divide(tp, union)
+    if per_class:
+        return iou
+    return _mean_present(iou, union > 0)
+
+
+def dice_from_confusion(matrix: np.ndarray, per_class: bool = False, exclude_background: bool = False) -> np.ndarray:
+    """
+    Computes the Dice coefficient from the pixel confusion matrix. The mean
+    only considers classes that occur in annotations or predictions.
+
+    :param matrix: the confusion matrix (rows: annotations, columns: predictions)
+    :type matrix: np.ndarray
+    :param per_class: whether to return the per-class Dice rather than the mean
+    :type per_class: bool
+    :param exclude_background: whether to ignore the background class (index 0)
+    :type exclude_background: bool
+    :return: the (mean) Dice
+    :rtype: np.ndarray
+    """
+    tp, fp, fn = _counts(matrix, exclude_background)
+    area = 2 * tp + fp + fn
+    dice = safe_divide(2 * tp, area)
+    if per_class:
+        return dice
+    return _mean_present(dice, area > 0)
+
+
+def pixel_accuracy_from_confusion(matrix: np.ndarray, per_class: bool = False, exclude_background: bool = False) -> np.ndarray:
+    """
+    Computes the pixel accuracy from the pixel confusion matrix. Per class, this is
+    the fraction of the annotated pixels that got predicted correctly. When excluding
+    the background, pixels annotated as background are not taken into account.
+
+    :param matrix: the confusion matrix (rows: annotations, columns: predictions)
+    :type matrix: np.ndarray
+    :param per_class: whether to return the per-class accuracy rather than the overall one
+    :type per_class: bool
+    :param exclude_background: whether to ignore the background class (index 0)
+    :type exclude_background: bool
+    :return: the accuracy
+    :rtype: np.ndarray
+    """
+    if exclude_background:
+        matrix = matrix[..., 1:, :]
+        tp = np.diagonal(matrix[..., :, 1:], axis1=-2, axis2=-1)
+    else:
+        tp = np.diagonal(matrix, axis1=-2, axis2=-1)
+    area = matrix.sum(axis=-1)
+    if per_class:
+        return safe_divide(tp, area)
+    return safe_divide(tp.sum(axis=-1), area.sum(axis=-1))
@@ -0,0 +1,317 @@
+import logging
+from typing import List, Dict, Optional, Tuple
+
+import numpy as np
+
+from ._data import ImagePairList, MultiImagePairList
+from ._encoded import EncodedPairs
+from ._scores import parse_scores
+
+
+class LabelEncoder:
+    """
+    Turns the classification labels of image pairs into integer indices.
+    The label index persists across calls, i.e., indices stay the same
+    across batches. New labels get appended to the index, unless the
+    encoder is fixed.
+    """
+
+    def __init__(self, classes: List[str] = None, fixed: bool = False):
+        """
+        Initializes the encoder.
+
+        :param classes: the initial list of class labels, can be None
+        :type classes: list
+        :param fixed: whether the class labels are fixed, i.e., pairs with unknown labels get skipped
+        :type fixed: bool
+        """
+        self._classes = []
+        self._index = dict()
+        self.fixed = fixed
+        self.num_skipped = 0
+        self.num_missing_scores = 0
+        if classes is not None:
+            for cls in classes:
+                if cls not in self._index:
+                    self._index[cls] = len(self._classes)
+                    self._classes.append(cls)
+
+    @property
+    def classes(self) -> List[str]:
+        """
+        Returns the class labels, ordered by their index.
+
+        :return: the labels
+        :rtype: list
+        """
+        return self._classes[:]
+
+    @property
+    def num_classes(self) -> int:
+        """
+        Returns the number of class labels in the index.
+
+        :return: the number of labels
+        :rtype: int
+        """
+        return len(self._classes)
+
+    def lookup(self) -> Dict[str, int]:
+        """
+        Returns the label -> index lookup.
+
+        :return: the lookup
+        :rtype: dict
+        """
+        return dict(self._index)
+
+    def index_of(self, label: str) -> Optional[int]:
+        """
+        Returns the index for the label, adding it to the index if necessary (and allowed).
+
+        :param label: the label to get the index for
+        :type label: str
+        :return: the index, None if unknown label and encoder is fixed
+        :rtype: int
+        """
+        result = self._index.get(label)
+        if (result is None) and not self.fixed:
+            result = len(self._classes)
+            self._index[label] = result
+            self._classes.append(label)
+        return result
+
+    def _encode(self, data: ImagePairList) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Encodes the labels of annotations and predictions in a single pass.
+
+        :param data: the image pairs to encode
+        :type data: ImagePairList
+        :return: the tuple of int32 arrays with the label indices of annotations and predictions and the positions of the encoded pairs
+        :rtype: tuple
+        """
+        anns = np.empty(len(data), dtype=np.int32)
+        preds = np.empty(len(data), dtype=np.int32)
+        rows = np.empty(len(data), dtype=np.int64)
+        index = self._index
+        count = 0
+        for i, pair in enumerate(data):
+            ann = pair.annotation.annotation
+            pred = pair.prediction.annotation
+            # classification labels are strings, empty ones count as missing
+            if not ann or not pred:
+                continue
+            a = index.get(ann)
+            if a is None:
+                a = self.index_of(ann)
+            p = index.get(pred)
+            if p is None:
+                p = self.index_of(pred)
+            if (a is None) or (p is None):
+                self.num_skipped += 1
+                continue
+            anns[count] = a
+            preds[count] = p
+            rows[count] = i
+            count += 1
+        return anns[:count], preds[:count], rows[:count]
+
+    def encode(self, data: ImagePairList) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Encodes the labels of annotations and predictions in a single pass.
+        Pairs where either side has no label get skipped, as do pairs with
+        unknown labels if the encoder is fixed.
+
+        :param data: the image pairs to encode
+        :type data: ImagePairList
+        :return: the tuple of int32 arrays with the label indices of annotations and predictions
+        :rtype: tuple
+        """
+        anns, preds, _ = self._encode(data)
+        return anns, preds
+
+    def _encode_scores(self, data: ImagePairList, score_key: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Encodes the labels and the per-class probabilities in a single pass.
+
+        :param data: the image pairs to encode
+        :type data: ImagePairList
+        :param score_key: the meta-data key with the label -> probability mapping
+        :type score_key: str
+        :return: the tuple of label indices of annotations and predictions, the score matrix and the positions of the encoded pairs
+        :rtype: tuple
+        """
+        anns, preds, rows = self._encode(data)
+        pair_indices = []
+        class_indices = []
+        values = []
+        self.num_missing_scores = 0
+        for i, row in enumerate(rows.tolist()):
+            meta = data[row].prediction.get_metadata()
+            scores = None if meta is None else parse_scores(meta.get(score_key))
+            if scores is None:
+                self.num_missing_scores += 1
+                pair_indices.append(i)
+                class_indices.append(preds[i])
+                values.append(1.0)
+                continue
+            for label, value in scores.items():
+                index = self.index_of(label)
+                if index is None:
+                    continue
+                pair_indices.append(i)
+                class_indices.append(index)
+                values.append(value)
+        result = np.zeros((len(anns), len(self._classes)), dtype=np.float32)
+        result[np.array(pair_indices, dtype=np.int64), np.array(class_indices, dtype=np.int64)] = np.array(values, dtype=np.float32)
+        return anns, preds, result, rows
+
+    def encode_scores(self, data: ImagePairList, score_key: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Encodes the labels like encode, but also turns the per-class probabilities stored
+        in the meta-data of the predictions into a dense float32 score matrix, with the
+        columns in the order of the class index. Labels that only occur in the probabilities
+        get added to the index (unless fixed). Predictions without probabilities get a score
+        of 1 for the predicted label.
+
+        :param data: the image pairs to encode
+        :type data: ImagePairList
+        :param score_key: the meta-data key with the label -> probability mapping
+        :type score_key: str
+        :return: the tuple of label indices of annotations and predictions and the score matrix (num_pairs, num_classes)
+        :rtype: tuple
+        """
+        anns, preds, scores, _ = self._encode_scores(data, score_key)
+        return anns, preds, scores
+
+    def encode_rows(self, data: ImagePairList, score_key: str = None) -> Tuple[np.ndarray, np.ndarray, Optional[np.ndarray], np.ndarray]:
+        """
+        Encodes the labels (and scores) like encode/encode_scores, but also returns the
+        positions of the encoded pairs in the data, e.g., for retrieving their names.
+
+        :param data: the image pairs to encode
+        :type data: ImagePairList
+        :param score_key: the meta-data key with the label -> probability mapping, no score matrix if None
+        :type score_key: str
+        :return: the tuple of label indices of annotations and predictions, the score matrix (or None) and the positions
+        :rtype: tuple
+        """
+        if score_key is None:
+            anns, preds, rows = self._encode(data)
+            return anns, preds, None, rows
+        return self._encode_scores(data, score_key)
+
+    def encode_encoded(self, pairs: EncodedPairs) -> Tuple[np.ndarray, np.ndarray, Optional[np.ndarray]]:
+        """
+        Translates the label indices (and scores) of the encoded pairs from their class
+        table into the index of this encoder. Pairs with labels unknown to a fixed encoder
+        get skipped. If the class tables agree, the arrays get returned as they are.
+
+        :param pairs: the encoded pairs
+        :type pairs: EncodedPairs
+        :return: the tuple of label indices of annotations and predictions and the score matrix (None if not available)
+        :rtype: tuple
+        """
+        table = np.array([-1 if x is None else x for x in (self.index_of(c) for c in pairs.classes)], dtype=np.int32)
+        if np.array_equal(table, np.arange(len(table))):
+            return pairs.anns, pairs.preds, pairs.scores
+        anns = table[pairs.anns]
+        preds = table[pairs.preds]
+        valid = (anns >= 0) & (preds >= 0)
+        num_invalid = len(valid) - int(np.count_nonzero(valid))
+        self.num_skipped += num_invalid
+        if num_invalid > 0:
+            anns = anns[valid]
+            preds = preds[valid]
+        scores = None
+        if pairs.scores is not None:
+            known = table >= 0
+            source = pairs.scores[valid] if num_invalid > 0 else pairs.scores
+            scores = np.zeros((len(anns), len(self._classes)), dtype=np.float32)
+            scores[:, table[known]] = source[:, known]
+        return anns, preds, scores
+
+    def encode_multi(self, data: MultiImagePairList, score_key: str = None) -> Tuple[np.ndarray, np.ndarray, Optional[np.ndarray]]:
+        """
+        Encodes the labels of the annotations and the predictions of all the models,
+        aligned on a shared pair index: only images for which the annotation and the
+        predictions of all the models could be encoded are retained.
+
+        :param data: the multi-pairs to encode
+        :type data: MultiImagePairList
+        :param score_key: the meta-data key with the label -> probability mapping, no score matrices if None
+        :type score_key: str
+        :return: the tuple of annotation label indices (num_pairs), prediction label indices (num_models, num_pairs) and score matrices (num_models, num_pairs, num_classes)
+        :rtype: tuple
+        """
+        encoded = []
+        num_missing_scores = 0
+        for i in range(data.num_models):
+            if score_key is None:
+                anns, preds, rows = self._encode(data.pairs(i))
+                scores = None
+            else:
+                anns, preds, scores, rows = self._encode_scores(data.pairs(i), score_key)
+                num_missing_scores += self.num_missing_scores
+            encoded.append((anns, preds, scores, rows))
+        self.num_missing_scores = num_missing_scores
+        if len(encoded) == 0:
+            return np.zeros(0, dtype=np.int32), np.zeros((0, 0), dtype=np.int32), None
+
+        common = encoded[0][3]
+        for _, _, _, rows in encoded[1:]:
+            common = np.intersect1d(common, rows, assume_unique=True)
+        num_classes = len(self._classes)
+        anns = None
+        preds = []
+        scores = None if score_key is None else []
+        for ann, pred, score, rows in encoded:
+            # rows are sorted, hence the positions of the common ones can be looked up directly
+            positions = np.searchsorted(rows, common)
+            if anns is None:
+                anns = ann[positions]
+            preds.append(pred[positions])
+            if score is not None:
+                score = score[positions]
+                if score.shape[1] < num_classes:
+                    score = np.pad(score, ((0, 0), (0, num_classes - score.shape[1])))
+                scores.append(score)
+        return anns, np.stack(preds), None if scores is None else np.stack(scores)
+
+    def sort_order(self) -> List[int]:
+        """
+        Returns the current indices of the class labels in alphabetical order of the labels.
+
+        :return: the indices
+        :rtype: list
+        """
+        return sorted(range(len(self._classes)), key=lambda i: self._classes[i])
+
+    def sort_classes(self, *arrays: np.ndarray) -> List[np.ndarray]:
+        """
+        Sorts the class labels alphabetically and remaps the supplied arrays
+        of label indices accordingly.
+
+        :param arrays: the arrays with label indices to remap
+        :return: the list of remapped arrays
+        :rtype: list
+        """
+        order = self.sort_order()
+        remap = np.empty(len(order), dtype=np.int32)
+        remap[order] = np.arange(len(order), dtype=np.int32)
+        self._classes = [self._classes[i] for i in order]
+        self._index = {cls: i for i, cls in enumerate(self._classes)}
+        return [remap[x] for x in arrays]
+
+    def log(self, logger: logging.Logger):
+        """
+        Outputs the class labels via the logger.
+
+        :param logger: the logger to use
+        :type logger: logging.Logger
+        """
+        logger.info("%d classes: %s" % (len(self._classes), ", ".join(self._classes)))
+        if self.num_skipped > 0:
+            logger.info("# pairs skipped due to unknown labels: %d" % self.num_skipped)
+        if self.num_missing_scores > 0:
+            logger.info("# predictions without class probabilities: %d" % self.num_missing_scores)
@@ -0,0 +1,295 @@
+from typing import List, Iterable, Iterator
+
+from idc.api import ImageData
+from ._data import ImagePair, ImagePairList
+
+MATCH_AUTO = "auto"
+MATCH_HASH = "hash"
+MATCH_MERGE = "merge"
+MATCH_STRATEGIES = [
+    MATCH_AUTO,
+    MATCH_HASH,
+    MATCH_MERGE,
+]
+
+UNMATCHED_COUNT = "count"
+UNMATCHED_LIST = "list"
+UNMATCHED_REPORTS = [
+    UNMATCHED_COUNT,
+    UNMATCHED_LIST,
+]
+
+
+class NotSortedError(Exception):
+    """
+    Raised by the merge join if the names of a side are not in ascending order.
+    """
+    pass
+
+
+class MatchResult:
+    """
+    The outcome of matching annotations and predictions: the pairs, the number
+    of unmatched and duplicate items per side and, if requested, the names of
+    the unmatched items.
+    """
+
+    def __init__(self, report_names: bool = False):
+        """
+        Initializes the result.
+
+        :param report_names: whether to record the names of the unmatched items
+        :type report_names: bool
+        """
+        self.pairs = ImagePairList()
+        self.num_unmatched_annotations = 0
+        self.num_unmatched_predictions = 0
+        self.num_duplicate_annotations = 0
+        self.num_duplicate_predictions = 0
+        self.unmatched_annotations = [] if report_names else None
+        self.unmatched_predictions = [] if report_names else None
+
+    def add_unmatched(self, item: ImageData, is_ann: bool):
+        """
+        Records an item that has no counterpart.
+
+        :param item: the item
+        :type item: ImageData
+        :param is_ann: whether the item is an annotation
+        :type is_ann: bool
+        """
+        if is_ann:
+            self.num_unmatched_annotations += 1
+            if self.unmatched_annotations is not None:
+                self.unmatched_annotations.append(item.image_name)
+        else:
+            self.num_unmatched_predictions += 1
+            if self.unmatched_predictions is not None:
+                self.unmatched_predictions.append(item.image_name)
+
+    def add_duplicate(self, is_ann: bool):
+        """
+        Records an item whose (normalized) name was already encountered on its side.
+
+        :param is_ann: whether the item is an annotation
+        :type is_ann: bool
+        """
+        if is_ann:
+            self.num_duplicate_annotations += 1
+        else:
+            self.num_duplicate_predictions += 1
+
+
+class PairMatcher:
+    """
+    Matches annotations and predictions via their (normalized) image names.
+    Pairs are output in the order of the annotations, for duplicate names
+    the first item of each side is used. Names can be normalized by removing
+    directories and/or the extension or by ignoring the case; the items
+    themselves are not altered, the pairs use the name of the annotation.
+
+    The hash join keeps a single lookup of the predictions in memory. The
+    merge join requires both sides to be sorted by their normalized names
+    (in ascending order), but only holds on to one item per side and can
+    therefore process the items as they arrive.
+    """
+
+    def __init__(self, strategy: str = MATCH_AUTO, strip_directory: bool = False, strip_extension: bool = False,
+                 ignore_case: bool = False, report_names: bool = False):
+        """
+        Initializes the matcher.
+
+        :param strategy: the join to use (auto|hash|merge), auto uses the merge join if both sides are sorted
+        :type strategy: str
+        :param strip_directory: whether to remove any directories from the names
+        :type strip_directory: bool
+        :param strip_extension: whether to remove the extension from the names
+        :type strip_extension: bool
+        :param ignore_case: whether to compare the names case-insensitively
+        :type ignore_case: bool
+        :param report_names: whether to record the names of the unmatched items rather than just counting them
+        :type report_names: bool
+        """
+        if strategy not in MATCH_STRATEGIES:
+            raise Exception("Unsupported matching strategy: %s" % strategy)
+        self.strategy = strategy
+        self.strip_directory = strip_directory
+        self.strip_extension = strip_extension
+        self.ignore_case = ignore_case
+        self.report_names = report_names
+
+    def key(self, image_name: str) -> str:
+        """
+        Returns the normalized name to match on.
+
+        :param image_name: the name of the image
+        :type image_name: str
+        :return: the normalized name
+        :rtype: str
+        """
+        if self.strip_directory:
+            image_name = image_name[max(image_name.rfind("/"), image_name.rfind("\\")) + 1:]
+        if self.strip_extension:
+            pos = image_name.rfind(".")
+            # hidden files like ".png" have no extension
+            if pos > max(image_name.rfind("/"), image_name.rfind("\\")) + 1:
+                image_name = image_name[:pos]
+        if self.ignore_case:
+            image_name = image_name.lower()
+        return image_name
+
+    def is_sorted(self, items: Iterable[ImageData]) -> bool:
+        """
+        Checks whether the items are sorted by their normalized names.
+
+        :param items: the items to check
+        :type items: Iterable
+        :return: True if sorted (duplicates are allowed)
+        :rtype: bool
+        """
+        prev = None
+        for item in items:
+            key = self.key(item.image_name)
+            if (prev is not None) and (key < prev):
+                return False
+            prev = key
+        return True
+
+    def match(self, annotations: List[ImageData], predictions: List[ImageData]) -> MatchResult:
+        """
+        Matches the annotations and predictions that are both available in full.
+
+        :param annotations: the annotations
+        :type annotations: list
+        :param predictions: the predictions
+        :type predictions: list
+        :return: the result
+        :rtype: MatchResult
+        """
+        strategy = self.strategy
+        if strategy == MATCH_AUTO:
+            strategy = MATCH_MERGE if (self.is_sorted(annotations) and self.is_sorted(predictions)) else MATCH_HASH
+        result = MatchResult(report_names=self.report_names)
+        if strategy == MATCH_MERGE:
+            for pair in self.merge_join(annotations, predictions, result):
+                result.pairs.append(pair)
+        else:
+            self.hash_join(annotations, predictions, result)
+        result.pairs.last = True
+        return result
+
+    def hash_join(self, annotations: Iterable[ImageData], predictions: Iterable[ImageData], result: MatchResult):
+        """
+        Matches the items by looking up the annotations in a hash table of the predictions.
+        Matched predictions stay in the table (with None as value), so that duplicate
+        annotations can be told apart from unmatched ones.
+
+        :param annotations: the annotations
+        :type annotations: Iterable
+        :param predictions: the predictions
+        :type predictions: Iterable
+        :param result: the result to add the pairs and unmatched items to
+        :type result: MatchResult
+        """
+        lookup = dict()
+        for item in predictions:
+            key = self.key(item.image_name)
+            if key in lookup:
+                result.add_duplicate(False)
+            else:
+                lookup[key] = item
+        for item in annotations:
+            key = self.key(item.image_name)
+            if key not in lookup:
+                result.add_unmatched(item, True)
+                continue
+            match = lookup[key]
+            if match is None:
+                # the prediction was already matched with an annotation of the same name
+                result.add_duplicate(True)
+                continue
+            result.pairs.append(ImagePair(item.image_name, item, match))
+            lookup[key] = None
+        for item in lookup.values():
+            if item is not None:
+                result.add_unmatched(item, False)
+
+    def merge_join(self, annotations: Iterable[ImageData], predictions: Iterable[ImageData], result: MatchResult) -> Iterator[ImagePair]:
+        """
+        Matches the items of the two sides that are sorted by their normalized names,
+        returning the pairs as soon as they are found. Raises a NotSortedError if
+        a side turns out not to be sorted.
+
+        :param annotations: the annotations, sorted by name
+        :type annotations: Iterable
+        :param predictions: the predictions, sorted by name
+        :type predictions: Iterable
+        :param result: the result to add the unmatched items to
+        :type result: MatchResult
+        :return: the pairs
+        :rtype: Iterator
+        """
+        anns = _SortedSide(self, annotations, True, result)
+        preds = _SortedSide(self, predictions, False, result)
+        while (anns.item is not None) and (preds.item is not None):
+            if anns.key == preds.key:
+                yield ImagePair(anns.item.image_name, anns.item, preds.item)
+                anns.advance()
+                preds.advance()
+            elif anns.key < preds.key:
+                result.add_unmatched(anns.item, True)
+                anns.advance()
+            else:
+                result.add_unmatched(preds.item, False)
+                preds.advance()
+        for side in [anns, preds]:
+            while side.item is not None:
+                result.add_unmatched(side.item, side.is_ann)
+                side.advance()
+
+
+class _SortedSide:
+    """
+    Iterates over one side of a merge join, skipping (and recording) the
+    duplicates and checking the order of the names.
+    """
+
+    def __init__(self, matcher: PairMatcher, items: Iterable[ImageData], is_ann: bool, result: MatchResult):
+        """
+        Initializes the side and moves to the first item.
+
+        :param matcher: the matcher to use for normalizing the names
+        :type matcher: PairMatcher
+        :param items: the items of the side
+        :type items: Iterable
+        :param is_ann: whether the side is the annotations
+        :type is_ann: bool
+        :param result: the result to record the duplicates with
+        :type result: MatchResult
+        """
+        self.matcher = matcher
+        self.items = iter(items)
+        self.is_ann = is_ann
+        self.result = result
+        self.item = None
+        self.key = None
+        self.advance()
+
+    def advance(self):
+        """
+        Moves to the next item with a new name, None if no more items.
+        """
+        prev = self.key
+        for item in self.items:
+            key = self.matcher.key(item.image_name)
+            if prev is not None:
+                if key < prev:
+                    raise NotSortedError("%s are not sorted by name: '%s' follows '%s'"
+                                         % ("Annotations" if self.is_ann else "Predictions", key, prev))
+                if key == prev:
+                    self.result.add_duplicate(self.is_ann)
+                    continue
+            self.item = item
+            self.key = key
+            return
+        self.item = None
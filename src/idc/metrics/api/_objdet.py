@@ -0,0 +1,621 @@
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import List, Optional
+
+import numpy as np
+
+from ._confusion import safe_divide
+from ._data import ImagePairList
+from ._labels import LabelEncoder
+
+IOU_THRESHOLDS_COCO = np.linspace(0.5, 0.95, 10)
+RECALL_THRESHOLDS_COCO = np.linspace(0.0, 1.0, 101)
+MAX_DETECTIONS = 100
+SCORE_KEY = "score"
+
+
+def box_iou(boxes1: np.ndarray, boxes2: np.ndarray) -> np.ndarray:
+    """
+    Computes the intersect-over-union for all combinations of the two sets of boxes.
+    The boxes are in (x0, y0, x1, y1) format. Leading (batch) dimensions get broadcast,
+    i.e., (..., N, 4) and (..., M, 4) result in (..., N, M).
+
+    :param boxes1: the first set of boxes
+    :type boxes1: np.ndarray
+    :param boxes2: the second set of boxes
+    :type boxes2: np.ndarray
+    :return: the IoU matrix (or matrices)
+    :rtype: np.ndarray
+    """
+    boxes1 = np.asarray(boxes1, dtype=np.float64)
+    boxes2 = np.asarray(boxes2, dtype=np.float64)
+    area1 = (boxes1[..., 2] - boxes1[..., 0]).clip(min=0) * (boxes1[..., 3] - boxes1[..., 1]).clip(min=0)
+    area2 = (boxes2[..., 2] - boxes2[..., 0]).clip(min=0) * (boxes2[..., 3] - boxes2[..., 1]).clip(min=0)
+    lt = np.maximum(boxes1[..., :, None, :2], boxes2[..., None, :, :2])
+    rb = np.minimum(boxes1[..., :, None, 2:], boxes2[..., None, :, 2:])
+    wh = (rb - lt).clip(min=0)
+    inter = wh[..., 0] * wh[..., 1]
+    union = area1[..., :, None] + area2[..., None, :] - inter
+    return safe_divide(inter, union)
+
+
+def _group_ranks(groups: np.ndarray) -> np.ndarray:
+    """
+    Determines the rank of each element within its group, with the groups being sorted.
+
+    :param groups: the sorted group indices
+    :type groups: np.ndarray
+    :return: the ranks
+    :rtype: np.ndarray
+    """
+    if len(groups) == 0:
+        return np.zeros(0, dtype=np.int64)
+    starts = np.flatnonzero(np.r_[True, groups[1:] != groups[:-1]])
+    counts = np.diff(np.r_[starts, len(groups)])
+    return np.arange(len(groups)) - np.repeat(starts, counts)
+
+
+class DetectionArrays:
+    """
+    Flat (struct-of-arrays) representation of the ground truth and the detections
+    of a number of images. Boxes are in absolute (x0, y0, x1, y1) format, the
+    image arrays contain the index of the image the box belongs to.
+    """
+
+    def __init__(self, num_images: int = 0,
+                 gt_boxes: np.ndarray = None, gt_labels: np.ndarray = None, gt_images: np.ndarray = None,
+                 det_boxes: np.ndarray = None, det_labels: np.ndarray = None, det_scores: np.ndarray = None,
+                 det_images: np.ndarray = None):
+        """
+        Initializes the arrays.
+
+        :param num_images: the number of images
+        :type num_images: int
+        :param gt_boxes: the boxes of the ground truth (N, 4)
+        :type gt_boxes: np.ndarray
+        :param gt_labels: the label indices of the ground truth (N,)
+        :type gt_labels: np.ndarray
+        :param gt_images: the image indices of the ground truth (N,)
+        :type gt_images: np.ndarray
+        :param det_boxes: the boxes of the detections (M, 4)
+        :type det_boxes: np.ndarray
+        :param det_labels: the label indices of the detections (M,)
+        :type det_labels: np.ndarray
+        :param det_scores: the scores of the detections (M,)
+        :type det_scores: np.ndarray
+        :param det_images: the image indices of the detections (M,)
+        :type det_images: np.ndarray
+        """
+        self.num_images = num_images
+        self.gt_boxes = np.zeros((0, 4), dtype=np.float64) if gt_boxes is None else np.asarray(gt_boxes, dtype=np.float64).reshape((-1, 4))
+        self.gt_labels = np.zeros(0, dtype=np.int32) if gt_labels is None else np.asarray(gt_labels, dtype=np.int32)
+        self.gt_images = np.zeros(0, dtype=np.int32) if gt_images is None else np.asarray(gt_images, dtype=np.int32)
+        self.det_boxes = np.zeros((0, 4), dtype=np.float64) if det_boxes is None else np.asarray(det_boxes, dtype=np.float64).reshape((-1, 4))
+        self.det_labels = np.zeros(0, dtype=np.int32) if det_labels is None else np.asarray(det_labels, dtype=np.int32)
+        self.det_scores = np.zeros(0, dtype=np.float32) if det_scores is None else np.asarray(det_scores, dtype=np.float32)
+        self.det_images = np.zeros(0, dtype=np.int32) if det_images is None else np.asarray(det_images, dtype=np.int32)
+
+    def split(self, num_images: int) -> List['DetectionArrays']:
+        """
+        Splits the arrays into chunks with the specified maximum number of images.
+
+        :param num_images: the maximum number of images per chunk
+        :type num_images: int
+        :return: the chunks
+        :rtype: list
+        """
+        if self.num_images <= num_images:
+            return [self]
+        result = []
+        # the image indices are ascending, hence binary search can be used
+        gt_order = np.argsort(self.gt_images, kind="stable")
+        det_order = np.argsort(self.det_images, kind="stable")
+        gt_images = self.gt_images[gt_order]
+        det_images = self.det_images[det_order]
+        for start in range(0, self.num_images, num_images):
+            end = min(start + num_images, self.num_images)
+            g = gt_order[np.searchsorted(gt_images, start):np.searchsorted(gt_images, end)]
+            d = det_order[np.searchsorted(det_images, start):np.searchsorted(det_images, end)]
+            result.append(DetectionArrays(
+                num_images=end - start,
+                gt_boxes=self.gt_boxes[g], gt_labels=self.gt_labels[g], gt_images=self.gt_images[g] - start,
+                det_boxes=self.det_boxes[d], det_labels=self.det_labels[d], det_scores=self.det_scores[d],
+                det_images=self.det_images[d] - start))
+        return result
+
+
+def detection_arrays_from_pairs(data: ImagePairList, encoder: LabelEncoder, score_key: str = SCORE_KEY) -> DetectionArrays:
+    """
+    Turns the object detection pairs into flat arrays. Objects with unknown labels
+    get skipped if the encoder is fixed. Predicted objects without a score
+    receive a score of 1.0.
+
+    :param data: the pairs to convert
+    :type data: ImagePairList
+    :param encoder: the encoder for the labels
+    :type encoder: LabelEncoder
+    :param score_key: the key in the meta-data of the predicted objects that contains the score
+    :type score_key: str
+    :return: the arrays
+    :rtype: DetectionArrays
+    """
+    from idc.api import get_object_label
+
+    gt_boxes = []
+    gt_labels = []
+    gt_images = []
+    det_boxes = []
+    det_labels = []
+    det_scores = []
+    det_images = []
+    for i, pair in enumerate(data):
+        for is_ann, item in [(True, pair.annotation), (False, pair.prediction)]:
+            objs = item.get_absolute() if item.has_annotation() else None
+            if objs is None:
+                continue
+            for obj in objs:
+                label = encoder.index_of(get_object_label(obj))
+                if label is None:
+                    encoder.num_skipped += 1
+                    continue
+                box = (obj.x, obj.y, obj.x + obj.width, obj.y + obj.height)
+                if is_ann:
+                    gt_boxes.append(box)
+                    gt_labels.append(label)
+                    gt_images.append(i)
+                else:
+                    det_boxes.append(box)
+                    det_labels.append(label)
+                    det_scores.append(float(obj.metadata.get(score_key, 1.0)))
+                    det_images.append(i)
+
+    return DetectionArrays(num_images=len(data),
+                           gt_boxes=gt_boxes, gt_labels=gt_labels, gt_images=gt_images,
+                           det_boxes=det_boxes, det_labels=det_labels, det_scores=det_scores, det_images=det_images)
+
+
+def image_box_iou(arrays: DetectionArrays) -> np.ndarray:
+    """
+    Computes the mean IoU per image: for each ground truth box the highest IoU
+    with a detection of the same label (0 if none), averaged across the ground
+    truth boxes of the image. Images without ground truth get NaN. All images
+    get evaluated at once using padded (image, gt, detection) IoU matrices.
+
+    :param arrays: the ground truth and detections of the images
+    :type arrays: DetectionArrays
+    :return: the mean IoU per image
+    :rtype: np.ndarray
+    """
+    result = np.full(arrays.num_images, np.nan)
+    if len(arrays.gt_images) == 0:
+        return result
+    gt_order = np.argsort(arrays.gt_images, kind="stable")
+    gt_images = arrays.gt_images[gt_order]
+    gt_rank = _group_ranks(gt_images)
+    gt_pad = np.zeros((arrays.num_images, int(gt_rank.max()) + 1, 4), dtype=np.float64)
+    gt_pad[gt_images, gt_rank] = arrays.gt_boxes[gt_order]
+    gt_labels = np.full(gt_pad.shape[:2], -1, dtype=np.int64)
+    gt_labels[gt_images, gt_rank] = arrays.gt_labels[gt_order]
+    gt_count = np.bincount(gt_images, minlength=arrays.num_images)
+    has_gt = gt_count > 0
+    if len(arrays.det_images) == 0:
+        result[has_gt] = 0.0
+        return result
+    det_order = np.argsort(arrays.det_images, kind="stable")
+    det_images = arrays.det_images[det_order]
+    det_rank = _group_ranks(det_images)
+    det_pad = np.zeros((arrays.num_images, int(det_rank.max()) + 1, 4), dtype=np.float64)
+    det_pad[det_images, det_rank] = arrays.det_boxes[det_order]
+    det_labels = np.full(det_pad.shape[:2], -2, dtype=np.int64)
+    det_labels[det_images, det_rank] = arrays.det_labels[det_order]
+    ious = box_iou(gt_pad, det_pad)
+    ious[gt_labels[:, :, None] != det_labels[:, None, :]] = 0.0
+    best = ious.max(axis=-1)
+    best[gt_labels < 0] = 0.0
+    result[has_gt] = best.sum(axis=-1)[has_gt] / gt_count[has_gt]
+    return result
+
+
+class DetectionMatches:
+    """
+    The outcome of matching detections against the ground truth: the label, score
+    and true-positive flags (one row per IoU threshold) of each retained detection,
+    as well as the number of ground truth boxes per label.
+    """
+
+    def __init__(self, labels: np.ndarray, scores: np.ndarray, tp: np.ndarray, num_gt: np.ndarray):
+        """
+        Initializes the container.
+
+        :param labels: the label indices of the detections (M,)
+        :type labels: np.ndarray
+        :param scores: the scores of the detections (M,)
+        :type scores: np.ndarray
+        :param tp: the true-positive flags (T, M)
+        :type tp: np.ndarray
+        :param num_gt: the number of ground truth boxes per label
+        :type num_gt: np.ndarray
+        """
+        self.labels = labels
+        self.scores = scores
+        self.tp = tp
+        self.num_gt = num_gt
+
+
+def match_detections(arrays: DetectionArrays, iou_thresholds: np.ndarray = None,
+                     max_detections: int = MAX_DETECTIONS) -> DetectionMatches:
+    """
+    Greedily matches the detections against the ground truth, following the COCO
+    protocol: per image and label only the max_detections highest scoring detections
+    are used, these get processed by descending score and each gets matched to the
+    unmatched ground truth box with the highest IoU (at least the threshold). The matching is vectorized across all image/label groups and
+    IoU thresholds, only iterating over the rank of the detections within a group.
+
+    :param arrays: the ground truth and detections to match
+    :type arrays: DetectionArrays
+    :param iou_thresholds: the IoU thresholds to use, COCO ones if None
+    :type iou_thresholds: np.ndarray
+    :param max_detections: the maximum number of detections per image and label
+    :type max_detections: int
+    :return: the matches
+    :rtype: DetectionMatches
+    """
+    if iou_thresholds is None:
+        iou_thresholds = IOU_THRESHOLDS_COCO
+    iou_thresholds = np.asarray(iou_thresholds, dtype=np.float64)
+    num_thresholds = len(iou_thresholds)
+    num_labels = 0
+    if len(arrays.gt_labels) > 0:
+        num_labels = max(num_labels, int(arrays.gt_labels.max()) + 1)
+    if len(arrays.det_labels) > 0:
+        num_labels = max(num_labels, int(arrays.det_labels.max()) + 1)
+    num_gt = np.bincount(arrays.gt_labels, minlength=num_labels).astype(np.int64)
+
+    # sort detections by image/label group and descending score (stable, like COCO)
+    det_groups = arrays.det_images.astype(np.int64) * num_labels + arrays.det_labels
+    order = np.lexsort((-arrays.det_scores, det_groups))
+    det_groups = det_groups[order]
+    # retain the highest scoring detections per image and label (COCOeval evaluates per category)
+    if max_detections is not None:
+        keep = _group_ranks(det_groups) < max_detections
+        order = order[keep]
+        det_groups = det_groups[keep]
+    gt_order = np.argsort(arrays.gt_images.astype(np.int64) * num_labels + arrays.gt_labels, kind="stable")
+    gt_groups = arrays.gt_images[gt_order].astype(np.int64) * num_labels + arrays.gt_labels[gt_order]
+
+    labels = arrays.det_labels[order]
+    scores = arrays.det_scores[order]
+    tp = np.zeros((num_thresholds, len(order)), dtype=bool)
+    if (len(order) == 0) or (len(gt_order) == 0):
+        return DetectionMatches(labels, scores, tp, num_gt)
+
+    # only groups with detections are of interest, ground truth of other groups remains unmatched
+    groups, det_group_idx = np.unique(det_groups, return_inverse=True)
+    det_rank = _group_ranks(det_groups)
+    gt_pos = np.searchsorted(groups, gt_groups)
+    gt_pos_clipped = np.minimum(gt_pos, len(groups) - 1)
+    gt_keep = groups[gt_pos_clipped] == gt_groups
+    gt_group_idx = gt_pos_clipped[gt_keep]
+    gt_rank = _group_ranks(gt_groups)[gt_keep]
+    if len(gt_group_idx) == 0:
+        return DetectionMatches(labels, scores, tp, num_gt)
+
+    # padded (groups, rank, 4) boxes
+    num_groups = len(groups)
+    max_dets = int(det_rank.max()) + 1
+    max_gts = int(gt_rank.max()) + 1
+    det_pad = np.zeros((num_groups, max_dets, 4), dtype=np.float64)
+    det_pad[det_group_idx, det_rank] = arrays.det_boxes[order]
+    det_valid = np.zeros((num_groups, max_dets), dtype=bool)
+    det_valid[det_group_idx, det_rank] = True
+    gt_pad = np.zeros((num_groups, max_gts, 4), dtype=np.float64)
+    gt_pad[gt_group_idx, gt_rank] = arrays.gt_boxes[gt_order][gt_keep]
+    gt_valid = np.zeros((num_groups, max_gts), dtype=bool)
+    gt_valid[gt_group_idx, gt_rank] = True
+
+    ious = box_iou(det_pad, gt_pad)
+    ious[~np.broadcast_to(gt_valid[:, None, :], ious.shape)] = -1.0
+    # like COCO, an IoU of exactly 1 still matches a threshold of 1
+    thresholds = np.minimum(iou_thresholds, 1 - 1e-10)[:, None]
+    gt_matched = np.zeros((num_thresholds, num_groups, max_gts), dtype=bool)
+    matched = np.zeros((num_thresholds, num_groups, max_dets), dtype=bool)
+    t_idx, g_idx = np.meshgrid(np.arange(num_thresholds), np.arange(num_groups), indexing="ij")
+    for d in range(max_dets):
+        candidates = np.where(gt_matched, -1.0, ious[None, :, d, :])
+        best = candidates.argmax(axis=-1)
+        best_iou = np.take_along_axis(candidates, best[..., None], axis=-1)[..., 0]
+        ok = (best_iou >= thresholds) & det_valid[None, :, d]
+        matched[:, :, d] = ok
+        gt_matched[t_idx, g_idx, best] |= ok
+    tp[:] = matched[:, det_group_idx, det_rank]
+
+    return DetectionMatches(labels, scores, tp, num_gt)
+
+
+def _match_detections(args) -> DetectionMatches:
+    """
+    Helper function for matching detections in a worker process.
+
+    :param args: the tuple of arrays, IoU thresholds and max detections
+    :type args: tuple
+    :return: the matches
+    :rtype: DetectionMatches
+    """
+    return match_detections(*args)
+
+
+class DetectionEvaluation:
+    """
+    COCO-style evaluation results: the interpolated precision (T, R, K),
+    the average precision (T, K) and the recall (T, K), with T being the
+    IoU thresholds, R the recall thresholds and K the labels. Labels without
+    ground truth have NaN values.
+    """
+
+    def __init__(self, iou_thresholds: np.ndarray, recall_thresholds: np.ndarray, max_detections: int,
+                 precision: np.ndarray, recall: np.ndarray, num_gt: np.ndarray):
+        """
+        Initializes the results.
+
+        :param iou_thresholds: the IoU thresholds
+        :type iou_thresholds: np.ndarray
+        :param recall_thresholds: the recall thresholds for interpolating the precision
+        :type recall_thresholds: np.ndarray
+        :param max_detections: the maximum number of detections per image and label
+        :type max_detections: int
+        :param precision: the interpolated precision (T, R, K)
+        :type precision: np.ndarray
+        :param recall: the recall (T, K)
+        :type recall: np.ndarray
+        :param num_gt: the number of ground truth boxes per label
+        :type num_gt: np.ndarray
+        """
+        self.iou_thresholds = iou_thresholds
+        self.recall_thresholds = recall_thresholds
+        self.max_detections = max_detections
+        self.precision = precision
+        self.recall = recall
+        self.num_gt = num_gt
+
+    @property
+    def num_classes(self) -> int:
+        """
+        Returns the number of labels.
+
+        :return: the number of labels
+        :rtype: int
+        """
+        return len(self.num_gt)
+
+    @property
+    def ap(self) -> np.ndarray:
+        """
+        Returns the average precision per IoU threshold and label (T, K).
+
+        :return: the average precision
+        :rtype: np.ndarray
+        """
+        return self.precision.mean(axis=1)
+
+    def threshold_index(self, iou_threshold: float) -> int:
+        """
+        Returns the index of the IoU threshold.
+
+        :param iou_threshold: the threshold to look for
+        :type iou_threshold: float
+        :return: the index
+        :rtype: int
+        """
+        idx = np.flatnonzero(np.isclose(self.iou_thresholds, iou_threshold))
+        if len(idx) == 0:
+            raise Exception("IoU threshold %s not evaluated, available: %s" % (str(iou_threshold), ", ".join("%.2f" % x for x in self.iou_thresholds)))
+        return int(idx[0])
+
+    def _summarize(self, values: np.ndarray, iou_threshold: Optional[float], per_class: bool) -> np.ndarray:
+        """
+        Averages the (T, K) values across IoU thresholds (or picks the specified one) and labels.
+
+        :param values: the values to summarize
+        :type values: np.ndarray
+        :param iou_threshold: the IoU threshold to use, averages across all if None
+        :type iou_threshold: float
+        :param per_class: whether to return the values per label rather than their mean
+        :type per_class: bool
+        :return: the value(s)
+        :rtype: np.ndarray
+        """
+        if iou_threshold is None:
+            values = values.mean(axis=0)
+        else:
+            values = values[self.threshold_index(iou_threshold)]
+        if per_class:
+            return values
+        if np.all(np.isnan(values)):
+            return np.float64(np.nan)
+        return np.nanmean(values)
+
+    def average_precision(self, iou_threshold: float = None, per_class: bool = False) -> np.ndarray:
+        """
+        Returns the (mean) average precision.
+
+        :param iou_threshold: the IoU threshold to use, averages across all if None
+        :type iou_threshold: float
+        :param per_class: whether to return the values per label rather than their mean
+        :type per_class: bool
+        :return: the value(s)
+        :rtype: np.ndarray
+        """
+        return self._summarize(self.ap, iou_threshold, per_class)
+
+    def average_recall(self, iou_threshold: float = None, per_class: bool = False) -> np.ndarray:
+        """
+        Returns the (mean) average recall.
+
+        :param iou_threshold: the IoU threshold to use, averages across all if None
+        :type iou_threshold: float
+        :param per_class: whether to return the values per label rather than their mean
+        :type per_class: bool
+        :return: the value(s)
+        :rtype: np.ndarray
+        """
+        return self._summarize(self.recall, iou_threshold, per_class)
+
+    def reorder(self, indices: List[int]) -> 'DetectionEvaluation':
+        """
+        Returns a copy with the labels in the specified order.
+
+        :param indices: the label indices in the new order
+        :type indices: list
+        :return: the reordered evaluation
+        :rtype: DetectionEvaluation
+        """
+        indices = np.asarray(indices, dtype=np.int64)
+        return DetectionEvaluation(self.iou_thresholds, self.recall_thresholds, self.max_detections,
+                                   self.precision[..., indices], self.recall[..., indices], self.num_gt[indices])
+
+
+class DetectionEvaluator:
+    """
+    Accumulates detection matches across batches and computes the COCO-style
+    precision/recall from them. The matching can be performed in parallel
+    on chunks of images.
+    """
+
+    def __init__(self, iou_thresholds: np.ndarray = None, recall_thresholds: np.ndarray = None,
+                 max_detections: int = MAX_DETECTIONS, workers: int = 1, chunk_size: int = 256, executor: Executor = None):
+        """
+        Initializes the evaluator.
+
+        :param iou_thresholds: the IoU thresholds to use, COCO ones if None
+        :type iou_thresholds: np.ndarray
+        :param recall_thresholds: the recall thresholds for interpolating the precision, COCO ones if None
+        :type recall_thresholds: np.ndarray
+        :param max_detections: the maximum number of detections per image and label
+        :type max_detections: int
+        :param workers: the number of worker processes to use for matching, <= 1 for none
+        :type workers: int
+        :param chunk_size: the number of images to match at a time
+        :type chunk_size: int
+        :param executor: the (shared) pool to use for matching in parallel, creates a pool per update if None and workers > 1
+        :type executor: Executor
+        """
+        self.iou_thresholds = IOU_THRESHOLDS_COCO if iou_thresholds is None else np.asarray(iou_thresholds, dtype=np.float64)
+        self.recall_thresholds = RECALL_THRESHOLDS_COCO if recall_thresholds is None else np.asarray(recall_thresholds, dtype=np.float64)
+        self.max_detections = max_detections
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.executor = executor
+        self._matches = []
+        self._num_gt = np.zeros(0, dtype=np.int64)
+
+    def update(self, arrays: DetectionArrays):
+        """
+        Matches the detections against the ground truth and adds the outcome to the accumulated state.
+
+        :param arrays: the ground truth and detections to add
+        :type arrays: DetectionArrays
+        """
+        chunk_size = self.chunk_size
+        if (self.workers is not None) and (self.workers > 1):
+            # make sure that all the workers get a share of the images
+            chunk_size = max(1, min(chunk_size, -(-arrays.num_images // self.workers)))
+        chunks = arrays.split(chunk_size)
+        if (self.executor is not None) and (len(chunks) > 1):
+            matches = list(self.executor.map(_match_detections, [(c, self.iou_thresholds, self.max_detections) for c in chunks]))
+        elif (self.workers is not None) and (self.workers > 1) and (len(chunks) > 1):
+            with ProcessPoolExecutor(max_workers=min(self.workers, len(chunks))) as executor:
+                matches = list(executor.map(_match_detections, [(c, self.iou_thresholds, self.max_detections) for c in chunks]))
+        else:
+            matches = [match_detections(c, self.iou_thresholds, self.max_detections) for c in chunks]
+        for m in matches:
+            self.add_matches(m)
+
+    def add_matches(self, matches: DetectionMatches):
+        """
+        Adds the matches to the accumulated state.
+
+        :param matches: the matches to add
+        :type matches: DetectionMatches
+        """
+        if len(matches.num_gt) > len(self._num_gt):
+            num_gt = np.zeros(len(matches.num_gt), dtype=np.int64)
+            num_gt[:len(self._num_gt)] = self._num_gt
+            self._num_gt = num_gt
+        self._num_gt[:len(matches.num_gt)] += matches.num_gt
+        if len(matches.labels) > 0:
+            self._matches.append(matches)
+
+    def reset(self):
+        """
+        Clears the accumulated state.
+        """
+        self._matches = []
+        self._num_gt = np.zeros(0, dtype=np.int64)
+
+    def matches(self) -> DetectionMatches:
+        """
+        Returns all the accumulated matches, combined into a single container.
+
+        :return: the matches
+        :rtype: DetectionMatches
+        """
+        if len(self._matches) == 0:
+            return DetectionMatches(np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float32),
+                                    np.zeros((len(self.iou_thresholds), 0), dtype=bool), self._num_gt.copy())
+        if len(self._matches) > 1:
+            self._matches = [DetectionMatches(np.concatenate([m.labels for m in self._matches]),
+                                              np.concatenate([m.scores for m in self._matches]),
+                                              np.concatenate([m.tp for m in self._matches], axis=1),
+                                              self._num_gt)]
+        m = self._matches[0]
+        return DetectionMatches(m.labels, m.scores, m.tp, self._num_gt.copy())
+
+    def compute(self, num_classes: int = None) -> DetectionEvaluation:
+        """
+        Computes precision and recall from the accumulated matches.
+
+        :param num_classes: the number of labels, determined from the data if None
+        :type num_classes: int
+        :return: the evaluation
+        :rtype: DetectionEvaluation
+        """
+        num_thresholds = len(self.iou_thresholds)
+        matches = self.matches()
+        labels = matches.labels
+        scores = matches.scores
+        tp = matches.tp
+        if num_classes is None:
+            num_classes = max(len(self._num_gt), int(labels.max()) + 1 if len(labels) > 0 else 0)
+        num_gt = np.zeros(num_classes, dtype=np.int64)
+        num_gt[:min(num_classes, len(self._num_gt))] = self._num_gt[:num_classes]
+
+        precision = np.full((num_thresholds, len(self.recall_thresholds), num_classes), np.nan)
+        recall = np.full((num_thresholds, num_classes), np.nan)
+        # group the detections by label, ordered by descending score (stable, like COCO)
+        order = np.lexsort((-scores, labels))
+        labels = labels[order]
+        tp = tp[:, order]
+        bounds = np.searchsorted(labels, np.arange(num_classes + 1))
+        for k in range(num_classes):
+            if num_gt[k] == 0:
+                continue
+            tps = tp[:, bounds[k]:bounds[k + 1]]
+            if tps.shape[1] == 0:
+                precision[:, :, k] = 0.0
+                recall[:, k] = 0.0
+                continue
+            tp_sum = np.cumsum(tps, axis=1, dtype=np.float64)
+            fp_sum = np.cumsum(~tps, axis=1, dtype=np.float64)
+            rc = tp_sum / num_gt[k]
+            pr = tp_sum / (tp_sum + fp_sum)
+            # precision envelope
+            pr = np.maximum.accumulate(pr[:, ::-1], axis=1)[:, ::-1]
+            recall[:, k] = rc[:, -1]
+            for t in range(num_thresholds):
+                inds = np.searchsorted(rc[t], self.recall_thresholds, side="left")
+                valid = inds < len(rc[t])
+                q = np.zeros(len(self.recall_thresholds), dtype=np.float64)
+                q[valid] = pr[t, inds[valid]]
+                precision[t, :, k] = q
+
+        return DetectionEvaluation(self.iou_thresholds, self.recall_thresholds, self.max_detections,
+                                   precision, recall, num_gt)
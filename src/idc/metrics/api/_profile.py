@@ -0,0 +1,318 @@
+import atexit
+import datetime
+import json
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from typing import Dict, Optional, List
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+ENV_IDC_METRICS_PROFILE = "IDC_METRICS_PROFILE"
+
+PROFILE_VERSION = 1
+
+PROFILE_PREFIX = "profile"
+
+
+def peak_rss() -> Optional[float]:
+    """
+    Returns the peak resident set size of the process in MB, if available.
+
+    :return: the peak RSS, None if not available (e.g., on Windows)
+    :rtype: float
+    """
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, kilobytes elsewhere
+    if sys.platform == "darwin":
+        return rss / 1024 / 1024
+    return rss / 1024
+
+
+class ProfileEntry:
+    """
+    The accumulated measurements of a single stage.
+    """
+
+    def __init__(self):
+        """
+        Initializes the entry.
+        """
+        self.calls = 0
+        self.seconds = 0.0
+        self.items = 0
+        self.peak_rss_mb = None
+
+    def items_per_second(self) -> Optional[float]:
+        """
+        Returns the throughput.
+
+        :return: the number of items per second, None if no items or no time recorded
+        :rtype: float
+        """
+        if (self.items == 0) or (self.seconds <= 0):
+            return None
+        return self.items / self.seconds
+
+    def to_dict(self) -> Dict:
+        """
+        Returns the measurements as dictionary.
+
+        :return: the measurements
+        :rtype: dict
+        """
+        return {
+            "calls": self.calls,
+            "seconds": self.seconds,
+            "items": self.items,
+            "items_per_second": self.items_per_second(),
+            "peak_rss_mb": self.peak_rss_mb,
+        }
+
+
+class Measurement:
+    """
+    Context manager that measures the wall time of a stage and records it
+    with the profiler. The number of items can be set while inside the block,
+    if not known beforehand.
+    """
+
+    __slots__ = ("profiler", "stage", "items", "_start")
+
+    def __init__(self, profiler: 'Profiler', stage: str, items: int = 0):
+        """
+        Initializes the measurement.
+
+        :param profiler: the profiler to record the measurement with
+        :type profiler: Profiler
+        :param stage: the name of the stage
+        :type stage: str
+        :param items: the number of items processed in the stage
+        :type items: int
+        """
+        self.profiler = profiler
+        self.stage = stage
+        self.items = items
+        self._start = None
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.profiler.record(self.stage, time.perf_counter() - self._start, items=self.items)
+        return False
+
+
+class NullMeasurement:
+    """
+    Measurement that does nothing, used when profiling is disabled.
+    """
+
+    __slots__ = ("items",)
+
+    def __init__(self):
+        """
+        Initializes the measurement.
+        """
+        self.items = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        return False
+
+
+NULL_MEASUREMENT = NullMeasurement()
+
+
+class Profiler:
+    """
+    Collects wall time, number of calls, number of items and the peak RSS
+    (of the process at the end of the stage) per stage. Stages are
+    identified by name, e.g., "load-metrics-pairs/annotations" or
+    "summary-statistics-ic/accuracy/compute".
+    """
+
+    def __init__(self):
+        """
+        Initializes the profiler.
+        """
+        self._entries = dict()
+        self._lock = threading.Lock()
+        self.started = datetime.datetime.now()
+
+    def measure(self, stage: str, items: int = 0) -> Measurement:
+        """
+        Returns a context manager for measuring the stage.
+
+        :param stage: the name of the stage
+        :type stage: str
+        :param items: the number of items processed in the stage
+        :type items: int
+        :return: the context manager
+        :rtype: Measurement
+        """
+        return Measurement(self, stage, items=items)
+
+    def record(self, stage: str, seconds: float, items: int = 0):
+        """
+        Adds the measurement of a stage.
+
+        :param stage: the name of the stage
+        :type stage: str
+        :param seconds: the wall time in seconds
+        :type seconds: float
+        :param items: the number of items processed
+        :type items: int
+        """
+        rss = peak_rss()
+        # the sub-flows of the pairs reader can be executed in threads
+        with self._lock:
+            entry = self._entries.get(stage)
+            if entry is None:
+                entry = ProfileEntry()
+                self._entries[stage] = entry
+            entry.calls += 1
+            entry.seconds += seconds
+            entry.items += items
+            entry.peak_rss_mb = rss
+
+    def stages(self) -> List[str]:
+        """
+        Returns the names of the stages in the order they were first recorded.
+
+        :return: the stages
+        :rtype: list
+        """
+        with self._lock:
+            return list(self._entries.keys())
+
+    def entry(self, stage: str) -> Optional[ProfileEntry]:
+        """
+        Returns the measurements of the stage.
+
+        :param stage: the name of the stage
+        :type stage: str
+        :return: the measurements, None if not recorded
+        :rtype: ProfileEntry
+        """
+        with self._lock:
+            return self._entries.get(stage)
+
+    def reset(self):
+        """
+        Removes all measurements.
+        """
+        with self._lock:
+            self._entries = dict()
+
+    def to_dict(self) -> Dict:
+        """
+        Returns the profile as JSON-serializable dictionary.
+
+        :return: the profile
+        :rtype: dict
+        """
+        with self._lock:
+            stages = {k: v.to_dict() for k, v in self._entries.items()}
+        return {
+            "version": PROFILE_VERSION,
+            "started": self.started.isoformat(timespec="seconds"),
+            "peak_rss_mb": peak_rss(),
+            "stages": stages,
+        }
+
+    def save(self, path: str):
+        """
+        Saves the profile as JSON file.
+
+        :param path: the file to write to
+        :type path: str
+        """
+        with open(path, "w") as fp:
+            json.dump(self.to_dict(), fp, indent=2)
+
+
+_profiler = None
+
+
+def active_profiler() -> Optional[Profiler]:
+    """
+    Returns the profiler, if profiling is enabled.
+
+    :return: the profiler, None if disabled
+    :rtype: Profiler
+    """
+    return _profiler
+
+
+def start_profiling() -> Profiler:
+    """
+    Enables profiling, if not already enabled.
+
+    :return: the profiler
+    :rtype: Profiler
+    """
+    global _profiler
+    if _profiler is None:
+        _profiler = Profiler()
+    return _profiler
+
+
+def stop_profiling() -> Optional[Profiler]:
+    """
+    Disables profiling.
+
+    :return: the profiler that was active, None if profiling was not enabled
+    :rtype: Profiler
+    """
+    global _profiler
+    result = _profiler
+    _profiler = None
+    return result
+
+
+def measure(stage: str, items: int = 0):
+    """
+    Returns a context manager for measuring the stage, which does nothing
+    if profiling is disabled.
+
+    :param stage: the name of the stage
+    :type stage: str
+    :param items: the number of items processed in the stage
+    :type items: int
+    :return: the context manager
+    """
+    if _profiler is None:
+        return NULL_MEASUREMENT
+    return Measurement(_profiler, stage, items=items)
+
+
+def _save_profile(path: str):
+    """
+    Saves the profile to the file at exit, if still enabled.
+    Worker processes do not write profiles.
+
+    :param path: the file to write to
+    :type path: str
+    """
+    if (_profiler is None) or (multiprocessing.parent_process() is not None):
+        return
+    try:
+        _profiler.save(path)
+    except Exception as e:
+        print("Failed to save profile to %s: %s" % (path, str(e)), file=sys.stderr)
+
+
+if len(os.environ.get(ENV_IDC_METRICS_PROFILE, "")) > 0:
+    start_profiling()
+    atexit.register(_save_profile, os.environ[ENV_IDC_METRICS_PROFILE])
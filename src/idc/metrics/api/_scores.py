@@ -0,0 +1,453 @@
+import json
+from typing import Dict, Optional, Tuple, List
+
+import numpy as np
+
+from ._confusion import AVERAGE_MICRO, AVERAGE_MACRO, AVERAGE_WEIGHTED, AVERAGE_NONE, safe_divide
+
+SCORES_KEY = "scores"
+
+NUM_BINS = 15
+
+CHUNK_ELEMENTS = 1 << 24
+
+CURVE_ROC = "roc"
+CURVE_PR = "pr"
+CURVES = [
+    CURVE_ROC,
+    CURVE_PR,
+]
+
+
+def parse_scores(value) -> Optional[Dict[str, float]]:
+    """
+    Turns the meta-data value with the per-class probabilities into a dictionary.
+    Supports dictionaries (label -> probability) and their JSON representation.
+
+    :param value: the meta-data value to parse
+    :return: the label -> probability mapping, None if not available
+    :rtype: dict
+    """
+    if value is None:
+        return None
+    if isinstance(value, str):
+        if len(value.strip()) == 0:
+            return None
+        value = json.loads(value)
+    if not isinstance(value, dict):
+        raise Exception("Expected dictionary with label -> probability mapping, but got: %s" % str(type(value)))
+    return value
+
+
+class ScoreAccumulator:
+    """
+    Collects the annotated label indices and the score matrices across batches.
+    Score matrices with fewer classes get padded with zeros when the number
+    of classes grows. The chunks get merged lazily when accessed.
+    As every score row is kept, the memory usage is O(N), i.e., 4 bytes per
+    pair and class (plus 4 bytes for the label index).
+    """
+
+    def __init__(self):
+        """
+        Initializes the accumulator.
+        """
+        self.reset()
+
+    def reset(self):
+        """
+        Discards the collected data.
+        """
+        self._anns = []
+        self._scores = []
+        self.num_classes = 0
+
+    def update(self, anns: np.ndarray, scores: np.ndarray):
+        """
+        Adds the annotations and the corresponding score matrix.
+
+        :param anns: the label indices of the annotations
+        :type anns: np.ndarray
+        :param scores: the float32 score matrix (num_pairs, num_classes)
+        :type scores: np.ndarray
+        """
+        self._anns.append(np.asarray(anns, dtype=np.int32))
+        self._scores.append(np.asarray(scores, dtype=np.float32))
+        self.num_classes = max(self.num_classes, scores.shape[1])
+
+    @property
+    def total(self) -> int:
+        """
+        Returns the number of collected pairs.
+
+        :return: the number of pairs
+        :rtype: int
+        """
+        return sum(len(x) for x in self._anns)
+
+    @property
+    def anns(self) -> np.ndarray:
+        """
+        Returns all the label indices of the annotations.
+
+        :return: the label indices
+        :rtype: np.ndarray
+        """
+        if len(self._anns) == 0:
+            return np.zeros(0, dtype=np.int32)
+        if len(self._anns) > 1:
+            self._anns = [np.concatenate(self._anns)]
+        return self._anns[0]
+
+    @property
+    def scores(self) -> np.ndarray:
+        """
+        Returns the score matrix of all pairs.
+
+        :return: the matrix (num_pairs, num_classes)
+        :rtype: np.ndarray
+        """
+        if len(self._scores) == 0:
+            return np.zeros((0, self.num_classes), dtype=np.float32)
+        if (len(self._scores) > 1) or (self._scores[0].shape[1] < self.num_classes):
+            self._scores = [np.concatenate([pad_scores(x, self.num_classes) for x in self._scores])]
+        return self._scores[0]
+
+
+def pad_scores(scores: np.ndarray, num_classes: int) -> np.ndarray:
+    """
+    Pads the score matrix with zero columns to the specified number of classes.
+
+    :param scores: the score matrix (num_pairs, classes)
+    :type scores: np.ndarray
+    :param num_classes: the number of classes
+    :type num_classes: int
+    :return: the (padded) matrix
+    :rtype: np.ndarray
+    """
+    if scores.shape[1] >= num_classes:
+        return scores
+    return np.pad(scores, ((0, 0), (0, num_classes - scores.shape[1])))
+
+
+def one_hot(anns: np.ndarray, num_classes: int) -> np.ndarray:
+    """
+    Turns the label indices into a boolean one-hot matrix.
+
+    :param anns: the label indices
+    :type anns: np.ndarray
+    :param num_classes: the number of classes
+    :type num_classes: int
+    :return: the matrix (num_pairs, num_classes)
+    :rtype: np.ndarray
+    """
+    result = np.zeros((len(anns), num_classes), dtype=bool)
+    result[np.arange(len(anns)), anns] = True
+    return result
+
+
+def _sorted_runs(targets: np.ndarray, scores: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Sorts each column by descending score and determines, for every position, the
+    cumulative true positives before the run of tied scores it belongs to and at
+    the end of that run, as well as the position of the end of the run.
+
+    :param targets: the boolean targets (num_pairs, columns)
+    :type targets: np.ndarray
+    :param scores: the scores (num_pairs, columns)
+    :type scores: np.ndarray
+    :return: the tuple of sorted targets, tp before run, tp at run end, index of run end
+    :rtype: tuple
+    """
+    n = len(scores)
+    order = np.argsort(-scores, axis=0, kind="stable")
+    scores = np.take_along_axis(scores, order, axis=0)
+    targets = np.take_along_axis(targets, order, axis=0)
+    tp = np.cumsum(targets, axis=0, dtype=np.int64)
+    change = np.diff(scores, axis=0) != 0
+    rows = np.arange(n, dtype=np.int64)[:, None]
+    run_start = np.ones(scores.shape, dtype=bool)
+    run_start[1:] = change
+    run_end = np.ones(scores.shape, dtype=bool)
+    run_end[:-1] = change
+    start = np.maximum.accumulate(np.where(run_start, rows, 0), axis=0)
+    end = np.minimum.accumulate(np.where(run_end, rows, n - 1)[::-1], axis=0)[::-1]
+    tp_excl = tp - targets
+    return targets, np.take_along_axis(tp_excl, start, axis=0), np.take_along_axis(tp, end, axis=0), end
+
+
+def _chunked(function, targets: np.ndarray, scores: np.ndarray, chunk_elements: int = CHUNK_ELEMENTS) -> np.ndarray:
+    """
+    Applies the per-column function to chunks of columns to limit the memory usage.
+
+    :param function: the function to apply, returns one value per column
+    :param targets: the boolean targets (num_pairs, columns)
+    :type targets: np.ndarray
+    :param scores: the scores (num_pairs, columns)
+    :type scores: np.ndarray
+    :param chunk_elements: the maximum number of elements to process at a time
+    :type chunk_elements: int
+    :return: the values per column
+    :rtype: np.ndarray
+    """
+    step = max(1, chunk_elements // max(1, len(scores)))
+    if step >= scores.shape[1]:
+        return function(targets, scores)
+    return np.concatenate([function(targets[:, i:i + step], scores[:, i:i + step]) for i in range(0, scores.shape[1], step)])
+
+
+def _auroc_columns(targets: np.ndarray, scores: np.ndarray) -> np.ndarray:
+    """
+    Computes the area under the ROC curve for each column (one-vs-rest),
+    equivalent to the trapezoidal rule over the ROC curve (ties count half).
+
+    :param targets: the boolean targets (num_pairs, columns)
+    :type targets: np.ndarray
+    :param scores: the scores (num_pairs, columns)
+    :type scores: np.ndarray
+    :return: the AUROC per column, NaN if a column lacks positives or negatives
+    :rtype: np.ndarray
+    """
+    targets, tp_before, tp_end, _ = _sorted_runs(targets, scores)
+    positives = targets.sum(axis=0).astype(np.float64)
+    negatives = len(targets) - positives
+    area = np.where(targets, 0.0, tp_before + 0.5 * (tp_end - tp_before)).sum(axis=0)
+    result = np.full(len(positives), np.nan)
+    valid = (positives > 0) & (negatives > 0)
+    result[valid] = area[valid] / (positives[valid] * negatives[valid])
+    return result
+
+
+def _average_precision_columns(targets: np.ndarray, scores: np.ndarray) -> np.ndarray:
+    """
+    Computes the average precision for each column (one-vs-rest), i.e., the sum of
+    the precisions at each threshold weighted by the increase in recall.
+
+    :param targets: the boolean targets (num_pairs, columns)
+    :type targets: np.ndarray
+    :param scores: the scores (num_pairs, columns)
+    :type scores: np.ndarray
+    :return: the AP per column, NaN if a column lacks positives
+    :rtype: np.ndarray
+    """
+    targets, _, tp_end, end = _sorted_runs(targets, scores)
+    positives = targets.sum(axis=0).astype(np.float64)
+    precision = tp_end / (end + 1.0)
+    total = np.where(targets, precision, 0.0).sum(axis=0)
+    result = np.full(len(positives), np.nan)
+    valid = positives > 0
+    result[valid] = total[valid] / positives[valid]
+    return result
+
+
+def _average_columns(values: np.ndarray, support: np.ndarray, average: str) -> np.ndarray:
+    """
+    Averages the per-class values, ignoring classes for which the value is undefined (NaN).
+
+    :param values: the per-class values
+    :type values: np.ndarray
+    :param support: the number of annotations per class
+    :type support: np.ndarray
+    :param average: the type of average (macro/weighted/none)
+    :type average: str
+    :return: the averaged value(s)
+    :rtype: np.ndarray
+    """
+    if average == AVERAGE_NONE:
+        return values
+    valid = ~np.isnan(values)
+    if not valid.any():
+        return np.float64(np.nan)
+    if average == AVERAGE_MACRO:
+        return np.float64(values[valid].mean())
+    if average == AVERAGE_WEIGHTED:
+        return np.float64(safe_divide((values[valid] * support[valid]).sum(), support[valid].sum()))
+    raise Exception("Unsupported average: %s" % average)
+
+
+def _from_columns(function, anns: np.ndarray, scores: np.ndarray, average: str) -> np.ndarray:
+    """
+    Computes a one-vs-rest statistic for all classes and averages it.
+    Micro averaging treats all elements of the score matrix as a single binary problem.
+
+    :param function: the per-column function
+    :param anns: the label indices of the annotations
+    :type anns: np.ndarray
+    :param scores: the score matrix (num_pairs, num_classes)
+    :type scores: np.ndarray
+    :param average: the type of average (micro/macro/weighted/none)
+    :type average: str
+    :return: the value(s)
+    :rtype: np.ndarray
+    """
+    targets = one_hot(anns, scores.shape[1])
+    if average == AVERAGE_MICRO:
+        return np.float64(function(targets.reshape((-1, 1)), scores.reshape((-1, 1)))[0])
+    values = _chunked(function, targets, scores)
+    return _average_columns(values, targets.sum(axis=0), average)
+
+
+def auroc_from_scores(anns: np.ndarray, scores: np.ndarray, average: str = AVERAGE_MACRO) -> np.ndarray:
+    """
+    Computes the area under the ROC curve (one-vs-rest) from the score matrix.
+    Classes without annotations (or without negatives) are excluded from the averages.
+
+    :param anns: the label indices of the annotations
+    :type anns: np.ndarray
+    :param scores: the score matrix (num_pairs, num_classes)
+    :type scores: np.ndarray
+    :param average: the type of average (micro/macro/weighted/none)
+    :type average: str
+    :return: the AUROC
+    :rtype: np.ndarray
+    """
+    return _from_columns(_auroc_columns, anns, scores, average)
+
+
+def average_precision_from_scores(anns: np.ndarray, scores: np.ndarray, average: str = AVERAGE_MACRO) -> np.ndarray:
+    """
+    Computes the average precision (one-vs-rest) from the score matrix.
+    Classes without annotations are excluded from the averages.
+
+    :param anns: the label indices of the annotations
+    :type anns: np.ndarray
+    :param scores: the score matrix (num_pairs, num_classes)
+    :type scores: np.ndarray
+    :param average: the type of average (micro/macro/weighted/none)
+    :type average: str
+    :return: the AP
+    :rtype: np.ndarray
+    """
+    return _from_columns(_average_precision_columns, anns, scores, average)
+
+
+def top_k_accuracy_from_scores(anns: np.ndarray, scores: np.ndarray, top_k: int = 1, average: str = AVERAGE_MICRO) -> np.ndarray:
+    """
+    Computes the top-k accuracy from the score matrix, i.e., the fraction of pairs for
+    which fewer than k other classes have a score at least as high as the annotated
+    class. Ties count against the annotated class, so rows with equal scores (e.g.,
+    one-hot rows of predictions without probabilities) do not become hits by default.
+    Per class, this is the fraction of its annotations that got a hit.
+
+    :param anns: the label indices of the annotations
+    :type anns: np.ndarray
+    :param scores: the score matrix (num_pairs, num_classes)
+    :type scores: np.ndarray
+    :param top_k: the number of top-scoring classes to consider
+    :type top_k: int
+    :param average: the type of average (micro/macro/weighted/none)
+    :type average: str
+    :return: the accuracy
+    :rtype: np.ndarray
+    """
+    anns = np.asarray(anns, dtype=np.int64)
+    true_scores = scores[np.arange(len(anns)), anns]
+    hits = (scores >= true_scores[:, None]).sum(axis=1) - 1 < top_k
+    if average == AVERAGE_MICRO:
+        return np.float64(safe_divide(hits.sum(), len(hits)))
+    support = np.bincount(anns, minlength=scores.shape[1])
+    per_class = safe_divide(np.bincount(anns, weights=hits, minlength=scores.shape[1]), support)
+    per_class[support == 0] = np.nan
+    if average == AVERAGE_NONE:
+        return np.nan_to_num(per_class)
+    return _average_columns(per_class, support, average)
+
+
+def calibration_error_from_scores(anns: np.ndarray, scores: np.ndarray, num_bins: int = NUM_BINS) -> np.float64:
+    """
+    Computes the expected calibration error (L1) of the top-1 predictions, using
+    equal-width confidence bins (lower bound exclusive, upper bound inclusive).
+
+    :param anns: the label indices of the annotations
+    :type anns: np.ndarray
+    :param scores: the score matrix (num_pairs, num_classes)
+    :type scores: np.ndarray
+    :param num_bins: the number of bins
+    :type num_bins: int
+    :return: the calibration error
+    :rtype: np.float64
+    """
+    if len(anns) == 0:
+        return np.float64(np.nan)
+    confidences = scores.max(axis=1).astype(np.float64)
+    correct = (scores.argmax(axis=1) == anns).astype(np.float64)
+    bins = np.clip(np.ceil(confidences * num_bins).astype(np.int64) - 1, 0, num_bins - 1)
+    sum_conf = np.bincount(bins, weights=confidences, minlength=num_bins)
+    sum_correct = np.bincount(bins, weights=correct, minlength=num_bins)
+    return np.float64(np.abs(sum_correct - sum_conf).sum() / len(anns))
+
+
+def binary_curve(targets: np.ndarray, scores: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Determines the cumulative true/false positives at each distinct score threshold
+    (in descending order) with a single sort.
+
+    :param targets: the boolean targets
+    :type targets: np.ndarray
+    :param scores: the scores
+    :type scores: np.ndarray
+    :return: the tuple of true positives, false positives and thresholds
+    :rtype: tuple
+    """
+    order = np.argsort(-scores, kind="stable")
+    scores = scores[order]
+    targets = targets[order]
+    last = np.r_[np.flatnonzero(np.diff(scores)), len(scores) - 1]
+    tps = np.cumsum(targets, dtype=np.int64)[last]
+    fps = last + 1 - tps
+    return tps, fps, scores[last]
+
+
+def roc_curve(targets: np.ndarray, scores: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Computes the ROC curve, starting at (0, 0) with an infinite threshold.
+
+    :param targets: the boolean targets
+    :type targets: np.ndarray
+    :param scores: the scores
+    :type scores: np.ndarray
+    :return: the tuple of false positive rates, true positive rates and thresholds
+    :rtype: tuple
+    """
+    tps, fps, thresholds = binary_curve(targets, scores)
+    tps = np.r_[0, tps]
+    fps = np.r_[0, fps]
+    return safe_divide(fps, fps[-1]), safe_divide(tps, tps[-1]), np.r_[np.inf, thresholds]
+
+
+def precision_recall_curve(targets: np.ndarray, scores: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Computes the precision-recall curve, in order of descending thresholds.
+
+    :param targets: the boolean targets
+    :type targets: np.ndarray
+    :param scores: the scores
+    :type scores: np.ndarray
+    :return: the tuple of precisions, recalls and thresholds
+    :rtype: tuple
+    """
+    tps, fps, thresholds = binary_curve(targets, scores)
+    return safe_divide(tps, tps + fps), safe_divide(tps, tps[-1]), thresholds
+
+
+def curves_from_scores(anns: np.ndarray, scores: np.ndarray, curve: str = CURVE_ROC) -> List[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    """
+    Computes the one-vs-rest ROC or precision-recall curve for each class.
+
+    :param anns: the label indices of the annotations
+    :type anns: np.ndarray
+    :param scores: the score matrix (num_pairs, num_classes)
+    :type scores: np.ndarray
+    :param curve: the type of curve (roc|pr)
+    :type curve: str
+    :return: the curve per class (see roc_curve and precision_recall_curve)
+    :rtype: list
+    """
+    if curve == CURVE_ROC:
+        function = roc_curve
+    elif curve == CURVE_PR:
+        function = precision_recall_curve
+    else:
+        raise Exception("Unsupported curve: %s" % curve)
+    targets = one_hot(anns, scores.shape[1])
+    return [function(targets[:, i], scores[:, i]) for i in range(scores.shape[1])]
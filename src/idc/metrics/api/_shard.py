@@ -0,0 +1,45 @@
+import hashlib
+from typing import Tuple
+
+SHARD_DIGEST_SIZE = 8
+
+
+def parse_shard(shard: str) -> Tuple[int, int]:
+    """
+    Parses the shard specification of the form "i/N", with i being the 1-based
+    index of the shard and N the total number of shards.
+
+    :param shard: the specification to parse
+    :type shard: str
+    :return: the tuple of 0-based index and number of shards
+    :rtype: tuple
+    """
+    parts = shard.split("/")
+    if len(parts) != 2:
+        raise Exception("Shard must be of the form 'i/N': %s" % shard)
+    try:
+        index = int(parts[0])
+        num_shards = int(parts[1])
+    except ValueError:
+        raise Exception("Shard must be of the form 'i/N': %s" % shard)
+    if num_shards < 1:
+        raise Exception("Number of shards must be at least 1: %s" % shard)
+    if (index < 1) or (index > num_shards):
+        raise Exception("Shard index must be in [1, %d]: %s" % (num_shards, shard))
+    return index - 1, num_shards
+
+
+def shard_of(image_name: str, num_shards: int) -> int:
+    """
+    Determines the shard that the image belongs to, using a hash of the name that
+    is stable across processes, machines and Python versions (unlike hash()).
+
+    :param image_name: the name of the image
+    :type image_name: str
+    :param num_shards: the total number of shards
+    :type num_shards: int
+    :return: the 0-based index of the shard
+    :rtype: int
+    """
+    digest = hashlib.blake2b(image_name.encode("utf-8"), digest_size=SHARD_DIGEST_SIZE).digest()
+    return int.from_bytes(digest, "big") % num_shards
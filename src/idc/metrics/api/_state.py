@@ -0,0 +1,177 @@
+import json
+import os
+from typing import List, Dict, Any, Tuple
+
+import numpy as np
+
+STATE_VERSION = 1
+
+STATE_META = "__meta__"
+
+
+class StatisticState:
+    """
+    The accumulated state of a summary statistics filter, from which the statistics
+    can be computed exactly: the name of the filter that produced it, the class labels
+    the label indices of the arrays refer to, the arrays (e.g., confusion matrix)
+    and additional parameters (e.g., running sums, thresholds). States of the same
+    kind can be merged, i.e., data can be evaluated in shards and combined afterwards.
+    The last flag indicates that no further states will follow.
+    """
+
+    def __init__(self, kind: str, classes: List[str] = None, fixed: bool = False,
+                 arrays: Dict[str, np.ndarray] = None, params: Dict[str, Any] = None, last: bool = False):
+        """
+        Initializes the state.
+
+        :param kind: the name of the filter the state belongs to
+        :type kind: str
+        :param classes: the class labels, the label indices of the arrays refer to them
+        :type classes: list
+        :param fixed: whether the class labels were fixed
+        :type fixed: bool
+        :param arrays: the arrays of the state
+        :type arrays: dict
+        :param params: the JSON-serializable parameters of the state
+        :type params: dict
+        :param last: whether no further states will follow
+        :type last: bool
+        """
+        self.kind = kind
+        self.classes = [] if classes is None else list(classes)
+        self.fixed = fixed
+        self.arrays = dict() if arrays is None else arrays
+        self.params = dict() if params is None else params
+        self.last = last
+
+
+def save_state(path: str, state: StatisticState):
+    """
+    Saves the state as numpy .npz file, with the meta-data stored as JSON string.
+    The file gets written to a temporary file first and then moved into place.
+
+    :param path: the file to write to
+    :type path: str
+    :param state: the state to save
+    :type state: StatisticState
+    """
+    meta = {
+        "version": STATE_VERSION,
+        "kind": state.kind,
+        "classes": state.classes,
+        "fixed": state.fixed,
+        "params": state.params,
+    }
+    arrays = dict(state.arrays)
+    arrays[STATE_META] = np.array(json.dumps(meta))
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as fp:
+        np.savez(fp, **arrays)
+    os.replace(tmp, path)
+
+
+def load_state(path: str) -> StatisticState:
+    """
+    Loads the state saved by save_state.
+
+    :param path: the file to load
+    :type path: str
+    :return: the state
+    :rtype: StatisticState
+    """
+    with np.load(path, allow_pickle=False) as data:
+        if STATE_META not in data.files:
+            raise Exception("Not a statistic state: %s" % path)
+        meta = json.loads(str(data[STATE_META]))
+        if meta.get("version") != STATE_VERSION:
+            raise Exception("Unsupported version of statistic state: %s" % str(meta.get("version")))
+        arrays = {x: data[x] for x in data.files if x != STATE_META}
+    return StatisticState(meta["kind"], classes=meta["classes"], fixed=meta["fixed"], arrays=arrays, params=meta["params"])
+
+
+def state_mapping(classes: List[str], encoder, default: int = -1) -> np.ndarray:
+    """
+    Maps the class labels of a state onto the label indices of the encoder,
+    adding unknown labels to the encoder unless it is fixed.
+
+    :param classes: the class labels of the state
+    :type classes: list
+    :param encoder: the LabelEncoder to map onto
+    :param default: the index to use for labels unknown to a fixed encoder
+    :type default: int
+    :return: the encoder's label index for each label of the state
+    :rtype: np.ndarray
+    """
+    result = np.full(len(classes), default, dtype=np.int64)
+    for i, cls in enumerate(classes):
+        index = encoder.index_of(cls)
+        if index is not None:
+            result[i] = index
+    return result
+
+
+def remap_confusion(matrix: np.ndarray, mapping: np.ndarray, num_classes: int) -> np.ndarray:
+    """
+    Translates the confusion matrix into the label indices of the mapping.
+    Rows and columns of labels mapped onto -1 get dropped, labels mapped onto
+    the same index get combined.
+
+    :param matrix: the confusion matrix to translate
+    :type matrix: np.ndarray
+    :param mapping: the new label index for each label of the matrix
+    :type mapping: np.ndarray
+    :param num_classes: the number of classes of the new matrix
+    :type num_classes: int
+    :return: the new matrix (num_classes, num_classes)
+    :rtype: np.ndarray
+    """
+    valid = mapping >= 0
+    target = mapping[valid]
+    result = np.zeros((num_classes, num_classes), dtype=np.int64)
+    np.add.at(result, (target[:, None], target[None, :]), matrix[np.ix_(valid, valid)])
+    return result
+
+
+def remap_scores(anns: np.ndarray, scores: np.ndarray, mapping: np.ndarray, num_classes: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Translates the label indices of the annotations and the columns of the score matrix
+    into the label indices of the mapping. Rows with annotations mapped onto -1 get dropped,
+    as do the columns of such labels.
+
+    :param anns: the label indices of the annotations
+    :type anns: np.ndarray
+    :param scores: the score matrix (num_pairs, classes)
+    :type scores: np.ndarray
+    :param mapping: the new label index for each label
+    :type mapping: np.ndarray
+    :param num_classes: the number of classes of the new score matrix
+    :type num_classes: int
+    :return: the tuple of new annotations and new score matrix (num_pairs, num_classes)
+    :rtype: tuple
+    """
+    mapped = mapping[anns] if len(anns) > 0 else np.zeros(0, dtype=np.int64)
+    keep = mapped >= 0
+    valid = mapping[:scores.shape[1]] >= 0
+    result = np.zeros((int(keep.sum()), num_classes), dtype=np.float32)
+    result[:, mapping[:scores.shape[1]][valid]] = scores[keep][:, valid]
+    return mapped[keep].astype(np.int32), result
+
+
+def remap_counts(counts: np.ndarray, mapping: np.ndarray, num_classes: int) -> np.ndarray:
+    """
+    Translates the per-label counts into the label indices of the mapping.
+
+    :param counts: the counts per label
+    :type counts: np.ndarray
+    :param mapping: the new label index for each label
+    :type mapping: np.ndarray
+    :param num_classes: the number of classes of the new counts
+    :type num_classes: int
+    :return: the new counts (num_classes)
+    :rtype: np.ndarray
+    """
+    mapping = mapping[:len(counts)]
+    valid = mapping >= 0
+    result = np.zeros(num_classes, dtype=np.int64)
+    np.add.at(result, mapping[valid], counts[:len(mapping)][valid])
+    return result
@@ -0,0 +1,356 @@
+from typing import List, Iterable
+
+import numpy as np
+from wai.common.adams.imaging.locateobjects import LocatedObject, LocatedObjects
+
+from idc.api import ImageData, ImageClassificationData, ObjectDetectionData, ImageSegmentationData, DepthData
+from idc.api import ImageSegmentationAnnotations, DepthInformation, LABEL_KEY
+from ._data import ImagePair, ImagePairList
+from ._objdet import SCORE_KEY
+from ._scores import SCORES_KEY
+
+SYNTHETIC_IC = "ic"
+SYNTHETIC_OD = "od"
+SYNTHETIC_IS = "is"
+SYNTHETIC_DP = "dp"
+SYNTHETIC_TYPES = [
+    SYNTHETIC_IC,
+    SYNTHETIC_OD,
+    SYNTHETIC_IS,
+    SYNTHETIC_DP,
+]
+
+BLOCK_SIZE = 1000
+
+PREDICTION_STREAM = 1
+
+
+class SyntheticDataGenerator:
+    """
+    Generates synthetic annotations and predictions of the specified data type.
+    The items get generated in blocks, with each block using its own random number
+    generator seeded from the seed and the block index. This makes the data
+    reproducible and the predictions, which get derived from the same ground truth
+    plus noise, can be generated independently of the annotations (e.g., in a
+    separate sub-flow).
+    """
+
+    def __init__(self, data_type: str, num_items: int, num_classes: int = 10, error_rate: float = 0.2,
+                 width: int = 64, height: int = 64, max_objects: int = 10, scores: bool = False,
+                 seed: int = 42, block_size: int = BLOCK_SIZE):
+        """
+        Initializes the generator.
+
+        :param data_type: the type of data to generate (ic|od|is|dp)
+        :type data_type: str
+        :param num_items: the number of items to generate
+        :type num_items: int
+        :param num_classes: the number of class labels
+        :type num_classes: int
+        :param error_rate: the rate of mistakes in the predictions (noise level for depth)
+        :type error_rate: float
+        :param width: the width of the images
+        :type width: int
+        :param height: the height of the images
+        :type height: int
+        :param max_objects: the maximum number of objects/regions per image (od/is)
+        :type max_objects: int
+        :param scores: whether to add class probabilities to the classification predictions
+        :type scores: bool
+        :param seed: the seed value for the random number generators
+        :type seed: int
+        :param block_size: the number of items to generate at a time
+        :type block_size: int
+        """
+        if data_type not in SYNTHETIC_TYPES:
+            raise Exception("Unsupported data type: %s" % data_type)
+        if num_items < 0:
+            raise Exception("Number of items cannot be negative: %d" % num_items)
+        if num_classes < 2:
+            raise Exception("At least two classes required, but got: %d" % num_classes)
+        if (error_rate < 0) or (error_rate > 1):
+            raise Exception("Error rate must be in [0, 1], but got: %f" % error_rate)
+        if (width < 1) or (height < 1):
+            raise Exception("Width and height must be at least 1, but got: %dx%d" % (width, height))
+        if block_size < 1:
+            raise Exception("Block size must be at least 1, but got: %d" % block_size)
+        self.data_type = data_type
+        self.num_items = num_items
+        self.num_classes = num_classes
+        self.error_rate = error_rate
+        self.width = width
+        self.height = height
+        self.max_objects = max(1, max_objects)
+        self.scores = scores
+        self.seed = seed
+        self.block_size = block_size
+
+    def labels(self) -> List[str]:
+        """
+        Returns the class labels.
+
+        :return: the labels
+        :rtype: list
+        """
+        return ["class-%d" % i for i in range(self.num_classes)]
+
+    def image_name(self, index: int) -> str:
+        """
+        Returns the name of the image with the specified index.
+
+        :param index: the index of the image
+        :type index: int
+        :return: the name
+        :rtype: str
+        """
+        return "image-%08d.png" % index
+
+    def generate(self, predictions: bool = False) -> Iterable[ImageData]:
+        """
+        Generates the annotations or predictions one by one.
+
+        :param predictions: whether to generate the predictions rather than the annotations
+        :type predictions: bool
+        :return: the items
+        :rtype: Iterable
+        """
+        for start in range(0, self.num_items, self.block_size):
+            yield from self.block(start // self.block_size, predictions=predictions)
+
+    def pairs(self, batch_size: int = None) -> Iterable[ImagePairList]:
+        """
+        Generates batches of pairs of annotations and predictions, the last one flagged as such.
+
+        :param batch_size: the maximum number of pairs per batch, all pairs in one batch if None
+        :type batch_size: int
+        :return: the batches
+        :rtype: Iterable
+        """
+        if batch_size is None:
+            batch_size = max(1, self.num_items)
+        batch = ImagePairList()
+        num_pairs = 0
+        for ann, pred in zip(self.generate(False), self.generate(True)):
+            batch.append(ImagePair(ann.image_name, ann, pred))
+            num_pairs += 1
+            if (len(batch) == batch_size) or (num_pairs == self.num_items):
+                batch.last = num_pairs == self.num_items
+                yield batch
+                batch = ImagePairList()
+
+    def block(self, index: int, predictions: bool = False) -> List[ImageData]:
+        """
+        Generates the annotations or predictions of the specified block.
+
+        :param index: the index of the block
+        :type index: int
+        :param predictions: whether to generate the predictions rather than the annotations
+        :type predictions: bool
+        :return: the items of the block
+        :rtype: list
+        """
+        start = index * self.block_size
+        count = max(0, min(self.block_size, self.num_items - start))
+        truth = np.random.default_rng([self.seed, index])
+        noise = np.random.default_rng([self.seed, index, PREDICTION_STREAM]) if predictions else None
+        if self.data_type == SYNTHETIC_IC:
+            return self._classification(start, count, truth, noise)
+        elif self.data_type == SYNTHETIC_OD:
+            return self._detection(start, count, truth, noise)
+        elif self.data_type == SYNTHETIC_IS:
+            return self._segmentation(start, count, truth, noise)
+        else:
+            return self._depth(start, count, truth, noise)
+
+    def _classification(self, start: int, count: int, truth: np.random.Generator, noise: np.random.Generator = None) -> List[ImageData]:
+        """
+        Generates image classification items.
+
+        :param start: the index of the first item
+        :type start: int
+        :param count: the number of items
+        :type count: int
+        :param truth: the generator for the ground truth
+        :type truth: np.random.Generator
+        :param noise: the generator for the prediction noise, None for annotations
+        :type noise: np.random.Generator
+        :return: the items
+        :rtype: list
+        """
+        labels = self.labels()
+        indices = truth.integers(0, self.num_classes, count)
+        probs = None
+        if noise is not None:
+            wrong = noise.random(count) < self.error_rate
+            offsets = noise.integers(1, self.num_classes, count)
+            indices = np.where(wrong, (indices + offsets) % self.num_classes, indices)
+            if self.scores:
+                logits = noise.normal(size=(count, self.num_classes))
+                logits[np.arange(count), indices] += 3.0
+                probs = np.exp(logits - logits.max(axis=1, keepdims=True))
+                probs /= probs.sum(axis=1, keepdims=True)
+        result = []
+        for i in range(count):
+            metadata = None
+            if probs is not None:
+                metadata = {SCORES_KEY: dict(zip(labels, probs[i].tolist()))}
+            result.append(ImageClassificationData(image_name=self.image_name(start + i), image_size=(self.width, self.height),
+                                                  metadata=metadata, annotation=labels[indices[i]]))
+        return result
+
+    def _boxes(self, rng: np.random.Generator, num: int) -> np.ndarray:
+        """
+        Generates random boxes within the image.
+
+        :param rng: the generator to use
+        :type rng: np.random.Generator
+        :param num: the number of boxes
+        :type num: int
+        :return: the boxes as x, y, width, height (num, 4)
+        :rtype: np.ndarray
+        """
+        w = np.maximum(1, (rng.uniform(0.05, 0.5, num) * self.width)).astype(np.int64)
+        h = np.maximum(1, (rng.uniform(0.05, 0.5, num) * self.height)).astype(np.int64)
+        x = (rng.random(num) * (self.width - w + 1)).astype(np.int64)
+        y = (rng.random(num) * (self.height - h + 1)).astype(np.int64)
+        return np.stack([x, y, w, h], axis=1)
+
+    def _jitter(self, rng: np.random.Generator, boxes: np.ndarray) -> np.ndarray:
+        """
+        Shifts the boxes randomly, keeping them inside the image.
+
+        :param rng: the generator to use
+        :type rng: np.random.Generator
+        :param boxes: the boxes as x, y, width, height (num, 4)
+        :type boxes: np.ndarray
+        :return: the shifted boxes
+        :rtype: np.ndarray
+        """
+        shift = np.rint(rng.normal(0, self.error_rate * 0.5, (len(boxes), 2)) * boxes[:, 2:]).astype(np.int64)
+        result = boxes.copy()
+        result[:, 0] = np.clip(boxes[:, 0] + shift[:, 0], 0, self.width - boxes[:, 2])
+        result[:, 1] = np.clip(boxes[:, 1] + shift[:, 1], 0, self.height - boxes[:, 3])
+        return result
+
+    def _flip(self, rng: np.random.Generator, labels: np.ndarray) -> np.ndarray:
+        """
+        Replaces labels with other ones at the error rate.
+
+        :param rng: the generator to use
+        :type rng: np.random.Generator
+        :param labels: the label indices
+        :type labels: np.ndarray
+        :return: the new label indices
+        :rtype: np.ndarray
+        """
+        wrong = rng.random(len(labels)) < self.error_rate
+        offsets = rng.integers(1, self.num_classes, len(labels))
+        return np.where(wrong, (labels + offsets) % self.num_classes, labels)
+
+    def _detection(self, start: int, count: int, truth: np.random.Generator, noise: np.random.Generator = None) -> List[ImageData]:
+        """
+        Generates object detection items. Predictions miss objects at the error rate,
+        get shifted and mislabeled and contain additional false positives.
+
+        :param start: the index of the first item
+        :type start: int
+        :param count: the number of items
+        :type count: int
+        :param truth: the generator for the ground truth
+        :type truth: np.random.Generator
+        :param noise: the generator for the prediction noise, None for annotations
+        :type noise: np.random.Generator
+        :return: the items
+        :rtype: list
+        """
+        labels = self.labels()
+        result = []
+        for i in range(count):
+            num = int(truth.integers(0, self.max_objects + 1))
+            boxes = self._boxes(truth, num)
+            indices = truth.integers(0, self.num_classes, num)
+            scores = None
+            if noise is not None:
+                found = noise.random(num) >= self.error_rate
+                boxes = self._jitter(noise, boxes[found])
+                indices = self._flip(noise, indices[found])
+                scores = noise.uniform(0.5, 1.0, len(boxes))
+                num_fp = int(noise.poisson(self.error_rate * self.max_objects / 2))
+                boxes = np.concatenate([boxes, self._boxes(noise, num_fp)])
+                indices = np.concatenate([indices, noise.integers(0, self.num_classes, num_fp)])
+                scores = np.concatenate([scores, noise.uniform(0.0, 0.6, num_fp)])
+            objs = LocatedObjects()
+            for n in range(len(boxes)):
+                x, y, w, h = boxes[n].tolist()
+                metadata = {LABEL_KEY: labels[indices[n]]}
+                if scores is not None:
+                    metadata[SCORE_KEY] = float(scores[n])
+                objs.append(LocatedObject(x, y, w, h, **metadata))
+            result.append(ObjectDetectionData(image_name=self.image_name(start + i), image_size=(self.width, self.height),
+                                              annotation=objs))
+        return result
+
+    def _segmentation(self, start: int, count: int, truth: np.random.Generator, noise: np.random.Generator = None) -> List[ImageData]:
+        """
+        Generates image segmentation items from rectangular regions. Predictions
+        contain shifted regions, mislabeled at the error rate.
+
+        :param start: the index of the first item
+        :type start: int
+        :param count: the number of items
+        :type count: int
+        :param truth: the generator for the ground truth
+        :type truth: np.random.Generator
+        :param noise: the generator for the prediction noise, None for annotations
+        :type noise: np.random.Generator
+        :return: the items
+        :rtype: list
+        """
+        labels = self.labels()
+        result = []
+        for i in range(count):
+            num = int(truth.integers(1, self.max_objects + 1))
+            boxes = self._boxes(truth, num)
+            indices = truth.integers(0, self.num_classes, num)
+            if noise is not None:
+                boxes = self._jitter(noise, boxes)
+                indices = self._flip(noise, indices)
+            label_map = np.full((self.height, self.width), -1, dtype=np.int32)
+            for n in range(num):
+                x, y, w, h = boxes[n].tolist()
+                label_map[y:y + h, x:x + w] = indices[n]
+            layers = dict()
+            for index in np.unique(indices).tolist():
+                layers[labels[index]] = ((label_map == index) * 255).astype(np.uint8)
+            result.append(ImageSegmentationData(image_name=self.image_name(start + i), image_size=(self.width, self.height),
+                                                annotation=ImageSegmentationAnnotations(labels=labels, layers=layers)))
+        return result
+
+    def _depth(self, start: int, count: int, truth: np.random.Generator, noise: np.random.Generator = None) -> List[ImageData]:
+        """
+        Generates depth estimation items from noisy planes. Predictions are the
+        ground truth with multiplicative log-normal noise (error rate as sigma).
+
+        :param start: the index of the first item
+        :type start: int
+        :param count: the number of items
+        :type count: int
+        :param truth: the generator for the ground truth
+        :type truth: np.random.Generator
+        :param noise: the generator for the prediction noise, None for annotations
+        :type noise: np.random.Generator
+        :return: the items
+        :rtype: list
+        """
+        ys = np.linspace(0, 1, self.height, dtype=np.float32)[:, None]
+        xs = np.linspace(0, 1, self.width, dtype=np.float32)[None, :]
+        result = []
+        for i in range(count):
+            base, dx, dy = truth.uniform(1, 10), truth.uniform(-1, 1), truth.uniform(-1, 1)
+            depth = (base + dx * xs + dy * ys + truth.normal(0, 0.1, (self.height, self.width))).astype(np.float32)
+            depth = np.maximum(depth, 0.1, dtype=np.float32)
+            if noise is not None:
+                depth = depth * np.exp(noise.normal(0, self.error_rate, depth.shape)).astype(np.float32)
+            result.append(DepthData(image_name=self.image_name(start + i), image_size=(self.width, self.height),
+                                    annotation=DepthInformation(depth)))
+        return result
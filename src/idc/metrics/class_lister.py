@@ -20,4 +20,18 @@ def list_classes() -> Dict[str, List[str]]:
         "idc.metrics.statistic.imgcls.ClassificationStatistic": [
             "idc.metrics.statistic.imgcls",
         ],
+        "idc.metrics.statistic.objdet.ObjectDetectionStatistic": [
+            "idc.metrics.statistic.objdet",
+        ],
+        "idc.metrics.statistic.imgseg.SegmentationStatistic": [
+            "idc.metrics.statistic.imgseg",
+        ],
+        "idc.metrics.statistic.depth.DepthStatistic": [
+            "idc.metrics.statistic.depth",
+        ],
+        "idc.metrics.statistic.ImageStatisticFilter": [
+            "idc.metrics.statistic.depth",
+            "idc.metrics.statistic.imgseg",
+            "idc.metrics.statistic.objdet",
+        ],
     }
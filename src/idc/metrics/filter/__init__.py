@@ -0,0 +1 @@
+from ._image_statistics import ImageStatistics
@@ -0,0 +1,221 @@
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from typing import List
+
+from wai.logging import LOGGING_WARNING
+
+from idc.metrics.api import ImagePairList, to_batches
+from idc.metrics.registry import available_image_statistics
+from idc.metrics.statistic import ImageStatisticFilter, ImageStatisticTable
+from seppl import SessionHandler, split_args, Plugin, Initializable, init_initializable, split_cmdline
+from seppl.io import BatchFilter
+
+
+def _evaluate(args):
+    """
+    Evaluates a batch function on its payload, used by the worker processes.
+
+    :param args: the tuple of function, payload and keyword arguments
+    :type args: tuple
+    :return: the values
+    """
+    function, payload, kwargs = args
+    return function(*payload, **kwargs)
+
+
+class ImageStatistics(BatchFilter):
+    """
+    Calculates per-image statistics for the incoming pairs.
+    """
+
+    def __init__(self, statistics: str = None, workers: int = None, batch_size: int = None,
+                 logger_name: str = None, logging_level: str = LOGGING_WARNING):
+        """
+        Initializes the filter.
+
+        :param statistics: the per-image statistics (and their options) to generate
+        :type statistics: str
+        :param workers: the number of worker processes to use for evaluating the batches
+        :type workers: int
+        :param batch_size: the number of images to evaluate at a time (and per worker task)
+        :type batch_size: int
+        :param logger_name: the name to use for the logger
+        :type logger_name: str
+        :param logging_level: the logging level to use
+        :type logging_level: str
+        """
+        super().__init__(logger_name=logger_name, logging_level=logging_level)
+        self.statistics = statistics
+        self.workers = workers
+        self.batch_size = batch_size
+        self._statistics = None
+        self._executor = None
+
+    def name(self) -> str:
+        """
+        Returns the name of the handler, used as sub-command.
+
+        :return: the name
+        :rtype: str
+        """
+        return "image-statistics"
+
+    def description(self) -> str:
+        """
+        Returns a description of the handler.
+
+        :return: the description
+        :rtype: str
+        """
+        return "Calculates per-image statistics for the incoming pairs, e.g., for determining the worst images. " \
+               "The pairs get evaluated in batches, optionally spread across worker processes. " \
+               "Outputs a table with the columns image, statistic and value."
+
+    def accepts(self) -> List:
+        """
+        Returns the list of classes that are accepted.
+
+        :return: the list of classes
+        :rtype: list
+        """
+        return [ImagePairList]
+
+    def generates(self) -> List:
+        """
+        Returns the list of classes that get produced.
+
+        :return: the list of classes
+        :rtype: list
+        """
+        return [ImageStatisticTable]
+
+    def _create_argparser(self) -> argparse.ArgumentParser:
+        """
+        Creates an argument parser. Derived classes need to fill in the options.
+
+        :return: the parser
+        :rtype: argparse.ArgumentParser
+        """
+        parser = super()._create_argparser()
+        parser.add_argument("-s", "--statistics", type=str, default=None, help="The per-image statistics to calculate.", required=True)
+        parser.add_argument("-w", "--workers", type=int, default=1, help="The number of worker processes to use for evaluating the batches; <= 1 for none.", required=False)
+        parser.add_argument("-b", "--batch_size", type=int, default=64, help="The number of images to evaluate at a time (and per worker task).", required=False)
+        return parser
+
+    def _parse_statistics(self) -> List[Plugin]:
+        """
+        Parses the statistics command-line and returns the list of plugins it represents.
+        Raises an exception in case of an invalid statistic.
+
+        :return: the list of plugins
+        :rtype: list
+        """
+        from seppl import args_to_objects
+
+        # split command-line into valid plugin subsets
+        valid = dict()
+        valid.update(available_image_statistics())
+        stats = split_cmdline(self.statistics)
+        args = split_args(stats, list(valid.keys()))
+        return args_to_objects(args, valid, allow_global_options=False)
+
+    def _apply_args(self, ns: argparse.Namespace):
+        """
+        Initializes the object with the arguments of the parsed namespace.
+
+        :param ns: the parsed arguments
+        :type ns: argparse.Namespace
+        """
+        super()._apply_args(ns)
+        self.statistics = ns.statistics
+        self.workers = ns.workers
+        self.batch_size = ns.batch_size
+
+    def initialize(self):
+        """
+        Initializes the processing, e.g., for opening files or databases.
+        """
+        super().initialize()
+
+        if self.statistics is None:
+            raise Exception("No statistics defined!")
+        if self.workers is None:
+            self.workers = 1
+        if self.batch_size is None:
+            self.batch_size = 64
+        if self.batch_size < 1:
+            raise Exception("Batch size must be at least 1: %d" % self.batch_size)
+
+        self._statistics = self._parse_statistics()
+        self._executor = None
+
+        for statistic in self._statistics:
+            if not isinstance(statistic, ImageStatisticFilter):
+                raise Exception("Not a per-image statistic: %s" % str(type(statistic)))
+            if isinstance(statistic, SessionHandler):
+                statistic.session = self.session
+            if isinstance(statistic, Initializable):
+                init_initializable(statistic, "statistic")
+
+    def _requires_list_input(self) -> bool:
+        """
+        Returns whether lists are expected as input for the _process method.
+
+        :return: True if list inputs are expected by the filter
+        :rtype: bool
+        """
+        return True
+
+    def _calculate(self, statistic: ImageStatisticFilter, chunks: List[ImagePairList]) -> List:
+        """
+        Calculates the statistic for the chunks of pairs. The payloads get prepared
+        in this process, the evaluation happens in the worker processes if enabled.
+
+        :param statistic: the statistic to calculate
+        :type statistic: ImageStatisticFilter
+        :param chunks: the chunks of pairs
+        :type chunks: list
+        :return: the values per chunk
+        :rtype: list
+        """
+        if (self.workers <= 1) or (len(chunks) < 2):
+            return [statistic.calculate_batch(chunk) for chunk in chunks]
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        function = statistic.batch_function()
+        kwargs = statistic.batch_arguments()
+        tasks = [(function, statistic.prepare_batch(chunk), kwargs) for chunk in chunks]
+        return list(self._executor.map(_evaluate, tasks))
+
+    def _do_process(self, data):
+        """
+        Processes the data record(s).
+
+        :param data: the record(s) to process
+        :return: the potentially updated record(s)
+        """
+        pairs = []
+        for batch in to_batches(data):
+            pairs.extend(batch)
+        if len(pairs) == 0:
+            return None
+        chunks = [ImagePairList(pairs[i:i + self.batch_size]) for i in range(0, len(pairs), self.batch_size)]
+        result = ImageStatisticTable()
+        for statistic in self._statistics:
+            try:
+                values = self._calculate(statistic, chunks)
+            except:
+                self.logger().exception("Failed to obtain statistic: %s" % str(type(statistic)))
+                continue
+            for chunk, chunk_values in zip(chunks, values):
+                result.add(statistic._statistic_name(), [pair.image_name for pair in chunk], chunk_values)
+        return result
+
+    def finalize(self):
+        """
+        Finishes the processing, e.g., for closing files or databases.
+        """
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+        super().finalize()
@@ -0,0 +1,316 @@
+import abc
+import argparse
+from typing import List, Optional
+
+from wai.logging import LOGGING_WARNING
+
+from idc.metrics.api import StatisticState, save_state, active_profiler, start_profiling, stop_profiling, measure, to_batches
+from idc.metrics.statistic import DatasetStatisticList, profile_statistics
+from seppl.io import BatchFilter
+from seppl.placeholders import placeholder_list, PlaceholderSupporter
+
+
+class AccumulatingStatisticsFilter(BatchFilter, abc.ABC):
+    """
+    Ancestor for filters that collect data across batches and output the final
+    statistics once the batch flagged as last (batch.last) has been received.
+    The readers of this library (load-metrics-pairs, load-metrics-multi-pairs,
+    load-encoded-pairs-ic, load-statistic-states, generate-synthetic-data) flag
+    their last batch. As filters cannot forward any data when finalizing, the
+    final statistics of data without such a flag only get output via the logger.
+    """
+
+    def _requires_list_input(self) -> bool:
+        """
+        Returns whether lists are expected as input for the _process method.
+
+        :return: True if list inputs are expected by the filter
+        :rtype: bool
+        """
+        return True
+
+    def _to_batches(self, data) -> List:
+        """
+        Turns the data that the filter received into a list of batches.
+
+        :param data: the data to convert
+        :return: the batches
+        :rtype: list
+        """
+        return to_batches(data)
+
+    def _num_items(self, batch) -> int:
+        """
+        Returns the number of items in the batch, for profiling.
+
+        :param batch: the batch to inspect
+        :return: the number of items
+        :rtype: int
+        """
+        if isinstance(batch, StatisticState):
+            return 0
+        return len(batch)
+
+    def _process_batch(self, batch) -> Optional[DatasetStatisticList]:
+        """
+        Processes a single batch.
+
+        :param batch: the batch to process
+        :return: the statistics, None if none to output
+        :rtype: DatasetStatisticList
+        """
+        raise NotImplementedError()
+
+    def _last_statistics(self, stats: DatasetStatisticList) -> DatasetStatisticList:
+        """
+        Hook for amending the statistics generated for the last batch.
+
+        :param stats: the statistics of the last batch
+        :type stats: DatasetStatisticList
+        :return: the (potentially amended) statistics
+        :rtype: DatasetStatisticList
+        """
+        return stats
+
+    def _pending_statistics(self) -> Optional[DatasetStatisticList]:
+        """
+        Returns the final statistics that have not been forwarded yet, as no
+        batch was flagged as the last one.
+
+        :return: the statistics, None if nothing pending
+        :rtype: DatasetStatisticList
+        """
+        raise NotImplementedError()
+
+    def _do_process(self, data):
+        """
+        Processes the data record(s).
+
+        :param data: the record(s) to process
+        :return: the potentially updated record(s)
+        """
+        result = []
+        for batch in self._to_batches(data):
+            with measure("%s/batch" % self.name(), items=self._num_items(batch)):
+                stats = self._process_batch(batch)
+            if stats is not None:
+                if batch.last:
+                    stats = self._last_statistics(stats)
+                result.append(stats)
+        if len(result) == 0:
+            return None
+        elif len(result) == 1:
+            return result[0]
+        else:
+            return result
+
+    def _finish(self):
+        """
+        Hook for finishing up (e.g., saving state, releasing resources) after
+        the pending statistics have been output.
+        """
+        pass
+
+    def finalize(self):
+        """
+        Finishes the processing, e.g., for closing files or databases.
+        """
+        # statistics can no longer be forwarded at this stage, hence only output them via the logger
+        stats = self._pending_statistics()
+        if stats is not None:
+            self.logger().warning("Last batch was not flagged by the reader, final statistics were not forwarded:")
+            for stat in stats:
+                self.logger().warning("%s: %s" % (stat.statistic, str(stat.value)))
+        self._finish()
+        super().finalize()
+
+
+class SummaryStatisticsFilter(AccumulatingStatisticsFilter, PlaceholderSupporter, abc.ABC):
+    """
+    Ancestor for the summary statistics filters, which either output the statistics
+    per batch or accumulate them across batches (with optional snapshots), can save
+    the accumulated state for merging it with the states of other shards and can
+    append profiling information to the final statistics.
+    """
+
+    def __init__(self, accumulate: bool = False, snapshot_interval: int = None, save_state: str = None, profile: bool = None,
+                 logger_name: str = None, logging_level: str = LOGGING_WARNING):
+        """
+        Initializes the filter.
+
+        :param accumulate: whether to accumulate the statistics across batches rather than outputting them per batch
+        :type accumulate: bool
+        :param snapshot_interval: the number of batches after which to output intermediate statistics in accumulate mode, 0 for final ones only
+        :type snapshot_interval: int
+        :param save_state: the file to save the accumulated state to when finishing, ignored if None
+        :type save_state: str
+        :param profile: whether to enable profiling and append the measurements to the final statistics
+        :type profile: bool
+        :param logger_name: the name to use for the logger
+        :type logger_name: str
+        :param logging_level: the logging level to use
+        :type logging_level: str
+        """
+        super().__init__(logger_name=logger_name, logging_level=logging_level)
+        self.accumulate = accumulate
+        self.snapshot_interval = snapshot_interval
+        self.save_state = save_state
+        self.profile = profile
+        self._num_batches = 0
+        self._pending = False
+        self._executor = None
+        self._own_profiler = False
+
+    def generates(self) -> List:
+        """
+        Returns the list of classes that get produced.
+
+        :return: the list of classes
+        :rtype: list
+        """
+        return [DatasetStatisticList]
+
+    def _state_description(self) -> str:
+        """
+        Returns what the accumulated state consists of, for the help of the save_state option.
+
+        :return: the description
+        :rtype: str
+        """
+        raise NotImplementedError()
+
+    def _accumulate_help(self) -> str:
+        """
+        Returns the help for the accumulate option.
+
+        :return: the help
+        :rtype: str
+        """
+        return "Whether to accumulate the statistics across batches and output them once the last batch has been received, rather than outputting them per batch. The final statistics only get forwarded if the reader flags its last batch (e.g., load-metrics-pairs), otherwise they only get logged."
+
+    def _create_argparser(self) -> argparse.ArgumentParser:
+        """
+        Creates an argument parser. Derived classes need to fill in the options.
+
+        :return: the parser
+        :rtype: argparse.ArgumentParser
+        """
+        parser = super()._create_argparser()
+        parser.add_argument("-A", "--accumulate", action="store_true", help=self._accumulate_help())
+        parser.add_argument("-I", "--snapshot_interval", type=int, default=0, help="The number of batches after which to output intermediate statistics in accumulate mode; 0 to only output the final statistics.", required=False)
+        parser.add_argument("--save_state", type=str, default=None, help="The file to save the accumulated state (%s) to when finishing, for merging it with the states of other shards via load-statistic-states; requires accumulate mode. " % self._state_description() + placeholder_list(obj=self), required=False)
+        parser.add_argument("--profile", action="store_true", help="Whether to enable profiling and append the measurements collected so far (time, items, peak RSS per stage) to the final statistics as profile/STAGE/MEASURE; profiling gets disabled again when the filter finishes, unless it was already enabled (e.g., via the IDC_METRICS_PROFILE environment variable).")
+        return parser
+
+    def _apply_args(self, ns: argparse.Namespace):
+        """
+        Initializes the object with the arguments of the parsed namespace.
+
+        :param ns: the parsed arguments
+        :type ns: argparse.Namespace
+        """
+        super()._apply_args(ns)
+        self.accumulate = ns.accumulate
+        self.snapshot_interval = ns.snapshot_interval
+        self.save_state = ns.save_state
+        self.profile = ns.profile
+
+    def initialize(self):
+        """
+        Initializes the processing, e.g., for opening files or databases.
+        """
+        super().initialize()
+
+        if self.accumulate is None:
+            self.accumulate = False
+        if self.snapshot_interval is None:
+            self.snapshot_interval = 0
+        if (self.save_state is not None) and not self.accumulate:
+            raise Exception("Saving the state requires accumulate mode!")
+        if self.profile is None:
+            self.profile = False
+        # only scope the profiler to the filter if not already enabled (e.g., via IDC_METRICS_PROFILE)
+        self._own_profiler = self.profile and (active_profiler() is None)
+        if self._own_profiler:
+            start_profiling()
+        self._num_batches = 0
+        self._pending = False
+
+    def _is_output_due(self, batch) -> bool:
+        """
+        Checks whether the accumulated statistics need to be output after the batch,
+        i.e., for the last batch or a snapshot.
+
+        :param batch: the batch that was just added
+        :return: True if to output
+        :rtype: bool
+        """
+        return batch.last or ((self.snapshot_interval > 0) and (self._num_batches % self.snapshot_interval == 0))
+
+    def _has_accumulated(self) -> bool:
+        """
+        Returns whether any data has been accumulated.
+
+        :return: True if data accumulated
+        :rtype: bool
+        """
+        raise NotImplementedError()
+
+    def _compute_accumulated(self) -> DatasetStatisticList:
+        """
+        Calculates the statistics from the accumulated state.
+
+        :return: the statistics
+        :rtype: DatasetStatisticList
+        """
+        raise NotImplementedError()
+
+    def _get_state(self) -> StatisticState:
+        """
+        Returns the accumulated state.
+
+        :return: the state
+        :rtype: StatisticState
+        """
+        raise NotImplementedError()
+
+    def _last_statistics(self, stats: DatasetStatisticList) -> DatasetStatisticList:
+        """
+        Appends the profiling information to the statistics of the last batch, if enabled.
+
+        :param stats: the statistics of the last batch
+        :type stats: DatasetStatisticList
+        :return: the (potentially amended) statistics
+        :rtype: DatasetStatisticList
+        """
+        if self.profile:
+            stats.extend(profile_statistics())
+        return stats
+
+    def _pending_statistics(self) -> Optional[DatasetStatisticList]:
+        """
+        Returns the final statistics that have not been forwarded yet, as no
+        batch was flagged as the last one.
+
+        :return: the statistics, None if nothing pending
+        :rtype: DatasetStatisticList
+        """
+        if self.accumulate and self._pending and self._has_accumulated():
+            return self._compute_accumulated()
+        return None
+
+    def _finish(self):
+        """
+        Saves the accumulated state (if requested), shuts down the worker processes
+        and stops the profiler if the filter started it.
+        """
+        if self.accumulate and (self.save_state is not None):
+            path = self.session.expand_placeholders(self.save_state)
+            self.logger().info("Saving state to: %s" % path)
+            save_state(path, self._get_state())
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+        if self._own_profiler:
+            stop_profiling()
+            self._own_profiler = False
@@ -0,0 +1,310 @@
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional
+
+import numpy as np
+from wai.logging import LOGGING_WARNING
+
+from idc.metrics.api import ImagePairList, DepthAccumulator, MIN_DEPTH, CHUNK_SIZE, split_pairs, depth_accumulator_from_pairs
+from idc.metrics.api import measure
+from idc.metrics.api import StatisticState
+from idc.metrics.filter._summary_statistics import SummaryStatisticsFilter
+from idc.metrics.registry import available_depth_statistics
+from idc.metrics.statistic import DatasetStatisticList
+from idc.metrics.statistic.depth import DepthStatistic
+from seppl import SessionHandler, split_args, Plugin, Initializable, init_initializable, split_cmdline
+
+
+class SummaryStatistics(SummaryStatisticsFilter):
+    """
+    Calculates summary statistics for the incoming depth estimation pairs.
+    """
+
+    def __init__(self, statistics: str = None, min_depth: float = None, max_depth: float = None, chunk_size: int = None,
+                 workers: int = None, accumulate: bool = False, snapshot_interval: int = None, save_state: str = None, profile: bool = None,
+                 logger_name: str = None, logging_level: str = LOGGING_WARNING):
+        """
+        Initializes the filter.
+
+        :param statistics: the statistics (and their options) to generate
+        :type statistics: str
+        :param min_depth: the minimum valid depth in the annotations
+        :type min_depth: float
+        :param max_depth: the maximum valid depth in the annotations, no limit if None
+        :type max_depth: float
+        :param chunk_size: the number of pixels to process at a time
+        :type chunk_size: int
+        :param workers: the number of worker processes to distribute the images of a batch across
+        :type workers: int
+        :param accumulate: whether to accumulate the statistics across batches rather than outputting them per batch
+        :type accumulate: bool
+        :param snapshot_interval: the number of batches after which to output intermediate statistics in accumulate mode, 0 for final ones only
+        :type snapshot_interval: int
+        :param save_state: the file to save the accumulated state to when finishing, ignored if None
+        :type save_state: str
+        :param profile: whether to enable profiling and append the measurements to the final statistics
+        :type profile: bool
+        :param logger_name: the name to use for the logger
+        :type logger_name: str
+        :param logging_level: the logging level to use
+        :type logging_level: str
+        """
+        super().__init__(accumulate=accumulate, snapshot_interval=snapshot_interval, save_state=save_state, profile=profile,
+                         logger_name=logger_name, logging_level=logging_level)
+        self.statistics = statistics
+        self.min_depth = min_depth
+        self.max_depth = max_depth
+        self.chunk_size = chunk_size
+        self.workers = workers
+        self._statistics = None
+        self._accumulator = None
+
+    def name(self) -> str:
+        """
+        Returns the name of the handler, used as sub-command.
+
+        :return: the name
+        :rtype: str
+        """
+        return "summary-statistics-dp"
+
+    def description(self) -> str:
+        """
+        Returns a description of the handler.
+
+        :return: the description
+        :rtype: str
+        """
+        return "Calculates summary statistics for the incoming depth estimation pairs. The errors get accumulated as running sums over chunks of pixels."
+
+    def accepts(self) -> List:
+        """
+        Returns the list of classes that are accepted.
+
+        :return: the list of classes
+        :rtype: list
+        """
+        return [ImagePairList, StatisticState]
+
+    def _state_description(self) -> str:
+        """
+        Returns what the accumulated state consists of, for the help of the save_state option.
+
+        :return: the description
+        :rtype: str
+        """
+        return "running sums"
+
+    def _create_argparser(self) -> argparse.ArgumentParser:
+        """
+        Creates an argument parser. Derived classes need to fill in the options.
+
+        :return: the parser
+        :rtype: argparse.ArgumentParser
+        """
+        parser = super()._create_argparser()
+        parser.add_argument("-s", "--statistics", type=str, default=None, help="The summary statistics to calculate.", required=True)
+        parser.add_argument("-m", "--min_depth", type=float, default=MIN_DEPTH, help="The minimum valid depth in the annotations; predictions get clipped to the valid range.", required=False)
+        parser.add_argument("-M", "--max_depth", type=float, default=None, help="The maximum valid depth in the annotations; no limit if not specified.", required=False)
+        parser.add_argument("-C", "--chunk_size", type=int, default=CHUNK_SIZE, help="The number of pixels to process at a time.", required=False)
+        parser.add_argument("-w", "--workers", type=int, default=1, help="The number of worker processes to distribute the images of a batch across; <= 1 for none.", required=False)
+        return parser
+
+    def _parse_statistics(self) -> List[Plugin]:
+        """
+        Parses the statistics command-line and returns the list of plugins it represents.
+        Raises an exception in case of an invalid statistic.
+
+        :return: the list of plugins
+        :rtype: list
+        """
+        from seppl import args_to_objects
+
+        # split command-line into valid plugin subsets
+        valid = dict()
+        valid.update(available_depth_statistics())
+        stats = split_cmdline(self.statistics)
+        args = split_args(stats, list(valid.keys()))
+        return args_to_objects(args, valid, allow_global_options=False)
+
+    def _apply_args(self, ns: argparse.Namespace):
+        """
+        Initializes the object with the arguments of the parsed namespace.
+
+        :param ns: the parsed arguments
+        :type ns: argparse.Namespace
+        """
+        super()._apply_args(ns)
+        self.statistics = ns.statistics
+        self.min_depth = ns.min_depth
+        self.max_depth = ns.max_depth
+        self.chunk_size = ns.chunk_size
+        self.workers = ns.workers
+
+    def initialize(self):
+        """
+        Initializes the processing, e.g., for opening files or databases.
+        """
+        super().initialize()
+
+        if self.statistics is None:
+            raise Exception("No statistics defined!")
+        if self.min_depth is None:
+            self.min_depth = MIN_DEPTH
+        if self.chunk_size is None:
+            self.chunk_size = CHUNK_SIZE
+        if self.chunk_size < 1:
+            raise Exception("Chunk size must be at least 1: %d" % self.chunk_size)
+        if self.workers is None:
+            self.workers = 1
+
+        self._statistics = self._parse_statistics()
+        self._accumulator = self._new_accumulator()
+
+        for statistic in self._statistics:
+            if not isinstance(statistic, DepthStatistic):
+                raise Exception("Not a depth statistic: %s" % str(type(statistic)))
+            if isinstance(statistic, SessionHandler):
+                statistic.session = self.session
+            if isinstance(statistic, Initializable):
+                init_initializable(statistic, "statistic")
+
+    def _new_accumulator(self) -> DepthAccumulator:
+        """
+        Creates a new accumulator.
+
+        :return: the accumulator
+        :rtype: DepthAccumulator
+        """
+        return DepthAccumulator(min_depth=self.min_depth, max_depth=self.max_depth, chunk_size=self.chunk_size)
+
+    def _compute(self, accumulator: DepthAccumulator) -> DatasetStatisticList:
+        """
+        Calculates the statistics from the running sums.
+
+        :param accumulator: the accumulator to use
+        :type accumulator: DepthAccumulator
+        :return: the statistics
+        :rtype: DatasetStatisticList
+        """
+        with measure("%s/compute" % self.name()):
+            result = DatasetStatisticList()
+            for statistic in self._statistics:
+                try:
+                    result.append(statistic.calculate_from_accumulator(accumulator))
+                except:
+                    self.logger().exception("Failed to obtain statistic: %s" % str(type(statistic)))
+            self._pending = False
+            return result
+
+    def _update(self, accumulator: DepthAccumulator, batch: ImagePairList):
+        """
+        Adds the pairs of the batch to the running sums, one image at a time.
+
+        :param accumulator: the accumulator to update
+        :type accumulator: DepthAccumulator
+        :param batch: the pairs to add
+        :type batch: ImagePairList
+        """
+        if (self.workers > 1) and (len(batch) > 1):
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            chunks = split_pairs(batch, self.workers)
+            n = len(chunks)
+            for partial, failed in self._executor.map(depth_accumulator_from_pairs, chunks, [self.min_depth] * n, [self.max_depth] * n, [self.chunk_size] * n):
+                accumulator.merge(partial)
+                for image_name in failed:
+                    self.logger().warning("No depth information, skipping: %s" % image_name)
+        else:
+            for pair in batch:
+                if not accumulator.update_pair(pair):
+                    self.logger().warning("No depth information, skipping: %s" % pair.image_name)
+
+    def _get_state(self) -> StatisticState:
+        """
+        Returns the accumulated state.
+
+        :return: the state
+        :rtype: StatisticState
+        """
+        acc = self._accumulator
+        params = {
+            "min_depth": acc.min_depth,
+            "max_depth": acc.max_depth,
+            "count": acc.count,
+            "sum_abs_rel": acc.sum_abs_rel,
+            "sum_sq_rel": acc.sum_sq_rel,
+            "sum_sq": acc.sum_sq,
+            "sum_sq_log": acc.sum_sq_log,
+        }
+        return StatisticState(self.name(), arrays={"sum_delta": acc.sum_delta}, params=params)
+
+    def _merge_state(self, state: StatisticState):
+        """
+        Adds the state (e.g., of another shard) to the accumulated state.
+
+        :param state: the state to add
+        :type state: StatisticState
+        """
+        if state.kind != self.name():
+            raise Exception("Cannot merge state of %s into %s!" % (state.kind, self.name()))
+        other = DepthAccumulator(min_depth=state.params["min_depth"], max_depth=state.params["max_depth"])
+        other.count = state.params["count"]
+        other.sum_abs_rel = state.params["sum_abs_rel"]
+        other.sum_sq_rel = state.params["sum_sq_rel"]
+        other.sum_sq = state.params["sum_sq"]
+        other.sum_sq_log = state.params["sum_sq_log"]
+        other.sum_delta = state.arrays["sum_delta"].astype(np.int64)
+        self._accumulator.merge(other)
+
+    def _has_accumulated(self) -> bool:
+        """
+        Returns whether any data has been accumulated.
+
+        :return: True if data accumulated
+        :rtype: bool
+        """
+        return self._accumulator.count > 0
+
+    def _compute_accumulated(self) -> DatasetStatisticList:
+        """
+        Calculates the statistics from the accumulated state.
+
+        :return: the statistics
+        :rtype: DatasetStatisticList
+        """
+        return self._compute(self._accumulator)
+
+    def _process_batch(self, batch) -> Optional[DatasetStatisticList]:
+        """
+        Processes a single batch of pairs.
+
+        :param batch: the pairs or state to process
+        :type batch: ImagePairList or StatisticState
+        :return: the statistics, None if none to output
+        :rtype: DatasetStatisticList
+        """
+        if not self.accumulate:
+            if isinstance(batch, StatisticState):
+                raise Exception("Statistic states can only be merged in accumulate mode!")
+            accumulator = self._new_accumulator()
+            self._update(accumulator, batch)
+            if accumulator.count == 0:
+                self.logger().warning("No valid pixels to calculate statistics for!")
+                return None
+            return self._compute(accumulator)
+
+        self._num_batches += 1
+        if isinstance(batch, StatisticState):
+            self._merge_state(batch)
+        else:
+            with measure("%s/update" % self.name(), items=len(batch)):
+                self._update(self._accumulator, batch)
+        self._pending = True
+        if self._is_output_due(batch):
+            if self._accumulator.count == 0:
+                self.logger().warning("No valid pixels to calculate statistics for!")
+                return None
+            self.logger().info("Statistics after %d batches/%d pixels" % (self._num_batches, self._accumulator.count))
+            return self._compute(self._accumulator)
+        return None
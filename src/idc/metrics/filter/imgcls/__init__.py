@@ -1 +1,2 @@
 from ._summary_statistics import SummaryStatistics
+from ._model_comparison import ModelComparison
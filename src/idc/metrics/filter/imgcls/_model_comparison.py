@@ -0,0 +1,315 @@
+import argparse
+from typing import List, Optional
+
+import numpy as np
+from wai.logging import LOGGING_WARNING
+
+from idc.metrics.api import MultiImagePairList, LabelEncoder, to_multi_batches
+from idc.metrics.api import SCORES_KEY, pad_scores
+from idc.metrics.api import NUM_PERMUTATIONS, model_confusion_matrices, mcnemar_test, permutation_test_from_confusion, permutation_test_rows, comparison_names
+from idc.metrics.filter._summary_statistics import AccumulatingStatisticsFilter
+from idc.metrics.registry import available_imgcls_statistics
+from idc.metrics.statistic import DatasetStatistic, DatasetStatisticList, to_statistic_value
+from idc.metrics.statistic.imgcls import ClassificationStatistic, NumClassesHandler
+from seppl import SessionHandler, split_args, Plugin, Initializable, init_initializable, split_cmdline
+
+
+class ModelComparison(AccumulatingStatisticsFilter):
+    """
+    Calculates the statistics for the predictions of several models on the same images
+    and compares the models pairwise with significance tests.
+    """
+
+    def __init__(self, statistics: str = None, classes: List[str] = None, score_key: str = None,
+                 permutations: int = None, seed: int = None, logger_name: str = None, logging_level: str = LOGGING_WARNING):
+        """
+        Initializes the filter.
+
+        :param statistics: the statistics (and their options) to generate
+        :type statistics: str
+        :param classes: the fixed list of class labels to use, determined from the data if None
+        :type classes: list
+        :param score_key: the meta-data key of the predictions with the per-class probabilities
+        :type score_key: str
+        :param permutations: the number of permutations for the paired permutation tests, 0 for none
+        :type permutations: int
+        :param seed: the seed for the permutations, None for a random one
+        :type seed: int
+        :param logger_name: the name to use for the logger
+        :type logger_name: str
+        :param logging_level: the logging level to use
+        :type logging_level: str
+        """
+        super().__init__(logger_name=logger_name, logging_level=logging_level)
+        self.statistics = statistics
+        self.classes = classes
+        self.score_key = score_key
+        self.permutations = permutations
+        self.seed = seed
+        self._statistics = None
+        self._encoder = None
+        self._requires_scores = False
+        self._models = None
+        self._anns = None
+        self._preds = None
+        self._scores = None
+
+    def name(self) -> str:
+        """
+        Returns the name of the handler, used as sub-command.
+
+        :return: the name
+        :rtype: str
+        """
+        return "model-comparison-ic"
+
+    def description(self) -> str:
+        """
+        Returns a description of the handler.
+
+        :return: the description
+        :rtype: str
+        """
+        return "Calculates the statistics for the predictions of several models on the same images (see load-metrics-multi-pairs) "\
+               "and compares all pairs of models using McNemar's test and paired permutation tests of the statistics. "\
+               "The statistics are output once the last batch has been received."
+
+    def accepts(self) -> List:
+        """
+        Returns the list of classes that are accepted.
+
+        :return: the list of classes
+        :rtype: list
+        """
+        return [MultiImagePairList]
+
+    def generates(self) -> List:
+        """
+        Returns the list of classes that get produced.
+
+        :return: the list of classes
+        :rtype: list
+        """
+        return [DatasetStatisticList]
+
+    def _create_argparser(self) -> argparse.ArgumentParser:
+        """
+        Creates an argument parser. Derived classes need to fill in the options.
+
+        :return: the parser
+        :rtype: argparse.ArgumentParser
+        """
+        parser = super()._create_argparser()
+        parser.add_argument("-s", "--statistics", type=str, default=None, help="The summary statistics to calculate and compare.", required=True)
+        parser.add_argument("-c", "--classes", type=str, default=None, help="The fixed list of class labels to use, which determines their order; pairs with other labels get skipped. Determined from the data if not provided.", required=False, nargs="*")
+        parser.add_argument("-k", "--score_key", type=str, default=SCORES_KEY, help="The meta-data key of the predictions that contains the per-class probabilities (dictionary or JSON string of label -> probability); only used by statistics that require scores.", required=False)
+        parser.add_argument("-P", "--permutations", type=int, default=NUM_PERMUTATIONS, help="The number of permutations for the paired permutation tests of the statistics; 0 to disable.", required=False)
+        parser.add_argument("-S", "--seed", type=int, default=None, help="The seed for the permutations, for reproducible p-values.", required=False)
+        return parser
+
+    def _parse_statistics(self) -> List[Plugin]:
+        """
+        Parses the statistics command-line and returns the list of plugins it represents.
+        Raises an exception in case of an invalid statistic.
+
+        :return: the list of plugins
+        :rtype: list
+        """
+        from seppl import args_to_objects
+
+        # split command-line into valid plugin subsets
+        valid = dict()
+        valid.update(available_imgcls_statistics())
+        stats = split_cmdline(self.statistics)
+        args = split_args(stats, list(valid.keys()))
+        return args_to_objects(args, valid, allow_global_options=False)
+
+    def _apply_args(self, ns: argparse.Namespace):
+        """
+        Initializes the object with the arguments of the parsed namespace.
+
+        :param ns: the parsed arguments
+        :type ns: argparse.Namespace
+        """
+        super()._apply_args(ns)
+        self.statistics = ns.statistics
+        self.classes = ns.classes
+        self.score_key = ns.score_key
+        self.permutations = ns.permutations
+        self.seed = ns.seed
+
+    def initialize(self):
+        """
+        Initializes the processing, e.g., for opening files or databases.
+        """
+        super().initialize()
+
+        if self.statistics is None:
+            raise Exception("No statistics defined!")
+        if self.score_key is None:
+            self.score_key = SCORES_KEY
+        if self.permutations is None:
+            self.permutations = NUM_PERMUTATIONS
+
+        self._statistics = self._parse_statistics()
+        if (self.classes is not None) and (len(self.classes) > 0):
+            self._encoder = LabelEncoder(classes=self.classes, fixed=True)
+        else:
+            self._encoder = LabelEncoder()
+        self._models = None
+        self._anns = []
+        self._preds = []
+        self._scores = []
+
+        for statistic in self._statistics:
+            if not isinstance(statistic, ClassificationStatistic):
+                raise Exception("Not a classification statistic: %s" % str(type(statistic)))
+            if isinstance(statistic, SessionHandler):
+                statistic.session = self.session
+            if isinstance(statistic, Initializable):
+                init_initializable(statistic, "statistic")
+        self._requires_scores = any(statistic.requires_scores() for statistic in self._statistics)
+
+    def _to_batches(self, data) -> List:
+        """
+        Turns the data that the filter received into a list of batches.
+
+        :param data: the data to convert
+        :return: the batches
+        :rtype: list
+        """
+        return to_multi_batches(data)
+
+    def _arrays(self):
+        """
+        Assembles the encoded labels (and scores) of all the batches, sorting
+        the classes alphabetically unless they were specified explicitly.
+
+        :return: the tuple of annotations (num_pairs), predictions (num_models, num_pairs) and scores (num_models, num_pairs, num_classes)
+        :rtype: tuple
+        """
+        num_classes = self._encoder.num_classes
+        anns = np.concatenate(self._anns)
+        preds = np.concatenate(self._preds, axis=1)
+        scores = None
+        if self._requires_scores:
+            scores = np.concatenate([np.stack([pad_scores(s, num_classes) for s in x]) for x in self._scores], axis=1)
+        if not self._encoder.fixed:
+            order = self._encoder.sort_order()
+            anns, preds = self._encoder.sort_classes(anns, preds)
+            if scores is not None:
+                scores = scores[..., order]
+        return anns, preds, scores
+
+    def _values(self, statistic: ClassificationStatistic, matrices: np.ndarray, anns: np.ndarray, scores: Optional[np.ndarray]) -> List:
+        """
+        Calculates the values of the statistic for all the models, using the numpy engines.
+
+        :param statistic: the statistic to calculate
+        :type statistic: ClassificationStatistic
+        :param matrices: the confusion matrices of the models
+        :type matrices: np.ndarray
+        :param anns: the class label indices of the annotations
+        :type anns: np.ndarray
+        :param scores: the score matrices of the models, None if not available
+        :type scores: np.ndarray
+        :return: the values, one per model
+        :rtype: list
+        """
+        if statistic.requires_scores():
+            return [statistic._from_scores(anns, x) for x in scores]
+        # all models in one go
+        return list(statistic._from_confusion_matrix(matrices))
+
+    def _compare(self) -> DatasetStatisticList:
+        """
+        Calculates the statistics and significance tests from the collected pairs.
+
+        :return: the statistics
+        :rtype: DatasetStatisticList
+        """
+        anns, preds, scores = self._arrays()
+        num_classes = self._encoder.num_classes
+        self._encoder.log(self.logger())
+        self.logger().info("# pairs: %d" % len(anns))
+        matrices = model_confusion_matrices(anns, preds, num_classes)
+        num_models = len(self._models)
+
+        result = DatasetStatisticList()
+        for statistic in self._statistics:
+            if isinstance(statistic, NumClassesHandler):
+                statistic.set_num_classes(num_classes)
+            try:
+                for model, value in zip(self._models, self._values(statistic, matrices, anns, scores)):
+                    result.append(DatasetStatistic(statistic="%s [%s]" % (statistic._statistic_name(), model), value=to_statistic_value(value)))
+            except:
+                self.logger().exception("Failed to obtain statistic: %s" % str(type(statistic)))
+
+        for i in range(num_models):
+            for n in range(i + 1, num_models):
+                stat, p_value = mcnemar_test(preds[i] == anns, preds[n] == anns)
+                prefix = "McNemar [%s vs %s]" % (self._models[i], self._models[n])
+                result.append(DatasetStatistic(statistic="%s (statistic)" % prefix, value=stat))
+                result.append(DatasetStatistic(statistic="%s (p-value)" % prefix, value=p_value))
+                if self.permutations < 1:
+                    continue
+                for statistic in self._statistics:
+                    try:
+                        if statistic.requires_scores():
+                            diff, p_value = permutation_test_rows(statistic._from_scores, anns, scores[i], scores[n],
+                                                                  num_permutations=self.permutations, seed=self.seed)
+                        else:
+                            diff, p_value = permutation_test_from_confusion(statistic._from_confusion_matrix, anns, preds[i], preds[n], num_classes,
+                                                                            num_permutations=self.permutations, seed=self.seed)
+                        names = comparison_names(statistic._statistic_name(), self._models[i], self._models[n])
+                        result.append(DatasetStatistic(statistic=names[0], value=to_statistic_value(diff)))
+                        result.append(DatasetStatistic(statistic=names[1], value=to_statistic_value(p_value)))
+                    except:
+                        self.logger().exception("Failed to compare statistic: %s" % str(type(statistic)))
+        return result
+
+    def _process_batch(self, batch: MultiImagePairList) -> Optional[DatasetStatisticList]:
+        """
+        Processes a single batch of multi-pairs.
+
+        :param batch: the multi-pairs to process
+        :type batch: MultiImagePairList
+        :return: the statistics, None if none to output
+        :rtype: DatasetStatisticList
+        """
+        models = batch.models
+        if models is None:
+            models = ["model%d" % (i + 1) for i in range(batch.num_models)]
+        if self._models is None:
+            self._models = list(models)
+        elif list(models) != self._models:
+            raise Exception("Models differ between batches: %s != %s" % (", ".join(models), ", ".join(self._models)))
+
+        anns, preds, scores = self._encoder.encode_multi(batch, score_key=self.score_key if self._requires_scores else None)
+        if len(anns) > 0:
+            self._anns.append(anns)
+            self._preds.append(preds)
+            self._scores.append(scores)
+
+        if not batch.last:
+            return None
+        if len(self._anns) == 0:
+            self.logger().warning("No labeled pairs to compare the models on!")
+            return None
+        result = self._compare()
+        self._anns = []
+        self._preds = []
+        self._scores = []
+        return result
+
+    def _pending_statistics(self) -> Optional[DatasetStatisticList]:
+        """
+        Returns the final statistics that have not been forwarded yet, as no
+        batch was flagged as the last one.
+
+        :return: the statistics, None if nothing pending
+        :rtype: DatasetStatisticList
+        """
+        if (self._anns is not None) and (len(self._anns) > 0):
+            return self._compare()
+        return None
@@ -1,37 +1,77 @@
 import argparse
-from typing import List
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional
 
+import numpy as np
 from wai.logging import LOGGING_WARNING
 
-from idc.metrics.api import ImagePairList
+from idc.metrics.api import ImagePairList, EncodedPairs, LabelEncoder, ConfusionMatrix, confusion_matrix, pairs_from_confusion
+from idc.metrics.api import SCORES_KEY, ScoreAccumulator, pad_scores
+from idc.metrics.api import CONFIDENCE, bootstrap_confusion_matrices, bootstrap_rows, bootstrap_interval, bootstrap_names
+from idc.metrics.api import measure
+from idc.metrics.api import StatisticState, state_mapping, remap_confusion, remap_scores
+from idc.metrics.filter._summary_statistics import SummaryStatisticsFilter
 from idc.metrics.registry import available_imgcls_statistics
-from idc.metrics.statistic import DatasetStatisticList
+from idc.metrics.statistic import DatasetStatistic, DatasetStatisticList, to_statistic_value
 from idc.metrics.statistic.imgcls import ClassificationStatistic
-from idc.metrics.statistic.imgcls import NumClassesHandler, determine_classes
+from idc.metrics.statistic.imgcls import NumClassesHandler, determine_classes, determine_scores
 from seppl import SessionHandler, split_args, Plugin, Initializable, init_initializable, split_cmdline
-from seppl.io import BatchFilter
 
 
-class SummaryStatistics(BatchFilter):
+class SummaryStatistics(SummaryStatisticsFilter):
     """
     Calculates summary statistics for the incoming data pairs.
     """
 
-    def __init__(self, statistics: str = None,
-                 logger_name: str = None, logging_level: str = LOGGING_WARNING):
+    def __init__(self, statistics: str = None, classes: List[str] = None, score_key: str = None, accumulate: bool = False,
+                 snapshot_interval: int = None, bootstrap: int = None, confidence: float = None, seed: int = None,
+                 workers: int = None, save_state: str = None, profile: bool = None, logger_name: str = None, logging_level: str = LOGGING_WARNING):
         """
         Initializes the filter.
 
         :param statistics: the statistics (and their options) to generate
         :type statistics: str
+        :param classes: the fixed list of class labels to use, determined from the data if None
+        :type classes: list
+        :param score_key: the meta-data key of the predictions with the per-class probabilities
+        :type score_key: str
+        :param accumulate: whether to accumulate the statistics across batches rather than outputting them per batch
+        :type accumulate: bool
+        :param snapshot_interval: the number of batches after which to output intermediate statistics in accumulate mode, 0 for final ones only
+        :type snapshot_interval: int
+        :param bootstrap: the number of bootstrap resamples for computing confidence intervals, 0 for none
+        :type bootstrap: int
+        :param confidence: the confidence level of the intervals
+        :type confidence: float
+        :param seed: the seed for the bootstrap resampling, None for a random one
+        :type seed: int
+        :param workers: the number of worker processes for resampling statistics that require scores
+        :type workers: int
+        :param save_state: the file to save the accumulated state to when finishing, ignored if None
+        :type save_state: str
+        :param profile: whether to enable profiling and append the measurements to the final statistics
+        :type profile: bool
         :param logger_name: the name to use for the logger
         :type logger_name: str
         :param logging_level: the logging level to use
         :type logging_level: str
         """
-        super().__init__(logger_name=logger_name, logging_level=logging_level)
+        super().__init__(accumulate=accumulate, snapshot_interval=snapshot_interval, save_state=save_state, profile=profile,
+                         logger_name=logger_name, logging_level=logging_level)
         self.statistics = statistics
+        self.classes = classes
+        self.score_key = score_key
+        self.bootstrap = bootstrap
+        self.confidence = confidence
+        self.seed = seed
+        self.workers = workers
         self._statistics = None
+        self._statistics_cmdline = None
+        self._encoder = None
+        self._matrix = None
+        self._scores = None
+        self._requires_scores = False
+        self._failed = None
 
     def name(self) -> str:
         """
@@ -58,16 +98,25 @@ class SummaryStatistics(BatchFilter):
         :return: the list of classes
         :rtype: list
         """
-        return [ImagePairList]
+        return [ImagePairList, EncodedPairs, StatisticState]
 
-    def generates(self) -> List:
+    def _state_description(self) -> str:
         """
-        Returns the list of classes that get produced.
+        Returns what the accumulated state consists of, for the help of the save_state option.
 
-        :return: the list of classes
-        :rtype: list
+        :return: the description
+        :rtype: str
+        """
+        return "confusion matrix, scores of all pairs if required"
+
+    def _accumulate_help(self) -> str:
+        """
+        Returns the help for the accumulate option.
+
+        :return: the help
+        :rtype: str
         """
-        return [DatasetStatisticList]
+        return super()._accumulate_help() + " NB: score-based statistics (e.g., auroc-ic) keep the scores of all the pairs, i.e., memory usage and the size of the saved state grow linearly with the number of pairs (4 bytes per pair and class); the confusion matrix-based ones only require constant memory."
 
     def _create_argparser(self) -> argparse.ArgumentParser:
         """
@@ -78,6 +127,12 @@ class SummaryStatistics(BatchFilter):
         """
         parser = super()._create_argparser()
         parser.add_argument("-s", "--statistics", type=str, default=None, help="The summary statistics to calculate.", required=True)
+        parser.add_argument("-c", "--classes", type=str, default=None, help="The fixed list of class labels to use, which determines their order; pairs with other labels get skipped. Determined from the data if not provided.", required=False, nargs="*")
+        parser.add_argument("-k", "--score_key", type=str, default=SCORES_KEY, help="The meta-data key of the predictions that contains the per-class probabilities (dictionary or JSON string of label -> probability); only used by statistics that require scores.", required=False)
+        parser.add_argument("-B", "--bootstrap", type=int, default=0, help="The number of bootstrap resamples for computing confidence intervals, outputting mean, lower and upper bound of each statistic as well; 0 to disable.", required=False)
+        parser.add_argument("-C", "--confidence", type=float, default=CONFIDENCE, help="The confidence level of the bootstrap intervals.", required=False)
+        parser.add_argument("-S", "--seed", type=int, default=None, help="The seed for the bootstrap resampling, for reproducible intervals.", required=False)
+        parser.add_argument("-w", "--workers", type=int, default=1, help="The number of worker processes for resampling statistics that require scores; <= 1 for none.", required=False)
         return parser
 
     def _parse_statistics(self) -> List[Plugin]:
@@ -106,6 +161,12 @@ class SummaryStatistics(BatchFilter):
         """
         super()._apply_args(ns)
         self.statistics = ns.statistics
+        self.classes = ns.classes
+        self.score_key = ns.score_key
+        self.bootstrap = ns.bootstrap
+        self.confidence = ns.confidence
+        self.seed = ns.seed
+        self.workers = ns.workers
 
     def initialize(self):
         """
@@ -115,8 +176,31 @@ class SummaryStatistics(BatchFilter):
 
         if self.statistics is None:
             raise Exception("No statistics defined!")
+        if self.score_key is None:
+            self.score_key = SCORES_KEY
+        if self.bootstrap is None:
+            self.bootstrap = 0
+        if self.confidence is None:
+            self.confidence = CONFIDENCE
+        if (self.confidence <= 0) or (self.confidence >= 1):
+            raise Exception("Confidence must be in (0, 1): %f" % self.confidence)
+        if self.workers is None:
+            self.workers = 1
 
-        self._statistics = self._parse_statistics()
+        # unchanged statistics get re-used when initializing again (e.g., in idc-metrics-server), keeping their backends
+        if (self._statistics is not None) and (self._statistics_cmdline == self.statistics):
+            for statistic in self._statistics:
+                statistic.reset()
+        else:
+            self._statistics = self._parse_statistics()
+            self._statistics_cmdline = self.statistics
+        if (self.classes is not None) and (len(self.classes) > 0):
+            self._encoder = LabelEncoder(classes=self.classes, fixed=True)
+        else:
+            self._encoder = LabelEncoder()
+        self._matrix = ConfusionMatrix()
+        self._scores = ScoreAccumulator()
+        self._failed = set()
 
         for statistic in self._statistics:
             if not isinstance(statistic, ClassificationStatistic):
@@ -125,26 +209,342 @@ class SummaryStatistics(BatchFilter):
                 statistic.session = self.session
             if isinstance(statistic, Initializable):
                 init_initializable(statistic, "statistic")
+        self._requires_scores = any(statistic.requires_scores() for statistic in self._statistics)
+
+    def _set_num_classes(self, statistic: ClassificationStatistic, num_classes: int):
+        """
+        Updates the number of classes of the statistic.
+
+        :param statistic: the statistic to update
+        :type statistic: ClassificationStatistic
+        :param num_classes: the number of classes
+        :type num_classes: int
+        """
+        if self.accumulate and not statistic.supports_confusion_matrix() \
+                and (statistic.num_classes is not None) and (statistic.num_classes != num_classes):
+            self.logger().warning("Number of classes changed from %d to %d, resetting accumulated state of: %s (use --classes to fix the labels)"
+                                  % (statistic.num_classes, num_classes, statistic.name()))
+        statistic.set_num_classes(num_classes)
+
+    def _class_order(self) -> Optional[np.ndarray]:
+        """
+        Returns the label indices in alphabetical order of the class labels. As the
+        encoder is shared across batches, its indices follow the order in which the
+        labels appeared and only get sorted when calculating the statistics.
+
+        :return: the indices, None if the classes are fixed or already sorted
+        :rtype: np.ndarray
+        """
+        if self._encoder.fixed:
+            return None
+        order = np.array(self._encoder.sort_order(), dtype=np.int64)
+        if np.array_equal(order, np.arange(len(order))):
+            return None
+        return order
+
+    def _sort_classes(self, order: np.ndarray, anns, preds, matrix, scores):
+        """
+        Remaps the label indices, confusion matrix and score matrix to the alphabetical order of the classes.
+
+        :param order: the label indices in alphabetical order, see _class_order
+        :type order: np.ndarray
+        :param anns: the array with the class label indices of the annotations, can be None
+        :param preds: the array with the class label indices of the predictions, can be None
+        :param matrix: the confusion matrix, can be None
+        :param scores: the score matrix, can be None
+        :return: the tuple of remapped annotations, predictions, confusion matrix and score matrix
+        :rtype: tuple
+        """
+        remap = np.empty(len(order), dtype=np.int64)
+        remap[order] = np.arange(len(order), dtype=np.int64)
+        if anns is not None:
+            anns = remap[anns]
+        if preds is not None:
+            preds = remap[preds]
+        if matrix is not None:
+            matrix = matrix[np.ix_(order, order)]
+        if scores is not None:
+            scores = pad_scores(scores, len(order))[:, order]
+        return anns, preds, matrix, scores
 
-    def _do_process(self, data):
+    def _calculate(self, anns, preds, num_classes: int, scores=None) -> DatasetStatisticList:
         """
-        Processes the data record(s).
+        Calculates the statistics for a single batch.
 
-        :param data: the record(s) to process
-        :return: the potentially updated record(s)
+        :param anns: the array with the class label indices of the annotations
+        :param preds: the array with the class label indices of the predictions
+        :param num_classes: the number of classes
+        :type num_classes: int
+        :param scores: the score matrix, None if not required
+        :return: the statistics
+        :rtype: DatasetStatisticList
         """
-        anns, preds, lookup = determine_classes(data, logger=self.logger())
+        order = self._class_order()
+        if order is not None:
+            anns, preds, _, scores = self._sort_classes(order, anns, preds, None, scores)
+        # the confusion matrix is shared by all statistics that can be derived from it
+        matrix = None
+        bootstrap = dict()
         result = DatasetStatisticList()
         for statistic in self._statistics:
             if isinstance(statistic, NumClassesHandler):
-                statistic.set_num_classes(len(lookup))
+                self._set_num_classes(statistic, num_classes)
             if isinstance(statistic, ClassificationStatistic):
                 try:
-                    stat = statistic.calculate(anns, preds)
+                    if statistic.supports_confusion_matrix():
+                        if matrix is None:
+                            matrix = confusion_matrix(anns, preds, num_classes)
+                        stat = statistic.calculate_from_confusion_matrix(matrix)
+                    elif statistic.supports_score_matrix():
+                        stat = statistic.calculate_from_scores(anns, pad_scores(scores, num_classes))
+                    elif statistic.requires_scores():
+                        stat = statistic.calculate(anns, pad_scores(scores, num_classes))
+                    else:
+                        stat = statistic.calculate(anns, preds)
                     result.append(stat)
+                    if self.bootstrap > 0:
+                        if matrix is None:
+                            matrix = confusion_matrix(anns, preds, num_classes)
+                        result.extend(self._intervals(statistic, matrix, anns, scores, bootstrap))
                 except:
                     self.logger().exception("Failed to obtain statistic: %s" % str(type(statistic)))
             else:
                 raise Exception("Unhandled type of statistic: %s" % str(type(statistic)))
+        return result
+
+    def _update(self, anns, preds, num_classes: int, scores=None):
+        """
+        Adds the batch to the accumulated state.
+
+        :param anns: the array with the class label indices of the annotations
+        :param preds: the array with the class label indices of the predictions
+        :param num_classes: the number of classes
+        :type num_classes: int
+        :param scores: the score matrix, None if not required
+        """
+        self._matrix.update(anns, preds, num_classes=num_classes)
+        if scores is not None:
+            self._scores.update(anns, scores)
+        for statistic in self._statistics:
+            if isinstance(statistic, NumClassesHandler):
+                self._set_num_classes(statistic, num_classes)
+            if isinstance(statistic, ClassificationStatistic):
+                if not statistic.supports_confusion_matrix() and not statistic.supports_score_matrix():
+                    try:
+                        if statistic.requires_scores():
+                            statistic.update(anns, pad_scores(scores, num_classes))
+                        else:
+                            statistic.update(anns, preds)
+                    except:
+                        self._failed.add(id(statistic))
+                        self.logger().exception("Failed to update statistic: %s" % str(type(statistic)))
+            else:
+                raise Exception("Unhandled type of statistic: %s" % str(type(statistic)))
+        self._pending = True
 
+    def _get_state(self) -> StatisticState:
+        """
+        Returns the accumulated state.
+
+        :return: the state
+        :rtype: StatisticState
+        """
+        num_classes = self._encoder.num_classes
+        self._matrix.grow(num_classes)
+        arrays = {"matrix": self._matrix.matrix}
+        if self._scores.total > 0:
+            arrays["anns"] = self._scores.anns
+            arrays["scores"] = pad_scores(self._scores.scores, num_classes)
+        return StatisticState(self.name(), classes=self._encoder.classes, fixed=self._encoder.fixed, arrays=arrays)
+
+    def _merge_state(self, state: StatisticState):
+        """
+        Adds the state (e.g., of another shard) to the accumulated state.
+
+        :param state: the state to add
+        :type state: StatisticState
+        """
+        if state.kind != self.name():
+            raise Exception("Cannot merge state of %s into %s!" % (state.kind, self.name()))
+        mapping = state_mapping(state.classes, self._encoder)
+        num_classes = self._encoder.num_classes
+        matrix = remap_confusion(state.arrays["matrix"], mapping, num_classes)
+        self._matrix.merge(matrix)
+        anns = None
+        scores = None
+        if "scores" in state.arrays:
+            anns, scores = remap_scores(state.arrays["anns"], state.arrays["scores"], mapping, num_classes)
+            self._scores.update(anns, scores)
+        elif self._requires_scores and (matrix.sum() > 0):
+            raise Exception("Statistics require scores, but the state has no score matrix!")
+        self._encoder.log(self.logger())
+        if matrix.sum() == 0:
+            return
+        for statistic in self._statistics:
+            if isinstance(statistic, NumClassesHandler):
+                self._set_num_classes(statistic, num_classes)
+            if statistic.supports_confusion_matrix() or statistic.supports_score_matrix():
+                continue
+            # statistics with their own state get updated with the pairs that the state represents
+            try:
+                if statistic.requires_scores():
+                    statistic.update(anns, scores)
+                else:
+                    statistic.update(*pairs_from_confusion(matrix))
+            except:
+                self._failed.add(id(statistic))
+                self.logger().exception("Failed to update statistic: %s" % str(type(statistic)))
+        self._pending = True
+
+    def _intervals(self, statistic: ClassificationStatistic, matrix, anns, scores, cache: dict) -> List[DatasetStatistic]:
+        """
+        Computes the bootstrap confidence interval of the statistic, always using the numpy
+        engines. Statistics derived from the confusion matrix get evaluated on all resampled
+        confusion matrices at once, the ones requiring scores on resampled pairs.
+
+        :param statistic: the statistic to compute the interval for
+        :type statistic: ClassificationStatistic
+        :param matrix: the confusion matrix of the pairs
+        :type matrix: np.ndarray
+        :param anns: the class label indices of the annotations
+        :type anns: np.ndarray
+        :param scores: the score matrix, None if not available
+        :type scores: np.ndarray
+        :param cache: for sharing the resampled confusion matrices between statistics
+        :type cache: dict
+        :return: the mean, lower and upper bound statistics
+        :rtype: list
+        """
+        if statistic.requires_scores():
+            if (self.workers > 1) and (self._executor is None):
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            values = bootstrap_rows(statistic._from_scores, (anns, pad_scores(scores, matrix.shape[0])), self.bootstrap,
+                                    seed=self.seed, num_chunks=max(1, self.workers), executor=self._executor)
+        else:
+            if "matrices" not in cache:
+                cache["matrices"] = bootstrap_confusion_matrices(matrix, self.bootstrap, np.random.default_rng(self.seed))
+            values = statistic._from_confusion_matrix(cache["matrices"])
+        result = []
+        for name, value in zip(bootstrap_names(statistic._statistic_name()), bootstrap_interval(values, self.confidence)):
+            result.append(DatasetStatistic(statistic=name, value=to_statistic_value(value)))
         return result
+
+    def _compute(self) -> DatasetStatisticList:
+        """
+        Calculates the statistics from the accumulated state.
+
+        :return: the statistics
+        :rtype: DatasetStatisticList
+        """
+        with measure("%s/compute" % self.name()):
+            num_classes = self._encoder.num_classes
+            self._matrix.grow(num_classes)
+            matrix = self._matrix.matrix
+            anns = self._scores.anns
+            scores = pad_scores(self._scores.scores, num_classes)
+            order = self._class_order()
+            if order is not None:
+                anns, _, matrix, scores = self._sort_classes(order, anns, None, matrix, scores)
+            bootstrap = dict()
+            result = DatasetStatisticList()
+            for statistic in self._statistics:
+                # the accumulated state of statistics with failed updates is incomplete
+                if id(statistic) in self._failed:
+                    continue
+                try:
+                    if statistic.supports_confusion_matrix():
+                        stat = statistic.calculate_from_confusion_matrix(matrix)
+                    elif statistic.supports_score_matrix():
+                        stat = statistic.calculate_from_scores(anns, scores)
+                    else:
+                        stat = statistic.compute()
+                        # statistics with their own state use the label indices of the encoder
+                        if (order is not None) and isinstance(stat.value, list) and (len(stat.value) == num_classes):
+                            stat.value = [stat.value[i] for i in order]
+                    result.append(stat)
+                    if self.bootstrap > 0:
+                        result.extend(self._intervals(statistic, matrix, anns, scores, bootstrap))
+                except:
+                    self.logger().exception("Failed to obtain statistic: %s" % str(type(statistic)))
+            self._pending = False
+            return result
+
+    def _encode(self, batch: EncodedPairs):
+        """
+        Translates the encoded pairs into the label index of the filter.
+
+        :param batch: the encoded pairs
+        :type batch: EncodedPairs
+        :return: the tuple of: annotation label indices, prediction label indices, score matrix and the class lookup
+        :rtype: tuple
+        """
+        anns, preds, scores = self._encoder.encode_encoded(batch)
+        if self._requires_scores and (scores is None):
+            raise Exception("Statistics require scores, but the encoded pairs have no score matrix!")
+        self._encoder.log(self.logger())
+        if len(anns) == 0:
+            return None, None, None, None
+        return anns, preds, scores if self._requires_scores else None, self._encoder.lookup()
+
+    def _has_accumulated(self) -> bool:
+        """
+        Returns whether any data has been accumulated.
+
+        :return: True if data accumulated
+        :rtype: bool
+        """
+        return self._matrix.total > 0
+
+    def _compute_accumulated(self) -> DatasetStatisticList:
+        """
+        Calculates the statistics from the accumulated state.
+
+        :return: the statistics
+        :rtype: DatasetStatisticList
+        """
+        return self._compute()
+
+    def _process_batch(self, batch) -> Optional[DatasetStatisticList]:
+        """
+        Processes a single batch of pairs.
+
+        :param batch: the pairs or state to process
+        :type batch: ImagePairList or EncodedPairs or StatisticState
+        :return: the statistics, None if none to output
+        :rtype: DatasetStatisticList
+        """
+        if isinstance(batch, StatisticState):
+            if not self.accumulate:
+                raise Exception("Statistic states can only be merged in accumulate mode!")
+            self._merge_state(batch)
+            anns, preds, scores, lookup = None, None, None, None
+        else:
+            with measure("%s/encode" % self.name(), items=len(batch)):
+                if isinstance(batch, EncodedPairs):
+                    anns, preds, scores, lookup = self._encode(batch)
+                elif self._requires_scores:
+                    anns, preds, scores, lookup = determine_scores(batch, score_key=self.score_key, logger=self.logger(), encoder=self._encoder)
+                    if self._encoder.num_missing_scores > 0:
+                        self.logger().warning("%d predictions have no class probabilities under meta-data key '%s', using one-hot scores of the predicted label instead (top-k accuracy reduces to top-1 for them)!"
+                                              % (self._encoder.num_missing_scores, self.score_key))
+                else:
+                    anns, preds, lookup = determine_classes(batch, logger=self.logger(), encoder=self._encoder)
+                    scores = None
+
+        if not self.accumulate:
+            if lookup is None:
+                self.logger().warning("No labeled pairs to calculate statistics for!")
+                return None
+            return self._calculate(anns, preds, len(lookup), scores=scores)
+
+        self._num_batches += 1
+        if lookup is not None:
+            with measure("%s/update" % self.name(), items=len(anns)):
+                self._update(anns, preds, len(lookup), scores=scores)
+        if self._is_output_due(batch):
+            if self._matrix.total == 0:
+                self.logger().warning("No labeled pairs to calculate statistics for!")
+                return None
+            self.logger().info("Statistics after %d batches/%d pairs" % (self._num_batches, self._matrix.total))
+            return self._compute()
+        return None
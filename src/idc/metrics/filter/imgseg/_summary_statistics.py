@@ -0,0 +1,298 @@
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional
+
+from wai.logging import LOGGING_WARNING
+
+from idc.metrics.api import ImagePairList, SegmentationConfusion, segmentation_encoder, sorted_label_order, split_pairs
+from idc.metrics.api import register_segmentation_labels, segmentation_confusion_from_pairs
+from idc.metrics.api import measure
+from idc.metrics.api import StatisticState, state_mapping, remap_confusion
+from idc.metrics.filter._summary_statistics import SummaryStatisticsFilter
+from idc.metrics.registry import available_imgseg_statistics
+from idc.metrics.statistic import DatasetStatisticList
+from idc.metrics.statistic.imgseg import SegmentationStatistic
+from seppl import SessionHandler, split_args, Plugin, Initializable, init_initializable, split_cmdline
+
+
+class SummaryStatistics(SummaryStatisticsFilter):
+    """
+    Calculates summary statistics for the incoming image segmentation pairs.
+    """
+
+    def __init__(self, statistics: str = None, classes: List[str] = None,
+                 workers: int = None, accumulate: bool = False, snapshot_interval: int = None, save_state: str = None, profile: bool = None,
+                 logger_name: str = None, logging_level: str = LOGGING_WARNING):
+        """
+        Initializes the filter.
+
+        :param statistics: the statistics (and their options) to generate
+        :type statistics: str
+        :param classes: the fixed list of class labels to use, determined from the data if None
+        :type classes: list
+        :param workers: the number of worker processes to distribute the images of a batch across
+        :type workers: int
+        :param accumulate: whether to accumulate the statistics across batches rather than outputting them per batch
+        :type accumulate: bool
+        :param snapshot_interval: the number of batches after which to output intermediate statistics in accumulate mode, 0 for final ones only
+        :type snapshot_interval: int
+        :param save_state: the file to save the accumulated state to when finishing, ignored if None
+        :type save_state: str
+        :param profile: whether to enable profiling and append the measurements to the final statistics
+        :type profile: bool
+        :param logger_name: the name to use for the logger
+        :type logger_name: str
+        :param logging_level: the logging level to use
+        :type logging_level: str
+        """
+        super().__init__(accumulate=accumulate, snapshot_interval=snapshot_interval, save_state=save_state, profile=profile,
+                         logger_name=logger_name, logging_level=logging_level)
+        self.statistics = statistics
+        self.classes = classes
+        self.workers = workers
+        self._statistics = None
+        self._encoder = None
+        self._confusion = None
+
+    def name(self) -> str:
+        """
+        Returns the name of the handler, used as sub-command.
+
+        :return: the name
+        :rtype: str
+        """
+        return "summary-statistics-is"
+
+    def description(self) -> str:
+        """
+        Returns a description of the handler.
+
+        :return: the description
+        :rtype: str
+        """
+        return "Calculates summary statistics for the incoming image segmentation pairs. The pixel counts get accumulated image by image."
+
+    def accepts(self) -> List:
+        """
+        Returns the list of classes that are accepted.
+
+        :return: the list of classes
+        :rtype: list
+        """
+        return [ImagePairList, StatisticState]
+
+    def _state_description(self) -> str:
+        """
+        Returns what the accumulated state consists of, for the help of the save_state option.
+
+        :return: the description
+        :rtype: str
+        """
+        return "pixel confusion matrix"
+
+    def _create_argparser(self) -> argparse.ArgumentParser:
+        """
+        Creates an argument parser. Derived classes need to fill in the options.
+
+        :return: the parser
+        :rtype: argparse.ArgumentParser
+        """
+        parser = super()._create_argparser()
+        parser.add_argument("-s", "--statistics", type=str, default=None, help="The summary statistics to calculate.", required=True)
+        parser.add_argument("-c", "--classes", type=str, default=None, help="The fixed list of class labels to use, which determines their order; layers with other labels count as background. Determined from the data if not provided.", required=False, nargs="*")
+        parser.add_argument("-w", "--workers", type=int, default=1, help="The number of worker processes to distribute the images of a batch across; <= 1 for none.", required=False)
+        return parser
+
+    def _parse_statistics(self) -> List[Plugin]:
+        """
+        Parses the statistics command-line and returns the list of plugins it represents.
+        Raises an exception in case of an invalid statistic.
+
+        :return: the list of plugins
+        :rtype: list
+        """
+        from seppl import args_to_objects
+
+        # split command-line into valid plugin subsets
+        valid = dict()
+        valid.update(available_imgseg_statistics())
+        stats = split_cmdline(self.statistics)
+        args = split_args(stats, list(valid.keys()))
+        return args_to_objects(args, valid, allow_global_options=False)
+
+    def _apply_args(self, ns: argparse.Namespace):
+        """
+        Initializes the object with the arguments of the parsed namespace.
+
+        :param ns: the parsed arguments
+        :type ns: argparse.Namespace
+        """
+        super()._apply_args(ns)
+        self.statistics = ns.statistics
+        self.classes = ns.classes
+        self.workers = ns.workers
+
+    def initialize(self):
+        """
+        Initializes the processing, e.g., for opening files or databases.
+        """
+        super().initialize()
+
+        if self.statistics is None:
+            raise Exception("No statistics defined!")
+        if self.workers is None:
+            self.workers = 1
+
+        self._statistics = self._parse_statistics()
+        self._encoder = segmentation_encoder(self.classes)
+        self._confusion = SegmentationConfusion()
+
+        for statistic in self._statistics:
+            if not isinstance(statistic, SegmentationStatistic):
+                raise Exception("Not an image segmentation statistic: %s" % str(type(statistic)))
+            if isinstance(statistic, SessionHandler):
+                statistic.session = self.session
+            if isinstance(statistic, Initializable):
+                init_initializable(statistic, "statistic")
+
+    def _compute(self, confusion: SegmentationConfusion) -> DatasetStatisticList:
+        """
+        Calculates the statistics from the pixel confusion matrix.
+
+        :param confusion: the confusion matrix to use
+        :type confusion: SegmentationConfusion
+        :return: the statistics
+        :rtype: DatasetStatisticList
+        """
+        with measure("%s/compute" % self.name()):
+            matrix = confusion.matrix
+            # labels determined from the data get output in alphabetical order
+            if not self._encoder.fixed:
+                order = sorted_label_order(self._encoder)
+                matrix = matrix[order][:, order]
+            result = DatasetStatisticList()
+            for statistic in self._statistics:
+                try:
+                    result.append(statistic.calculate_from_confusion_matrix(matrix))
+                except:
+                    self.logger().exception("Failed to obtain statistic: %s" % str(type(statistic)))
+            self._pending = False
+            return result
+
+    def _update_parallel(self, confusion: SegmentationConfusion, batch: ImagePairList):
+        """
+        Distributes the pairs of the batch across the worker processes, which compute
+        the confusion matrices of their share that get added to the overall one.
+
+        :param confusion: the confusion matrix to update
+        :type confusion: SegmentationConfusion
+        :param batch: the pairs to add
+        :type batch: ImagePairList
+        """
+        # the workers need to know all the labels upfront
+        register_segmentation_labels(batch, self._encoder)
+        classes = self._encoder.classes
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        chunks = split_pairs(batch, self.workers)
+        for matrix, num_skipped, failed in self._executor.map(segmentation_confusion_from_pairs, chunks, [classes] * len(chunks)):
+            confusion.merge(matrix)
+            self._encoder.num_skipped += num_skipped
+            for image_name in failed:
+                self.logger().warning("Failed to determine image size, skipping: %s" % image_name)
+
+    def _update(self, confusion: SegmentationConfusion, batch: ImagePairList):
+        """
+        Adds the pairs of the batch to the confusion matrix, one image at a time.
+
+        :param confusion: the confusion matrix to update
+        :type confusion: SegmentationConfusion
+        :param batch: the pairs to add
+        :type batch: ImagePairList
+        """
+        if (self.workers > 1) and (len(batch) > 1):
+            self._update_parallel(confusion, batch)
+        else:
+            for pair in batch:
+                if not confusion.update_pair(pair, self._encoder):
+                    self.logger().warning("Failed to determine image size, skipping: %s" % pair.image_name)
+        # the matrix only grows when labels appear, make sure it covers the fixed labels as well
+        confusion.grow(self._encoder.num_classes)
+        self._encoder.log(self.logger())
+
+    def _get_state(self) -> StatisticState:
+        """
+        Returns the accumulated state.
+
+        :return: the state
+        :rtype: StatisticState
+        """
+        self._confusion.grow(self._encoder.num_classes)
+        return StatisticState(self.name(), classes=self._encoder.classes, fixed=self._encoder.fixed,
+                              arrays={"matrix": self._confusion.matrix})
+
+    def _merge_state(self, state: StatisticState):
+        """
+        Adds the state (e.g., of another shard) to the accumulated state.
+        Labels unknown to fixed class labels count as background.
+
+        :param state: the state to add
+        :type state: StatisticState
+        """
+        if state.kind != self.name():
+            raise Exception("Cannot merge state of %s into %s!" % (state.kind, self.name()))
+        mapping = state_mapping(state.classes, self._encoder, default=0)
+        self._confusion.merge(remap_confusion(state.arrays["matrix"], mapping, self._encoder.num_classes))
+        self._encoder.log(self.logger())
+
+    def _has_accumulated(self) -> bool:
+        """
+        Returns whether any data has been accumulated.
+
+        :return: True if data accumulated
+        :rtype: bool
+        """
+        return self._confusion.total > 0
+
+    def _compute_accumulated(self) -> DatasetStatisticList:
+        """
+        Calculates the statistics from the accumulated state.
+
+        :return: the statistics
+        :rtype: DatasetStatisticList
+        """
+        return self._compute(self._confusion)
+
+    def _process_batch(self, batch) -> Optional[DatasetStatisticList]:
+        """
+        Processes a single batch of pairs.
+
+        :param batch: the pairs or state to process
+        :type batch: ImagePairList or StatisticState
+        :return: the statistics, None if none to output
+        :rtype: DatasetStatisticList
+        """
+        if not self.accumulate:
+            if isinstance(batch, StatisticState):
+                raise Exception("Statistic states can only be merged in accumulate mode!")
+            confusion = SegmentationConfusion()
+            self._update(confusion, batch)
+            if confusion.total == 0:
+                self.logger().warning("No pixels to calculate statistics for!")
+                return None
+            return self._compute(confusion)
+
+        self._num_batches += 1
+        if isinstance(batch, StatisticState):
+            self._merge_state(batch)
+        else:
+            with measure("%s/update" % self.name(), items=len(batch)):
+                self._update(self._confusion, batch)
+        self._pending = True
+        if self._is_output_due(batch):
+            if self._confusion.total == 0:
+                self.logger().warning("No pixels to calculate statistics for!")
+                return None
+            self.logger().info("Statistics after %d batches/%d pixels" % (self._num_batches, self._confusion.total))
+            return self._compute(self._confusion)
+        return None
@@ -0,0 +1 @@
+from ._summary_statistics import SummaryStatistics
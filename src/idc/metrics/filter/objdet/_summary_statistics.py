@@ -0,0 +1,319 @@
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional
+
+import numpy as np
+from wai.logging import LOGGING_WARNING
+
+from idc.metrics.api import ImagePairList, LabelEncoder, DetectionEvaluator, DetectionMatches, MAX_DETECTIONS, SCORE_KEY, detection_arrays_from_pairs
+from idc.metrics.api import measure
+from idc.metrics.api import StatisticState, state_mapping, remap_counts
+from idc.metrics.filter._summary_statistics import SummaryStatisticsFilter
+from idc.metrics.registry import available_objdet_statistics
+from idc.metrics.statistic import DatasetStatisticList
+from idc.metrics.statistic.objdet import ObjectDetectionStatistic
+from seppl import SessionHandler, split_args, Plugin, Initializable, init_initializable, split_cmdline
+
+
+class SummaryStatistics(SummaryStatisticsFilter):
+    """
+    Calculates summary statistics for the incoming object detection pairs.
+    """
+
+    def __init__(self, statistics: str = None, classes: List[str] = None, score_key: str = None,
+                 max_detections: int = None, workers: int = None, batch_size: int = None,
+                 accumulate: bool = False, snapshot_interval: int = None, save_state: str = None, profile: bool = None,
+                 logger_name: str = None, logging_level: str = LOGGING_WARNING):
+        """
+        Initializes the filter.
+
+        :param statistics: the statistics (and their options) to generate
+        :type statistics: str
+        :param classes: the fixed list of class labels to use, determined from the data if None
+        :type classes: list
+        :param score_key: the meta-data key of the predicted objects that holds the score
+        :type score_key: str
+        :param max_detections: the maximum number of detections per image and label to consider
+        :type max_detections: int
+        :param workers: the number of worker processes to use for matching the detections
+        :type workers: int
+        :param batch_size: the number of images to match at a time
+        :type batch_size: int
+        :param accumulate: whether to accumulate the statistics across batches rather than outputting them per batch
+        :type accumulate: bool
+        :param snapshot_interval: the number of batches after which to output intermediate statistics in accumulate mode, 0 for final ones only
+        :type snapshot_interval: int
+        :param save_state: the file to save the accumulated state to when finishing, ignored if None
+        :type save_state: str
+        :param profile: whether to enable profiling and append the measurements to the final statistics
+        :type profile: bool
+        :param logger_name: the name to use for the logger
+        :type logger_name: str
+        :param logging_level: the logging level to use
+        :type logging_level: str
+        """
+        super().__init__(accumulate=accumulate, snapshot_interval=snapshot_interval, save_state=save_state, profile=profile,
+                         logger_name=logger_name, logging_level=logging_level)
+        self.statistics = statistics
+        self.classes = classes
+        self.score_key = score_key
+        self.max_detections = max_detections
+        self.workers = workers
+        self.batch_size = batch_size
+        self._statistics = None
+        self._encoder = None
+        self._evaluator = None
+
+    def name(self) -> str:
+        """
+        Returns the name of the handler, used as sub-command.
+
+        :return: the name
+        :rtype: str
+        """
+        return "summary-statistics-od"
+
+    def description(self) -> str:
+        """
+        Returns a description of the handler.
+
+        :return: the description
+        :rtype: str
+        """
+        return "Calculates summary statistics for the incoming object detection pairs. The predicted objects are expected to have a score in their meta-data."
+
+    def accepts(self) -> List:
+        """
+        Returns the list of classes that are accepted.
+
+        :return: the list of classes
+        :rtype: list
+        """
+        return [ImagePairList, StatisticState]
+
+    def _state_description(self) -> str:
+        """
+        Returns what the accumulated state consists of, for the help of the save_state option.
+
+        :return: the description
+        :rtype: str
+        """
+        return "matched detections"
+
+    def _create_argparser(self) -> argparse.ArgumentParser:
+        """
+        Creates an argument parser. Derived classes need to fill in the options.
+
+        :return: the parser
+        :rtype: argparse.ArgumentParser
+        """
+        parser = super()._create_argparser()
+        parser.add_argument("-s", "--statistics", type=str, default=None, help="The summary statistics to calculate.", required=True)
+        parser.add_argument("-c", "--classes", type=str, default=None, help="The fixed list of class labels to use; objects with other labels get skipped. Determined from the data if not provided.", required=False, nargs="*")
+        parser.add_argument("-k", "--score_key", type=str, default=SCORE_KEY, help="The meta-data key of the predicted objects that contains the score; objects without a score use 1.0.", required=False)
+        parser.add_argument("-m", "--max_detections", type=int, default=MAX_DETECTIONS, help="The maximum number of detections per image and label to consider (highest scores first, like COCOeval).", required=False)
+        parser.add_argument("-w", "--workers", type=int, default=1, help="The number of worker processes to use for matching the detections; <= 1 for none.", required=False)
+        parser.add_argument("-b", "--batch_size", type=int, default=256, help="The number of images to match at a time (and per worker task).", required=False)
+        return parser
+
+    def _parse_statistics(self) -> List[Plugin]:
+        """
+        Parses the statistics command-line and returns the list of plugins it represents.
+        Raises an exception in case of an invalid statistic.
+
+        :return: the list of plugins
+        :rtype: list
+        """
+        from seppl import args_to_objects
+
+        # split command-line into valid plugin subsets
+        valid = dict()
+        valid.update(available_objdet_statistics())
+        stats = split_cmdline(self.statistics)
+        args = split_args(stats, list(valid.keys()))
+        return args_to_objects(args, valid, allow_global_options=False)
+
+    def _apply_args(self, ns: argparse.Namespace):
+        """
+        Initializes the object with the arguments of the parsed namespace.
+
+        :param ns: the parsed arguments
+        :type ns: argparse.Namespace
+        """
+        super()._apply_args(ns)
+        self.statistics = ns.statistics
+        self.classes = ns.classes
+        self.score_key = ns.score_key
+        self.max_detections = ns.max_detections
+        self.workers = ns.workers
+        self.batch_size = ns.batch_size
+
+    def initialize(self):
+        """
+        Initializes the processing, e.g., for opening files or databases.
+        """
+        super().initialize()
+
+        if self.statistics is None:
+            raise Exception("No statistics defined!")
+        if self.score_key is None:
+            self.score_key = SCORE_KEY
+        if self.max_detections is None:
+            self.max_detections = MAX_DETECTIONS
+        if self.workers is None:
+            self.workers = 1
+        if self.batch_size is None:
+            self.batch_size = 256
+        if self.batch_size < 1:
+            raise Exception("Batch size must be at least 1: %d" % self.batch_size)
+
+        self._statistics = self._parse_statistics()
+        if (self.classes is not None) and (len(self.classes) > 0):
+            self._encoder = LabelEncoder(classes=self.classes, fixed=True)
+        else:
+            self._encoder = LabelEncoder()
+        # the pool is shared by all evaluators for the duration of the run
+        if self.workers > 1:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        self._evaluator = self._new_evaluator()
+
+        for statistic in self._statistics:
+            if not isinstance(statistic, ObjectDetectionStatistic):
+                raise Exception("Not an object detection statistic: %s" % str(type(statistic)))
+            if isinstance(statistic, SessionHandler):
+                statistic.session = self.session
+            if isinstance(statistic, Initializable):
+                init_initializable(statistic, "statistic")
+
+    def _new_evaluator(self) -> DetectionEvaluator:
+        """
+        Creates a new evaluator.
+
+        :return: the evaluator
+        :rtype: DetectionEvaluator
+        """
+        return DetectionEvaluator(max_detections=self.max_detections, workers=self.workers, chunk_size=self.batch_size, executor=self._executor)
+
+    def _compute(self, evaluator: DetectionEvaluator) -> DatasetStatisticList:
+        """
+        Calculates the statistics from the evaluator.
+
+        :param evaluator: the evaluator to use
+        :type evaluator: DetectionEvaluator
+        :return: the statistics
+        :rtype: DatasetStatisticList
+        """
+        with measure("%s/compute" % self.name()):
+            evaluation = evaluator.compute(self._encoder.num_classes)
+            # labels determined from the data get output in alphabetical order
+            if not self._encoder.fixed:
+                evaluation = evaluation.reorder(np.argsort(self._encoder.classes, kind="stable"))
+            result = DatasetStatisticList()
+            for statistic in self._statistics:
+                try:
+                    result.append(statistic.calculate_from_evaluation(evaluation))
+                except:
+                    self.logger().exception("Failed to obtain statistic: %s" % str(type(statistic)))
+            self._pending = False
+            return result
+
+    def _get_state(self) -> StatisticState:
+        """
+        Returns the accumulated state.
+
+        :return: the state
+        :rtype: StatisticState
+        """
+        matches = self._evaluator.matches()
+        arrays = {
+            "labels": matches.labels,
+            "scores": matches.scores,
+            "tp": matches.tp,
+            "num_gt": np.pad(matches.num_gt, (0, max(0, self._encoder.num_classes - len(matches.num_gt)))),
+            "iou_thresholds": self._evaluator.iou_thresholds,
+            "recall_thresholds": self._evaluator.recall_thresholds,
+        }
+        return StatisticState(self.name(), classes=self._encoder.classes, fixed=self._encoder.fixed, arrays=arrays,
+                              params={"max_detections": self.max_detections})
+
+    def _merge_state(self, state: StatisticState):
+        """
+        Adds the state (e.g., of another shard) to the accumulated state.
+
+        :param state: the state to add
+        :type state: StatisticState
+        """
+        if state.kind != self.name():
+            raise Exception("Cannot merge state of %s into %s!" % (state.kind, self.name()))
+        iou_thresholds = state.arrays["iou_thresholds"]
+        if (len(iou_thresholds) != len(self._evaluator.iou_thresholds)) or not np.allclose(iou_thresholds, self._evaluator.iou_thresholds) \
+                or not np.array_equal(state.arrays["recall_thresholds"], self._evaluator.recall_thresholds):
+            raise Exception("Cannot merge states with different IoU/recall thresholds!")
+        if state.params["max_detections"] != self.max_detections:
+            raise Exception("Cannot merge states with different maximum number of detections: %d != %d" % (state.params["max_detections"], self.max_detections))
+        mapping = state_mapping(state.classes, self._encoder)
+        labels = state.arrays["labels"]
+        mapped = mapping[labels] if len(labels) > 0 else np.zeros(0, dtype=np.int64)
+        keep = mapped >= 0
+        self._evaluator.add_matches(DetectionMatches(mapped[keep].astype(np.int32), state.arrays["scores"][keep],
+                                                     state.arrays["tp"][:, keep],
+                                                     remap_counts(state.arrays["num_gt"], mapping, self._encoder.num_classes)))
+        self._encoder.log(self.logger())
+
+    def _has_accumulated(self) -> bool:
+        """
+        Returns whether any data has been accumulated.
+
+        :return: True if data accumulated
+        :rtype: bool
+        """
+        return self._encoder.num_classes > 0
+
+    def _compute_accumulated(self) -> DatasetStatisticList:
+        """
+        Calculates the statistics from the accumulated state.
+
+        :return: the statistics
+        :rtype: DatasetStatisticList
+        """
+        return self._compute(self._evaluator)
+
+    def _process_batch(self, batch) -> Optional[DatasetStatisticList]:
+        """
+        Processes a single batch of pairs.
+
+        :param batch: the pairs or state to process
+        :type batch: ImagePairList or StatisticState
+        :return: the statistics, None if none to output
+        :rtype: DatasetStatisticList
+        """
+        if isinstance(batch, StatisticState):
+            if not self.accumulate:
+                raise Exception("Statistic states can only be merged in accumulate mode!")
+            self._merge_state(batch)
+            arrays = None
+        else:
+            with measure("%s/encode" % self.name(), items=len(batch)):
+                arrays = detection_arrays_from_pairs(batch, self._encoder, score_key=self.score_key)
+            self._encoder.log(self.logger())
+
+        if not self.accumulate:
+            if len(arrays.gt_labels) == 0:
+                self.logger().warning("No annotated objects to calculate statistics for!")
+                return None
+            evaluator = self._new_evaluator()
+            evaluator.update(arrays)
+            return self._compute(evaluator)
+
+        self._num_batches += 1
+        if arrays is not None:
+            with measure("%s/update" % self.name(), items=len(batch)):
+                self._evaluator.update(arrays)
+        self._pending = True
+        if self._is_output_due(batch):
+            if self._encoder.num_classes == 0:
+                self.logger().warning("No objects to calculate statistics for!")
+                return None
+            self.logger().info("Statistics after %d batches" % self._num_batches)
+            return self._compute(self._evaluator)
+        return None
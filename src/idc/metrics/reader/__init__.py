@@ -1 +1,5 @@
 from ._load_metrics_pairs import LoadMetricsPairsReader
+from ._load_metrics_multi_pairs import LoadMetricsMultiPairsReader
+from ._load_encoded_pairs import LoadEncodedPairsReader
+from ._load_statistic_states import LoadStatisticStatesReader
+from ._generate_synthetic_data import GenerateSyntheticDataReader
@@ -0,0 +1,178 @@
+import argparse
+from typing import List, Iterable
+
+from wai.logging import LOGGING_WARNING
+
+from idc.api import data_type_to_class
+from idc.metrics.api import SYNTHETIC_TYPES, SYNTHETIC_IC, BLOCK_SIZE, SyntheticDataGenerator
+from kasperl.api import Reader
+
+
+class GenerateSyntheticDataReader(Reader):
+
+    def __init__(self, data_type: str = None, num_items: int = None, num_classes: int = None, error_rate: float = None,
+                 width: int = None, height: int = None, max_objects: int = None, predictions: bool = None,
+                 scores: bool = None, seed: int = None,
+                 logger_name: str = None, logging_level: str = LOGGING_WARNING):
+        """
+        Initializes the reader.
+
+        :param data_type: the type of data to generate (ic|od|is|dp)
+        :type data_type: str
+        :param num_items: the number of items to generate
+        :type num_items: int
+        :param num_classes: the number of class labels
+        :type num_classes: int
+        :param error_rate: the rate of mistakes in the predictions (noise level for depth)
+        :type error_rate: float
+        :param width: the width of the images
+        :type width: int
+        :param height: the height of the images
+        :type height: int
+        :param max_objects: the maximum number of objects/regions per image (od/is)
+        :type max_objects: int
+        :param predictions: whether to generate the predictions rather than the annotations
+        :type predictions: bool
+        :param scores: whether to add class probabilities to the classification predictions
+        :type scores: bool
+        :param seed: the seed value for the random number generators
+        :type seed: int
+        :param logger_name: the name to use for the logger
+        :type logger_name: str
+        :param logging_level: the logging level to use
+        :type logging_level: str
+        """
+        super().__init__(logger_name=logger_name, logging_level=logging_level)
+        self.data_type = data_type
+        self.num_items = num_items
+        self.num_classes = num_classes
+        self.error_rate = error_rate
+        self.width = width
+        self.height = height
+        self.max_objects = max_objects
+        self.predictions = predictions
+        self.scores = scores
+        self.seed = seed
+        self._generator = None
+        self._block = 0
+
+    def name(self) -> str:
+        """
+        Returns the name of the handler, used as sub-command.
+
+        :return: the name
+        :rtype: str
+        """
+        return "generate-synthetic-data"
+
+    def description(self) -> str:
+        """
+        Returns a description of the reader.
+
+        :return: the description
+        :rtype: str
+        """
+        return "Generates reproducible synthetic annotations or predictions for benchmarking and testing, " \
+               "for image classification, object detection, image segmentation or depth estimation. " \
+               "Predictions get derived from the same ground truth as the annotations (using the same seed), " \
+               "with mistakes/noise added according to the error rate."
+
+    def _create_argparser(self) -> argparse.ArgumentParser:
+        """
+        Creates an argument parser. Derived classes need to fill in the options.
+
+        :return: the parser
+        :rtype: argparse.ArgumentParser
+        """
+        parser = super()._create_argparser()
+        parser.add_argument("-t", "--data_type", choices=SYNTHETIC_TYPES, default=SYNTHETIC_IC, help="The type of data to generate.", required=False)
+        parser.add_argument("-n", "--num_items", type=int, default=1000, help="The number of items to generate.", required=False)
+        parser.add_argument("-k", "--num_classes", type=int, default=10, help="The number of class labels.", required=False)
+        parser.add_argument("-e", "--error_rate", type=float, default=0.2, help="The rate of mistakes in the predictions, the sigma of the log-normal noise for depth.", required=False)
+        parser.add_argument("-W", "--width", type=int, default=64, help="The width of the images.", required=False)
+        parser.add_argument("-H", "--height", type=int, default=64, help="The height of the images.", required=False)
+        parser.add_argument("-m", "--max_objects", type=int, default=10, help="The maximum number of objects/regions per image (object detection/image segmentation).", required=False)
+        parser.add_argument("-p", "--predictions", action="store_true", help="Whether to generate the predictions rather than the annotations.")
+        parser.add_argument("--scores", action="store_true", help="Whether to add class probabilities to the meta-data of the classification predictions.")
+        parser.add_argument("-S", "--seed", type=int, default=42, help="The seed value for the random number generators.", required=False)
+        return parser
+
+    def _apply_args(self, ns: argparse.Namespace):
+        """
+        Initializes the object with the arguments of the parsed namespace.
+
+        :param ns: the parsed arguments
+        :type ns: argparse.Namespace
+        """
+        super()._apply_args(ns)
+        self.data_type = ns.data_type
+        self.num_items = ns.num_items
+        self.num_classes = ns.num_classes
+        self.error_rate = ns.error_rate
+        self.width = ns.width
+        self.height = ns.height
+        self.max_objects = ns.max_objects
+        self.predictions = ns.predictions
+        self.scores = ns.scores
+        self.seed = ns.seed
+
+    def generates(self) -> List:
+        """
+        Returns the list of classes that get produced.
+
+        :return: the list of classes
+        :rtype: list
+        """
+        if self.data_type is None:
+            self.data_type = SYNTHETIC_IC
+        return [data_type_to_class(self.data_type)]
+
+    def initialize(self):
+        """
+        Initializes the processing, e.g., for opening files or databases.
+        """
+        super().initialize()
+        if self.data_type is None:
+            self.data_type = SYNTHETIC_IC
+        if self.num_items is None:
+            self.num_items = 1000
+        if self.num_classes is None:
+            self.num_classes = 10
+        if self.error_rate is None:
+            self.error_rate = 0.2
+        if self.width is None:
+            self.width = 64
+        if self.height is None:
+            self.height = 64
+        if self.max_objects is None:
+            self.max_objects = 10
+        if self.predictions is None:
+            self.predictions = False
+        if self.scores is None:
+            self.scores = False
+        if self.seed is None:
+            self.seed = 42
+        self._generator = SyntheticDataGenerator(self.data_type, self.num_items, num_classes=self.num_classes,
+                                                 error_rate=self.error_rate, width=self.width, height=self.height,
+                                                 max_objects=self.max_objects, scores=self.scores, seed=self.seed)
+        self._block = 0
+
+    def read(self) -> Iterable:
+        """
+        Loads the data and returns the items one by one.
+
+        :return: the data
+        :rtype: Iterable
+        """
+        items = self._generator.block(self._block, predictions=self.predictions)
+        self._block += 1
+        yield from items
+
+    def has_finished(self) -> bool:
+        """
+        Returns whether reading has finished.
+
+        :return: True if finished
+        :rtype: bool
+        """
+        return self._block * BLOCK_SIZE >= self.num_items
@@ -0,0 +1,129 @@
+import argparse
+from typing import List, Iterable
+
+from wai.logging import LOGGING_WARNING
+
+from idc.metrics.api import EncodedPairs, load_encoded_pairs
+from kasperl.api import Reader
+from seppl.placeholders import placeholder_list, PlaceholderSupporter
+
+
+class LoadEncodedPairsReader(Reader, PlaceholderSupporter):
+
+    def __init__(self, input_dir: str = None, chunk_size: int = None, skip_scores: bool = None,
+                 logger_name: str = None, logging_level: str = LOGGING_WARNING):
+        """
+        Initializes the reader.
+
+        :param input_dir: the directory with the encoded pairs
+        :type input_dir: str
+        :param chunk_size: the maximum number of pairs to forward at a time, 0 for all at once
+        :type chunk_size: int
+        :param skip_scores: whether to ignore the score matrix
+        :type skip_scores: bool
+        :param logger_name: the name to use for the logger
+        :type logger_name: str
+        :param logging_level: the logging level to use
+        :type logging_level: str
+        """
+        super().__init__(logger_name=logger_name, logging_level=logging_level)
+        self.input_dir = input_dir
+        self.chunk_size = chunk_size
+        self.skip_scores = skip_scores
+        self._finished = False
+
+    def name(self) -> str:
+        """
+        Returns the name of the handler, used as sub-command.
+
+        :return: the name
+        :rtype: str
+        """
+        return "load-encoded-pairs-ic"
+
+    def description(self) -> str:
+        """
+        Returns a description of the reader.
+
+        :return: the description
+        :rtype: str
+        """
+        return "Memory-maps the classification pairs written by to-encoded-pairs-ic and forwards them in chunks, which summary-statistics-ic can process without decoding any labels."
+
+    def _create_argparser(self) -> argparse.ArgumentParser:
+        """
+        Creates an argument parser. Derived classes need to fill in the options.
+
+        :return: the parser
+        :rtype: argparse.ArgumentParser
+        """
+        parser = super()._create_argparser()
+        parser.add_argument("-i", "--input", type=str, help="The directory with the encoded pairs. " + placeholder_list(obj=self), required=True)
+        parser.add_argument("-c", "--chunk_size", type=int, default=1000000, help="The maximum number of pairs to forward at a time; 0 to forward all at once.", required=False)
+        parser.add_argument("--skip_scores", action="store_true", help="Whether to ignore the score matrix.")
+        return parser
+
+    def _apply_args(self, ns: argparse.Namespace):
+        """
+        Initializes the object with the arguments of the parsed namespace.
+
+        :param ns: the parsed arguments
+        :type ns: argparse.Namespace
+        """
+        super()._apply_args(ns)
+        self.input_dir = ns.input
+        self.chunk_size = ns.chunk_size
+        self.skip_scores = ns.skip_scores
+
+    def generates(self) -> List:
+        """
+        Returns the list of classes that get produced.
+
+        :return: the list of classes
+        :rtype: list
+        """
+        return [EncodedPairs]
+
+    def initialize(self):
+        """
+        Initializes the processing, e.g., for opening files or databases.
+        """
+        super().initialize()
+        if self.input_dir is None:
+            raise Exception("No input directory specified!")
+        if self.chunk_size is None:
+            self.chunk_size = 1000000
+        if self.chunk_size < 0:
+            raise Exception("Chunk size must be at least 0, but got: %d" % self.chunk_size)
+        if self.skip_scores is None:
+            self.skip_scores = False
+        self._finished = False
+
+    def read(self) -> Iterable:
+        """
+        Loads the data and returns the items one by one.
+
+        :return: the data
+        :rtype: Iterable
+        """
+        path = self.session.expand_placeholders(self.input_dir)
+        self.logger().info("Loading encoded pairs from: %s" % path)
+        pairs = load_encoded_pairs(path, load_scores=not self.skip_scores)
+        self.logger().info("# pairs: %d, # classes: %d" % (len(pairs), pairs.num_classes))
+        self._finished = True
+        if (self.chunk_size == 0) or (len(pairs) <= self.chunk_size):
+            yield pairs
+            return
+        for start in range(0, len(pairs), self.chunk_size):
+            chunk = pairs.slice(start, start + self.chunk_size)
+            chunk.last = start + self.chunk_size >= len(pairs)
+            yield chunk
+
+    def has_finished(self) -> bool:
+        """
+        Returns whether reading has finished.
+
+        :return: True if finished
+        :rtype: bool
+        """
+        return self._finished
@@ -0,0 +1,231 @@
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Iterable, Optional, Tuple
+
+from wai.logging import LOGGING_WARNING
+
+from idc.api import ImageData
+from idc.metrics.api import MultiImagePair, MultiImagePairList
+from kasperl.api import Reader
+from seppl.io import Filter
+from ._metrics_pairs_reader import MetricsPairsReader
+
+
+class LoadMetricsMultiPairsReader(MetricsPairsReader):
+
+    def __init__(self, annotations_subflow: str = None, annotations_flow_format: str = None,
+                 predictions_subflows: List[str] = None, predictions_flow_format: str = None,
+                 models: List[str] = None, parallel: bool = None, labels_only: bool = None,
+                 cache_dir: str = None, cache_max_size: float = None, cache_invalidate: bool = None, cache_hash: bool = None,
+                 shard: str = None, match_strategy: str = None, strip_directory: bool = None, strip_extension: bool = None,
+                 ignore_case: bool = None, unmatched: str = None,
+                 logger_name: str = None, logging_level: str = LOGGING_WARNING):
+        """
+        Initializes the reader.
+
+        :param annotations_subflow: the sub-flow for reading the annotations
+        :type annotations_subflow: str
+        :param predictions_subflows: the sub-flows for reading the predictions, one per model
+        :type predictions_subflows: list
+        :param models: the names of the models, uses model1, model2, ... if None
+        :type models: list
+        :param parallel: whether to execute the sub-flows concurrently
+        :type parallel: bool
+        :param labels_only: whether to only keep name and annotation of the items, discarding the image data
+        :type labels_only: bool
+        :param cache_dir: the directory for caching the annotations, no caching if None
+        :type cache_dir: str
+        :param cache_max_size: the maximum size of the cache in MB
+        :type cache_max_size: float
+        :param cache_invalidate: whether to discard the cached annotations and re-read them
+        :type cache_invalidate: bool
+        :param cache_hash: whether to fingerprint the source files via their content rather than modification time and size
+        :type cache_hash: bool
+        :param shard: the shard of the images to evaluate ("i/N", 1-based), all images if None
+        :type shard: str
+        :param match_strategy: how to match annotations and predictions (auto|hash|merge)
+        :type match_strategy: str
+        :param strip_directory: whether to remove directories from the image names before matching
+        :type strip_directory: bool
+        :param strip_extension: whether to remove the extension from the image names before matching
+        :type strip_extension: bool
+        :param ignore_case: whether to match the image names case-insensitively
+        :type ignore_case: bool
+        :param unmatched: how to report the images without counterpart (count|list)
+        :type unmatched: str
+        :param logger_name: the name to use for the logger
+        :type logger_name: str
+        :param logging_level: the logging level to use
+        :type logging_level: str
+        """
+        super().__init__(annotations_subflow=annotations_subflow, annotations_flow_format=annotations_flow_format,
+                         predictions_flow_format=predictions_flow_format, parallel=parallel,
+                         labels_only=labels_only, cache_dir=cache_dir, cache_max_size=cache_max_size,
+                         cache_invalidate=cache_invalidate, cache_hash=cache_hash, shard=shard,
+                         match_strategy=match_strategy, strip_directory=strip_directory,
+                         strip_extension=strip_extension, ignore_case=ignore_case, unmatched=unmatched,
+                         logger_name=logger_name, logging_level=logging_level)
+        self.predictions_flows = predictions_subflows
+        self.models = models
+        self._predictions_readers = None
+        self._predictions_filters = None
+
+    def name(self) -> str:
+        """
+        Returns the name of the handler, used as sub-command.
+
+        :return: the name
+        :rtype: str
+        """
+        return "load-metrics-multi-pairs"
+
+    def description(self) -> str:
+        """
+        Returns a description of the reader.
+
+        :return: the description
+        :rtype: str
+        """
+        return "Loads the annotations once and the predictions of several models using the respective sub-flows, forwarding the images that all models have predictions for, for comparing the models. Unlike load-metrics-pairs, streaming is not supported (no --stream/--chunk_size/--queue_size), i.e., all the items get loaded into memory before matching."
+
+    def _create_argparser(self) -> argparse.ArgumentParser:
+        """
+        Creates an argument parser. Derived classes need to fill in the options.
+
+        :return: the parser
+        :rtype: argparse.ArgumentParser
+        """
+        parser = super()._create_argparser()
+        parser.add_argument("-p", "--predictions_flows", type=str, default=None, help="The subflows to loading the predictions (reader and optional filter(s)), one per model.", nargs="+")
+        parser.add_argument("-m", "--models", type=str, default=None, help="The names of the models, in the same order as the predictions subflows; uses model1, model2, ... if not provided.", nargs="*")
+        return parser
+
+    def _apply_args(self, ns: argparse.Namespace):
+        """
+        Initializes the object with the arguments of the parsed namespace.
+
+        :param ns: the parsed arguments
+        :type ns: argparse.Namespace
+        """
+        super()._apply_args(ns)
+        self.predictions_flows = ns.predictions_flows
+        self.models = ns.models
+
+    def generates(self) -> List:
+        """
+        Returns the list of classes that get produced.
+
+        :return: the list of classes
+        :rtype: list
+        """
+        return [MultiImagePair]
+
+    def initialize(self):
+        """
+        Initializes the processing, e.g., for opening files or databases.
+        """
+        super().initialize()
+
+        if (self.predictions_flows is None) or (len(self.predictions_flows) == 0):
+            raise Exception("No predictions sub-flows specified!")
+        if (self.models is None) or (len(self.models) == 0):
+            self.models = ["model%d" % (i + 1) for i in range(len(self.predictions_flows))]
+        if len(self.models) != len(self.predictions_flows):
+            raise Exception("Number of model names and predictions sub-flows differ: %d != %d" % (len(self.models), len(self.predictions_flows)))
+        if len(set(self.models)) != len(self.models):
+            raise Exception("Model names must be unique: %s" % ", ".join(self.models))
+        self._predictions_readers = []
+        self._predictions_filters = []
+        for flow in self.predictions_flows:
+            _reader, _filter = self._initialize_sub_flow(self._parse_sub_flow(flow, self.predictions_flow_format))
+            if _reader is None:
+                raise Exception("No predictions reader specified: %s" % flow)
+            self._predictions_readers.append(_reader)
+            self._predictions_filters.append(_filter)
+
+    def _timed_read(self, label: str, reader: Reader, flt: Optional[Filter]) -> List[ImageData]:
+        """
+        Reads all the data from the sub-flow and logs how long it took.
+
+        :param label: the label for the sub-flow to use in the log message
+        :type label: str
+        :param reader: the reader of the sub-flow
+        :type reader: Reader
+        :param flt: the optional filter of the sub-flow
+        :type flt: Filter
+        :return: the items
+        :rtype: list
+        """
+        start = time.perf_counter()
+        if reader is self._annotations_reader:
+            result = self._read_annotations()
+        else:
+            result = self._read_sub_flow(reader, flt)
+        self.logger().info("%s: %d items in %.3f sec" % (label, len(result), time.perf_counter() - start))
+        return result
+
+    def _read_sub_flows(self) -> Tuple[List[ImageData], List[List[ImageData]]]:
+        """
+        Reads the annotations and the predictions of all the models.
+
+        :return: the tuple of annotations and list of predictions per model
+        :rtype: tuple
+        """
+        flows = [("annotations", self._annotations_reader, self._annotations_filter)]
+        for model, reader, flt in zip(self.models, self._predictions_readers, self._predictions_filters):
+            flows.append(("predictions/%s" % model, reader, flt))
+        if self.parallel:
+            self.logger().info("Reading annotations/predictions concurrently...")
+            with ThreadPoolExecutor(max_workers=len(flows)) as executor:
+                futures = [executor.submit(self._timed_read, *flow) for flow in flows]
+                items = [future.result() for future in futures]
+        else:
+            items = [self._timed_read(*flow) for flow in flows]
+        return items[0], items[1:]
+
+    def read(self) -> Iterable:
+        """
+        Loads the data and returns the items one by one.
+
+        :return: the data
+        :rtype: Iterable
+        """
+        annotations, predictions = self._read_sub_flows()
+        if self._shard is not None:
+            annotations = [x for x in annotations if self._in_shard(x.image_name)]
+            predictions = [[x for x in preds if self._in_shard(x.image_name)] for preds in predictions]
+            self.logger().info("shard %d/%d" % (self._shard[0] + 1, self._shard[1]))
+        self.logger().info("# annotations: %d" % len(annotations))
+
+        # shared pair index: the images that have an annotation and predictions from all models
+        matched = None
+        for model, preds in zip(self.models, predictions):
+            self.logger().info("# predictions/%s: %d" % (model, len(preds)))
+            result = self._matcher.match(annotations, preds)
+            self._report_match(result, len(result.pairs))
+            lookup = dict()
+            for pair in result.pairs:
+                self._check_pair(pair)
+                lookup[pair.image_name] = pair.prediction
+            if matched is None:
+                matched = {k: [v] for k, v in lookup.items()}
+            else:
+                matched = {k: v + [lookup[k]] for k, v in matched.items() if k in lookup}
+
+        # in the order of the annotations
+        pairs = MultiImagePairList()
+        pairs.models = list(self.models)
+        for annotation in annotations:
+            if annotation.image_name in matched:
+                pairs.append(MultiImagePair(image_name=annotation.image_name, annotation=annotation,
+                                            predictions=matched.pop(annotation.image_name)))
+        self._common_names = [x.image_name for x in pairs]
+        self.logger().info("# pairs (all models): %d" % len(pairs))
+
+        if len(pairs) > 0:
+            pairs.last = True
+            yield pairs
+
+        self._common_names = None
+        return None
@@ -1,21 +1,30 @@
 import argparse
-from typing import List, Iterable, Tuple, Optional, Dict
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Iterable, Tuple, Optional
 
 from wai.logging import LOGGING_WARNING
 
 from idc.api import ImageData
 from idc.metrics.api import ImagePair, ImagePairList
-from idc.registry import available_readers, available_filters
-from kasperl.api import PIPELINE_FORMATS, PIPELINE_FORMAT_CMDLINE, load_pipeline
+from idc.metrics.api import active_profiler, measure
+from idc.metrics.api import MATCH_MERGE, UNMATCHED_LIST, MatchResult, NotSortedError
 from kasperl.api import Reader
-from seppl import Plugin, split_args, Initializable, init_initializable
-from seppl.io import BatchFilter, MultiFilter, Filter
+from seppl.io import Filter
+from ._metrics_pairs_reader import MetricsPairsReader
 
 
-class LoadMetricsPairsReader(Reader):
+class LoadMetricsPairsReader(MetricsPairsReader):
 
     def __init__(self, annotations_subflow: str = None, annotations_flow_format: str = None,
                  predictions_subflow: str = None, predictions_flow_format: str = None,
+                 stream: bool = None, chunk_size: int = None, parallel: bool = None, queue_size: int = None,
+                 labels_only: bool = None, cache_dir: str = None, cache_max_size: float = None,
+                 cache_invalidate: bool = None, cache_hash: bool = None, shard: str = None,
+                 match_strategy: str = None, strip_directory: bool = None, strip_extension: bool = None,
+                 ignore_case: bool = None, unmatched: str = None,
                  logger_name: str = None, logging_level: str = LOGGING_WARNING):
         """
         Initializes the reader.
@@ -24,23 +33,56 @@ class LoadMetricsPairsReader(Reader):
         :type annotations_subflow: str
         :param predictions_subflow: the sub-flow for reading the predictions
         :type predictions_subflow: str
+        :param stream: whether to read the sub-flows in parallel and forward pairs as soon as they are complete
+        :type stream: bool
+        :param chunk_size: the maximum number of pairs to forward at a time when streaming
+        :type chunk_size: int
+        :param parallel: whether to execute the annotations and predictions sub-flows concurrently
+        :type parallel: bool
+        :param queue_size: the maximum number of items to buffer per sub-flow when executing them concurrently
+        :type queue_size: int
+        :param labels_only: whether to only keep name and annotation of the items, discarding the image data
+        :type labels_only: bool
+        :param cache_dir: the directory for caching the annotations, no caching if None
+        :type cache_dir: str
+        :param cache_max_size: the maximum size of the cache in MB
+        :type cache_max_size: float
+        :param cache_invalidate: whether to discard the cached annotations and re-read them
+        :type cache_invalidate: bool
+        :param cache_hash: whether to fingerprint the source files via their content rather than modification time and size
+        :type cache_hash: bool
+        :param shard: the shard of the images to evaluate ("i/N", 1-based), all images if None
+        :type shard: str
+        :param match_strategy: how to match annotations and predictions (auto|hash|merge)
+        :type match_strategy: str
+        :param strip_directory: whether to remove directories from the image names before matching
+        :type strip_directory: bool
+        :param strip_extension: whether to remove the extension from the image names before matching
+        :type strip_extension: bool
+        :param ignore_case: whether to match the image names case-insensitively
+        :type ignore_case: bool
+        :param unmatched: how to report the images without counterpart (count|list)
+        :type unmatched: str
         :param logger_name: the name to use for the logger
         :type logger_name: str
         :param logging_level: the logging level to use
         :type logging_level: str
         """
-        super().__init__(logger_name=logger_name, logging_level=logging_level)
-        self.annotations_subflow = annotations_subflow
-        self.annotations_flow_format = annotations_flow_format
-        self.predictions_subflow = predictions_subflow
-        self.predictions_flow_format = predictions_flow_format
-        self._annotations_subflow = None
-        self._annotations_reader = None
-        self._annotations_filter = None
+        super().__init__(annotations_subflow=annotations_subflow, annotations_flow_format=annotations_flow_format,
+                         predictions_flow_format=predictions_flow_format, parallel=parallel,
+                         labels_only=labels_only, cache_dir=cache_dir, cache_max_size=cache_max_size,
+                         cache_invalidate=cache_invalidate, cache_hash=cache_hash, shard=shard,
+                         match_strategy=match_strategy, strip_directory=strip_directory,
+                         strip_extension=strip_extension, ignore_case=ignore_case, unmatched=unmatched,
+                         logger_name=logger_name, logging_level=logging_level)
+        self.predictions_flow = predictions_subflow
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.queue_size = queue_size
         self._predictions_subflow = None
+        self._predictions_subflow_key = None
         self._predictions_reader = None
         self._predictions_filter = None
-        self._common_names = None
 
     def name(self) -> str:
         """
@@ -60,6 +102,15 @@ class LoadMetricsPairsReader(Reader):
         """
         return "Loads the annotation/prediction pairs using the respective sub-flows and forwards matching pairs for calculating metrics."
 
+    def _match_strategy_help(self) -> str:
+        """
+        Returns the help for the match_strategy option.
+
+        :return: the help
+        :rtype: str
+        """
+        return "How to match annotations and predictions: 'merge' requires both sub-flows to produce items sorted by name and, when streaming, only keeps one item per sub-flow in memory; 'hash' works with any order; 'auto' uses 'merge' if both sides are sorted and 'hash' otherwise (always 'hash' when streaming)."
+
     def _create_argparser(self) -> argparse.ArgumentParser:
         """
         Creates an argument parser. Derived classes need to fill in the options.
@@ -68,10 +119,10 @@ class LoadMetricsPairsReader(Reader):
         :rtype: argparse.ArgumentParser
         """
         parser = super()._create_argparser()
-        parser.add_argument("-a", "--annotations_flow", type=str, default=None, help="The subflow to loading the annotations (reader and optional filter(s)).")
-        parser.add_argument("-A", "--annotations_flow_format", choices=PIPELINE_FORMATS, default=PIPELINE_FORMAT_CMDLINE, help="The format of the annotations pipeline.")
-        parser.add_argument("-p", "--predictions_flow", type=str, default=None, help="The subflow to loading the predictions (reader and optional filter(s)).")
-        parser.add_argument("-P", "--predictions_flow_format", choices=PIPELINE_FORMATS, default=PIPELINE_FORMAT_CMDLINE, help="The format of the predictions pipeline.")
+        parser.add_argument("-p", "--predictions_flow", type=str, default=None, help="The subflow to loading the predictions (reader and optional filter(s)). The filter(s) receive all items in one go, unless streaming, in which case they receive one item at a time.")
+        parser.add_argument("-s", "--stream", action="store_true", help="Whether to read annotations and predictions alternately and forward pairs as soon as both halves have arrived, rather than loading everything into memory first. The filters of the sub-flows then process the items one at a time, i.e., filters that require all the data at once (e.g., for sorting or splitting) are not suitable. Any annotations cache gets read and written in chunks, i.e., it does not hold all the annotations in memory.")
+        parser.add_argument("-c", "--chunk_size", type=int, default=1000, help="The maximum number of pairs to forward at a time when streaming.", required=False)
+        parser.add_argument("-q", "--queue_size", type=int, default=1000, help="The maximum number of items to buffer when executing the sub-flows concurrently while streaming.", required=False)
         return parser
 
     def _apply_args(self, ns: argparse.Namespace):
@@ -82,10 +133,10 @@ class LoadMetricsPairsReader(Reader):
         :type ns: argparse.Namespace
         """
         super()._apply_args(ns)
-        self.annotations_flow = ns.annotations_flow
-        self.annotations_flow_format = ns.annotations_flow_format
         self.predictions_flow = ns.predictions_flow
-        self.predictions_flow_format = ns.predictions_flow_format
+        self.stream = ns.stream
+        self.chunk_size = ns.chunk_size
+        self.queue_size = ns.queue_size
 
     def generates(self) -> List:
         """
@@ -96,157 +147,340 @@ class LoadMetricsPairsReader(Reader):
         """
         return [ImagePair]
 
-    def _parse_sub_flow(self, flow: str, flow_format: str) -> List[Plugin]:
-        """
-        Parses the command-line and returns the list of plugins it represents.
-        Raises an exception in case of an invalid sub-flow.
-
-        :param flow: the flow to parse
-        :type flow: str
-        :param flow_format: the format of the flow
-        :type flow_format: str
-        :return: the list of plugins
-        :rtype: list
-        """
-        from seppl import args_to_objects
-
-        # split command-line into valid plugin subsets
-        valid = dict()
-        valid.update(available_readers())
-        valid.update(available_filters())
-        pipeline = load_pipeline(flow, flow_format, logger=self.logger())
-        args = split_args(pipeline, list(valid.keys()))
-        return args_to_objects(args, valid, allow_global_options=False)
-
-    def _initialize_sub_flow(self, sub_flow: List[Plugin]) -> Tuple[Optional[Reader], Optional[Filter]]:
-        """
-        Initializes the sub-flow.
-        
-        :param sub_flow: the sub-flow plugins to initialize
-        :type sub_flow: list 
-        :return: the tuple of reader/filter
-        :rtype: tuple
-        """
-        _reader = None
-        _filter = None
-        if len(sub_flow) > 0:
-            filters = []
-            for plugin in sub_flow:
-                if isinstance(plugin, Reader):
-                    if len(filters) > 0:
-                        raise Exception("Reader must be first plugin in sub-flow!")
-                    _reader = plugin
-                if isinstance(plugin, BatchFilter):
-                    filters.append(plugin)
-            if len(filters) == 1:
-                _filter = filters[0]
-            elif len(filters) > 1:
-                _filter = MultiFilter(filters=filters)
-
-        if _reader is not None:
-            _reader.session = self.session
-            if isinstance(_reader, Initializable):
-                init_initializable(_reader, "writer")
-        if _filter is not None:
-            _filter.session = self.session
-            if isinstance(_filter, Initializable):
-                init_initializable(_filter, "filter")
-                
-        return _reader, _filter
-
     def initialize(self):
         """
         Initializes the processing, e.g., for opening files or databases.
         """
         super().initialize()
 
-        self._common_names = set()
-
-        if self.annotations_flow is None:
-            raise Exception("No annotations sub-flow specified!")
-        if self.annotations_flow_format is None:
-            self.annotations_flow_format = PIPELINE_FORMAT_CMDLINE
-        self._annotations_subflow = self._parse_sub_flow(self.annotations_flow, self.annotations_flow_format)
-        self._annotations_reader, self._annotations_filter = self._initialize_sub_flow(self._annotations_subflow)
-        if self._annotations_reader is None:
-            raise Exception("No annotations reader specified!")
+        if self.stream is None:
+            self.stream = False
+        if self.chunk_size is None:
+            self.chunk_size = 1000
+        if self.chunk_size < 1:
+            raise Exception("Chunk size must be at least 1, but got: %d" % self.chunk_size)
+        if self.queue_size is None:
+            self.queue_size = 1000
+        if self.queue_size < 1:
+            raise Exception("Queue size must be at least 1, but got: %d" % self.queue_size)
+        if self.stream and self.parallel and (self.match_strategy == MATCH_MERGE):
+            self.logger().warning("Sub-flows cannot be executed concurrently when streaming with merge join, reading them sequentially.")
 
         if self.predictions_flow is None:
             raise Exception("No predictions sub-flow specified!")
-        if self.predictions_flow_format is None:
-            self.predictions_flow_format = PIPELINE_FORMAT_CMDLINE
-        self._predictions_subflow = self._parse_sub_flow(self.predictions_flow, self.predictions_flow_format)
+        key = (self.predictions_flow, self.predictions_flow_format)
+        if (self._predictions_subflow is None) or (self._predictions_subflow_key != key):
+            self._predictions_subflow = self._parse_sub_flow(self.predictions_flow, self.predictions_flow_format)
+            self._predictions_subflow_key = key
         self._predictions_reader, self._predictions_filter = self._initialize_sub_flow(self._predictions_subflow)
         if self._predictions_reader is None:
             raise Exception("No predictions reader specified!")
 
-    def _create_lookup(self, items: List[ImageData]) -> Dict[str, ImageData]:
+    def _read_side(self, is_ann: bool) -> Tuple[List[ImageData], float]:
         """
-        Generates a lookup from the list of items.
+        Reads all the annotations or predictions, for executing the sub-flows concurrently.
 
-        :param items: the items to turn into a dict
-        :type items: list
-        :return: the generated lookup, using image_name as key
-        :rtype: dict
+        :param is_ann: whether to read the annotations or the predictions
+        :type is_ann: bool
+        :return: the tuple of items and time in seconds it took
+        :rtype: tuple
         """
-        result = dict()
-        for item in items:
-            result[item.image_name] = item
-        return result
+        start = time.perf_counter()
+        if is_ann:
+            items = self._read_annotations()
+        else:
+            items = self._read_sub_flow(self._predictions_reader, self._predictions_filter)
+        return items, time.perf_counter() - start
+
+    def _alternate_sub_flows(self) -> Iterable[Tuple[bool, ImageData]]:
+        """
+        Reads annotations and predictions alternately, one item at a time.
 
-    def read(self) -> Iterable:
+        :return: the tuples of annotation flag and item
+        :rtype: Iterable
         """
-        Loads the data and returns the items one by one.
+        sides = [
+            (True, iter(self._iterate_annotations())),
+            (False, iter(self._iterate_sub_flow(self._predictions_reader, self._predictions_filter))),
+        ]
+        while len(sides) > 0:
+            for side in list(sides):
+                is_ann, it = side
+                item = next(it, None)
+                if item is None:
+                    sides.remove(side)
+                else:
+                    yield is_ann, item
+
+    def _produce(self, is_ann: bool, reader: Reader, flt: Optional[Filter], items: queue.Queue, stopped: threading.Event) -> Tuple[int, float]:
+        """
+        Executes the sub-flow and places the items in the queue, followed by None once finished.
+
+        :param is_ann: whether the annotations sub-flow is being executed
+        :type is_ann: bool
+        :param reader: the reader of the sub-flow
+        :type reader: Reader
+        :param flt: the optional filter of the sub-flow
+        :type flt: Filter
+        :param items: the queue to add the items to
+        :type items: queue.Queue
+        :param stopped: the event that signals that the consumer is no longer interested in the items
+        :type stopped: threading.Event
+        :return: the tuple of number of items read and time in seconds it took
+        :rtype: tuple
+        """
+        start = time.perf_counter()
+        count = 0
+        try:
+            sub_flow = self._iterate_annotations() if is_ann else self._iterate_sub_flow(reader, flt)
+            for item in sub_flow:
+                while not stopped.is_set():
+                    try:
+                        items.put((is_ann, item), timeout=0.1)
+                        count += 1
+                        break
+                    except queue.Full:
+                        pass
+                if stopped.is_set():
+                    break
+        finally:
+            items.put((is_ann, None))
+        return count, time.perf_counter() - start
+
+    def _parallel_sub_flows(self) -> Iterable[Tuple[bool, ImageData]]:
+        """
+        Executes the annotations and predictions sub-flows concurrently and
+        returns the items in the order they become available.
 
-        :return: the data
+        :return: the tuples of annotation flag and item
         :rtype: Iterable
         """
-        self.logger().info("Reading annotations...")
-        annotations = []
-        while not self._annotations_reader.has_finished():
-            for item in self._annotations_reader.read():
-                if item is not None:
-                    annotations.append(item)
-        if self._annotations_filter is not None:
-            annotations = self._annotations_filter.process(annotations)
+        items = queue.Queue(maxsize=self.queue_size)
+        stopped = threading.Event()
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            futures = {
+                True: executor.submit(self._produce, True, self._annotations_reader, self._annotations_filter, items, stopped),
+                False: executor.submit(self._produce, False, self._predictions_reader, self._predictions_filter, items, stopped),
+            }
+            active = 2
+            try:
+                while active > 0:
+                    is_ann, item = items.get()
+                    if item is None:
+                        active -= 1
+                    else:
+                        yield is_ann, item
+            finally:
+                stopped.set()
+                # drain to unblock producers that are waiting for a free slot
+                while active > 0:
+                    is_ann, item = items.get()
+                    if item is None:
+                        active -= 1
+            profiler = active_profiler()
+            for is_ann in [True, False]:
+                count, duration = futures[is_ann].result()
+                side = "annotations" if is_ann else "predictions"
+                self.logger().info("%s: %d items in %.3f sec" % (side, count, duration))
+                if profiler is not None:
+                    profiler.record("%s/%s" % (self.name(), side), duration, items=count)
+        self.logger().info("sub-flows finished after %.3f sec" % (time.perf_counter() - start))
+
+    def _load_all(self) -> Tuple[List[ImageData], List[ImageData]]:
+        """
+        Loads annotations and predictions completely (restricted to the shard, if any).
+
+        :return: the tuple of annotations and predictions
+        :rtype: tuple
+        """
+        if self.parallel:
+            # like when reading them sequentially, the sub-flow filters receive all items in one go
+            self.logger().info("Reading annotations/predictions concurrently...")
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                futures = {is_ann: executor.submit(self._read_side, is_ann) for is_ann in [True, False]}
+            profiler = active_profiler()
+            for is_ann in [True, False]:
+                items, duration = futures[is_ann].result()
+                side = "annotations" if is_ann else "predictions"
+                self.logger().info("%s: %d items in %.3f sec" % (side, len(items), duration))
+                if profiler is not None:
+                    profiler.record("%s/%s" % (self.name(), side), duration, items=len(items))
+            annotations = futures[True].result()[0]
+            predictions = futures[False].result()[0]
+            self.logger().info("sub-flows finished after %.3f sec" % (time.perf_counter() - start))
+        else:
+            self.logger().info("Reading annotations...")
+            start = time.perf_counter()
+            with measure("%s/annotations" % self.name()) as m:
+                annotations = self._read_annotations()
+                m.items = len(annotations)
+            self.logger().info("annotations: %d items in %.3f sec" % (len(annotations), time.perf_counter() - start))
+
+            self.logger().info("Reading predictions...")
+            start = time.perf_counter()
+            with measure("%s/predictions" % self.name()) as m:
+                predictions = self._read_sub_flow(self._predictions_reader, self._predictions_filter)
+                m.items = len(predictions)
+            self.logger().info("predictions: %d items in %.3f sec" % (len(predictions), time.perf_counter() - start))
+        if self._shard is not None:
+            annotations = [x for x in annotations if self._in_shard(x.image_name)]
+            predictions = [x for x in predictions if self._in_shard(x.image_name)]
+            self.logger().info("shard %d/%d" % (self._shard[0] + 1, self._shard[1]))
+        return annotations, predictions
+
+    def _match_all(self, annotations: List[ImageData], predictions: List[ImageData]) -> Optional[ImagePairList]:
+        """
+        Matches the annotations and predictions via their (normalized) image names.
+
+        :param annotations: the annotations
+        :type annotations: list
+        :param predictions: the predictions
+        :type predictions: list
+        :return: the pairs in the order of the annotations, None if no matches
+        :rtype: ImagePairList
+        """
         self.logger().info("# annotations: %d" % len(annotations))
-        annotations_lookup = self._create_lookup(annotations)
-
-        self.logger().info("Reading predictions...")
-        predictions = []
-        while not self._predictions_reader.has_finished():
-            for item in self._predictions_reader.read():
-                if item is not None:
-                    predictions.append(item)
-        if self._predictions_filter is not None:
-            predictions = self._predictions_filter.process(predictions)
         self.logger().info("# predictions: %d" % len(predictions))
-        predictions_lookup = self._create_lookup(predictions)
-
-        self._common_names = list(set(annotations_lookup.keys()) & set(predictions_lookup.keys()))
-        self.logger().info("# pairs: %d" % len(self._common_names))
-        if len(self._common_names) == 0:
+        result = self._matcher.match(annotations, predictions)
+        self._report_match(result, len(result.pairs))
+        for pair in result.pairs:
+            self._check_pair(pair)
+        self._common_names = [x.image_name for x in result.pairs]
+        if len(result.pairs) == 0:
             return None
+        return result.pairs
 
-        result = ImagePairList()
-        for image_name in self._common_names:
-            if type(annotations_lookup[image_name]) is not type(predictions_lookup[image_name]):
-                raise Exception("Annotation and prediction differ in type: %s != %s"
-                                % (str(type(annotations_lookup[image_name])), str(type(predictions_lookup[image_name]))))
-            result.append(ImagePair(
-                image_name=image_name,
-                annotation=annotations_lookup[image_name],
-                prediction=predictions_lookup[image_name]))
-        yield result
+    def _read_all(self) -> Iterable:
+        """
+        Loads annotations and predictions completely before forwarding the matching pairs.
 
-        self._common_names = None
-        return None
+        :return: the pairs
+        :rtype: Iterable
+        """
+        annotations, predictions = self._load_all()
+        with measure("%s/match" % self.name(), items=len(annotations) + len(predictions)):
+            result = self._match_all(annotations, predictions)
+        if result is not None:
+            yield result
 
-    def has_finished(self) -> bool:
+    def _read_streamed(self) -> Iterable:
         """
-        Returns whether reading has finished.
+        Reads annotations and predictions alternately and forwards chunks of pairs
+        as soon as both halves of an image have arrived. Only the items that have
+        not been matched yet are kept in memory.
 
-        :return: True if finished
-        :rtype: bool
+        :return: the chunks of pairs
+        :rtype: Iterable
+        """
+        if self.match_strategy == MATCH_MERGE:
+            yield from self._read_merged()
+            return
+        self.logger().info("Streaming annotations/predictions...")
+        pending_anns = dict()
+        pending_preds = dict()
+        if self.parallel:
+            items = self._parallel_sub_flows()
+        else:
+            items = self._alternate_sub_flows()
+        num_pairs = 0
+        chunk = ImagePairList()
+        # a full chunk is held back until the next pair arrives, so that the final chunk can be flagged
+        full = None
+        for is_ann, item in items:
+            if not self._in_shard(item.image_name):
+                continue
+            key = self._matcher.key(item.image_name)
+            if is_ann:
+                own, other = pending_anns, pending_preds
+            else:
+                own, other = pending_preds, pending_anns
+            if key in other:
+                match = other.pop(key)
+                if full is not None:
+                    yield full
+                    full = None
+                if is_ann:
+                    chunk.append(self._create_pair(item.image_name, item, match))
+                else:
+                    chunk.append(self._create_pair(match.image_name, match, item))
+                num_pairs += 1
+                if len(chunk) >= self.chunk_size:
+                    full = chunk
+                    chunk = ImagePairList()
+            elif key not in own:
+                own[key] = item
+
+        if len(chunk) > 0:
+            if full is not None:
+                yield full
+            chunk.last = True
+            yield chunk
+        elif full is not None:
+            full.last = True
+            yield full
+        self.logger().info("# pairs: %d" % num_pairs)
+        self.logger().info("# unmatched annotations: %d" % len(pending_anns))
+        self.logger().info("# unmatched predictions: %d" % len(pending_preds))
+        if self.unmatched == UNMATCHED_LIST:
+            for item in pending_anns.values():
+                self.logger().info("unmatched annotation: %s" % item.image_name)
+            for item in pending_preds.values():
+                self.logger().info("unmatched prediction: %s" % item.image_name)
+
+    def _read_merged(self) -> Iterable:
         """
-        return True
+        Reads annotations and predictions that are both sorted by name in lockstep
+        and forwards chunks of pairs, only holding on to one item per sub-flow.
+
+        :return: the chunks of pairs
+        :rtype: Iterable
+        """
+        self.logger().info("Merging sorted annotations/predictions...")
+        result = MatchResult(report_names=self.unmatched == UNMATCHED_LIST)
+        annotations = (x for x in self._iterate_annotations() if self._in_shard(x.image_name))
+        predictions = (x for x in self._iterate_sub_flow(self._predictions_reader, self._predictions_filter)
+                       if self._in_shard(x.image_name))
+        chunk = ImagePairList()
+        # a full chunk is held back until the next pair arrives, so that the final chunk can be flagged
+        full = None
+        num_pairs = 0
+        try:
+            for pair in self._matcher.merge_join(annotations, predictions, result):
+                self._check_pair(pair)
+                if full is not None:
+                    yield full
+                    full = None
+                chunk.append(pair)
+                num_pairs += 1
+                if len(chunk) >= self.chunk_size:
+                    full = chunk
+                    chunk = ImagePairList()
+        except NotSortedError as e:
+            raise Exception("Sub-flows must produce the images sorted by name when using merge join: %s" % str(e))
+
+        if len(chunk) > 0:
+            if full is not None:
+                yield full
+            chunk.last = True
+            yield chunk
+        elif full is not None:
+            full.last = True
+            yield full
+        self._report_match(result, num_pairs)
+
+    def read(self) -> Iterable:
+        """
+        Loads the data and returns the items one by one.
+
+        :return: the data
+        :rtype: Iterable
+        """
+        if self.stream:
+            yield from self._read_streamed()
+        else:
+            yield from self._read_all()
+
+        self._common_names = None
+        return None
@@ -0,0 +1,121 @@
+import argparse
+from typing import List, Iterable
+
+from wai.logging import LOGGING_WARNING
+
+from idc.metrics.api import StatisticState, load_state
+from kasperl.api import Reader
+from seppl.io import locate_files
+from seppl.placeholders import placeholder_list, PlaceholderSupporter
+
+
+class LoadStatisticStatesReader(Reader, PlaceholderSupporter):
+
+    def __init__(self, source: List[str] = None, source_list: List[str] = None,
+                 logger_name: str = None, logging_level: str = LOGGING_WARNING):
+        """
+        Initializes the reader.
+
+        :param source: the state file(s) to read
+        :type source: list
+        :param source_list: the file(s) listing the state files
+        :type source_list: list
+        :param logger_name: the name to use for the logger
+        :type logger_name: str
+        :param logging_level: the logging level to use
+        :type logging_level: str
+        """
+        super().__init__(logger_name=logger_name, logging_level=logging_level)
+        self.source = source
+        self.source_list = source_list
+        self._finished = False
+
+    def name(self) -> str:
+        """
+        Returns the name of the handler, used as sub-command.
+
+        :return: the name
+        :rtype: str
+        """
+        return "load-statistic-states"
+
+    def description(self) -> str:
+        """
+        Returns a description of the reader.
+
+        :return: the description
+        :rtype: str
+        """
+        return "Loads the accumulated states that the summary statistics filters saved via --save_state (e.g., one per shard) " \
+               "and forwards them one by one, the last one flagged as such. A summary statistics filter of the same type in " \
+               "accumulate mode merges them and outputs the exact statistics across all of them."
+
+    def _create_argparser(self) -> argparse.ArgumentParser:
+        """
+        Creates an argument parser. Derived classes need to fill in the options.
+
+        :return: the parser
+        :rtype: argparse.ArgumentParser
+        """
+        parser = super()._create_argparser()
+        parser.add_argument("-i", "--input", type=str, help="Path to the state file(s) to read; glob syntax is supported; " + placeholder_list(obj=self), required=False, nargs="*")
+        parser.add_argument("-I", "--input_list", type=str, help="Path to the text file(s) listing the state files to use; " + placeholder_list(obj=self), required=False, nargs="*")
+        return parser
+
+    def _apply_args(self, ns: argparse.Namespace):
+        """
+        Initializes the object with the arguments of the parsed namespace.
+
+        :param ns: the parsed arguments
+        :type ns: argparse.Namespace
+        """
+        super()._apply_args(ns)
+        self.source = ns.input
+        self.source_list = ns.input_list
+
+    def generates(self) -> List:
+        """
+        Returns the list of classes that get produced.
+
+        :return: the list of classes
+        :rtype: list
+        """
+        return [StatisticState]
+
+    def initialize(self):
+        """
+        Initializes the processing, e.g., for opening files or databases.
+        """
+        super().initialize()
+        self._finished = False
+
+    def read(self) -> Iterable:
+        """
+        Loads the data and returns the items one by one.
+
+        :return: the data
+        :rtype: Iterable
+        """
+        source = None if self.source is None else [self.session.expand_placeholders(x) for x in self.source]
+        source_list = None if self.source_list is None else [self.session.expand_placeholders(x) for x in self.source_list]
+        inputs = locate_files(source, input_lists=source_list, fail_if_empty=True, default_glob="*.npz")
+        self._finished = True
+        kind = None
+        for i, path in enumerate(inputs):
+            self.logger().info("Loading state: %s" % path)
+            state = load_state(path)
+            if kind is None:
+                kind = state.kind
+            elif state.kind != kind:
+                raise Exception("States of different type cannot be merged: %s != %s (%s)" % (state.kind, kind, path))
+            state.last = i == len(inputs) - 1
+            yield state
+
+    def has_finished(self) -> bool:
+        """
+        Returns whether reading has finished.
+
+        :return: True if finished
+        :rtype: bool
+        """
+        return self._finished
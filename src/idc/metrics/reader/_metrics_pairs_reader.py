@@ -0,0 +1,536 @@
+import abc
+import argparse
+from typing import List, Iterable, Tuple, Optional
+
+from wai.logging import LOGGING_WARNING
+
+from idc.api import ImageData, ImageClassificationData
+from idc.metrics.api import ImagePair, CACHE_MAX_SIZE, AnnotationCache, expand_source_files, cache_key
+from idc.metrics.api import parse_shard, shard_of
+from idc.metrics.api import MATCH_AUTO, MATCH_STRATEGIES, UNMATCHED_COUNT, UNMATCHED_LIST, UNMATCHED_REPORTS, MatchResult, PairMatcher
+from idc.registry import available_readers, available_filters
+from kasperl.api import PIPELINE_FORMATS, PIPELINE_FORMAT_CMDLINE, load_pipeline
+from kasperl.api import Reader, AnnotationsOnlyReader, make_list
+from seppl import Plugin, split_args, Initializable, init_initializable
+from seppl.variables import expand_variables
+from seppl.io import BatchFilter, MultiFilter, Filter
+
+
+class MetricsPairsReader(Reader, abc.ABC):
+    """
+    Ancestor for readers that load the annotations and the predictions via
+    sub-flows and match them via their (normalized) image names. Handles
+    the sub-flows, the caching of the annotations, the sharding and the
+    matching.
+    """
+
+    def __init__(self, annotations_subflow: str = None, annotations_flow_format: str = None,
+                 predictions_flow_format: str = None, parallel: bool = None,
+                 labels_only: bool = None, cache_dir: str = None, cache_max_size: float = None,
+                 cache_invalidate: bool = None, cache_hash: bool = None, shard: str = None,
+                 match_strategy: str = None, strip_directory: bool = None, strip_extension: bool = None,
+                 ignore_case: bool = None, unmatched: str = None,
+                 logger_name: str = None, logging_level: str = LOGGING_WARNING):
+        """
+        Initializes the reader.
+
+        :param annotations_subflow: the sub-flow for reading the annotations
+        :type annotations_subflow: str
+        :param annotations_flow_format: the format of the annotations sub-flow
+        :type annotations_flow_format: str
+        :param predictions_flow_format: the format of the predictions sub-flow(s)
+        :type predictions_flow_format: str
+        :param parallel: whether to execute the annotations and predictions sub-flows concurrently
+        :type parallel: bool
+        :param labels_only: whether to only keep name and annotation of the items, discarding the image data
+        :type labels_only: bool
+        :param cache_dir: the directory for caching the annotations, no caching if None
+        :type cache_dir: str
+        :param cache_max_size: the maximum size of the cache in MB
+        :type cache_max_size: float
+        :param cache_invalidate: whether to discard the cached annotations and re-read them
+        :type cache_invalidate: bool
+        :param cache_hash: whether to fingerprint the source files via their content rather than modification time and size
+        :type cache_hash: bool
+        :param shard: the shard of the images to evaluate ("i/N", 1-based), all images if None
+        :type shard: str
+        :param match_strategy: how to match annotations and predictions (auto|hash|merge)
+        :type match_strategy: str
+        :param strip_directory: whether to remove directories from the image names before matching
+        :type strip_directory: bool
+        :param strip_extension: whether to remove the extension from the image names before matching
+        :type strip_extension: bool
+        :param ignore_case: whether to match the image names case-insensitively
+        :type ignore_case: bool
+        :param unmatched: how to report the images without counterpart (count|list)
+        :type unmatched: str
+        :param logger_name: the name to use for the logger
+        :type logger_name: str
+        :param logging_level: the logging level to use
+        :type logging_level: str
+        """
+        super().__init__(logger_name=logger_name, logging_level=logging_level)
+        self.annotations_flow = annotations_subflow
+        self.annotations_flow_format = annotations_flow_format
+        self.predictions_flow_format = predictions_flow_format
+        self.parallel = parallel
+        self.labels_only = labels_only
+        self.cache_dir = cache_dir
+        self.cache_max_size = cache_max_size
+        self.cache_invalidate = cache_invalidate
+        self.cache_hash = cache_hash
+        self.shard = shard
+        self.match_strategy = match_strategy
+        self.strip_directory = strip_directory
+        self.strip_extension = strip_extension
+        self.ignore_case = ignore_case
+        self.unmatched = unmatched
+        self._annotations_subflow = None
+        self._annotations_subflow_key = None
+        self._annotations_reader = None
+        self._annotations_filter = None
+        self._common_names = None
+        self._cache = None
+        self._cache_key = None
+        self._shard = None
+        self._matcher = None
+
+    def _match_strategy_help(self) -> str:
+        """
+        Returns the help for the match_strategy option.
+
+        :return: the help
+        :rtype: str
+        """
+        return "How to match annotations and predictions: 'merge' requires both sub-flows to produce items sorted by name; 'hash' works with any order; 'auto' uses 'merge' if both sides are sorted and 'hash' otherwise."
+
+    def _create_argparser(self) -> argparse.ArgumentParser:
+        """
+        Creates an argument parser. Derived classes need to fill in the options.
+
+        :return: the parser
+        :rtype: argparse.ArgumentParser
+        """
+        parser = super()._create_argparser()
+        parser.add_argument("-a", "--annotations_flow", type=str, default=None, help="The subflow to loading the annotations (reader and optional filter(s)). The filter(s) receive all items in one go.")
+        parser.add_argument("-A", "--annotations_flow_format", choices=PIPELINE_FORMATS, default=PIPELINE_FORMAT_CMDLINE, help="The format of the annotations pipeline.")
+        parser.add_argument("-P", "--predictions_flow_format", choices=PIPELINE_FORMATS, default=PIPELINE_FORMAT_CMDLINE, help="The format of the predictions pipeline(s).")
+        parser.add_argument("-j", "--parallel", action="store_true", help="Whether to execute the annotations and predictions sub-flows concurrently in separate threads.")
+        parser.add_argument("--labels_only", action="store_true", help="Whether to only keep the image names and annotations, discarding the image data; readers that support it are switched into annotations-only mode.")
+        parser.add_argument("--cache_dir", type=str, default=None, help="The directory for caching the annotations (without image data) across runs; the cache is keyed by the annotations sub-flow and the modification time/size of its source files.", required=False)
+        parser.add_argument("--cache_max_size", type=float, default=CACHE_MAX_SIZE, help="The maximum size of the cache in MB; the least recently used annotations get evicted.", required=False)
+        parser.add_argument("--cache_invalidate", action="store_true", help="Whether to discard the cached annotations of the sub-flow and re-read them.")
+        parser.add_argument("--cache_hash", action="store_true", help="Whether to fingerprint the source files of the annotations via their content rather than modification time and size.")
+        parser.add_argument("-M", "--match_strategy", choices=MATCH_STRATEGIES, default=MATCH_AUTO, help=self._match_strategy_help(), required=False)
+        parser.add_argument("--strip_directory", action="store_true", help="Whether to remove any directories from the image names before matching.")
+        parser.add_argument("--strip_extension", action="store_true", help="Whether to remove the extension from the image names before matching, e.g., for matching 'img.jpg' with 'img.png'.")
+        parser.add_argument("--ignore_case", action="store_true", help="Whether to match the image names case-insensitively.")
+        parser.add_argument("--unmatched", choices=UNMATCHED_REPORTS, default=UNMATCHED_COUNT, help="How to report the images that have no counterpart: only their number or also their names.", required=False)
+        parser.add_argument("--shard", type=str, default=None, help="The shard of the images to evaluate, in the form 'i/N' (1-based); images get assigned to the shards via a stable hash of their name, allowing the evaluation to be split across processes or machines and the saved states to be merged afterwards.", required=False)
+        return parser
+
+    def _apply_args(self, ns: argparse.Namespace):
+        """
+        Initializes the object with the arguments of the parsed namespace.
+
+        :param ns: the parsed arguments
+        :type ns: argparse.Namespace
+        """
+        super()._apply_args(ns)
+        self.annotations_flow = ns.annotations_flow
+        self.annotations_flow_format = ns.annotations_flow_format
+        self.predictions_flow_format = ns.predictions_flow_format
+        self.parallel = ns.parallel
+        self.labels_only = ns.labels_only
+        self.cache_dir = ns.cache_dir
+        self.cache_max_size = ns.cache_max_size
+        self.cache_invalidate = ns.cache_invalidate
+        self.cache_hash = ns.cache_hash
+        self.shard = ns.shard
+        self.match_strategy = ns.match_strategy
+        self.strip_directory = ns.strip_directory
+        self.strip_extension = ns.strip_extension
+        self.ignore_case = ns.ignore_case
+        self.unmatched = ns.unmatched
+
+    def _parse_sub_flow(self, flow: str, flow_format: str) -> List[Plugin]:
+        """
+        Parses the command-line and returns the list of plugins it represents.
+        Raises an exception in case of an invalid sub-flow.
+
+        :param flow: the flow to parse
+        :type flow: str
+        :param flow_format: the format of the flow
+        :type flow_format: str
+        :return: the list of plugins
+        :rtype: list
+        """
+        from seppl import args_to_objects
+
+        # split command-line into valid plugin subsets
+        valid = dict()
+        valid.update(available_readers())
+        valid.update(available_filters())
+        pipeline = load_pipeline(flow, flow_format, logger=self.logger())
+        args = split_args(pipeline, list(valid.keys()))
+        return args_to_objects(args, valid, allow_global_options=False)
+
+    def _initialize_sub_flow(self, sub_flow: List[Plugin]) -> Tuple[Optional[Reader], Optional[Filter]]:
+        """
+        Initializes the sub-flow.
+        
+        :param sub_flow: the sub-flow plugins to initialize
+        :type sub_flow: list 
+        :return: the tuple of reader/filter
+        :rtype: tuple
+        """
+        _reader = None
+        _filter = None
+        if len(sub_flow) > 0:
+            filters = []
+            for plugin in sub_flow:
+                if isinstance(plugin, Reader):
+                    if len(filters) > 0:
+                        raise Exception("Reader must be first plugin in sub-flow!")
+                    _reader = plugin
+                if isinstance(plugin, BatchFilter):
+                    filters.append(plugin)
+            if len(filters) == 1:
+                _filter = filters[0]
+            elif len(filters) > 1:
+                _filter = MultiFilter(filters=filters)
+
+        if _reader is not None:
+            _reader.session = self.session
+            if self.labels_only and isinstance(_reader, AnnotationsOnlyReader):
+                _reader.annotations_only = True
+            if isinstance(_reader, Initializable):
+                init_initializable(_reader, "writer")
+        if _filter is not None:
+            _filter.session = self.session
+            if isinstance(_filter, Initializable):
+                init_initializable(_filter, "filter")
+                
+        return _reader, _filter
+
+    def initialize(self):
+        """
+        Initializes the processing, e.g., for opening files or databases.
+        """
+        super().initialize()
+
+        self._common_names = set()
+
+        if self.parallel is None:
+            self.parallel = False
+        if self.labels_only is None:
+            self.labels_only = False
+        self._shard = None if self.shard is None else parse_shard(self.shard)
+        if self.match_strategy is None:
+            self.match_strategy = MATCH_AUTO
+        if self.strip_directory is None:
+            self.strip_directory = False
+        if self.strip_extension is None:
+            self.strip_extension = False
+        if self.ignore_case is None:
+            self.ignore_case = False
+        if self.unmatched is None:
+            self.unmatched = UNMATCHED_COUNT
+        if self.unmatched not in UNMATCHED_REPORTS:
+            raise Exception("Unsupported report of unmatched images: %s" % self.unmatched)
+        self._matcher = PairMatcher(strategy=self.match_strategy, strip_directory=self.strip_directory,
+                                    strip_extension=self.strip_extension, ignore_case=self.ignore_case,
+                                    report_names=self.unmatched == UNMATCHED_LIST)
+
+        if self.annotations_flow is None:
+            raise Exception("No annotations sub-flow specified!")
+        if self.annotations_flow_format is None:
+            self.annotations_flow_format = PIPELINE_FORMAT_CMDLINE
+        # the plugins of unchanged sub-flows get re-used when initializing again (e.g., in idc-metrics-server)
+        key = (self.annotations_flow, self.annotations_flow_format)
+        if (self._annotations_subflow is None) or (self._annotations_subflow_key != key):
+            self._annotations_subflow = self._parse_sub_flow(self.annotations_flow, self.annotations_flow_format)
+            self._annotations_subflow_key = key
+        self._annotations_reader, self._annotations_filter = self._initialize_sub_flow(self._annotations_subflow)
+        if self._annotations_reader is None:
+            raise Exception("No annotations reader specified!")
+        self._initialize_cache()
+        if self.predictions_flow_format is None:
+            self.predictions_flow_format = PIPELINE_FORMAT_CMDLINE
+
+    def _source_files(self, reader: Reader) -> List[str]:
+        """
+        Determines the source files of the reader from its input paths and input lists.
+
+        :param reader: the reader to get the files for
+        :type reader: Reader
+        :return: the files, empty if none could be determined
+        :rtype: list
+        """
+        paths = []
+        for attr in ["source", "source_list"]:
+            value = getattr(reader, attr, None)
+            if value is None:
+                continue
+            if isinstance(value, str):
+                value = [value]
+            paths.extend(expand_variables(x) for x in value)
+        files = expand_source_files(paths)
+        lists = getattr(reader, "source_list", None)
+        if lists is not None:
+            if isinstance(lists, str):
+                lists = [lists]
+            # the files referenced by the input lists
+            for path in expand_source_files([expand_variables(x) for x in lists]):
+                with open(path, "r") as fp:
+                    files.extend(expand_source_files([expand_variables(x.strip()) for x in fp.readlines() if len(x.strip()) > 0]))
+        return sorted(set(files))
+
+    def _initialize_cache(self):
+        """
+        Sets up the cache for the annotations, if a cache directory was specified.
+        """
+        self._cache = None
+        self._cache_key = None
+        if self.cache_dir is None:
+            return
+        if self.cache_max_size is None:
+            self.cache_max_size = CACHE_MAX_SIZE
+        if self.cache_invalidate is None:
+            self.cache_invalidate = False
+        if self.cache_hash is None:
+            self.cache_hash = False
+        files = self._source_files(self._annotations_reader)
+        if len(files) == 0:
+            self.logger().warning("Cannot determine the source files of the annotations reader, caching disabled!")
+            return
+        flow = load_pipeline(self.annotations_flow, self.annotations_flow_format, logger=self.logger())
+        self._cache = AnnotationCache(self.cache_dir, max_size=self.cache_max_size)
+        self._cache_key = cache_key(list(flow), files, hash_contents=self.cache_hash)
+        self.logger().info("Annotations cache key: %s" % self._cache_key)
+        if self.cache_invalidate and self._cache.invalidate(self._cache_key):
+            self.logger().info("Invalidated cached annotations")
+
+    def _cached_annotations(self) -> Optional[List[ImageData]]:
+        """
+        Returns the cached annotations.
+
+        :return: the annotations, None if not cached
+        :rtype: list
+        """
+        if self._cache is None:
+            return None
+        result = self._cache.load(self._cache_key)
+        if result is not None:
+            self.logger().info("Using %d cached annotations" % len(result))
+        return result
+
+    def _cache_annotations(self, items: List[ImageData]):
+        """
+        Stores the annotations in the cache, if enabled.
+
+        :param items: the annotations to store
+        :type items: list
+        """
+        if self._cache is None:
+            return
+        try:
+            self._cache.store(self._cache_key, items)
+            self.logger().info("Cached %d annotations" % len(items))
+        except:
+            self.logger().exception("Failed to cache annotations!")
+
+    def _read_annotations(self) -> List[ImageData]:
+        """
+        Reads all the annotations, from the cache if available.
+
+        :return: the annotations
+        :rtype: list
+        """
+        result = self._cached_annotations()
+        if result is None:
+            result = self._read_sub_flow(self._annotations_reader, self._annotations_filter)
+            self._cache_annotations(result)
+        return result
+
+    def _iterate_annotations(self) -> Iterable[ImageData]:
+        """
+        Returns the annotations one by one, from the cache if available.
+        The cache gets read and written in chunks, keeping the memory bounded.
+
+        :return: the annotations
+        :rtype: Iterable
+        """
+        if self._cache is not None:
+            cached = self._cache.iterate(self._cache_key)
+            if cached is not None:
+                self.logger().info("Using cached annotations")
+                yield from cached
+                return
+        writer = None
+        if self._cache is not None:
+            try:
+                writer = self._cache.writer(self._cache_key)
+            except:
+                self.logger().exception("Failed to cache annotations!")
+        try:
+            for item in self._iterate_sub_flow(self._annotations_reader, self._annotations_filter):
+                if writer is not None:
+                    try:
+                        writer.append(item)
+                    except:
+                        self.logger().exception("Failed to cache annotations!")
+                        writer.abort()
+                        writer = None
+                yield item
+            # only complete sets of annotations get cached
+            if writer is not None:
+                try:
+                    writer.close()
+                    self.logger().info("Cached %d annotations" % writer.count)
+                except:
+                    self.logger().exception("Failed to cache annotations!")
+                writer = None
+        finally:
+            if writer is not None:
+                writer.abort()
+
+    def _in_shard(self, image_name: str) -> bool:
+        """
+        Checks whether the image belongs to the shard to evaluate.
+
+        :param image_name: the name of the image
+        :type image_name: str
+        :return: True if to evaluate
+        :rtype: bool
+        """
+        if self._shard is None:
+            return True
+        # annotation and prediction of an image must end up in the same shard
+        return shard_of(self._matcher.key(image_name), self._shard[1]) == self._shard[0]
+
+    def _check_pair(self, pair: ImagePair):
+        """
+        Raises an exception if annotation and prediction of the pair differ in type.
+
+        :param pair: the pair to check
+        :type pair: ImagePair
+        """
+        if type(pair.annotation) is not type(pair.prediction):
+            raise Exception("Annotation and prediction differ in type: %s != %s"
+                            % (str(type(pair.annotation)), str(type(pair.prediction))))
+
+    def _create_pair(self, image_name: str, annotation: ImageData, prediction: ImageData) -> ImagePair:
+        """
+        Creates a pair from the annotation and prediction.
+        Raises an exception if the two differ in type.
+
+        :param image_name: the name of the image
+        :type image_name: str
+        :param annotation: the annotation
+        :type annotation: ImageData
+        :param prediction: the prediction
+        :type prediction: ImageData
+        :return: the generated pair
+        :rtype: ImagePair
+        """
+        result = ImagePair(image_name=image_name, annotation=annotation, prediction=prediction)
+        self._check_pair(result)
+        return result
+
+    def _strip_item(self, item: ImageData) -> ImageData:
+        """
+        Returns a lightweight copy of the item when in labels-only mode, which only
+        retains name, annotation and meta-data (and the image size if required
+        by the annotations). Otherwise the item is returned as is.
+
+        :param item: the item to strip
+        :type item: ImageData
+        :return: the (stripped) item
+        :rtype: ImageData
+        """
+        if not self.labels_only:
+            return item
+        if isinstance(item, ImageClassificationData):
+            image_size = None
+        else:
+            image_size = item.image_size
+        return type(item)(image_name=item.image_name, image_size=image_size,
+                          metadata=item.get_metadata(), annotation=item.annotation)
+
+    def _read_sub_flow(self, reader: Reader, flt: Optional[Filter]) -> List[ImageData]:
+        """
+        Reads all the data from the sub-flow, applying the filter to all the items in one go.
+
+        :param reader: the reader of the sub-flow
+        :type reader: Reader
+        :param flt: the optional filter of the sub-flow
+        :type flt: Filter
+        :return: the items
+        :rtype: list
+        """
+        result = []
+        while not reader.has_finished():
+            for item in reader.read():
+                if item is not None:
+                    if flt is None:
+                        item = self._strip_item(item)
+                    result.append(item)
+        if flt is not None:
+            result = [self._strip_item(x) for x in make_list(flt.process(result)) if x is not None]
+        return result
+
+    def _iterate_sub_flow(self, reader: Reader, flt: Optional[Filter]) -> Iterable[ImageData]:
+        """
+        Reads the data from the sub-flow and returns the (filtered) items one by one.
+        Unlike _read_sub_flow, the filter gets applied to each item individually.
+
+        :param reader: the reader of the sub-flow
+        :type reader: Reader
+        :param flt: the optional filter of the sub-flow
+        :type flt: Filter
+        :return: the items
+        :rtype: Iterable
+        """
+        while not reader.has_finished():
+            for item in reader.read():
+                if item is None:
+                    continue
+                if flt is None:
+                    yield self._strip_item(item)
+                    continue
+                for filtered in make_list(flt.process(item)):
+                    if filtered is not None:
+                        yield self._strip_item(filtered)
+
+    def _report_match(self, result: MatchResult, num_pairs: int):
+        """
+        Logs the outcome of the matching.
+
+        :param result: the result to report
+        :type result: MatchResult
+        :param num_pairs: the number of pairs that were generated
+        :type num_pairs: int
+        """
+        self.logger().info("# pairs: %d" % num_pairs)
+        self.logger().info("# unmatched annotations: %d" % result.num_unmatched_annotations)
+        self.logger().info("# unmatched predictions: %d" % result.num_unmatched_predictions)
+        if result.num_duplicate_annotations > 0:
+            self.logger().warning("# duplicate annotations (ignored): %d" % result.num_duplicate_annotations)
+        if result.num_duplicate_predictions > 0:
+            self.logger().warning("# duplicate predictions (ignored): %d" % result.num_duplicate_predictions)
+        if result.unmatched_annotations is not None:
+            for name in result.unmatched_annotations:
+                self.logger().info("unmatched annotation: %s" % name)
+        if result.unmatched_predictions is not None:
+            for name in result.unmatched_predictions:
+                self.logger().info("unmatched prediction: %s" % name)
+
+    def has_finished(self) -> bool:
+        """
+        Returns whether reading has finished.
+
+        :return: True if finished
+        :rtype: bool
+        """
+        return True
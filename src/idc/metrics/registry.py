@@ -10,10 +10,42 @@ def available_imgcls_statistics() -> Dict[str, Plugin]:
     return REGISTRY.plugins("idc.metrics.statistic.imgcls.ClassificationStatistic")
 
 
+def available_objdet_statistics() -> Dict[str, Plugin]:
+    """
+    Returns all object detection statistics plugins.
+    """
+    return REGISTRY.plugins("idc.metrics.statistic.objdet.ObjectDetectionStatistic")
+
+
+def available_imgseg_statistics() -> Dict[str, Plugin]:
+    """
+    Returns all image segmentation statistics plugins.
+    """
+    return REGISTRY.plugins("idc.metrics.statistic.imgseg.SegmentationStatistic")
+
+
+def available_depth_statistics() -> Dict[str, Plugin]:
+    """
+    Returns all depth estimation statistics plugins.
+    """
+    return REGISTRY.plugins("idc.metrics.statistic.depth.DepthStatistic")
+
+
+def available_image_statistics() -> Dict[str, Plugin]:
+    """
+    Returns all per-image statistics plugins.
+    """
+    return REGISTRY.plugins("idc.metrics.statistic.ImageStatisticFilter")
+
+
 def available_statistics() -> Dict[str, Plugin]:
     """
-    Returns all image classification statistics plugins.
+    Returns all statistics plugins.
     """
     result = dict()
     result.update(available_imgcls_statistics())
+    result.update(available_objdet_statistics())
+    result.update(available_imgseg_statistics())
+    result.update(available_depth_statistics())
+    result.update(available_image_statistics())
     return result
@@ -1,2 +1,4 @@
-from ._statistic import DatasetStatistic, DatasetStatisticList, DatasetStatisticFilter
+from ._statistic import DatasetStatistic, DatasetStatisticList, DatasetStatisticFilter, to_statistic_value
 from ._statistic import ImageStatistic, ImageStatisticList, ImageStatisticFilter
+from ._statistic import StatisticTable, DatasetStatisticTable, ImageStatisticTable
+from ._profile import profile_statistics
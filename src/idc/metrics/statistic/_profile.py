@@ -0,0 +1,25 @@
+from idc.metrics.api import PROFILE_PREFIX, Profiler, active_profiler
+from ._statistic import DatasetStatistic, DatasetStatisticList
+
+
+def profile_statistics(profiler: Profiler = None) -> DatasetStatisticList:
+    """
+    Turns the measurements of the profiler into statistics, named
+    "profile/STAGE/MEASURE" with MEASURE being one of calls, seconds, items,
+    items_per_second and peak_rss_mb (the latter two only if available).
+
+    :param profiler: the profiler to use, uses the active one if None
+    :type profiler: Profiler
+    :return: the statistics, empty if profiling is disabled
+    :rtype: DatasetStatisticList
+    """
+    if profiler is None:
+        profiler = active_profiler()
+    result = DatasetStatisticList()
+    if profiler is None:
+        return result
+    for stage in profiler.stages():
+        for key, value in profiler.entry(stage).to_dict().items():
+            if value is not None:
+                result.append(DatasetStatistic(statistic="%s/%s/%s" % (PROFILE_PREFIX, stage, key), value=float(value)))
+    return result
@@ -1,11 +1,29 @@
 import abc
 from dataclasses import dataclass
-from typing import List, Any
+from typing import List, Any, Callable, Dict
+
+import numpy as np
 
 from seppl.io import BatchFilter
+from kasperl.api import make_list
 from idc.metrics.api import ImagePair, ImagePairList
 
 
+def to_statistic_value(value: Any) -> Any:
+    """
+    Turns the calculated value (tensor, array or scalar) into a float or,
+    in case of multiple values (e.g., per class), into a list of floats.
+
+    :param value: the value to convert
+    :return: the converted value
+    """
+    if hasattr(value, "tolist"):
+        value = value.tolist()
+    if isinstance(value, list):
+        return [float(x) for x in value]
+    return float(value)
+
+
 @dataclass
 class DatasetStatistic:
     """
@@ -32,16 +50,17 @@ class DatasetStatisticList(List[DatasetStatistic]):
         super().append(item)
 
     def extend(self, iterable):
-        for item in iterable:
+        items = list(iterable)
+        for item in items:
             self._check_type(item)
-        super().extend(iterable)
+        super().extend(items)
 
     def insert(self, index, object):
         self._check_type(object)
         super().insert(index, object)
 
     def __str__(self):
-        return str(self)
+        return "\n".join(str(x) for x in self)
 
 
 @dataclass
@@ -71,16 +90,366 @@ class ImageStatisticList(List[ImageStatistic]):
         super().append(item)
 
     def extend(self, iterable):
-        for item in iterable:
+        items = list(iterable)
+        for item in items:
             self._check_type(item)
-        super().extend(iterable)
+        super().extend(items)
 
     def insert(self, index, object):
         self._check_type(object)
         super().insert(index, object)
 
     def __str__(self):
-        return str(self)
+        return "\n".join(str(x) for x in self)
+
+
+class StatisticTable(abc.ABC):
+    """
+    Ancestor for columnar containers of statistics (struct of arrays). Names get
+    interned, i.e., stored only once, the rows refer to them via their IDs.
+    The columns get appended in chunks, which get merged lazily when accessed.
+    """
+
+    def __init__(self):
+        """
+        Initializes the table.
+        """
+        self.statistic_names = []
+        self._statistic_index = dict()
+        self._chunks = dict()
+        for column in self.column_types():
+            self._chunks[column] = []
+
+    def column_types(self) -> Dict[str, Any]:
+        """
+        Returns the numeric columns and their numpy types.
+
+        :return: the column name/type mapping
+        :rtype: dict
+        """
+        raise NotImplementedError()
+
+    def statistic_id(self, statistic: str) -> int:
+        """
+        Returns the ID for the statistic name, adding it if necessary.
+
+        :param statistic: the statistic name
+        :type statistic: str
+        :return: the ID
+        :rtype: int
+        """
+        result = self._statistic_index.get(statistic)
+        if result is None:
+            result = len(self.statistic_names)
+            self._statistic_index[statistic] = result
+            self.statistic_names.append(statistic)
+        return result
+
+    def _append(self, **columns):
+        """
+        Appends a chunk of rows.
+
+        :param columns: the arrays for all the columns, same length
+        """
+        types = self.column_types()
+        for column in types:
+            self._chunks[column].append(np.asarray(columns[column], dtype=types[column]))
+
+    def column(self, name: str) -> np.ndarray:
+        """
+        Returns the specified numeric column.
+
+        :param name: the name of the column
+        :type name: str
+        :return: the column
+        :rtype: np.ndarray
+        """
+        chunks = self._chunks[name]
+        if len(chunks) == 0:
+            return np.zeros(0, dtype=self.column_types()[name])
+        if len(chunks) > 1:
+            chunks[:] = [np.concatenate(chunks)]
+        return chunks[0]
+
+    @property
+    def statistic_ids(self) -> np.ndarray:
+        """
+        Returns the statistic ID column.
+
+        :return: the IDs
+        :rtype: np.ndarray
+        """
+        return self.column("statistic_id")
+
+    @property
+    def values(self) -> np.ndarray:
+        """
+        Returns the value column.
+
+        :return: the values
+        :rtype: np.ndarray
+        """
+        return self.column("value")
+
+    def _remap(self, names: List[str], intern: Callable) -> np.ndarray:
+        """
+        Determines the IDs in this table for the names of another table.
+
+        :param names: the names of the other table
+        :type names: list
+        :param intern: the method for obtaining the ID of a name
+        :type intern: callable
+        :return: the lookup array (other ID -> ID)
+        :rtype: np.ndarray
+        """
+        return np.array([intern(x) for x in names], dtype=np.int32)
+
+    def extend(self, table: 'StatisticTable'):
+        """
+        Appends the rows of the other table.
+
+        :param table: the table to append
+        :type table: StatisticTable
+        """
+        raise NotImplementedError()
+
+    def __len__(self):
+        return sum(len(x) for x in self._chunks["value"])
+
+    def to_columns(self) -> Dict[str, np.ndarray]:
+        """
+        Returns the table as columns, with the names resolved.
+
+        :return: the column name/array mapping
+        :rtype: dict
+        """
+        raise NotImplementedError()
+
+
+class DatasetStatisticTable(StatisticTable):
+    """
+    Columnar container for dataset statistics. Each row consists of the statistic ID,
+    the index of the value and the value. Multiple values (e.g., per class) get
+    stored as separate rows with increasing index, single values have index -1.
+    """
+
+    def column_types(self) -> Dict[str, Any]:
+        """
+        Returns the numeric columns and their numpy types.
+
+        :return: the column name/type mapping
+        :rtype: dict
+        """
+        return {"statistic_id": np.int32, "index": np.int32, "value": np.float64}
+
+    def add(self, statistic: str, value: Any):
+        """
+        Adds the value(s) of the statistic.
+
+        :param statistic: the name of the statistic
+        :type statistic: str
+        :param value: the single value or list of values
+        """
+        if isinstance(value, list):
+            index = np.arange(len(value))
+        else:
+            index = np.full(1, -1)
+            value = [value]
+        self._append(statistic_id=np.full(len(value), self.statistic_id(statistic)), index=index, value=value)
+
+    @property
+    def indices(self) -> np.ndarray:
+        """
+        Returns the index column.
+
+        :return: the indices
+        :rtype: np.ndarray
+        """
+        return self.column("index")
+
+    def extend(self, table: 'DatasetStatisticTable'):
+        """
+        Appends the rows of the other table.
+
+        :param table: the table to append
+        :type table: DatasetStatisticTable
+        """
+        if len(table) == 0:
+            return
+        statistics = self._remap(table.statistic_names, self.statistic_id)
+        self._append(statistic_id=statistics[table.statistic_ids], index=table.indices, value=table.values)
+
+    @classmethod
+    def from_list(cls, statistics: List[DatasetStatistic]) -> 'DatasetStatisticTable':
+        """
+        Creates a table from the statistics.
+
+        :param statistics: the statistics to convert
+        :type statistics: list
+        :return: the table
+        :rtype: DatasetStatisticTable
+        """
+        result = cls()
+        for statistic in statistics:
+            result.add(statistic.statistic, statistic.value)
+        return result
+
+    def to_list(self) -> DatasetStatisticList:
+        """
+        Turns the table into a list of DatasetStatistic objects.
+
+        :return: the list
+        :rtype: DatasetStatisticList
+        """
+        result = DatasetStatisticList()
+        for statistic_id, index, value in zip(self.statistic_ids.tolist(), self.indices.tolist(), self.values.tolist()):
+            name = self.statistic_names[statistic_id]
+            if index > 0 and (len(result) > 0) and (result[-1].statistic == name) and isinstance(result[-1].value, list):
+                result[-1].value.append(value)
+            else:
+                result.append(DatasetStatistic(statistic=name, value=value if index < 0 else [value]))
+        return result
+
+    def to_columns(self) -> Dict[str, np.ndarray]:
+        """
+        Returns the table as columns, with the names resolved.
+
+        :return: the column name/array mapping
+        :rtype: dict
+        """
+        return {
+            "statistic": np.array(self.statistic_names, dtype=object)[self.statistic_ids],
+            "index": self.indices,
+            "value": self.values,
+        }
+
+    def __str__(self):
+        return "%d statistics, %d values" % (len(self.statistic_names), len(self))
+
+
+class ImageStatisticTable(StatisticTable):
+    """
+    Columnar container for per-image statistics. Image and statistic names get
+    stored only once, each row consists of the image ID, the statistic ID and the value.
+    """
+
+    def __init__(self):
+        """
+        Initializes the table.
+        """
+        super().__init__()
+        self.image_names = []
+        self._image_index = dict()
+
+    def column_types(self) -> Dict[str, Any]:
+        """
+        Returns the numeric columns and their numpy types.
+
+        :return: the column name/type mapping
+        :rtype: dict
+        """
+        return {"image_id": np.int32, "statistic_id": np.int32, "value": np.float64}
+
+    def image_id(self, image_name: str) -> int:
+        """
+        Returns the ID for the image name, adding it if necessary.
+
+        :param image_name: the image name
+        :type image_name: str
+        :return: the ID
+        :rtype: int
+        """
+        result = self._image_index.get(image_name)
+        if result is None:
+            result = len(self.image_names)
+            self._image_index[image_name] = result
+            self.image_names.append(image_name)
+        return result
+
+    def add(self, statistic: str, image_names: List[str], values: np.ndarray):
+        """
+        Adds the values of a statistic for the specified images.
+
+        :param statistic: the name of the statistic
+        :type statistic: str
+        :param image_names: the names of the images
+        :type image_names: list
+        :param values: the values, one per image
+        :type values: np.ndarray
+        """
+        if len(image_names) != len(values):
+            raise Exception("Number of image names and values differ: %d != %d" % (len(image_names), len(values)))
+        self._append(image_id=[self.image_id(x) for x in image_names],
+                     statistic_id=np.full(len(values), self.statistic_id(statistic)),
+                     value=values)
+
+    @property
+    def image_ids(self) -> np.ndarray:
+        """
+        Returns the image ID column.
+
+        :return: the IDs
+        :rtype: np.ndarray
+        """
+        return self.column("image_id")
+
+    def extend(self, table: 'ImageStatisticTable'):
+        """
+        Appends the rows of the other table.
+
+        :param table: the table to append
+        :type table: ImageStatisticTable
+        """
+        if len(table) == 0:
+            return
+        images = self._remap(table.image_names, self.image_id)
+        statistics = self._remap(table.statistic_names, self.statistic_id)
+        self._append(image_id=images[table.image_ids], statistic_id=statistics[table.statistic_ids], value=table.values)
+
+    @classmethod
+    def from_list(cls, statistics: List[ImageStatistic]) -> 'ImageStatisticTable':
+        """
+        Creates a table from the statistics.
+
+        :param statistics: the statistics to convert
+        :type statistics: list
+        :return: the table
+        :rtype: ImageStatisticTable
+        """
+        result = cls()
+        if len(statistics) > 0:
+            result._append(image_id=[result.image_id(x.image_name) for x in statistics],
+                           statistic_id=[result.statistic_id(x.statistic) for x in statistics],
+                           value=[x.value for x in statistics])
+        return result
+
+    def to_list(self) -> ImageStatisticList:
+        """
+        Turns the table into a list of ImageStatistic objects.
+
+        :return: the list
+        :rtype: ImageStatisticList
+        """
+        result = ImageStatisticList()
+        for image_id, statistic_id, value in zip(self.image_ids.tolist(), self.statistic_ids.tolist(), self.values.tolist()):
+            result.append(ImageStatistic(image_name=self.image_names[image_id], statistic=self.statistic_names[statistic_id], value=value))
+        return result
+
+    def to_columns(self) -> Dict[str, np.ndarray]:
+        """
+        Returns the table as columns, with the names resolved.
+
+        :return: the column name/array mapping
+        :rtype: dict
+        """
+        return {
+            "image": np.array(self.image_names, dtype=object)[self.image_ids],
+            "statistic": np.array(self.statistic_names, dtype=object)[self.statistic_ids],
+            "value": self.values,
+        }
+
+    def __str__(self):
+        return "%d images, %d statistics, %d values" % (len(self.image_names), len(self.statistic_names), len(self))
 
 
 class DatasetStatisticFilter(BatchFilter, abc.ABC):
@@ -120,7 +489,9 @@ class DatasetStatisticFilter(BatchFilter, abc.ABC):
 
 class ImageStatisticFilter(BatchFilter, abc.ABC):
     """
-    Base class for per-image statistics.
+    Base class for per-image statistics. The values get calculated for batches of
+    pairs at a time: the pairs get turned into a picklable payload, which a
+    module-level function evaluates (potentially in a worker process).
     """
 
     def accepts(self) -> List:
@@ -141,6 +512,56 @@ class ImageStatisticFilter(BatchFilter, abc.ABC):
         """
         return [ImageStatistic]
 
+    def _statistic_name(self) -> str:
+        """
+        Returns the name for the statistic in the output.
+
+        :return: the name
+        :rtype: str
+        """
+        raise NotImplementedError()
+
+    def prepare_batch(self, pairs: ImagePairList) -> Any:
+        """
+        Turns the pairs into the payload for the batch function, i.e., the tuple
+        of positional arguments.
+
+        :param pairs: the pairs to prepare
+        :type pairs: ImagePairList
+        :return: the (picklable) payload
+        :rtype: tuple
+        """
+        raise NotImplementedError()
+
+    def batch_function(self) -> Callable:
+        """
+        Returns the module-level function that turns the payload into the values (one per pair).
+
+        :return: the function
+        :rtype: callable
+        """
+        raise NotImplementedError()
+
+    def batch_arguments(self) -> Dict[str, Any]:
+        """
+        Returns additional keyword arguments for the batch function.
+
+        :return: the arguments
+        :rtype: dict
+        """
+        return dict()
+
+    def calculate_batch(self, pairs: ImagePairList) -> np.ndarray:
+        """
+        Calculates the statistic for each of the pairs.
+
+        :param pairs: the pairs to calculate the statistic for
+        :type pairs: ImagePairList
+        :return: the values, one per pair (NaN if not available)
+        :rtype: np.ndarray
+        """
+        return self.batch_function()(*self.prepare_batch(pairs), **self.batch_arguments())
+
     def calculate(self, anns, preds) -> ImageStatistic:
         """
         Calculates the statistic from the tensors with annotations and predictions.
@@ -151,3 +572,26 @@ class ImageStatisticFilter(BatchFilter, abc.ABC):
         :rtype: ImageStatistic
         """
         raise NotImplementedError()
+
+    def _requires_list_input(self) -> bool:
+        """
+        Returns whether lists are expected as input for the _process method.
+
+        :return: True if list inputs are expected by the filter
+        :rtype: bool
+        """
+        return True
+
+    def _do_process(self, data):
+        """
+        Processes the data record(s).
+
+        :param data: the record(s) to process
+        :return: the statistics
+        """
+        pairs = make_list(data)
+        values = self.calculate_batch(pairs)
+        result = ImageStatisticList()
+        for pair, value in zip(pairs, values.tolist()):
+            result.append(ImageStatistic(image_name=pair.image_name, statistic=self._statistic_name(), value=value))
+        return result
@@ -0,0 +1,7 @@
+from ._depth_statistic import DepthStatistic
+from ._abs_rel import AbsRel
+from ._delta import Delta
+from ._image_rmse import ImageRMSE
+from ._rmse import RMSE
+from ._rmse_log import RMSELog
+from ._sq_rel import SqRel
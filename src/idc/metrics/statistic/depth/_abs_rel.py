@@ -0,0 +1,45 @@
+from idc.metrics.api import DepthAccumulator
+from ._depth_statistic import DepthStatistic
+
+
+class AbsRel(DepthStatistic):
+    """
+    Calculates the mean absolute relative error for depth estimation data.
+    """
+
+    def name(self) -> str:
+        """
+        Returns the name of the handler, used as sub-command.
+
+        :return: the name
+        :rtype: str
+        """
+        return "abs-rel-dp"
+
+    def description(self) -> str:
+        """
+        Returns a description of the handler.
+
+        :return: the description
+        :rtype: str
+        """
+        return "Calculates the mean absolute relative error for depth estimation data."
+
+    def _statistic_name(self):
+        """
+        Returns the name for the statistic in the output.
+
+        :return: the name
+        :rtype: str
+        """
+        return "AbsRel"
+
+    def _from_accumulator(self, accumulator: DepthAccumulator):
+        """
+        Calculates the value of the statistic from the running sums.
+
+        :param accumulator: the accumulator to use
+        :type accumulator: DepthAccumulator
+        :return: the value
+        """
+        return accumulator.abs_rel()
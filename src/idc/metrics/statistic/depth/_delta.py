@@ -0,0 +1,93 @@
+import argparse
+
+from wai.logging import LOGGING_WARNING
+
+from idc.metrics.api import DepthAccumulator, DELTA_POWERS
+from ._depth_statistic import DepthStatistic
+
+
+class Delta(DepthStatistic):
+    """
+    Calculates the threshold accuracy for depth estimation data.
+    """
+
+    def __init__(self, power: int = None,
+                 logger_name: str = None, logging_level: str = LOGGING_WARNING):
+        """
+        Initializes the filter.
+
+        :param power: the power k of the threshold 1.25^k
+        :type power: int
+        :param logger_name: the name to use for the logger
+        :type logger_name: str
+        :param logging_level: the logging level to use
+        :type logging_level: str
+        """
+        super().__init__(logger_name=logger_name, logging_level=logging_level)
+        self.power = power
+
+    def name(self) -> str:
+        """
+        Returns the name of the handler, used as sub-command.
+
+        :return: the name
+        :rtype: str
+        """
+        return "delta-dp"
+
+    def description(self) -> str:
+        """
+        Returns a description of the handler.
+
+        :return: the description
+        :rtype: str
+        """
+        return "Calculates the threshold accuracy for depth estimation data, i.e., the fraction of pixels with max(gt/pred, pred/gt) < 1.25^k."
+
+    def _create_argparser(self) -> argparse.ArgumentParser:
+        """
+        Creates an argument parser. Derived classes need to fill in the options.
+
+        :return: the parser
+        :rtype: argparse.ArgumentParser
+        """
+        parser = super()._create_argparser()
+        parser.add_argument("-k", "--power", type=int, choices=DELTA_POWERS, help="The power k of the threshold 1.25^k.", default=1, required=False)
+        return parser
+
+    def _apply_args(self, ns: argparse.Namespace):
+        """
+        Initializes the object with the arguments of the parsed namespace.
+
+        :param ns: the parsed arguments
+        :type ns: argparse.Namespace
+        """
+        super()._apply_args(ns)
+        self.power = ns.power
+
+    def initialize(self):
+        """
+        Initializes the processing, e.g., for opening files or databases.
+        """
+        super().initialize()
+        if self.power is None:
+            self.power = 1
+
+    def _statistic_name(self):
+        """
+        Returns the name for the statistic in the output.
+
+        :return: the name
+        :rtype: str
+        """
+        return "delta<1.25^%d" % self.power
+
+    def _from_accumulator(self, accumulator: DepthAccumulator):
+        """
+        Calculates the value of the statistic from the running sums.
+
+        :param accumulator: the accumulator to use
+        :type accumulator: DepthAccumulator
+        :return: the value
+        """
+        return accumulator.delta(self.power)
@@ -0,0 +1,58 @@
+import abc
+
+from idc.metrics.api import DepthAccumulator
+from kasperl.api import make_list
+from idc.metrics.statistic import DatasetStatisticFilter, DatasetStatistic, to_statistic_value
+
+
+class DepthStatistic(DatasetStatisticFilter, abc.ABC):
+    """
+    Ancestor for depth estimation statistics, which get derived from the running sums.
+    """
+
+    def _statistic_name(self):
+        """
+        Returns the name for the statistic in the output.
+
+        :return: the name
+        :rtype: str
+        """
+        raise NotImplementedError()
+
+    def _from_accumulator(self, accumulator: DepthAccumulator):
+        """
+        Calculates the value of the statistic from the running sums.
+
+        :param accumulator: the accumulator to use
+        :type accumulator: DepthAccumulator
+        :return: the value
+        """
+        raise NotImplementedError()
+
+    def calculate_from_accumulator(self, accumulator: DepthAccumulator) -> DatasetStatistic:
+        """
+        Calculates the statistic from the running sums.
+
+        :param accumulator: the accumulator to use
+        :type accumulator: DepthAccumulator
+        :return: the generated statistic
+        :rtype: DatasetStatistic
+        """
+        result = DatasetStatistic(statistic=self._statistic_name())
+        result.value = to_statistic_value(self._from_accumulator(accumulator))
+        return result
+
+    def _do_process(self, data):
+        """
+        Processes the data record(s).
+
+        :param data: the record(s) to process
+        :return: the statistic
+        """
+        accumulator = DepthAccumulator()
+        for pair in make_list(data):
+            if not accumulator.update_pair(pair):
+                self.logger().warning("No depth information, skipping: %s" % pair.image_name)
+        if accumulator.count == 0:
+            return None
+        return self.calculate_from_accumulator(accumulator)
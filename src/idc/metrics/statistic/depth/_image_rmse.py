@@ -0,0 +1,132 @@
+import argparse
+from typing import Callable, Dict, Any
+
+import numpy as np
+from wai.logging import LOGGING_WARNING
+
+from idc.metrics.api import ImagePairList, MIN_DEPTH, image_rmse
+from idc.metrics.statistic import ImageStatisticFilter
+
+
+class ImageRMSE(ImageStatisticFilter):
+    """
+    Calculates the RMSE per image for depth estimation data.
+    """
+
+    def __init__(self, min_depth: float = None, max_depth: float = None,
+                 logger_name: str = None, logging_level: str = LOGGING_WARNING):
+        """
+        Initializes the filter.
+
+        :param min_depth: the minimum valid depth in the annotations
+        :type min_depth: float
+        :param max_depth: the maximum valid depth in the annotations, no limit if None
+        :type max_depth: float
+        :param logger_name: the name to use for the logger
+        :type logger_name: str
+        :param logging_level: the logging level to use
+        :type logging_level: str
+        """
+        super().__init__(logger_name=logger_name, logging_level=logging_level)
+        self.min_depth = min_depth
+        self.max_depth = max_depth
+
+    def name(self) -> str:
+        """
+        Returns the name of the handler, used as sub-command.
+
+        :return: the name
+        :rtype: str
+        """
+        return "image-rmse-dp"
+
+    def description(self) -> str:
+        """
+        Returns a description of the handler.
+
+        :return: the description
+        :rtype: str
+        """
+        return "Calculates the root mean squared error per image for depth estimation data."
+
+    def _create_argparser(self) -> argparse.ArgumentParser:
+        """
+        Creates an argument parser. Derived classes need to fill in the options.
+
+        :return: the parser
+        :rtype: argparse.ArgumentParser
+        """
+        parser = super()._create_argparser()
+        parser.add_argument("-m", "--min_depth", type=float, default=MIN_DEPTH, help="The minimum valid depth in the annotations; predictions get clipped to the valid range.", required=False)
+        parser.add_argument("-M", "--max_depth", type=float, default=None, help="The maximum valid depth in the annotations; no limit if not specified.", required=False)
+        return parser
+
+    def _apply_args(self, ns: argparse.Namespace):
+        """
+        Initializes the object with the arguments of the parsed namespace.
+
+        :param ns: the parsed arguments
+        :type ns: argparse.Namespace
+        """
+        super()._apply_args(ns)
+        self.min_depth = ns.min_depth
+        self.max_depth = ns.max_depth
+
+    def initialize(self):
+        """
+        Initializes the processing, e.g., for opening files or databases.
+        """
+        super().initialize()
+        if self.min_depth is None:
+            self.min_depth = MIN_DEPTH
+
+    def _statistic_name(self) -> str:
+        """
+        Returns the name for the statistic in the output.
+
+        :return: the name
+        :rtype: str
+        """
+        return "RMSE"
+
+    def prepare_batch(self, pairs: ImagePairList) -> tuple:
+        """
+        Turns the pairs into the payload for the batch function, i.e., the tuple
+        of positional arguments.
+
+        :param pairs: the pairs to prepare
+        :type pairs: ImagePairList
+        :return: the (picklable) payload
+        :rtype: tuple
+        """
+        empty = np.zeros(0, dtype=np.float32)
+        gts = []
+        preds = []
+        for pair in pairs:
+            ann = pair.annotation.annotation
+            pred = pair.prediction.annotation
+            if (ann is None) or (pred is None) or (ann.data is None) or (pred.data is None):
+                gts.append(empty)
+                preds.append(empty)
+            else:
+                gts.append(ann.data)
+                preds.append(pred.data)
+        return gts, preds
+
+    def batch_function(self) -> Callable:
+        """
+        Returns the module-level function that turns the payload into the values (one per pair).
+
+        :return: the function
+        :rtype: callable
+        """
+        return image_rmse
+
+    def batch_arguments(self) -> Dict[str, Any]:
+        """
+        Returns additional keyword arguments for the batch function.
+
+        :return: the arguments
+        :rtype: dict
+        """
+        return {"min_depth": self.min_depth, "max_depth": self.max_depth}
@@ -0,0 +1,45 @@
+from idc.metrics.api import DepthAccumulator
+from ._depth_statistic import DepthStatistic
+
+
+class RMSELog(DepthStatistic):
+    """
+    Calculates the root mean squared error of the log depths for depth estimation data.
+    """
+
+    def name(self) -> str:
+        """
+        Returns the name of the handler, used as sub-command.
+
+        :return: the name
+        :rtype: str
+        """
+        return "rmse-log-dp"
+
+    def description(self) -> str:
+        """
+        Returns a description of the handler.
+
+        :return: the description
+        :rtype: str
+        """
+        return "Calculates the root mean squared error of the log depths for depth estimation data."
+
+    def _statistic_name(self):
+        """
+        Returns the name for the statistic in the output.
+
+        :return: the name
+        :rtype: str
+        """
+        return "RMSE-log"
+
+    def _from_accumulator(self, accumulator: DepthAccumulator):
+        """
+        Calculates the value of the statistic from the running sums.
+
+        :param accumulator: the accumulator to use
+        :type accumulator: DepthAccumulator
+        :return: the value
+        """
+        return accumulator.rmse_log()
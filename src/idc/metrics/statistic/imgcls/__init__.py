@@ -1,5 +1,9 @@
-from ._classification_statistic import ClassificationStatistic, ClassificationStatisticWithAverage, determine_classes, NumClassesHandler
+from ._classification_statistic import ClassificationStatistic, ClassificationStatisticWithAverage, ClassificationScoreStatistic, determine_classes, determine_scores, NumClassesHandler
+from ._classification_statistic import BACKEND_NUMPY, BACKEND_TORCH, BACKENDS
 from ._accuracy import Accuracy
+from ._auroc import AUROC
+from ._average_precision import AveragePrecision
+from ._calibration_error import CalibrationError
 from ._cohen_kappa import CohenKappa
 from ._precision import Precision
 from ._recall import Recall
@@ -3,6 +3,7 @@ from typing import List
 
 from wai.logging import LOGGING_WARNING
 
+from idc.metrics.api import accuracy_from_confusion, top_k_accuracy_from_scores
 from ._classification_statistic import ClassificationStatisticWithAverage
 
 
@@ -11,7 +12,7 @@ class Accuracy(ClassificationStatisticWithAverage):
     Calculates the accuracy for image classification data.
     """
 
-    def __init__(self, num_classes: int = None, average: str = None, top_k: int = None,
+    def __init__(self, num_classes: int = None, average: str = None, top_k: int = None, backend: str = None,
                  logger_name: str = None, logging_level: str = LOGGING_WARNING):
         """
         Initializes the filter.
@@ -22,12 +23,14 @@ class Accuracy(ClassificationStatisticWithAverage):
         :type average: str
         :param top_k: only compute the accuracy for the top K classes
         :type top_k: int
+        :param backend: the backend to use for the calculations (numpy|torch)
+        :type backend: str
         :param logger_name: the name to use for the logger
         :type logger_name: str
         :param logging_level: the logging level to use
         :type logging_level: str
         """
-        super().__init__(num_classes=num_classes, average=average, logger_name=logger_name, logging_level=logging_level)
+        super().__init__(num_classes=num_classes, average=average, backend=backend, logger_name=logger_name, logging_level=logging_level)
         self.top_k = top_k
 
     def name(self) -> str:
@@ -56,7 +59,7 @@ class Accuracy(ClassificationStatisticWithAverage):
         :rtype: argparse.ArgumentParser
         """
         parser = super()._create_argparser()
-        parser.add_argument("-k", "--top_k", type=int, help="Only take the top K classes into account.", default=1, required=False)
+        parser.add_argument("-k", "--top_k", type=int, help="Counts a pair as correct if the annotated class is among the K highest-scoring classes; K > 1 requires the per-class scores of the predictions.", default=1, required=False)
         return parser
 
     def _apply_args(self, ns: argparse.Namespace):
@@ -87,3 +90,35 @@ class Accuracy(ClassificationStatisticWithAverage):
             self._statistic = torchmetrics.Accuracy(task="multiclass", average=self.average, num_classes=self.num_classes, top_k=self.top_k)
         else:
             self._statistic = torchmetrics.Accuracy(task="multiclass", average=self.average, num_classes=self.num_classes)
+
+    def requires_scores(self) -> bool:
+        """
+        Returns whether the statistic requires the per-class scores rather than
+        just the predicted labels.
+
+        :return: True if scores required
+        :rtype: bool
+        """
+        return (self.top_k is not None) and (self.top_k > 1)
+
+    def _from_confusion_matrix(self, matrix):
+        """
+        Calculates the value of the statistic from the confusion matrix.
+
+        :param matrix: the confusion matrix (rows: annotations, columns: predictions)
+        :type matrix: np.ndarray
+        :return: the value(s)
+        """
+        return accuracy_from_confusion(matrix, average=self.average)
+
+    def _from_scores(self, anns, scores):
+        """
+        Calculates the value of the statistic from the score matrix.
+
+        :param anns: the class label indices of the annotations
+        :type anns: np.ndarray
+        :param scores: the score matrix (num_pairs, num_classes)
+        :type scores: np.ndarray
+        :return: the value(s)
+        """
+        return top_k_accuracy_from_scores(anns, scores, top_k=self.top_k, average=self.average)
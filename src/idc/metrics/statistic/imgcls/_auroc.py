@@ -0,0 +1,54 @@
+from idc.metrics.api import auroc_from_scores
+from ._classification_statistic import ClassificationScoreStatistic
+
+
+class AUROC(ClassificationScoreStatistic):
+    """
+    Calculates the area under the ROC curve for image classification data.
+    """
+
+    def name(self) -> str:
+        """
+        Returns the name of the handler, used as sub-command.
+
+        :return: the name
+        :rtype: str
+        """
+        return "auroc-ic"
+
+    def description(self) -> str:
+        """
+        Returns a description of the handler.
+
+        :return: the description
+        :rtype: str
+        """
+        return "Calculates the area under the ROC curve (one-vs-rest) for image classification data. Requires the per-class scores of the predictions; classes without annotations are excluded from the averages."
+
+    def _statistic_name(self):
+        """
+        Returns the name for the statistic in the output.
+
+        :return: the name
+        :rtype: str
+        """
+        return "AUROC"
+
+    def _initialize_statistic(self):
+        """
+        Initializes the processing, e.g., for opening files or databases.
+        """
+        import torchmetrics
+        self._statistic = torchmetrics.AUROC(task="multiclass", average=self.average, num_classes=self.num_classes)
+
+    def _from_scores(self, anns, scores):
+        """
+        Calculates the value of the statistic from the score matrix.
+
+        :param anns: the class label indices of the annotations
+        :type anns: np.ndarray
+        :param scores: the score matrix (num_pairs, num_classes)
+        :type scores: np.ndarray
+        :return: the value(s)
+        """
+        return auroc_from_scores(anns, scores, average=self.average)
@@ -0,0 +1,54 @@
+from idc.metrics.api import average_precision_from_scores
+from ._classification_statistic import ClassificationScoreStatistic
+
+
+class AveragePrecision(ClassificationScoreStatistic):
+    """
+    Calculates the average precision for image classification data.
+    """
+
+    def name(self) -> str:
+        """
+        Returns the name of the handler, used as sub-command.
+
+        :return: the name
+        :rtype: str
+        """
+        return "average-precision-ic"
+
+    def description(self) -> str:
+        """
+        Returns a description of the handler.
+
+        :return: the description
+        :rtype: str
+        """
+        return "Calculates the average precision (one-vs-rest), i.e., the area under the precision-recall curve, for image classification data. Requires the per-class scores of the predictions; classes without annotations are excluded from the averages."
+
+    def _statistic_name(self):
+        """
+        Returns the name for the statistic in the output.
+
+        :return: the name
+        :rtype: str
+        """
+        return "AP"
+
+    def _initialize_statistic(self):
+        """
+        Initializes the processing, e.g., for opening files or databases.
+        """
+        import torchmetrics
+        self._statistic = torchmetrics.AveragePrecision(task="multiclass", average=self.average, num_classes=self.num_classes)
+
+    def _from_scores(self, anns, scores):
+        """
+        Calculates the value of the statistic from the score matrix.
+
+        :param anns: the class label indices of the annotations
+        :type anns: np.ndarray
+        :param scores: the score matrix (num_pairs, num_classes)
+        :type scores: np.ndarray
+        :return: the value(s)
+        """
+        return average_precision_from_scores(anns, scores, average=self.average)
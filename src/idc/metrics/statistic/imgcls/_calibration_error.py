@@ -0,0 +1,118 @@
+import argparse
+
+from wai.logging import LOGGING_WARNING
+
+from idc.metrics.api import NUM_BINS, calibration_error_from_scores
+from ._classification_statistic import ClassificationStatistic
+
+
+class CalibrationError(ClassificationStatistic):
+    """
+    Calculates the expected calibration error for image classification data.
+    """
+
+    def __init__(self, num_classes: int = None, num_bins: int = None, backend: str = None,
+                 logger_name: str = None, logging_level: str = LOGGING_WARNING):
+        """
+        Initializes the filter.
+
+        :param num_classes: the number of classes
+        :type num_classes: int
+        :param num_bins: the number of confidence bins
+        :type num_bins: int
+        :param backend: the backend to use for the calculations (numpy|torch)
+        :type backend: str
+        :param logger_name: the name to use for the logger
+        :type logger_name: str
+        :param logging_level: the logging level to use
+        :type logging_level: str
+        """
+        super().__init__(num_classes=num_classes, backend=backend, logger_name=logger_name, logging_level=logging_level)
+        self.num_bins = num_bins
+
+    def name(self) -> str:
+        """
+        Returns the name of the handler, used as sub-command.
+
+        :return: the name
+        :rtype: str
+        """
+        return "ece-ic"
+
+    def description(self) -> str:
+        """
+        Returns a description of the handler.
+
+        :return: the description
+        :rtype: str
+        """
+        return "Calculates the expected calibration error (L1) of the highest-scoring classes for image classification data, using equal-width confidence bins. Requires the per-class scores of the predictions."
+
+    def _create_argparser(self) -> argparse.ArgumentParser:
+        """
+        Creates an argument parser. Derived classes need to fill in the options.
+
+        :return: the parser
+        :rtype: argparse.ArgumentParser
+        """
+        parser = super()._create_argparser()
+        parser.add_argument("-B", "--num_bins", type=int, help="The number of confidence bins.", default=NUM_BINS, required=False)
+        return parser
+
+    def _apply_args(self, ns: argparse.Namespace):
+        """
+        Initializes the object with the arguments of the parsed namespace.
+
+        :param ns: the parsed arguments
+        :type ns: argparse.Namespace
+        """
+        super()._apply_args(ns)
+        self.num_bins = ns.num_bins
+
+    def initialize(self):
+        """
+        Initializes the processing, e.g., for opening files or databases.
+        """
+        super().initialize()
+        if self.num_bins is None:
+            self.num_bins = NUM_BINS
+        if self.num_bins < 1:
+            raise Exception("Number of bins must be at least 1: %d" % self.num_bins)
+
+    def _statistic_name(self):
+        """
+        Returns the name for the statistic in the output.
+
+        :return: the name
+        :rtype: str
+        """
+        return "ECE"
+
+    def requires_scores(self) -> bool:
+        """
+        Returns whether the statistic requires the per-class scores rather than
+        just the predicted labels.
+
+        :return: True if scores required
+        :rtype: bool
+        """
+        return True
+
+    def _initialize_statistic(self):
+        """
+        Initializes the processing, e.g., for opening files or databases.
+        """
+        import torchmetrics
+        self._statistic = torchmetrics.CalibrationError(task="multiclass", num_classes=self.num_classes, n_bins=self.num_bins, norm="l1")
+
+    def _from_scores(self, anns, scores):
+        """
+        Calculates the value of the statistic from the score matrix.
+
+        :param anns: the class label indices of the annotations
+        :type anns: np.ndarray
+        :param scores: the score matrix (num_pairs, num_classes)
+        :type scores: np.ndarray
+        :return: the value(s)
+        """
+        return calibration_error_from_scores(anns, scores, num_bins=self.num_bins)
@@ -1,55 +1,89 @@
 import abc
 import argparse
 import logging
-from typing import List, Tuple, Optional, Dict
+from typing import List, Tuple, Optional, Dict, Any
 
+import numpy as np
 from wai.logging import LOGGING_WARNING
 
-from idc.api import ImageData
-from idc.metrics.api import ImagePairList
+from idc.metrics.api import ImagePairList, LabelEncoder, AVERAGES, AVERAGE_MICRO, AVERAGE_MACRO, AVERAGE_WEIGHTED, AVERAGE_NONE, confusion_matrix
+from idc.metrics.api import SCORES_KEY, pad_scores
+from idc.metrics.api import NULL_MEASUREMENT, active_profiler, measure
 from kasperl.api import make_list
-from idc.metrics.statistic import DatasetStatisticFilter, DatasetStatistic
+from idc.metrics.statistic import DatasetStatisticFilter, DatasetStatistic, to_statistic_value
 
+BACKEND_NUMPY = "numpy"
+BACKEND_TORCH = "torch"
+BACKENDS = [
+    BACKEND_NUMPY,
+    BACKEND_TORCH,
+]
 
-def determine_classes(data: ImagePairList, logger: logging.Logger = None) -> Tuple[Optional[ImageData], Optional[ImageData], Optional[Dict[str, int]]]:
+
+def determine_classes(data: ImagePairList, logger: logging.Logger = None, encoder: LabelEncoder = None) -> Tuple[Optional[Any], Optional[Any], Optional[Dict[str, int]]]:
     """
-    Processes the image pairs and returns the classes and the lookup.
+    Processes the image pairs and returns the encoded labels (as numpy arrays) and the lookup.
+    Without an encoder, the classes get sorted alphabetically. With an encoder,
+    the classes get indexed in the order defined by the encoder, which keeps
+    the indices stable across batches.
 
     :param data: the image pairs to use
     :type data: ImagePairList
     :param logger: optional logger instance to use
     :type logger: logging.Logger
-    :return: the tuple of: annotation classes, predictions classes and the class lookup
+    :param encoder: the encoder to use, creates a new one if None
+    :type encoder: LabelEncoder
+    :return: the tuple of: annotation label indices, prediction label indices and the class lookup
     :rtype: tuple
     """
-    from torch import tensor
-
-    classes = set()
-    for pair in make_list(data):
-        if pair.annotation.has_annotation() and pair.prediction.has_annotation():
-            classes.add(pair.annotation.annotation)
-            classes.add(pair.prediction.annotation)
-    classes = sorted(list(classes))
+    if encoder is None:
+        encoder = LabelEncoder()
+        anns, preds = encoder.encode(make_list(data))
+        anns, preds = encoder.sort_classes(anns, preds)
+    else:
+        anns, preds = encoder.encode(make_list(data))
     if logger is not None:
-        logger.info("%d classes: %s" % (len(classes), ", ".join(classes)))
-
-    if len(classes) > 0:
-        lookup = dict()
-        for i, cls in enumerate(classes):
-            lookup[cls] = i
-        anns = []
-        preds = []
-        for pair in make_list(data):
-            if pair.annotation.has_annotation() and pair.prediction.has_annotation():
-                anns.append(lookup[pair.annotation.annotation])
-                preds.append(lookup[pair.prediction.annotation])
-        anns = tensor(anns)
-        preds = tensor(preds)
-        return anns, preds, lookup
+        encoder.log(logger)
+
+    if len(anns) > 0:
+        return anns, preds, encoder.lookup()
 
     return None, None, None
 
 
+def determine_scores(data: ImagePairList, score_key: str = SCORES_KEY, logger: logging.Logger = None, encoder: LabelEncoder = None) -> Tuple[Optional[Any], Optional[Any], Optional[Any], Optional[Dict[str, int]]]:
+    """
+    Like determine_classes, but also returns the dense float32 score matrix built from
+    the per-class probabilities in the meta-data of the predictions.
+
+    :param data: the image pairs to use
+    :type data: ImagePairList
+    :param score_key: the meta-data key with the label -> probability mapping
+    :type score_key: str
+    :param logger: optional logger instance to use
+    :type logger: logging.Logger
+    :param encoder: the encoder to use, creates a new one if None
+    :type encoder: LabelEncoder
+    :return: the tuple of: annotation label indices, prediction label indices, score matrix and the class lookup
+    :rtype: tuple
+    """
+    if encoder is None:
+        encoder = LabelEncoder()
+        anns, preds, scores = encoder.encode_scores(make_list(data), score_key)
+        order = encoder.sort_order()
+        anns, preds = encoder.sort_classes(anns, preds)
+        scores = scores[:, order]
+    else:
+        anns, preds, scores = encoder.encode_scores(make_list(data), score_key)
+    if logger is not None:
+        encoder.log(logger)
+
+    if len(anns) > 0:
+        return anns, preds, scores, encoder.lookup()
+
+    return None, None, None, None
+
+
 class NumClassesHandler:
     """
     Mixin for classes that require to know the number of classes.
@@ -70,13 +104,15 @@ class ClassificationStatistic(DatasetStatisticFilter, NumClassesHandler, abc.ABC
     Ancestor for classification statistics.
     """
 
-    def __init__(self, num_classes: int = None,
+    def __init__(self, num_classes: int = None, backend: str = None,
                  logger_name: str = None, logging_level: str = LOGGING_WARNING):
         """
         Initializes the filter.
 
         :param num_classes: the number of classes
         :type num_classes: int
+        :param backend: the backend to use for the calculations (numpy|torch)
+        :type backend: str
         :param logger_name: the name to use for the logger
         :type logger_name: str
         :param logging_level: the logging level to use
@@ -84,6 +120,7 @@ class ClassificationStatistic(DatasetStatisticFilter, NumClassesHandler, abc.ABC
         """
         super().__init__(logger_name=logger_name, logging_level=logging_level)
         self.num_classes = num_classes
+        self.backend = backend
         self._statistic = None
 
     def _create_argparser(self) -> argparse.ArgumentParser:
@@ -95,6 +132,7 @@ class ClassificationStatistic(DatasetStatisticFilter, NumClassesHandler, abc.ABC
         """
         parser = super()._create_argparser()
         parser.add_argument("-n", "--num_classes", type=int, help="The number of classes in the dataset.", default=None, required=False)
+        parser.add_argument("-b", "--backend", choices=BACKENDS, help="The backend to use for the calculations; numpy avoids loading torch.", default=BACKEND_NUMPY, required=False)
         return parser
 
     def _apply_args(self, ns: argparse.Namespace):
@@ -106,6 +144,17 @@ class ClassificationStatistic(DatasetStatisticFilter, NumClassesHandler, abc.ABC
         """
         super()._apply_args(ns)
         self.num_classes = ns.num_classes
+        self.backend = ns.backend
+
+    def initialize(self):
+        """
+        Initializes the processing, e.g., for opening files or databases.
+        """
+        super().initialize()
+        if self.backend is None:
+            self.backend = BACKEND_NUMPY
+        if self.backend not in BACKENDS:
+            raise Exception("Unsupported backend: %s" % self.backend)
 
     def set_num_classes(self, num_classes: int):
         """
@@ -114,6 +163,9 @@ class ClassificationStatistic(DatasetStatisticFilter, NumClassesHandler, abc.ABC
         :param num_classes: the number of classes
         :type num_classes: int
         """
+        # the underlying statistic was set up for a different number of classes
+        if (self._statistic is not None) and (num_classes != self.num_classes):
+            self._statistic = None
         self.num_classes = num_classes
 
     def _initialize_statistic(self):
@@ -131,19 +183,169 @@ class ClassificationStatistic(DatasetStatisticFilter, NumClassesHandler, abc.ABC
         """
         raise NotImplementedError()
 
+    def _measure(self, method: str, items: int = 0):
+        """
+        Returns the context manager for measuring the method of the statistic,
+        which does nothing if profiling is disabled.
+
+        :param method: the name of the method
+        :type method: str
+        :param items: the number of pairs processed
+        :type items: int
+        :return: the context manager
+        """
+        if active_profiler() is None:
+            return NULL_MEASUREMENT
+        return measure("statistic/%s/%s" % (self._statistic_name(), method), items=items)
+
+    def _ensure_statistic(self):
+        """
+        Initializes the underlying statistic, if necessary.
+        """
+        if self._statistic is None:
+            with self._measure("initialize"):
+                self._initialize_statistic()
+
+    def _to_tensor(self, values):
+        """
+        Turns the numpy array into a tensor, other values get returned as is.
+
+        :param values: the values to convert
+        :return: the tensor
+        """
+        if isinstance(values, np.ndarray):
+            from torch import from_numpy
+            # memory-mapped arrays are read-only
+            if not values.flags.writeable:
+                values = np.array(values)
+            return from_numpy(values)
+        return values
+
     def calculate(self, anns, preds) -> DatasetStatistic:
         """
-        Calculates the statistic from the tensors with annotations and predictions.
+        Calculates the statistic from the annotations and predictions using torchmetrics.
 
-        :param anns: the tensor with the class label indices of the annotations
-        :param preds: the tensor with the class label indices of the predictions
+        :param anns: the array/tensor with the class label indices of the annotations
+        :param preds: the array/tensor with the class label indices of the predictions
         :return: the generated statistic
         :rtype: DatasetStatistic
         """
-        if self._statistic is None:
-            self._initialize_statistic()
-        result = DatasetStatistic(statistic=self._statistic_name())
-        result.value = float(self._statistic(anns, preds))
+        self._ensure_statistic()
+        with self._measure("calculate", items=len(anns)):
+            result = DatasetStatistic(statistic=self._statistic_name())
+            result.value = to_statistic_value(self._statistic(self._to_tensor(preds), self._to_tensor(anns)))
+        return result
+
+    def update(self, anns, preds):
+        """
+        Adds the annotations and predictions to the accumulated state of torchmetrics.
+
+        :param anns: the array/tensor with the class label indices of the annotations
+        :param preds: the array/tensor with the class label indices of the predictions
+        """
+        self._ensure_statistic()
+        with self._measure("update", items=len(anns)):
+            self._statistic.update(self._to_tensor(preds), self._to_tensor(anns))
+
+    def compute(self) -> DatasetStatistic:
+        """
+        Calculates the statistic from the accumulated state.
+
+        :return: the generated statistic
+        :rtype: DatasetStatistic
+        """
+        self._ensure_statistic()
+        with self._measure("compute"):
+            result = DatasetStatistic(statistic=self._statistic_name())
+            result.value = to_statistic_value(self._statistic.compute())
+        return result
+
+    def reset(self):
+        """
+        Clears the accumulated state.
+        """
+        if self._statistic is not None:
+            self._statistic.reset()
+
+    def requires_scores(self) -> bool:
+        """
+        Returns whether the statistic requires the per-class scores rather than
+        just the predicted labels.
+
+        :return: True if scores required
+        :rtype: bool
+        """
+        return False
+
+    def supports_confusion_matrix(self) -> bool:
+        """
+        Returns whether the statistic can be derived from the confusion matrix,
+        i.e., whether the numpy backend can be used.
+
+        :return: True if supported
+        :rtype: bool
+        """
+        return (self.backend != BACKEND_TORCH) and not self.requires_scores()
+
+    def supports_score_matrix(self) -> bool:
+        """
+        Returns whether the statistic can be derived from the score matrix with numpy.
+
+        :return: True if supported
+        :rtype: bool
+        """
+        return (self.backend != BACKEND_TORCH) and self.requires_scores()
+
+    def _from_confusion_matrix(self, matrix):
+        """
+        Calculates the value of the statistic from the confusion matrix.
+
+        :param matrix: the confusion matrix (rows: annotations, columns: predictions)
+        :type matrix: np.ndarray
+        :return: the value(s)
+        """
+        raise NotImplementedError()
+
+    def calculate_from_confusion_matrix(self, matrix) -> DatasetStatistic:
+        """
+        Calculates the statistic from the confusion matrix.
+
+        :param matrix: the confusion matrix (rows: annotations, columns: predictions)
+        :type matrix: np.ndarray
+        :return: the generated statistic
+        :rtype: DatasetStatistic
+        """
+        with self._measure("confusion-matrix"):
+            result = DatasetStatistic(statistic=self._statistic_name())
+            result.value = to_statistic_value(self._from_confusion_matrix(matrix))
+        return result
+
+    def _from_scores(self, anns, scores):
+        """
+        Calculates the value of the statistic from the score matrix.
+
+        :param anns: the class label indices of the annotations
+        :type anns: np.ndarray
+        :param scores: the score matrix (num_pairs, num_classes)
+        :type scores: np.ndarray
+        :return: the value(s)
+        """
+        raise NotImplementedError()
+
+    def calculate_from_scores(self, anns, scores) -> DatasetStatistic:
+        """
+        Calculates the statistic from the score matrix.
+
+        :param anns: the class label indices of the annotations
+        :type anns: np.ndarray
+        :param scores: the score matrix (num_pairs, num_classes)
+        :type scores: np.ndarray
+        :return: the generated statistic
+        :rtype: DatasetStatistic
+        """
+        with self._measure("scores", items=len(anns)):
+            result = DatasetStatistic(statistic=self._statistic_name())
+            result.value = to_statistic_value(self._from_scores(anns, scores))
         return result
 
     def _do_process(self, data):
@@ -154,9 +356,26 @@ class ClassificationStatistic(DatasetStatisticFilter, NumClassesHandler, abc.ABC
         :return: the statistic
         """
         result = None
+        if self.requires_scores():
+            anns, preds, scores, lookup = determine_scores(data)
+            if anns is not None:
+                if self.num_classes is None:
+                    self.set_num_classes(len(lookup))
+                scores = pad_scores(scores, self.num_classes)
+                if self.supports_score_matrix():
+                    result = self.calculate_from_scores(anns, scores)
+                else:
+                    result = self.calculate(anns, scores)
+            return result
+
         anns, preds, lookup = determine_classes(data)
         if (anns is not None) and (preds is not None):
-            result = self.calculate(preds, anns)
+            if self.num_classes is None:
+                self.set_num_classes(len(lookup))
+            if self.supports_confusion_matrix():
+                result = self.calculate_from_confusion_matrix(confusion_matrix(anns, preds, max(self.num_classes, len(lookup))))
+            else:
+                result = self.calculate(anns, preds)
 
         return result
 
@@ -166,7 +385,7 @@ class ClassificationStatisticWithAverage(ClassificationStatistic, abc.ABC):
     Ancestor for classification statistics that support averages.
     """
 
-    def __init__(self, num_classes: int = None, average: str = None,
+    def __init__(self, num_classes: int = None, average: str = None, backend: str = None,
                  logger_name: str = None, logging_level: str = LOGGING_WARNING):
         """
         Initializes the filter.
@@ -175,12 +394,14 @@ class ClassificationStatisticWithAverage(ClassificationStatistic, abc.ABC):
         :type num_classes: int
         :param average: the average to use
         :type average: str
+        :param backend: the backend to use for the calculations (numpy|torch)
+        :type backend: str
         :param logger_name: the name to use for the logger
         :type logger_name: str
         :param logging_level: the logging level to use
         :type logging_level: str
         """
-        super().__init__(num_classes=num_classes, logger_name=logger_name, logging_level=logging_level)
+        super().__init__(num_classes=num_classes, backend=backend, logger_name=logger_name, logging_level=logging_level)
         self.average = average
 
     def _create_argparser(self) -> argparse.ArgumentParser:
@@ -191,7 +412,7 @@ class ClassificationStatisticWithAverage(ClassificationStatistic, abc.ABC):
         :rtype: argparse.ArgumentParser
         """
         parser = super()._create_argparser()
-        parser.add_argument("-a", "--average", choices=self._averages(), help="The average to use.", default=self._default_average(), required=False)
+        parser.add_argument("-a", "--average", choices=self._averages(), help=self._average_help(), default=self._default_average(), required=False)
         return parser
 
     def _apply_args(self, ns: argparse.Namespace):
@@ -204,6 +425,67 @@ class ClassificationStatisticWithAverage(ClassificationStatistic, abc.ABC):
         super()._apply_args(ns)
         self.average = ns.average
 
+    def initialize(self):
+        """
+        Initializes the processing, e.g., for opening files or databases.
+        """
+        super().initialize()
+        if self.average is None:
+            self.average = self._default_average()
+
+    def _averages(self) -> List[str]:
+        """
+        Returns the possible averages.
+
+        :return: the averages
+        :rtype: list
+        """
+        return AVERAGES[:]
+
+    def _average_help(self) -> str:
+        """
+        Returns the help for the average option.
+
+        :return: the help
+        :rtype: str
+        """
+        return "The average to use."
+
+    def _default_average(self) -> str:
+        """
+        Returns the default average.
+
+        :return: the default
+        :rtype: str
+        """
+        return AVERAGE_MICRO
+
+
+class ClassificationScoreStatistic(ClassificationStatisticWithAverage, abc.ABC):
+    """
+    Ancestor for classification statistics that are computed from the per-class
+    scores (one-vs-rest) rather than the predicted labels.
+    """
+
+    def initialize(self):
+        """
+        Initializes the processing, e.g., for opening files or databases.
+        """
+        super().initialize()
+        # torchmetrics only supports macro, weighted and none for multiclass tasks
+        if (self.backend == BACKEND_TORCH) and (self.average == AVERAGE_MICRO):
+            raise Exception("The %s backend does not support the %s average, use the %s backend instead!" % (BACKEND_TORCH, AVERAGE_MICRO, BACKEND_NUMPY))
+
+    def requires_scores(self) -> bool:
+        """
+        Returns whether the statistic requires the per-class scores rather than
+        just the predicted labels.
+
+        :return: True if scores required
+        :rtype: bool
+        """
+        return True
+
     def _averages(self) -> List[str]:
         """
         Returns the possible averages.
@@ -211,7 +493,16 @@ class ClassificationStatisticWithAverage(ClassificationStatistic, abc.ABC):
         :return: the averages
         :rtype: list
         """
-        return ["micro", "macro", "weighted", "none"]
+        return [AVERAGE_MACRO, AVERAGE_WEIGHTED, AVERAGE_NONE, AVERAGE_MICRO]
+
+    def _average_help(self) -> str:
+        """
+        Returns the help for the average option.
+
+        :return: the help
+        :rtype: str
+        """
+        return "The average to use; %s is only supported by the %s backend." % (AVERAGE_MICRO, BACKEND_NUMPY)
 
     def _default_average(self) -> str:
         """
@@ -220,4 +511,4 @@ class ClassificationStatisticWithAverage(ClassificationStatistic, abc.ABC):
         :return: the default
         :rtype: str
         """
-        return "micro"
+        return AVERAGE_MACRO
@@ -1,3 +1,4 @@
+from idc.metrics.api import precision_from_confusion
 from ._classification_statistic import ClassificationStatisticWithAverage
 
 
@@ -39,3 +40,13 @@ class Precision(ClassificationStatisticWithAverage):
         """
         import torchmetrics
         self._statistic = torchmetrics.Precision(task="multiclass", average=self.average, num_classes=self.num_classes)
+
+    def _from_confusion_matrix(self, matrix):
+        """
+        Calculates the value of the statistic from the confusion matrix.
+
+        :param matrix: the confusion matrix (rows: annotations, columns: predictions)
+        :type matrix: np.ndarray
+        :return: the value(s)
+        """
+        return precision_from_confusion(matrix, average=self.average)
@@ -0,0 +1,5 @@
+from ._segmentation_statistic import SegmentationStatistic
+from ._dice import Dice
+from ._image_mean_iou import ImageMeanIoU
+from ._mean_iou import MeanIoU
+from ._pixel_accuracy import PixelAccuracy
@@ -0,0 +1,45 @@
+from idc.metrics.api import dice_from_confusion
+from ._segmentation_statistic import SegmentationStatistic
+
+
+class Dice(SegmentationStatistic):
+    """
+    Calculates the (mean) Dice coefficient for image segmentation data.
+    """
+
+    def name(self) -> str:
+        """
+        Returns the name of the handler, used as sub-command.
+
+        :return: the name
+        :rtype: str
+        """
+        return "dice-is"
+
+    def description(self) -> str:
+        """
+        Returns a description of the handler.
+
+        :return: the description
+        :rtype: str
+        """
+        return "Calculates the (mean) Dice coefficient for image segmentation data."
+
+    def _statistic_name(self):
+        """
+        Returns the name for the statistic in the output.
+
+        :return: the name
+        :rtype: str
+        """
+        return "Dice"
+
+    def _from_confusion_matrix(self, matrix):
+        """
+        Calculates the value of the statistic from the pixel confusion matrix.
+
+        :param matrix: the confusion matrix (rows: annotations, columns: predictions)
+        :type matrix: np.ndarray
+        :return: the value(s)
+        """
+        return dice_from_confusion(matrix, per_class=self.per_class, exclude_background=self.exclude_background)
@@ -0,0 +1,125 @@
+import argparse
+from typing import Callable, Dict, Any
+
+from wai.logging import LOGGING_WARNING
+
+from idc.metrics.api import ImagePairList, segmentation_encoder, label_map_from_layers, image_mean_iou
+from idc.metrics.statistic import ImageStatisticFilter
+
+
+class ImageMeanIoU(ImageStatisticFilter):
+    """
+    Calculates the mean IoU per image for image segmentation data.
+    """
+
+    def __init__(self, exclude_background: bool = False,
+                 logger_name: str = None, logging_level: str = LOGGING_WARNING):
+        """
+        Initializes the filter.
+
+        :param exclude_background: whether to ignore the background (pixels not covered by any layer)
+        :type exclude_background: bool
+        :param logger_name: the name to use for the logger
+        :type logger_name: str
+        :param logging_level: the logging level to use
+        :type logging_level: str
+        """
+        super().__init__(logger_name=logger_name, logging_level=logging_level)
+        self.exclude_background = exclude_background
+
+    def name(self) -> str:
+        """
+        Returns the name of the handler, used as sub-command.
+
+        :return: the name
+        :rtype: str
+        """
+        return "image-miou-is"
+
+    def description(self) -> str:
+        """
+        Returns a description of the handler.
+
+        :return: the description
+        :rtype: str
+        """
+        return "Calculates the mean IoU per image for image segmentation data."
+
+    def _create_argparser(self) -> argparse.ArgumentParser:
+        """
+        Creates an argument parser. Derived classes need to fill in the options.
+
+        :return: the parser
+        :rtype: argparse.ArgumentParser
+        """
+        parser = super()._create_argparser()
+        parser.add_argument("-x", "--exclude_background", action="store_true", help="Whether to ignore the background, i.e., the pixels not covered by any layer.")
+        return parser
+
+    def _apply_args(self, ns: argparse.Namespace):
+        """
+        Initializes the object with the arguments of the parsed namespace.
+
+        :param ns: the parsed arguments
+        :type ns: argparse.Namespace
+        """
+        super()._apply_args(ns)
+        self.exclude_background = ns.exclude_background
+
+    def initialize(self):
+        """
+        Initializes the processing, e.g., for opening files or databases.
+        """
+        super().initialize()
+        if self.exclude_background is None:
+            self.exclude_background = False
+
+    def _statistic_name(self) -> str:
+        """
+        Returns the name for the statistic in the output.
+
+        :return: the name
+        :rtype: str
+        """
+        return "mIoU"
+
+    def prepare_batch(self, pairs: ImagePairList) -> tuple:
+        """
+        Turns the pairs into the payload for the batch function, i.e., the tuple
+        of positional arguments.
+
+        :param pairs: the pairs to prepare
+        :type pairs: ImagePairList
+        :return: the (picklable) payload
+        :rtype: tuple
+        """
+        encoder = segmentation_encoder()
+        ann_maps = []
+        pred_maps = []
+        for pair in pairs:
+            ann_map = label_map_from_layers(pair.annotation.annotation, encoder)
+            if ann_map is None:
+                size = pair.annotation.image_size
+                shape = (0, 0) if size is None else (size[1], size[0])
+                ann_map = label_map_from_layers(pair.annotation.annotation, encoder, shape=shape)
+            ann_maps.append(ann_map)
+            pred_maps.append(label_map_from_layers(pair.prediction.annotation, encoder, shape=ann_map.shape))
+        return ann_maps, pred_maps, encoder.num_classes
+
+    def batch_function(self) -> Callable:
+        """
+        Returns the module-level function that turns the payload into the values (one per pair).
+
+        :return: the function
+        :rtype: callable
+        """
+        return image_mean_iou
+
+    def batch_arguments(self) -> Dict[str, Any]:
+        """
+        Returns additional keyword arguments for the batch function.
+
+        :return: the arguments
+        :rtype: dict
+        """
+        return {"exclude_background": self.exclude_background}
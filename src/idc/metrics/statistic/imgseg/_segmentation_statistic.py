@@ -0,0 +1,128 @@
+import abc
+import argparse
+
+from wai.logging import LOGGING_WARNING
+
+from idc.metrics.api import SegmentationConfusion, segmentation_encoder, sorted_label_order
+from kasperl.api import make_list
+from idc.metrics.statistic import DatasetStatisticFilter, DatasetStatistic, to_statistic_value
+
+
+class SegmentationStatistic(DatasetStatisticFilter, abc.ABC):
+    """
+    Ancestor for image segmentation statistics, which get derived from the
+    pixel-level confusion matrix (index 0 is the background).
+    """
+
+    def __init__(self, per_class: bool = False, exclude_background: bool = False,
+                 logger_name: str = None, logging_level: str = LOGGING_WARNING):
+        """
+        Initializes the filter.
+
+        :param per_class: whether to output the values per class rather than their mean
+        :type per_class: bool
+        :param exclude_background: whether to ignore the background (pixels not covered by any layer)
+        :type exclude_background: bool
+        :param logger_name: the name to use for the logger
+        :type logger_name: str
+        :param logging_level: the logging level to use
+        :type logging_level: str
+        """
+        super().__init__(logger_name=logger_name, logging_level=logging_level)
+        self.per_class = per_class
+        self.exclude_background = exclude_background
+
+    def _create_argparser(self) -> argparse.ArgumentParser:
+        """
+        Creates an argument parser. Derived classes need to fill in the options.
+
+        :return: the parser
+        :rtype: argparse.ArgumentParser
+        """
+        parser = super()._create_argparser()
+        parser.add_argument("-p", "--per_class", action="store_true", help="Whether to output the values per class (background first, then sorted by label) rather than their mean.")
+        parser.add_argument("-x", "--exclude_background", action="store_true", help="Whether to ignore the background, i.e., the pixels not covered by any layer.")
+        return parser
+
+    def _apply_args(self, ns: argparse.Namespace):
+        """
+        Initializes the object with the arguments of the parsed namespace.
+
+        :param ns: the parsed arguments
+        :type ns: argparse.Namespace
+        """
+        super()._apply_args(ns)
+        self.per_class = ns.per_class
+        self.exclude_background = ns.exclude_background
+
+    def initialize(self):
+        """
+        Initializes the processing, e.g., for opening files or databases.
+        """
+        super().initialize()
+        if self.per_class is None:
+            self.per_class = False
+        if self.exclude_background is None:
+            self.exclude_background = False
+
+    def _statistic_name(self):
+        """
+        Returns the name for the statistic in the output.
+
+        :return: the name
+        :rtype: str
+        """
+        raise NotImplementedError()
+
+    def _full_statistic_name(self) -> str:
+        """
+        Returns the name for the statistic in the output, including whether
+        the values are per class.
+
+        :return: the name
+        :rtype: str
+        """
+        result = self._statistic_name()
+        if self.per_class:
+            result += " (per class)"
+        return result
+
+    def _from_confusion_matrix(self, matrix):
+        """
+        Calculates the value of the statistic from the pixel confusion matrix.
+
+        :param matrix: the confusion matrix (rows: annotations, columns: predictions)
+        :type matrix: np.ndarray
+        :return: the value(s)
+        """
+        raise NotImplementedError()
+
+    def calculate_from_confusion_matrix(self, matrix) -> DatasetStatistic:
+        """
+        Calculates the statistic from the pixel confusion matrix.
+
+        :param matrix: the confusion matrix (rows: annotations, columns: predictions)
+        :type matrix: np.ndarray
+        :return: the generated statistic
+        :rtype: DatasetStatistic
+        """
+        result = DatasetStatistic(statistic=self._full_statistic_name())
+        result.value = to_statistic_value(self._from_confusion_matrix(matrix))
+        return result
+
+    def _do_process(self, data):
+        """
+        Processes the data record(s).
+
+        :param data: the record(s) to process
+        :return: the statistic
+        """
+        encoder = segmentation_encoder()
+        confusion = SegmentationConfusion()
+        for pair in make_list(data):
+            if not confusion.update_pair(pair, encoder):
+                self.logger().warning("Failed to determine image size, skipping: %s" % pair.image_name)
+        if confusion.total == 0:
+            return None
+        order = sorted_label_order(encoder)
+        return self.calculate_from_confusion_matrix(confusion.matrix[order][:, order])
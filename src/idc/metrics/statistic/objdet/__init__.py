@@ -0,0 +1,4 @@
+from ._objdet_statistic import ObjectDetectionStatistic
+from ._mean_average_precision import MeanAveragePrecision
+from ._mean_average_recall import MeanAverageRecall
+from ._image_iou import ImageIoU
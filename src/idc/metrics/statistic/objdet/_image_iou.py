@@ -0,0 +1,58 @@
+from typing import Callable
+
+from idc.metrics.api import ImagePairList, LabelEncoder, detection_arrays_from_pairs, image_box_iou
+from idc.metrics.statistic import ImageStatisticFilter
+
+
+class ImageIoU(ImageStatisticFilter):
+    """
+    Calculates the mean IoU per image for object detection data.
+    """
+
+    def name(self) -> str:
+        """
+        Returns the name of the handler, used as sub-command.
+
+        :return: the name
+        :rtype: str
+        """
+        return "image-iou-od"
+
+    def description(self) -> str:
+        """
+        Returns a description of the handler.
+
+        :return: the description
+        :rtype: str
+        """
+        return "Calculates the mean IoU per image for object detection data: for each annotated object the highest IoU with a predicted object of the same label, averaged across the annotated objects."
+
+    def _statistic_name(self) -> str:
+        """
+        Returns the name for the statistic in the output.
+
+        :return: the name
+        :rtype: str
+        """
+        return "IoU"
+
+    def prepare_batch(self, pairs: ImagePairList) -> tuple:
+        """
+        Turns the pairs into the payload for the batch function, i.e., the tuple
+        of positional arguments.
+
+        :param pairs: the pairs to prepare
+        :type pairs: ImagePairList
+        :return: the (picklable) payload
+        :rtype: tuple
+        """
+        return detection_arrays_from_pairs(pairs, LabelEncoder()),
+
+    def batch_function(self) -> Callable:
+        """
+        Returns the module-level function that turns the payload into the values (one per pair).
+
+        :return: the function
+        :rtype: callable
+        """
+        return image_box_iou
@@ -0,0 +1,45 @@
+from idc.metrics.api import DetectionEvaluation
+from ._objdet_statistic import ObjectDetectionStatistic
+
+
+class MeanAveragePrecision(ObjectDetectionStatistic):
+    """
+    Calculates the (mean) average precision for object detection data.
+    """
+
+    def name(self) -> str:
+        """
+        Returns the name of the handler, used as sub-command.
+
+        :return: the name
+        :rtype: str
+        """
+        return "map-od"
+
+    def description(self) -> str:
+        """
+        Returns a description of the handler.
+
+        :return: the description
+        :rtype: str
+        """
+        return "Calculates the (mean) average precision for object detection data, using the COCO protocol (101-point interpolation)."
+
+    def _statistic_name(self):
+        """
+        Returns the name for the statistic in the output.
+
+        :return: the name
+        :rtype: str
+        """
+        return "mAP"
+
+    def _from_evaluation(self, evaluation: DetectionEvaluation):
+        """
+        Calculates the value of the statistic from the evaluation.
+
+        :param evaluation: the evaluation to use
+        :type evaluation: DetectionEvaluation
+        :return: the value(s)
+        """
+        return evaluation.average_precision(iou_threshold=self.iou_threshold, per_class=self.per_class)
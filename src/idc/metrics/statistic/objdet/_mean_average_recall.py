@@ -0,0 +1,60 @@
+from idc.metrics.api import DetectionEvaluation
+from ._objdet_statistic import ObjectDetectionStatistic
+
+
+class MeanAverageRecall(ObjectDetectionStatistic):
+    """
+    Calculates the (mean) average recall for object detection data.
+    """
+
+    def name(self) -> str:
+        """
+        Returns the name of the handler, used as sub-command.
+
+        :return: the name
+        :rtype: str
+        """
+        return "mar-od"
+
+    def description(self) -> str:
+        """
+        Returns a description of the handler.
+
+        :return: the description
+        :rtype: str
+        """
+        return "Calculates the (mean) average recall for object detection data, using the COCO protocol."
+
+    def _statistic_name(self):
+        """
+        Returns the name for the statistic in the output.
+
+        :return: the name
+        :rtype: str
+        """
+        return "mAR"
+
+    def _full_statistic_name(self, evaluation: DetectionEvaluation) -> str:
+        """
+        Returns the name for the statistic in the output, including IoU threshold
+        and whether the values are per class.
+
+        :param evaluation: the evaluation the statistic is derived from
+        :type evaluation: DetectionEvaluation
+        :return: the name
+        :rtype: str
+        """
+        result = super()._full_statistic_name(evaluation)
+        if evaluation.max_detections is not None:
+            result = result.replace(self._statistic_name(), "%s-%d" % (self._statistic_name(), evaluation.max_detections), 1)
+        return result
+
+    def _from_evaluation(self, evaluation: DetectionEvaluation):
+        """
+        Calculates the value of the statistic from the evaluation.
+
+        :param evaluation: the evaluation to use
+        :type evaluation: DetectionEvaluation
+        :return: the value(s)
+        """
+        return evaluation.average_recall(iou_threshold=self.iou_threshold, per_class=self.per_class)
@@ -0,0 +1,128 @@
+import abc
+import argparse
+
+import numpy as np
+from wai.logging import LOGGING_WARNING
+
+from idc.metrics.api import LabelEncoder, DetectionEvaluation, DetectionEvaluator, detection_arrays_from_pairs
+from kasperl.api import make_list
+from idc.metrics.statistic import DatasetStatisticFilter, DatasetStatistic, to_statistic_value
+
+
+class ObjectDetectionStatistic(DatasetStatisticFilter, abc.ABC):
+    """
+    Ancestor for object detection statistics.
+    """
+
+    def __init__(self, iou_threshold: float = None, per_class: bool = False,
+                 logger_name: str = None, logging_level: str = LOGGING_WARNING):
+        """
+        Initializes the filter.
+
+        :param iou_threshold: the IoU threshold to use, averages across all evaluated thresholds if None
+        :type iou_threshold: float
+        :param per_class: whether to output the values per class rather than their mean
+        :type per_class: bool
+        :param logger_name: the name to use for the logger
+        :type logger_name: str
+        :param logging_level: the logging level to use
+        :type logging_level: str
+        """
+        super().__init__(logger_name=logger_name, logging_level=logging_level)
+        self.iou_threshold = iou_threshold
+        self.per_class = per_class
+
+    def _create_argparser(self) -> argparse.ArgumentParser:
+        """
+        Creates an argument parser. Derived classes need to fill in the options.
+
+        :return: the parser
+        :rtype: argparse.ArgumentParser
+        """
+        parser = super()._create_argparser()
+        parser.add_argument("-t", "--iou_threshold", type=float, help="The IoU threshold to use (eg 0.5 or 0.75), averages across the thresholds 0.50:0.05:0.95 if not specified.", default=None, required=False)
+        parser.add_argument("-p", "--per_class", action="store_true", help="Whether to output the values per class (sorted by label) rather than their mean.")
+        return parser
+
+    def _apply_args(self, ns: argparse.Namespace):
+        """
+        Initializes the object with the arguments of the parsed namespace.
+
+        :param ns: the parsed arguments
+        :type ns: argparse.Namespace
+        """
+        super()._apply_args(ns)
+        self.iou_threshold = ns.iou_threshold
+        self.per_class = ns.per_class
+
+    def initialize(self):
+        """
+        Initializes the processing, e.g., for opening files or databases.
+        """
+        super().initialize()
+        if self.per_class is None:
+            self.per_class = False
+
+    def _statistic_name(self):
+        """
+        Returns the name for the statistic in the output.
+
+        :return: the name
+        :rtype: str
+        """
+        raise NotImplementedError()
+
+    def _full_statistic_name(self, evaluation: DetectionEvaluation) -> str:
+        """
+        Returns the name for the statistic in the output, including IoU threshold
+        and whether the values are per class.
+
+        :param evaluation: the evaluation the statistic is derived from
+        :type evaluation: DetectionEvaluation
+        :return: the name
+        :rtype: str
+        """
+        result = self._statistic_name()
+        if self.iou_threshold is not None:
+            result += "@%.2f" % self.iou_threshold
+        if self.per_class:
+            result += " (per class)"
+        return result
+
+    def _from_evaluation(self, evaluation: DetectionEvaluation):
+        """
+        Calculates the value of the statistic from the evaluation.
+
+        :param evaluation: the evaluation to use
+        :type evaluation: DetectionEvaluation
+        :return: the value(s)
+        """
+        raise NotImplementedError()
+
+    def calculate_from_evaluation(self, evaluation: DetectionEvaluation) -> DatasetStatistic:
+        """
+        Calculates the statistic from the evaluation.
+
+        :param evaluation: the evaluation to use
+        :type evaluation: DetectionEvaluation
+        :return: the generated statistic
+        :rtype: DatasetStatistic
+        """
+        result = DatasetStatistic(statistic=self._full_statistic_name(evaluation))
+        result.value = to_statistic_value(self._from_evaluation(evaluation))
+        return result
+
+    def _do_process(self, data):
+        """
+        Processes the data record(s).
+
+        :param data: the record(s) to process
+        :return: the statistic
+        """
+        encoder = LabelEncoder()
+        arrays = detection_arrays_from_pairs(make_list(data), encoder)
+        evaluator = DetectionEvaluator()
+        evaluator.update(arrays)
+        evaluation = evaluator.compute(encoder.num_classes)
+        evaluation = evaluation.reorder(np.argsort(encoder.classes, kind="stable"))
+        return self.calculate_from_evaluation(evaluation)
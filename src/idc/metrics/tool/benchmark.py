@@ -0,0 +1,513 @@
+import argparse
+import datetime
+import json
+import logging
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import traceback
+import tracemalloc
+from typing import List, Dict, Optional
+
+from wai.logging import init_logging, set_logging_level, add_logging_level
+
+from idc.core import ENV_IDC_LOGLEVEL
+from idc.metrics.api import SYNTHETIC_IC, SYNTHETIC_OD, SYNTHETIC_IS, SYNTHETIC_DP, SYNTHETIC_TYPES
+from idc.metrics.api import LabelEncoder, detection_arrays_from_pairs, segmentation_encoder, register_segmentation_labels, label_map_from_layers
+from idc.metrics.reader import LoadMetricsPairsReader
+from idc.metrics.statistic.imgcls import determine_classes, determine_scores
+from idc.metrics.writer import StatisticsCSVWriter
+from idc.metrics.writer.imgcls import ActualVsPredictedCSVWriter
+from kasperl.api import Session
+
+BENCHMARK = "idc-metrics-benchmark"
+
+_logger = logging.getLogger(BENCHMARK)
+
+RESULTS_VERSION = 1
+
+STAGE_LOAD = "load"
+STAGE_MATCH = "match"
+STAGE_ENCODE = "encode"
+STAGE_COMPUTE = "compute"
+STAGE_WRITE = "write"
+STAGES = [
+    STAGE_LOAD,
+    STAGE_MATCH,
+    STAGE_ENCODE,
+    STAGE_COMPUTE,
+    STAGE_WRITE,
+]
+
+DEFAULT_STATISTICS = {
+    SYNTHETIC_IC: "accuracy-ic precision-ic -a macro recall-ic -a macro cohen-kappa-ic",
+    SYNTHETIC_OD: "map-od mar-od",
+    SYNTHETIC_IS: "miou-is dice-is pixel-accuracy-is",
+    SYNTHETIC_DP: "abs-rel-dp sq-rel-dp rmse-dp rmse-log-dp delta-dp",
+}
+
+SCORE_STATISTICS = "auroc-ic average-precision-ic ece-ic"
+
+WARMUP_SIZE = 10
+
+PACKAGES = [
+    "image_dataset_converter_metrics",
+    "image_dataset_converter",
+    "kasperl",
+    "seppl",
+    "numpy",
+]
+
+
+def _summary_filter(data_type: str):
+    """
+    Returns the summary statistics filter class for the data type.
+
+    :param data_type: the data type (ic|od|is|dp)
+    :type data_type: str
+    :return: the filter class
+    """
+    if data_type == SYNTHETIC_IC:
+        from idc.metrics.filter.imgcls import SummaryStatistics
+    elif data_type == SYNTHETIC_OD:
+        from idc.metrics.filter.objdet import SummaryStatistics
+    elif data_type == SYNTHETIC_IS:
+        from idc.metrics.filter.imgseg import SummaryStatistics
+    elif data_type == SYNTHETIC_DP:
+        from idc.metrics.filter.depth import SummaryStatistics
+    else:
+        raise Exception("Unsupported data type: %s" % data_type)
+    return SummaryStatistics
+
+
+def _encode(data_type: str, pairs, scores: bool) -> int:
+    """
+    Encodes the labels of the pairs the way the summary statistics filter does.
+
+    :param data_type: the data type (ic|od|is|dp)
+    :type data_type: str
+    :param pairs: the pairs to encode
+    :type pairs: ImagePairList
+    :param scores: whether to encode the class probabilities as well (image classification)
+    :type scores: bool
+    :return: the number of classes
+    :rtype: int
+    """
+    if data_type == SYNTHETIC_IC:
+        encoder = LabelEncoder()
+        if scores:
+            determine_scores(pairs, encoder=encoder)
+        else:
+            determine_classes(pairs, encoder=encoder)
+        return encoder.num_classes
+    elif data_type == SYNTHETIC_OD:
+        encoder = LabelEncoder()
+        detection_arrays_from_pairs(pairs, encoder)
+        return encoder.num_classes
+    elif data_type == SYNTHETIC_IS:
+        encoder = segmentation_encoder()
+        register_segmentation_labels(pairs, encoder)
+        for pair in pairs:
+            label_map_from_layers(pair.annotation.annotation, encoder)
+            label_map_from_layers(pair.prediction.annotation, encoder)
+        return encoder.num_classes
+    else:
+        # depth maps get used as they are
+        return 0
+
+
+class StageMonitor:
+    """
+    Measures the wall time and, if enabled, the peak of the memory allocated
+    by Python (and numpy) of the stages via tracemalloc.
+    """
+
+    def __init__(self, trace_memory: bool = False):
+        """
+        Initializes the monitor.
+
+        :param trace_memory: whether to record the peak memory
+        :type trace_memory: bool
+        """
+        self.trace_memory = trace_memory
+        self.seconds = dict()
+        self.peak_memory = dict()
+        self._stage = None
+        self._start = None
+        self._base = 0
+
+    def start(self, stage: str):
+        """
+        Starts the measurement of the stage.
+
+        :param stage: the stage
+        :type stage: str
+        """
+        self._stage = stage
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+            self._base = tracemalloc.get_traced_memory()[0]
+        self._start = time.perf_counter()
+
+    def stop(self):
+        """
+        Stops the measurement of the current stage.
+        """
+        self.seconds[self._stage] = time.perf_counter() - self._start
+        if self.trace_memory:
+            self.peak_memory[self._stage] = max(0, tracemalloc.get_traced_memory()[1] - self._base)
+        self._stage = None
+
+
+def _subflow(data_type: str, num_items: int, num_classes: int, width: int, height: int, scores: bool, seed: int, predictions: bool) -> str:
+    """
+    Generates the command-line of the sub-flow that generates the synthetic data.
+
+    :return: the command-line
+    :rtype: str
+    """
+    result = "generate-synthetic-data -t %s -n %d -k %d -W %d -H %d -S %d" % (data_type, num_items, num_classes, width, height, seed)
+    if predictions:
+        result += " -p"
+        if scores and (data_type == SYNTHETIC_IC):
+            result += " --scores"
+    return result
+
+
+def run_pipeline(data_type: str, num_items: int, num_classes: int, output_dir: str, width: int = 64, height: int = 64,
+                 scores: bool = False, seed: int = 42, trace_memory: bool = False) -> StageMonitor:
+    """
+    Runs the metrics pipeline once on synthetic data and measures its stages:
+    loading annotations/predictions via load-metrics-pairs, matching them,
+    encoding the labels, computing the summary statistics and writing them
+    (plus the actual vs predicted CSV for image classification).
+
+    :param data_type: the data type (ic|od|is|dp)
+    :type data_type: str
+    :param num_items: the number of images
+    :type num_items: int
+    :param num_classes: the number of classes
+    :type num_classes: int
+    :param output_dir: the directory to write the output files to
+    :type output_dir: str
+    :param width: the width of the images
+    :type width: int
+    :param height: the height of the images
+    :type height: int
+    :param scores: whether to generate class probabilities for image classification
+    :type scores: bool
+    :param seed: the seed value for the data generation
+    :type seed: int
+    :param trace_memory: whether to record the peak memory
+    :type trace_memory: bool
+    :return: the measurements
+    :rtype: StageMonitor
+    """
+    monitor = StageMonitor(trace_memory=trace_memory)
+    session = Session()
+
+    monitor.start(STAGE_LOAD)
+    reader = LoadMetricsPairsReader(
+        annotations_subflow=_subflow(data_type, num_items, num_classes, width, height, scores, seed, False),
+        predictions_subflow=_subflow(data_type, num_items, num_classes, width, height, scores, seed, True))
+    reader.session = session
+    reader.initialize()
+    annotations, predictions = reader._load_all()
+    monitor.stop()
+
+    monitor.start(STAGE_MATCH)
+    pairs = reader._match_all(annotations, predictions)
+    monitor.stop()
+    reader.finalize()
+    if pairs is None:
+        raise Exception("No pairs generated!")
+
+    monitor.start(STAGE_ENCODE)
+    _encode(data_type, pairs, scores)
+    monitor.stop()
+
+    statistics_cmdline = DEFAULT_STATISTICS[data_type]
+    if scores and (data_type == SYNTHETIC_IC):
+        statistics_cmdline += " " + SCORE_STATISTICS
+    monitor.start(STAGE_COMPUTE)
+    flt = _summary_filter(data_type)(statistics=statistics_cmdline, accumulate=True)
+    flt.session = session
+    flt.initialize()
+    result = flt.process(pairs)
+    flt.finalize()
+    monitor.stop()
+
+    monitor.start(STAGE_WRITE)
+    writer = StatisticsCSVWriter(output_file=os.path.join(output_dir, "statistics-%s.csv" % data_type))
+    writer.session = session
+    writer.initialize()
+    writer.write_batch([result])
+    writer.finalize()
+    if data_type == SYNTHETIC_IC:
+        writer = ActualVsPredictedCSVWriter(output_file=os.path.join(output_dir, "act-vs-pred-%s.csv" % data_type))
+        writer.session = session
+        writer.initialize()
+        writer.write_stream(pairs)
+        writer.finalize()
+    monitor.stop()
+
+    return monitor
+
+
+def _peak_rss() -> Optional[float]:
+    """
+    Returns the peak resident set size of the process in MB, if available.
+
+    :return: the peak RSS, None if not available (e.g., on Windows)
+    :rtype: float
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, kilobytes elsewhere
+    if sys.platform == "darwin":
+        return rss / 1024 / 1024
+    return rss / 1024
+
+
+def _versions() -> Dict[str, Optional[str]]:
+    """
+    Returns the versions of the relevant packages.
+
+    :return: the versions, None for packages that are not installed
+    :rtype: dict
+    """
+    from importlib.metadata import version, PackageNotFoundError
+    result = dict()
+    for package in PACKAGES:
+        try:
+            result[package] = version(package)
+        except PackageNotFoundError:
+            result[package] = None
+    return result
+
+
+def benchmark(data_types: List[str], sizes: List[int], num_classes: List[int], repeat: int = 3,
+              width: int = 64, height: int = 64, scores: bool = False, seed: int = 42,
+              trace_memory: bool = True, output_dir: str = None) -> Dict:
+    """
+    Benchmarks the stages of the metrics pipeline for all combinations of data types,
+    sizes and number of classes. Each configuration is run the specified number of
+    times for the timings, plus an additional time for measuring the memory.
+    A small warm-up run per data type precedes the measurements.
+
+    :param data_types: the data types to benchmark (ic|od|is|dp)
+    :type data_types: list
+    :param sizes: the numbers of images
+    :type sizes: list
+    :param num_classes: the numbers of classes
+    :type num_classes: list
+    :param repeat: the number of timed runs per configuration
+    :type repeat: int
+    :param width: the width of the images
+    :type width: int
+    :param height: the height of the images
+    :type height: int
+    :param scores: whether to generate class probabilities for image classification
+    :type scores: bool
+    :param seed: the seed value for the data generation
+    :type seed: int
+    :param trace_memory: whether to measure the peak memory per stage
+    :type trace_memory: bool
+    :param output_dir: the directory to write the output files to, uses a temporary directory if None
+    :type output_dir: str
+    :return: the results, JSON-serializable
+    :rtype: dict
+    """
+    if repeat < 1:
+        raise Exception("Number of repeats must be at least 1, but got: %d" % repeat)
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        if output_dir is None:
+            output_dir = tmp_dir
+        for data_type in data_types:
+            # discarded run, so that one-off costs (registry, imports) do not end up in the timings
+            run_pipeline(data_type, WARMUP_SIZE, min(num_classes), output_dir, width=width, height=height, scores=scores, seed=seed)
+            for size in sizes:
+                for classes in num_classes:
+                    _logger.info("%s: %d items, %d classes" % (data_type, size, classes))
+                    timings = {x: [] for x in STAGES}
+                    for _ in range(repeat):
+                        monitor = run_pipeline(data_type, size, classes, output_dir, width=width, height=height, scores=scores, seed=seed)
+                        for stage in STAGES:
+                            timings[stage].append(monitor.seconds[stage])
+                    memory = None
+                    if trace_memory:
+                        tracemalloc.start()
+                        try:
+                            memory = run_pipeline(data_type, size, classes, output_dir, width=width, height=height,
+                                                  scores=scores, seed=seed, trace_memory=True).peak_memory
+                        finally:
+                            tracemalloc.stop()
+                    for stage in STAGES:
+                        seconds = min(timings[stage])
+                        results.append({
+                            "data_type": data_type,
+                            "num_items": size,
+                            "num_classes": classes,
+                            "stage": stage,
+                            "seconds": seconds,
+                            "seconds_median": statistics.median(timings[stage]),
+                            "items_per_second": size / seconds if seconds > 0 else None,
+                            "peak_memory_mb": None if memory is None else memory[stage] / 1024 / 1024,
+                        })
+    return {
+        "version": RESULTS_VERSION,
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "packages": _versions(),
+        "config": {
+            "data_types": data_types,
+            "sizes": sizes,
+            "num_classes": num_classes,
+            "repeat": repeat,
+            "width": width,
+            "height": height,
+            "scores": scores,
+            "seed": seed,
+        },
+        "results": results,
+        "peak_rss_mb": _peak_rss(),
+    }
+
+
+def _key(result: Dict) -> tuple:
+    """
+    Returns the key that identifies the configuration and stage of the result.
+
+    :param result: the result to get the key for
+    :type result: dict
+    :return: the key
+    :rtype: tuple
+    """
+    return result["data_type"], result["num_items"], result["num_classes"], result["stage"]
+
+
+def compare_results(current: Dict, baseline: Dict) -> Dict[tuple, float]:
+    """
+    Compares the timings with the ones of a baseline run.
+
+    :param current: the results of the current run
+    :type current: dict
+    :param baseline: the results of the baseline run
+    :type baseline: dict
+    :return: the ratio of current and baseline time per configuration and stage present in both
+    :rtype: dict
+    """
+    lookup = {_key(x): x for x in baseline["results"]}
+    result = dict()
+    for item in current["results"]:
+        base = lookup.get(_key(item))
+        if (base is None) or (base["seconds"] <= 0):
+            continue
+        result[_key(item)] = item["seconds"] / base["seconds"]
+    return result
+
+
+def format_results(results: Dict, ratios: Dict[tuple, float] = None) -> str:
+    """
+    Turns the results into a plain-text table.
+
+    :param results: the results to format
+    :type results: dict
+    :param ratios: the ratios relative to the baseline, can be None
+    :type ratios: dict
+    :return: the table
+    :rtype: str
+    """
+    header = "%-4s %10s %7s %-8s %10s %12s %10s" % ("type", "items", "classes", "stage", "seconds", "items/sec", "peak MB")
+    if ratios is not None:
+        header += " %8s" % "vs base"
+    lines = [header, "-" * len(header)]
+    for item in results["results"]:
+        line = "%-4s %10d %7d %-8s %10.4f %12s %10s" % (
+            item["data_type"], item["num_items"], item["num_classes"], item["stage"], item["seconds"],
+            "-" if item["items_per_second"] is None else "%.1f" % item["items_per_second"],
+            "-" if item["peak_memory_mb"] is None else "%.1f" % item["peak_memory_mb"])
+        if ratios is not None:
+            ratio = ratios.get(_key(item))
+            line += " %8s" % ("-" if ratio is None else "%.2fx" % ratio)
+        lines.append(line)
+    if results.get("peak_rss_mb") is not None:
+        lines.append("")
+        lines.append("peak RSS: %.1f MB" % results["peak_rss_mb"])
+    return "\n".join(lines)
+
+
+def main(args=None):
+    """
+    The main method for parsing command-line arguments.
+
+    :param args: the commandline arguments, uses sys.argv if not supplied
+    :type args: list
+    """
+    init_logging(env_var=ENV_IDC_LOGLEVEL)
+    parser = argparse.ArgumentParser(
+        description="Benchmarks the stages of the metrics pipeline (load, match, encode, compute, write) on synthetic data, "
+                    "measuring time, throughput and peak memory. The results can be saved as JSON and compared against "
+                    "the ones of a previous run (e.g., of another version).",
+        prog=BENCHMARK,
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("-t", "--data_types", choices=SYNTHETIC_TYPES, help="The data types to benchmark.", default=SYNTHETIC_TYPES, type=str, required=False, nargs="+")
+    parser.add_argument("-n", "--sizes", metavar="INT", help="The numbers of images to benchmark with.", default=[1000], type=int, required=False, nargs="+")
+    parser.add_argument("-k", "--num_classes", metavar="INT", help="The numbers of classes to benchmark with.", default=[10], type=int, required=False, nargs="+")
+    parser.add_argument("-r", "--repeat", metavar="INT", help="The number of timed runs per configuration, the fastest one gets reported.", default=3, type=int, required=False)
+    parser.add_argument("-W", "--width", metavar="INT", help="The width of the synthetic images.", default=64, type=int, required=False)
+    parser.add_argument("-H", "--height", metavar="INT", help="The height of the synthetic images.", default=64, type=int, required=False)
+    parser.add_argument("--scores", action="store_true", help="Whether to generate class probabilities for image classification and compute score-based statistics as well.")
+    parser.add_argument("-S", "--seed", metavar="INT", help="The seed value for the data generation.", default=42, type=int, required=False)
+    parser.add_argument("--no_memory", action="store_true", help="Whether to skip the additional run for measuring the peak memory per stage.")
+    parser.add_argument("-d", "--output_dir", metavar="DIR", help="The directory to write the output files of the pipeline to, uses a temporary directory if not supplied.", default=None, type=str, required=False)
+    parser.add_argument("-o", "--output", metavar="FILE", help="The JSON file to store the results in.", default=None, type=str, required=False)
+    parser.add_argument("-c", "--compare", metavar="FILE", help="The JSON file with the results of a previous run to compare against.", default=None, type=str, required=False)
+    parser.add_argument("-m", "--max_slowdown", metavar="FACTOR", help="Fails if a stage takes longer than this factor times the baseline (requires --compare).", default=None, type=float, required=False)
+    add_logging_level(parser)
+    parsed = parser.parse_args(args=args)
+    set_logging_level(_logger, parsed.logging_level)
+    results = benchmark(parsed.data_types, parsed.sizes, parsed.num_classes, repeat=parsed.repeat,
+                        width=parsed.width, height=parsed.height, scores=parsed.scores, seed=parsed.seed,
+                        trace_memory=not parsed.no_memory, output_dir=parsed.output_dir)
+    if parsed.output is not None:
+        with open(parsed.output, "w") as fp:
+            json.dump(results, fp, indent=2)
+    ratios = None
+    if parsed.compare is not None:
+        with open(parsed.compare, "r") as fp:
+            ratios = compare_results(results, json.load(fp))
+    print(format_results(results, ratios=ratios))
+    if (ratios is not None) and (parsed.max_slowdown is not None):
+        slow = ["%s/%d/%d/%s: %.2fx" % (k + (v,)) for k, v in ratios.items() if v > parsed.max_slowdown]
+        if len(slow) > 0:
+            raise Exception("Slower than %.2fx the baseline:\n%s" % (parsed.max_slowdown, "\n".join(slow)))
+
+
+def sys_main() -> int:
+    """
+    Runs the main function using the system cli arguments, and
+    returns a system error code.
+
+    :return: 0 for success, 1 for failure.
+    """
+    try:
+        main()
+        return 0
+    except Exception:
+        traceback.print_exc()
+        print("options: %s" % str(sys.argv[1:]), file=sys.stderr)
+        return 1
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,708 @@
+import argparse
+import hmac
+import http.client
+import ipaddress
+import json
+import logging
+import os
+import secrets
+import shlex
+import socket
+import socketserver
+import sys
+import time
+import traceback
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from typing import List, Dict, Optional, Tuple
+
+from wai.logging import init_logging, set_logging_level, add_logging_level
+
+from idc.core import ENV_IDC_LOGLEVEL
+from idc.metrics.registry import available_statistics
+from idc.metrics.statistic import DatasetStatisticList
+from idc.registry import available_readers, available_filters, available_writers
+from kasperl.api import Session
+from seppl import Initializable, init_initializable, split_args, split_cmdline, args_to_objects
+from seppl.io import Reader, BatchFilter, Writer, StreamWriter, BatchWriter
+from seppl.variables import add_variable
+
+SERVER = "idc-metrics-server"
+
+_logger = logging.getLogger(SERVER)
+
+PROTOCOL_VERSION = 1
+
+DEFAULT_HOST = "127.0.0.1"
+
+DEFAULT_PORT = 8123
+
+MAX_PIPELINES = 16
+
+ENV_IDC_METRICS_TOKEN = "IDC_METRICS_TOKEN"
+
+CONTENT_TYPE_JSON = "application/json"
+
+PATH_EVALUATE = "/evaluate"
+PATH_STATUS = "/status"
+PATH_CLEAR = "/clear"
+
+SUMMARY_FILTERS = {
+    "ic": "summary-statistics-ic",
+    "od": "summary-statistics-od",
+    "is": "summary-statistics-is",
+    "dp": "summary-statistics-dp",
+}
+
+
+class CachedPipeline:
+    """
+    The parsed plugins of a pipeline, which get re-initialized for every evaluation.
+    """
+
+    def __init__(self, reader: Reader, filters: List[BatchFilter], writer: Optional[Writer]):
+        """
+        Initializes the container.
+
+        :param reader: the reader
+        :type reader: Reader
+        :param filters: the filters
+        :type filters: list
+        :param writer: the optional writer
+        :type writer: Writer
+        """
+        self.reader = reader
+        self.filters = filters
+        self.writer = writer
+        self.evaluations = 0
+
+    def plugins(self) -> List:
+        """
+        Returns all the plugins in the order of the pipeline.
+
+        :return: the plugins
+        :rtype: list
+        """
+        result = [self.reader]
+        result.extend(self.filters)
+        if self.writer is not None:
+            result.append(self.writer)
+        return result
+
+
+def check_options(data_type: str, statistics: str, options: str) -> List[str]:
+    """
+    Splits the additional options of the summary statistics filter and ensures
+    that they are only options of that filter, i.e., that they do not add any
+    other plugins (like writers) to the pipeline.
+
+    :param data_type: the data type of the summary statistics filter (ic|od|is|dp)
+    :type data_type: str
+    :param statistics: the statistics of the summary statistics filter
+    :type statistics: str
+    :param options: the options to check
+    :type options: str
+    :return: the split options
+    :rtype: list
+    """
+    result = shlex.split(options)
+    plugins = dict()
+    plugins.update(available_readers())
+    plugins.update(available_filters())
+    plugins.update(available_writers())
+    for arg in result:
+        if arg in plugins:
+            raise Exception("Options must not contain plugins: %s" % arg)
+    summary = type(plugins[SUMMARY_FILTERS[data_type]])()
+    try:
+        unknown = summary.parse_args(["-s", statistics] + result)
+    except SystemExit:
+        raise Exception("Invalid options for %s: %s" % (summary.name(), options))
+    if len(unknown) > 0:
+        raise Exception("Unknown options for %s: %s" % (summary.name(), " ".join(unknown)))
+    return result
+
+
+def build_pipeline(request: Dict, allow_pipeline: bool = False) -> str:
+    """
+    Turns the evaluation request into a pipeline string. Either the complete
+    pipeline is specified via "pipeline" (only if allowed) or it gets assembled
+    from "data_type" (ic|od|is|dp), "statistics" and additional "options" of the
+    summary statistics filter and the input:
+
+    - "annotations"/"predictions": the sub-flows for load-metrics-pairs
+    - "encoded": the directory with encoded pairs (ic only)
+    - "states": the list of files with statistic states
+
+    :param request: the request to turn into a pipeline
+    :type request: dict
+    :param allow_pipeline: whether complete pipelines are allowed
+    :type allow_pipeline: bool
+    :return: the pipeline
+    :rtype: str
+    """
+    if "pipeline" in request:
+        if not allow_pipeline:
+            raise Exception("Complete pipelines are not allowed, use 'data_type' and 'statistics' instead!")
+        return request["pipeline"]
+
+    data_type = request.get("data_type")
+    if data_type not in SUMMARY_FILTERS:
+        raise Exception("Either 'pipeline' or 'data_type' (%s) is required!" % "|".join(SUMMARY_FILTERS.keys()))
+    if "statistics" not in request:
+        raise Exception("No 'statistics' specified!")
+    if ("annotations" in request) and ("predictions" in request):
+        reader = "load-metrics-pairs -a %s -p %s" % (shlex.quote(request["annotations"]), shlex.quote(request["predictions"]))
+    elif "encoded" in request:
+        reader = "load-encoded-pairs-ic -i %s" % shlex.quote(request["encoded"])
+    elif "states" in request:
+        reader = "load-statistic-states -i %s" % " ".join(shlex.quote(x) for x in request["states"])
+    else:
+        raise Exception("Either 'annotations' and 'predictions', 'encoded' or 'states' are required!")
+    result = "%s %s -s %s --accumulate" % (reader, SUMMARY_FILTERS[data_type], shlex.quote(request["statistics"]))
+    if "options" in request:
+        result += " " + " ".join(shlex.quote(x) for x in check_options(data_type, request["statistics"], request["options"]))
+    return result
+
+
+def statistics_to_list(stats: DatasetStatisticList) -> List[List]:
+    """
+    Turns the statistics into a list of [statistic name, value] entries, in the
+    order they were generated. Statistics with the same name (e.g., the same
+    statistic with different options) are all retained.
+
+    :param stats: the statistics to convert
+    :type stats: DatasetStatisticList
+    :return: the list of entries
+    :rtype: list
+    """
+    return [[stat.statistic, stat.value] for stat in stats]
+
+
+def is_loopback(host: str) -> bool:
+    """
+    Checks whether the host name or address refers to the loopback interface.
+
+    :param host: the host to check
+    :type host: str
+    :return: True if loopback
+    :rtype: bool
+    """
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        pass
+    try:
+        return all(ipaddress.ip_address(info[4][0]).is_loopback for info in socket.getaddrinfo(host, None))
+    except (socket.gaierror, ValueError):
+        return False
+
+
+class EvaluationService:
+    """
+    Evaluates pipelines, keeping the registries, the parsed plugins of the most
+    recently used pipelines and thereby the underlying statistic objects in memory.
+    Variables (e.g., the directory with the predictions of the current epoch) allow
+    re-using the same pipeline with different inputs.
+    """
+
+    def __init__(self, max_pipelines: int = MAX_PIPELINES, allow_pipelines: bool = False):
+        """
+        Initializes the service.
+
+        :param max_pipelines: the maximum number of parsed pipelines to keep
+        :type max_pipelines: int
+        :param allow_pipelines: whether requests can specify complete pipelines
+        :type allow_pipelines: bool
+        """
+        self.max_pipelines = max_pipelines
+        self.allow_pipelines = allow_pipelines
+        self._pipelines = OrderedDict()
+        self._plugins = dict()
+        self._plugins.update(available_readers())
+        self._plugins.update(available_filters())
+        self._plugins.update(available_writers())
+        # the statistics get looked up by the summary statistics filters
+        available_statistics()
+        self.started = time.time()
+        self.evaluations = 0
+
+    def _parse(self, pipeline: str) -> CachedPipeline:
+        """
+        Parses the pipeline into its plugins.
+
+        :param pipeline: the pipeline to parse
+        :type pipeline: str
+        :return: the parsed pipeline
+        :rtype: CachedPipeline
+        """
+        args = split_args(split_cmdline(pipeline), list(self._plugins.keys()))
+        plugins = args_to_objects(args, self._plugins, allow_global_options=False)
+        reader = None
+        filters = []
+        writer = None
+        for plugin in plugins:
+            if isinstance(plugin, Reader):
+                if (reader is not None) or (len(filters) > 0):
+                    raise Exception("Reader must be the only and first plugin in the pipeline!")
+                reader = plugin
+            elif isinstance(plugin, BatchFilter):
+                if writer is not None:
+                    raise Exception("Writer must be the last plugin in the pipeline!")
+                filters.append(plugin)
+            elif isinstance(plugin, Writer):
+                if writer is not None:
+                    raise Exception("Only one writer can be defined!")
+                writer = plugin
+            else:
+                raise Exception("Unhandled plugin type: %s" % str(type(plugin)))
+        if reader is None:
+            raise Exception("No reader defined!")
+        return CachedPipeline(reader, filters, writer)
+
+    def _get(self, pipeline: str) -> Tuple[CachedPipeline, bool]:
+        """
+        Returns the parsed pipeline from the cache, parsing it if necessary.
+
+        :param pipeline: the pipeline to retrieve
+        :type pipeline: str
+        :return: the tuple of parsed pipeline and whether it was cached
+        :rtype: tuple
+        """
+        if pipeline in self._pipelines:
+            self._pipelines.move_to_end(pipeline)
+            return self._pipelines[pipeline], True
+        result = self._parse(pipeline)
+        self._pipelines[pipeline] = result
+        while len(self._pipelines) > self.max_pipelines:
+            self._pipelines.popitem(last=False)
+        return result, False
+
+    def clear(self):
+        """
+        Removes all parsed pipelines.
+        """
+        self._pipelines.clear()
+
+    def _execute(self, cached: CachedPipeline) -> List[DatasetStatisticList]:
+        """
+        Executes the pipeline and returns the generated statistics.
+
+        :param cached: the pipeline to execute
+        :type cached: CachedPipeline
+        :return: the statistics, one list per output of the last filter
+        :rtype: list
+        """
+        session = Session(logger=_logger)
+        plugins = cached.plugins()
+        for plugin in plugins:
+            plugin.session = session
+        initialized = []
+        result = []
+        try:
+            for plugin in plugins:
+                if isinstance(plugin, Initializable):
+                    if not init_initializable(plugin, plugin.name()):
+                        raise Exception("Failed to initialize: %s" % plugin.name())
+                    initialized.append(plugin)
+            batch = []
+            reader = cached.reader
+            while True:
+                for item in reader.read():
+                    data = item
+                    for flt in cached.filters:
+                        data = flt.process(data)
+                        if data is None:
+                            break
+                    if data is None:
+                        continue
+                    if isinstance(data, DatasetStatisticList):
+                        result.append(data)
+                    elif isinstance(data, list):
+                        result.extend(x for x in data if isinstance(x, DatasetStatisticList))
+                    if isinstance(cached.writer, StreamWriter):
+                        cached.writer.write_stream(data)
+                    elif isinstance(cached.writer, BatchWriter):
+                        batch.append(data)
+                if reader.has_finished():
+                    break
+            if isinstance(cached.writer, BatchWriter) and (len(batch) > 0):
+                cached.writer.write_batch(batch)
+        finally:
+            for plugin in initialized:
+                plugin.finalize()
+        return result
+
+    def evaluate(self, request: Dict) -> Dict:
+        """
+        Evaluates the request and returns the response.
+
+        :param request: the request, see build_pipeline; "variables" (name -> value) get defined before executing
+        :type request: dict
+        :return: the response with the statistics (one list of [name, value] entries per output), the time it took and whether the pipeline was cached
+        :rtype: dict
+        """
+        pipeline = build_pipeline(request, allow_pipeline=self.allow_pipelines)
+        return self.evaluate_pipeline(pipeline, variables=request.get("variables"))
+
+    def evaluate_pipeline(self, pipeline: str, variables: Dict = None) -> Dict:
+        """
+        Evaluates the pipeline and returns the response. Does not check whether
+        complete pipelines are allowed, hence only for trusted pipelines (e.g., warm-up).
+
+        :param pipeline: the pipeline to evaluate
+        :type pipeline: str
+        :param variables: the variables (name -> value) to define before executing, ignored if None
+        :type variables: dict
+        :return: the response with the statistics (one list of [name, value] entries per output), the time it took and whether the pipeline was cached
+        :rtype: dict
+        """
+        start = time.perf_counter()
+        if variables is None:
+            variables = dict()
+        for name, value in variables.items():
+            # early binding of the value via the default parameter
+            add_variable(name, "", False, lambda ignored, v=str(value): v)
+        cached, reused = self._get(pipeline)
+        stats = self._execute(cached)
+        cached.evaluations += 1
+        self.evaluations += 1
+        duration = time.perf_counter() - start
+        _logger.info("Evaluated in %.3f sec (cached: %s): %s" % (duration, str(reused), pipeline))
+        return {
+            "version": PROTOCOL_VERSION,
+            "statistics": [statistics_to_list(x) for x in stats],
+            "seconds": duration,
+            "cached": reused,
+        }
+
+    def status(self) -> Dict:
+        """
+        Returns the status of the service.
+
+        :return: the status
+        :rtype: dict
+        """
+        return {
+            "version": PROTOCOL_VERSION,
+            "uptime": time.time() - self.started,
+            "evaluations": self.evaluations,
+            "pipelines": [{"pipeline": k, "evaluations": v.evaluations} for k, v in self._pipelines.items()],
+        }
+
+
+class EvaluationRequestHandler(BaseHTTPRequestHandler):
+    """
+    Handles the HTTP requests: POST /evaluate (JSON request, see build_pipeline),
+    GET /status and POST /clear. Only requests with a Host header of the server's
+    own address and without an Origin header (i.e., not sent by web pages) are
+    accepted. POST requests must be JSON and carry the token as bearer token in
+    the Authorization header.
+    """
+
+    service = None
+
+    token = None
+
+    hosts = None
+
+    def address_string(self) -> str:
+        # Unix sockets have no client address
+        if isinstance(self.client_address, tuple):
+            return super().address_string()
+        return "unix"
+
+    def log_message(self, format, *args):
+        _logger.debug("%s - %s" % (self.address_string(), format % args))
+
+    def _respond(self, code: int, content: Dict):
+        """
+        Sends the content as JSON.
+
+        :param code: the HTTP status code
+        :type code: int
+        :param content: the content to send
+        :type content: dict
+        """
+        data = json.dumps(content).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _check_headers(self, post: bool) -> bool:
+        """
+        Checks the Host and Origin headers and, for POST requests, the content type
+        and the token. Sends an error response if the checks fail.
+
+        :param post: whether a POST request is being handled
+        :type post: bool
+        :return: True if the request can be processed
+        :rtype: bool
+        """
+        host = self.headers.get("Host")
+        if (host is None) or (host.lower() not in self.hosts):
+            self._respond(403, {"error": "Invalid host: %s" % host})
+            return False
+        if self.headers.get("Origin") is not None:
+            self._respond(403, {"error": "Cross-origin requests are not allowed!"})
+            return False
+        if not post:
+            return True
+        content_type = self.headers.get("Content-Type", "").split(";")[0].strip().lower()
+        if content_type != CONTENT_TYPE_JSON:
+            self._respond(415, {"error": "Content type must be %s!" % CONTENT_TYPE_JSON})
+            return False
+        auth = self.headers.get("Authorization", "")
+        if not auth.startswith("Bearer ") or not hmac.compare_digest(auth[len("Bearer "):].encode("utf-8"), self.token.encode("utf-8")):
+            self._respond(401, {"error": "Missing or invalid token!"})
+            return False
+        return True
+
+    def do_GET(self):
+        if not self._check_headers(False):
+            return
+        if self.path == PATH_STATUS:
+            self._respond(200, self.service.status())
+        else:
+            self._respond(404, {"error": "Unknown path: %s" % self.path})
+
+    def do_POST(self):
+        if not self._check_headers(True):
+            return
+        if self.path == PATH_CLEAR:
+            self.service.clear()
+            self._respond(200, self.service.status())
+            return
+        if self.path != PATH_EVALUATE:
+            self._respond(404, {"error": "Unknown path: %s" % self.path})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length).decode("utf-8"))
+            if not isinstance(request, dict):
+                raise Exception("Request must be a JSON object!")
+            build_pipeline(request, allow_pipeline=self.service.allow_pipelines)
+        except Exception as e:
+            self._respond(400, {"error": "Invalid request: %s" % str(e)})
+            return
+        try:
+            self._respond(200, self.service.evaluate(request))
+        except Exception as e:
+            _logger.exception("Failed to evaluate: %s" % str(request))
+            self._respond(500, {"error": str(e)})
+
+
+class UnixHTTPServer(socketserver.UnixStreamServer):
+    """
+    HTTP server listening on a Unix socket, which only the owner can access.
+    """
+
+    def server_bind(self):
+        if os.path.exists(self.server_address):
+            os.remove(self.server_address)
+        super().server_bind()
+        os.chmod(self.server_address, 0o600)
+
+
+def server_hosts(host: str, port: int) -> List[str]:
+    """
+    Returns the values of the Host header that refer to the server's own address.
+    For loopback addresses, "localhost" is accepted as well.
+
+    :param host: the host the server listens on
+    :type host: str
+    :param port: the port the server listens on
+    :type port: int
+    :return: the accepted values (lower case)
+    :rtype: list
+    """
+    names = [host]
+    if is_loopback(host):
+        names.append("localhost")
+    result = []
+    for name in names:
+        name = name.lower()
+        if ":" in name:
+            name = "[%s]" % name
+        result.append(name)
+        result.append("%s:%d" % (name, port))
+    return result
+
+
+def create_server(service: EvaluationService, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT,
+                  socket_path: str = None, allow_remote: bool = False, token: str = None) -> socketserver.BaseServer:
+    """
+    Creates the server for the service. Requests get handled one at a time.
+    POST requests must supply the token (see request_evaluation).
+    NB: any client that knows the token and can reach the port or socket can
+    evaluate pipelines with the permissions of the server. Hence only loopback
+    hosts are accepted, unless remote access is explicitly allowed.
+
+    :param service: the service to use
+    :type service: EvaluationService
+    :param host: the host to listen on
+    :type host: str
+    :param port: the port to listen on
+    :type port: int
+    :param socket_path: the Unix socket to listen on instead of host/port, ignored if None
+    :type socket_path: str
+    :param allow_remote: whether to allow listening on a non-loopback host
+    :type allow_remote: bool
+    :param token: the token that clients must supply, uses the IDC_METRICS_TOKEN environment variable if None
+    :type token: str
+    :return: the server
+    """
+    if token is None:
+        token = os.environ.get(ENV_IDC_METRICS_TOKEN)
+    if (token is None) or (len(token) == 0):
+        raise Exception("No token specified (or via environment variable %s)!" % ENV_IDC_METRICS_TOKEN)
+    if (socket_path is None) and not allow_remote and not is_loopback(host):
+        raise Exception("Host '%s' is not a loopback address, which allows remote clients to evaluate pipelines; "
+                        "allow remote access explicitly (--allow_remote) if this is intended!" % host)
+    handler = type("_Handler", (EvaluationRequestHandler,), {"service": service, "token": token})
+    if socket_path is not None:
+        handler.hosts = ["localhost"]
+        return UnixHTTPServer(socket_path, handler)
+    result = HTTPServer((host, port), handler)
+    # the actual port, in case of 0
+    handler.hosts = server_hosts(host, result.server_address[1])
+    return result
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    """
+    HTTP connection via a Unix socket.
+    """
+
+    def __init__(self, socket_path: str, timeout: float = None):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        if self.timeout is not None:
+            self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+def request_evaluation(request: Dict, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, socket_path: str = None,
+                       timeout: float = None, token: str = None) -> Dict:
+    """
+    Sends the evaluation request to the server and returns its response.
+    Raises an exception if the evaluation failed.
+
+    :param request: the request, see build_pipeline
+    :type request: dict
+    :param host: the host of the server
+    :type host: str
+    :param port: the port of the server
+    :type port: int
+    :param socket_path: the Unix socket of the server to use instead of host/port, ignored if None
+    :type socket_path: str
+    :param timeout: the timeout in seconds, None for no timeout
+    :type timeout: float
+    :param token: the token of the server, uses the IDC_METRICS_TOKEN environment variable if None
+    :type token: str
+    :return: the response
+    :rtype: dict
+    """
+    if token is None:
+        token = os.environ.get(ENV_IDC_METRICS_TOKEN, "")
+    if socket_path is not None:
+        conn = _UnixHTTPConnection(socket_path, timeout=timeout)
+    else:
+        conn = http.client.HTTPConnection(host, port, timeout=timeout)
+    try:
+        conn.request("POST", PATH_EVALUATE, body=json.dumps(request), headers={"Content-Type": CONTENT_TYPE_JSON, "Authorization": "Bearer %s" % token})
+        response = conn.getresponse()
+        content = json.loads(response.read().decode("utf-8"))
+    finally:
+        conn.close()
+    if response.status != 200:
+        raise Exception("Evaluation failed (%d): %s" % (response.status, content.get("error")))
+    return content
+
+
+def main(args=None):
+    """
+    The main method for parsing command-line arguments.
+
+    :param args: the commandline arguments, uses sys.argv if not supplied
+    :type args: list
+    """
+    init_logging(env_var=ENV_IDC_LOGLEVEL)
+    parser = argparse.ArgumentParser(
+        description="Long-running evaluation server that keeps registries, parsed pipelines and statistic objects "
+                    "in memory. Accepts JSON requests via POST %s, either with a complete 'pipeline' or with "
+                    "'data_type', 'statistics' (and optional 'options' for the summary statistics filter) and "
+                    "'annotations'/'predictions' sub-flows, an 'encoded' pairs directory or a list of 'states' files. "
+                    "Optional 'variables' (name -> value) get defined before evaluating and can be used in the paths "
+                    "of plugins that support placeholders, e.g., {EPOCH}, which allows re-using a cached pipeline "
+                    "with different inputs. Returns the statistics as JSON, per output of the pipeline a list of [name, value] entries. "
+                    "GET %s outputs the status, POST %s removes the cached pipelines. "
+                    "POST requests must be JSON and supply the token via the 'Authorization: Bearer TOKEN' header; "
+                    "requests from web pages (Origin header) or for other hosts (Host header) get rejected. "
+                    "WARNING: any client with the token that can reach the port or socket can evaluate pipelines with the "
+                    "permissions of the server, complete pipelines (which can include writers that write to arbitrary files) "
+                    "only if explicitly allowed. Hence only loopback hosts are allowed by default and the Unix socket "
+                    "is only accessible by its owner." % (PATH_EVALUATE, PATH_STATUS, PATH_CLEAR),
+        prog=SERVER,
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("-H", "--host", metavar="HOST", help="The host to listen on.", default=DEFAULT_HOST, type=str, required=False)
+    parser.add_argument("--allow_remote", action="store_true", help="Whether to allow listening on a non-loopback host, which lets remote clients (with the token) evaluate pipelines.", required=False)
+    parser.add_argument("-t", "--token", metavar="TOKEN", help="The token that clients must supply; uses the %s environment variable if not specified and generates a random one if that is not set either." % ENV_IDC_METRICS_TOKEN, default=None, type=str, required=False)
+    parser.add_argument("--allow_pipelines", action="store_true", help="Whether to allow requests with complete pipelines, which can include writers that write to arbitrary files.", required=False)
+    parser.add_argument("-p", "--port", metavar="PORT", help="The port to listen on.", default=DEFAULT_PORT, type=int, required=False)
+    parser.add_argument("-u", "--socket", metavar="FILE", help="The Unix socket to listen on instead of host/port.", default=None, type=str, required=False)
+    parser.add_argument("-m", "--max_pipelines", metavar="INT", help="The maximum number of parsed pipelines to keep in memory.", default=MAX_PIPELINES, type=int, required=False)
+    parser.add_argument("-w", "--warmup", metavar="PIPELINE", help="The pipeline(s) to evaluate at start-up, e.g., for loading the statistic backends.", default=None, type=str, required=False, nargs="*")
+    add_logging_level(parser)
+    parsed = parser.parse_args(args=args)
+    set_logging_level(_logger, parsed.logging_level)
+    token = parsed.token
+    if token is None:
+        token = os.environ.get(ENV_IDC_METRICS_TOKEN)
+    if (token is None) or (len(token) == 0):
+        token = secrets.token_urlsafe(32)
+        print("Token: %s" % token, file=sys.stderr)
+    service = EvaluationService(max_pipelines=parsed.max_pipelines, allow_pipelines=parsed.allow_pipelines)
+    if parsed.warmup is not None:
+        for pipeline in parsed.warmup:
+            _logger.info("Warming up: %s" % pipeline)
+            service.evaluate_pipeline(pipeline)
+    server = create_server(service, host=parsed.host, port=parsed.port, socket_path=parsed.socket,
+                           allow_remote=parsed.allow_remote, token=token)
+    if parsed.socket is not None:
+        _logger.info("Listening on: %s" % parsed.socket)
+    else:
+        _logger.info("Listening on: %s:%d" % (parsed.host, parsed.port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if (parsed.socket is not None) and os.path.exists(parsed.socket):
+            os.remove(parsed.socket)
+
+
+def sys_main() -> int:
+    """
+    Runs the main function using the system cli arguments, and
+    returns a system error code.
+
+    :return: 0 for success, 1 for failure.
+    """
+    try:
+        main()
+        return 0
+    except Exception:
+        traceback.print_exc()
+        print("options: %s" % str(sys.argv[1:]), file=sys.stderr)
+        return 1
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,4 @@
+from ._statistics_writer import StatisticsWriter, to_statistic_table
+from ._statistics_csv import StatisticsCSVWriter
+from ._statistics_parquet import StatisticsParquetWriter
+from ._statistics_arrow import StatisticsArrowWriter
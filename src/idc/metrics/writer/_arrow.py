@@ -0,0 +1,44 @@
+import numpy as np
+
+from idc.metrics.statistic import StatisticTable, ImageStatisticTable
+
+
+def _dictionary(ids: np.ndarray, names: list):
+    """
+    Creates a dictionary-encoded string column from the IDs and the interned names.
+
+    :param ids: the IDs
+    :type ids: np.ndarray
+    :param names: the interned names
+    :type names: list
+    :return: the pyarrow column
+    """
+    import pyarrow as pa
+    return pa.DictionaryArray.from_arrays(pa.array(ids, type=pa.int32()), pa.array(names, type=pa.string()))
+
+
+def to_arrow_table(table: StatisticTable):
+    """
+    Turns the statistics table into a pyarrow table without materializing the names
+    per row: images and statistics become dictionary-encoded string columns.
+
+    :param table: the table to convert
+    :type table: StatisticTable
+    :return: the pyarrow table
+    """
+    try:
+        import pyarrow as pa
+    except ImportError:
+        raise Exception("The pyarrow library is required for Arrow/Parquet output: pip install pyarrow")
+
+    if isinstance(table, ImageStatisticTable):
+        return pa.table({
+            "image": _dictionary(table.image_ids, table.image_names),
+            "statistic": _dictionary(table.statistic_ids, table.statistic_names),
+            "value": pa.array(table.values),
+        })
+    return pa.table({
+        "statistic": _dictionary(table.statistic_ids, table.statistic_names),
+        "index": pa.array(table.indices),
+        "value": pa.array(table.values),
+    })
@@ -0,0 +1,44 @@
+import csv
+
+from idc.metrics.statistic import StatisticTable
+from ._statistics_writer import StatisticsWriter
+
+
+class StatisticsCSVWriter(StatisticsWriter):
+    """
+    Writes the statistics to a CSV file.
+    """
+
+    def name(self) -> str:
+        """
+        Returns the name of the handler, used as sub-command.
+
+        :return: the name
+        :rtype: str
+        """
+        return "to-statistics-csv"
+
+    def description(self) -> str:
+        """
+        Returns a description of the writer.
+
+        :return: the description
+        :rtype: str
+        """
+        return "Outputs the statistics in CSV format. Dataset statistics use the columns statistic, index " \
+               "(-1 for single values) and value, per-image statistics the columns image, statistic and value."
+
+    def _write_table(self, table: StatisticTable, path: str):
+        """
+        Writes the table to the specified file.
+
+        :param table: the table to write
+        :type table: StatisticTable
+        :param path: the file to write to
+        :type path: str
+        """
+        columns = table.to_columns()
+        with open(path, "w", newline="") as fp:
+            writer = csv.writer(fp, quoting=csv.QUOTE_MINIMAL)
+            writer.writerow(list(columns.keys()))
+            writer.writerows(zip(*[x.tolist() for x in columns.values()]))
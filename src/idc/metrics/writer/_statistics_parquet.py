@@ -0,0 +1,95 @@
+import argparse
+
+from wai.logging import LOGGING_WARNING
+
+from idc.metrics.statistic import StatisticTable
+from ._arrow import to_arrow_table
+from ._statistics_writer import StatisticsWriter
+
+COMPRESSION_PARQUET = ["none", "snappy", "gzip", "brotli", "lz4", "zstd"]
+
+
+class StatisticsParquetWriter(StatisticsWriter):
+    """
+    Writes the statistics to a Parquet file (requires pyarrow).
+    """
+
+    def __init__(self, output_file: str = None, compression: str = None,
+                 logger_name: str = None, logging_level: str = LOGGING_WARNING):
+        """
+        Initializes the writer.
+
+        :param output_file: the file to write the statistics to
+        :type output_file: str
+        :param compression: the compression codec to use
+        :type compression: str
+        :param logger_name: the name to use for the logger
+        :type logger_name: str
+        :param logging_level: the logging level to use
+        :type logging_level: str
+        """
+        super().__init__(output_file=output_file, logger_name=logger_name, logging_level=logging_level)
+        self.compression = compression
+
+    def name(self) -> str:
+        """
+        Returns the name of the handler, used as sub-command.
+
+        :return: the name
+        :rtype: str
+        """
+        return "to-statistics-parquet"
+
+    def description(self) -> str:
+        """
+        Returns a description of the writer.
+
+        :return: the description
+        :rtype: str
+        """
+        return "Outputs the statistics in Parquet format, with image and statistic names dictionary-encoded. " \
+               "Dataset statistics use the columns statistic, index (-1 for single values) and value, " \
+               "per-image statistics the columns image, statistic and value. Requires the pyarrow library."
+
+    def _create_argparser(self) -> argparse.ArgumentParser:
+        """
+        Creates an argument parser. Derived classes need to fill in the options.
+
+        :return: the parser
+        :rtype: argparse.ArgumentParser
+        """
+        parser = super()._create_argparser()
+        parser.add_argument("-c", "--compression", choices=COMPRESSION_PARQUET, default="snappy", help="The compression codec to use.", required=False)
+        return parser
+
+    def _apply_args(self, ns: argparse.Namespace):
+        """
+        Initializes the object with the arguments of the parsed namespace.
+
+        :param ns: the parsed arguments
+        :type ns: argparse.Namespace
+        """
+        super()._apply_args(ns)
+        self.compression = ns.compression
+
+    def initialize(self):
+        """
+        Initializes the processing, e.g., for opening files or databases.
+        """
+        super().initialize()
+        if self.compression is None:
+            self.compression = "snappy"
+        if self.compression not in COMPRESSION_PARQUET:
+            raise Exception("Unsupported compression: %s" % self.compression)
+
+    def _write_table(self, table: StatisticTable, path: str):
+        """
+        Writes the table to the specified file.
+
+        :param table: the table to write
+        :type table: StatisticTable
+        :param path: the file to write to
+        :type path: str
+        """
+        import pyarrow.parquet as pq
+        pq.write_table(to_arrow_table(table), path, compression=self.compression)
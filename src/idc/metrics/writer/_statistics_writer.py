@@ -0,0 +1,152 @@
+import abc
+import argparse
+from typing import List, Optional
+
+from wai.logging import LOGGING_WARNING
+
+from idc.metrics.api import measure
+from idc.metrics.statistic import DatasetStatistic, DatasetStatisticList, DatasetStatisticTable
+from idc.metrics.statistic import ImageStatistic, ImageStatisticList, ImageStatisticTable, StatisticTable
+from kasperl.api import StreamWriter, make_list
+from seppl.placeholders import placeholder_list, PlaceholderSupporter
+
+
+def to_statistic_table(data) -> Optional[StatisticTable]:
+    """
+    Turns the statistics (single statistic, list or table) into a table.
+
+    :param data: the statistics to convert
+    :return: the table, None if not a statistics type
+    :rtype: StatisticTable
+    """
+    if isinstance(data, StatisticTable):
+        return data
+    if isinstance(data, DatasetStatistic):
+        data = DatasetStatisticList([data])
+    if isinstance(data, ImageStatistic):
+        data = ImageStatisticList([data])
+    if isinstance(data, DatasetStatisticList):
+        return DatasetStatisticTable.from_list(data)
+    if isinstance(data, ImageStatisticList):
+        return ImageStatisticTable.from_list(data)
+    return None
+
+
+class StatisticsWriter(StreamWriter, PlaceholderSupporter, abc.ABC):
+    """
+    Ancestor for writers that output statistics in bulk. The incoming statistics
+    get appended to a single (columnar) table as they arrive, either dataset or
+    per-image statistics (whichever arrives first), which then gets written in one
+    go when finalizing. As a stream writer, it does not force the pipeline into
+    batch mode, i.e., readers can still stream their data.
+    """
+
+    def __init__(self, output_file: str = None,
+                 logger_name: str = None, logging_level: str = LOGGING_WARNING):
+        """
+        Initializes the writer.
+
+        :param output_file: the file to write the statistics to
+        :type output_file: str
+        :param logger_name: the name to use for the logger
+        :type logger_name: str
+        :param logging_level: the logging level to use
+        :type logging_level: str
+        """
+        super().__init__(logger_name=logger_name, logging_level=logging_level)
+        self.output_file = output_file
+        self._table = None
+
+    def _output_help(self) -> str:
+        """
+        Returns the help string for the output option.
+
+        :return: the help string
+        :rtype: str
+        """
+        return "The file to store the statistics in. " + placeholder_list(obj=self)
+
+    def _create_argparser(self) -> argparse.ArgumentParser:
+        """
+        Creates an argument parser. Derived classes need to fill in the options.
+
+        :return: the parser
+        :rtype: argparse.ArgumentParser
+        """
+        parser = super()._create_argparser()
+        parser.add_argument("-o", "--output", type=str, help=self._output_help(), required=True)
+        return parser
+
+    def _apply_args(self, ns: argparse.Namespace):
+        """
+        Initializes the object with the arguments of the parsed namespace.
+
+        :param ns: the parsed arguments
+        :type ns: argparse.Namespace
+        """
+        super()._apply_args(ns)
+        self.output_file = ns.output
+
+    def accepts(self) -> List:
+        """
+        Returns the list of classes that are accepted.
+
+        :return: the list of classes
+        :rtype: list
+        """
+        return [DatasetStatistic, DatasetStatisticList, DatasetStatisticTable, ImageStatistic, ImageStatisticList, ImageStatisticTable]
+
+    def initialize(self):
+        """
+        Initializes the processing, e.g., for opening files or databases.
+        """
+        super().initialize()
+
+        if self.output_file is None:
+            raise Exception("No output file specified!")
+        self._table = None
+
+    def _write_table(self, table: StatisticTable, path: str):
+        """
+        Writes the table to the specified file.
+
+        :param table: the table to write
+        :type table: StatisticTable
+        :param path: the file to write to
+        :type path: str
+        """
+        raise NotImplementedError()
+
+    def write_stream(self, data):
+        """
+        Appends the statistics to the table.
+
+        :param data: the data to write (single record or iterable of records)
+        """
+        # the statistic lists are lists themselves, but get converted as a whole
+        items = [data] if isinstance(data, (DatasetStatisticList, ImageStatisticList)) else make_list(data)
+        for item in items:
+            table = to_statistic_table(item)
+            if table is None:
+                self.logger().warning("Unhandled data type: %s" % str(type(item)))
+                continue
+            if self._table is None:
+                self._table = type(table)()
+            if not isinstance(table, type(self._table)):
+                self.logger().warning("Cannot mix dataset and per-image statistics, skipping: %s" % str(type(item)))
+                continue
+            self._table.extend(table)
+
+    def finalize(self):
+        """
+        Finishes the processing, e.g., for closing files or databases.
+        """
+        if self._table is None:
+            self.logger().warning("No statistics to write!")
+        else:
+            path = self.session.expand_placeholders(self.output_file)
+            self.logger().info("Writing %d statistics to: %s" % (len(self._table), path))
+            with measure("%s/write" % self.name(), items=len(self._table)):
+                self._write_table(self._table, path)
+            self._table = None
+        super().finalize()
@@ -1 +1,3 @@
 from ._act_vs_pred_csv import ActualVsPredictedCSVWriter
+from ._curves_csv import CurvesCSVWriter
+from ._encoded_pairs import EncodedPairsWriter
@@ -1,18 +1,81 @@
 import argparse
 import csv
-from typing import List, Iterable
+import gzip
+import io
+from typing import List
 
 from wai.logging import LOGGING_WARNING
 
 from idc.api import ImageClassificationData
-from idc.metrics.api import ImagePairList, ImagePair
-from kasperl.api import BatchWriter
+from idc.metrics.api import ImagePairList, ImagePair, measure
+from kasperl.api import StreamWriter, make_list
 from seppl.placeholders import placeholder_list, PlaceholderSupporter
 
+COMPRESSION_AUTO = "auto"
+COMPRESSION_NONE = "none"
+COMPRESSION_GZIP = "gzip"
+COMPRESSION_ZSTD = "zstd"
+COMPRESSIONS = [
+    COMPRESSION_AUTO,
+    COMPRESSION_NONE,
+    COMPRESSION_GZIP,
+    COMPRESSION_ZSTD,
+]
 
-class ActualVsPredictedCSVWriter(BatchWriter, PlaceholderSupporter):
+BUFFER_SIZE = 1024 * 1024
+
+
+def determine_compression(path: str, compression: str) -> str:
+    """
+    Determines the compression to use for the file.
+
+    :param path: the file to write to
+    :type path: str
+    :param compression: the compression, auto-detects it from the extension if COMPRESSION_AUTO
+    :type compression: str
+    :return: the compression to use
+    :rtype: str
+    """
+    if compression != COMPRESSION_AUTO:
+        return compression
+    if path.lower().endswith(".gz"):
+        return COMPRESSION_GZIP
+    if path.lower().endswith(".zst"):
+        return COMPRESSION_ZSTD
+    return COMPRESSION_NONE
+
+
+def open_text_output(path: str, compression: str, buffer_size: int = BUFFER_SIZE):
+    """
+    Opens the file for writing text, optionally compressed.
+
+    :param path: the file to write to
+    :type path: str
+    :param compression: the compression to use (none|gzip|zstd)
+    :type compression: str
+    :param buffer_size: the size of the write buffer in bytes
+    :type buffer_size: int
+    :return: the file-like object
+    """
+    if compression == COMPRESSION_NONE:
+        return open(path, "w", newline="", buffering=buffer_size)
+    if compression == COMPRESSION_GZIP:
+        raw = gzip.open(path, "wb")
+    elif compression == COMPRESSION_ZSTD:
+        try:
+            import zstandard
+        except ImportError:
+            raise Exception("The zstandard library is required for zstd compression: pip install zstandard")
+        raw = zstandard.ZstdCompressor().stream_writer(open(path, "wb"), closefd=True)
+    else:
+        raise Exception("Unsupported compression: %s" % compression)
+    return io.TextIOWrapper(io.BufferedWriter(raw, buffer_size=buffer_size), newline="")
+
+
+class ActualVsPredictedCSVWriter(StreamWriter, PlaceholderSupporter):
 
     def __init__(self, output_file: str = None, column_image: str = None, column_actual: str = None, column_predicted: str = None,
+                 metadata_columns: List[str] = None, compression: str = None, buffer_size: int = None,
                  logger_name: str = None, logging_level: str = LOGGING_WARNING):
         """
         Initializes the writer.
@@ -25,6 +88,12 @@ class ActualVsPredictedCSVWriter(BatchWriter, PlaceholderSupporter):
         :type column_actual: str
         :param column_predicted: the column name for the predicted values
         :type column_predicted: str
+        :param metadata_columns: the meta-data keys of the predictions to output as additional columns
+        :type metadata_columns: list
+        :param compression: the compression to use (auto|none|gzip|zstd)
+        :type compression: str
+        :param buffer_size: the size of the write buffer in bytes
+        :type buffer_size: int
         :param logger_name: the name to use for the logger
         :type logger_name: str
         :param logging_level: the logging level to use
@@ -35,6 +104,11 @@ class ActualVsPredictedCSVWriter(BatchWriter, PlaceholderSupporter):
         self.column_image = column_image
         self.column_actual = column_actual
         self.column_predicted = column_predicted
+        self.metadata_columns = metadata_columns
+        self.compression = compression
+        self.buffer_size = buffer_size
+        self._fp = None
+        self._writer = None
 
     def name(self) -> str:
         """
@@ -52,7 +126,8 @@ class ActualVsPredictedCSVWriter(BatchWriter, PlaceholderSupporter):
         :return: the description
         :rtype: str
         """
-        return "Outputs a CSV file with actual vs predicted columns."
+        return "Outputs a CSV file with actual vs predicted columns. The rows get appended as the pairs arrive, " \
+               "optionally with additional columns from the meta-data of the predictions (e.g., the score)."
 
     def _create_argparser(self) -> argparse.ArgumentParser:
         """
@@ -66,6 +141,9 @@ class ActualVsPredictedCSVWriter(BatchWriter, PlaceholderSupporter):
         parser.add_argument("-i", "--column_image", type=str, help="The column name for the image name.", required=False, default="Image")
         parser.add_argument("-a", "--column_actual", type=str, help="The column name for the actual values.", required=False, default="Actual")
         parser.add_argument("-p", "--column_predicted", type=str, help="The column name for the predicted values.", required=False, default="Predicted")
+        parser.add_argument("-m", "--metadata_columns", type=str, help="The meta-data keys of the predictions to output as additional columns, e.g., score; missing values are left empty.", required=False, default=None, nargs="*")
+        parser.add_argument("-c", "--compression", choices=COMPRESSIONS, help="The compression to use; auto-detects it from the file extension (.gz, .zst) with auto; zstd requires the zstandard library.", required=False, default=COMPRESSION_AUTO)
+        parser.add_argument("-B", "--buffer_size", type=int, help="The size of the write buffer in bytes.", required=False, default=BUFFER_SIZE)
         return parser
 
     def _apply_args(self, ns: argparse.Namespace):
@@ -80,6 +158,9 @@ class ActualVsPredictedCSVWriter(BatchWriter, PlaceholderSupporter):
         self.column_image = ns.column_image
         self.column_actual = ns.column_actual
         self.column_predicted = ns.column_predicted
+        self.metadata_columns = ns.metadata_columns
+        self.compression = ns.compression
+        self.buffer_size = ns.buffer_size
 
     def accepts(self) -> List:
         """
@@ -88,7 +169,7 @@ class ActualVsPredictedCSVWriter(BatchWriter, PlaceholderSupporter):
         :return: the list of classes
         :rtype: list
         """
-        return [ImagePair]
+        return [ImagePairList, ImagePair]
 
     def initialize(self):
         """
@@ -105,26 +186,79 @@ class ActualVsPredictedCSVWriter(BatchWriter, PlaceholderSupporter):
             self.column_actual = "Actual"
         if self.column_predicted is None:
             self.column_predicted = "Predicted"
+        if self.metadata_columns is None:
+            self.metadata_columns = []
+        if self.compression is None:
+            self.compression = COMPRESSION_AUTO
+        if self.compression not in COMPRESSIONS:
+            raise Exception("Unsupported compression: %s" % self.compression)
+        if self.buffer_size is None:
+            self.buffer_size = BUFFER_SIZE
+        if self.buffer_size < 1:
+            raise Exception("Buffer size must be at least 1: %d" % self.buffer_size)
+        self._fp = None
+        self._writer = None
 
-    def write_batch(self, data: Iterable):
+    def _open(self):
         """
-        Saves the data in one go.
+        Opens the output file and writes the header.
+        """
+        path = self.session.expand_placeholders(self.output_file)
+        compression = determine_compression(path, self.compression)
+        self.logger().info("Writing data to: %s (compression: %s)" % (path, compression))
+        self._fp = open_text_output(path, compression, buffer_size=self.buffer_size)
+        self._writer = csv.writer(self._fp, quoting=csv.QUOTE_MINIMAL)
+        self._writer.writerow([self.column_image, self.column_actual, self.column_predicted] + self.metadata_columns)
 
-        :param data: the data to write
-        :type data: Iterable
+    def _row(self, pair: ImagePair) -> list:
         """
-        for item in data:
-            if not isinstance(item, ImagePairList):
+        Generates the row for the pair.
+
+        :param pair: the pair to generate the row for
+        :type pair: ImagePair
+        :return: the row
+        :rtype: list
+        """
+        row = [pair.image_name, pair.annotation.annotation, pair.prediction.annotation]
+        if len(self.metadata_columns) > 0:
+            meta = pair.prediction.get_metadata()
+            if meta is None:
+                meta = dict()
+            for key in self.metadata_columns:
+                row.append(meta.get(key, ""))
+        return row
+
+    def write_stream(self, data):
+        """
+        Saves the data one by one.
+
+        :param data: the data to write (single record or iterable of records)
+        """
+        if self._writer is None:
+            self._open()
+        # the pair lists are lists themselves, but get written as a whole
+        items = [data] if isinstance(data, (ImagePair, ImagePairList)) else make_list(data)
+        batches = []
+        pairs = []
+        for item in items:
+            if isinstance(item, ImagePair):
+                pairs.append(item)
+            elif isinstance(item, ImagePairList):
+                batches.append(item)
+            else:
                 self.logger().warning("Unhandled data type: %s" % str(type(item)))
-                continue
-
-            rows = [[self.column_image, self.column_actual, self.column_predicted]]
-            for pair in item:
-                if isinstance(pair.annotation, ImageClassificationData):
-                    rows.append([pair.image_name, pair.annotation.annotation, pair.prediction.annotation])
-
-            path = self.session.expand_placeholders(self.output_file)
-            self.logger().info("Writing data to: %s" % path)
-            with open(path, "w") as fp:
-                writer = csv.writer(fp, quoting=csv.QUOTE_MINIMAL)
-                writer.writerows(rows)
+        if len(pairs) > 0:
+            batches.append(pairs)
+        for batch in batches:
+            with measure("%s/write" % self.name(), items=len(batch)):
+                self._writer.writerows(self._row(pair) for pair in batch if isinstance(pair.annotation, ImageClassificationData))
+
+    def finalize(self):
+        """
+        Finishes the processing, e.g., for closing files or databases.
+        """
+        if self._fp is not None:
+            self._fp.close()
+            self._fp = None
+            self._writer = None
+        super().finalize()
@@ -0,0 +1,165 @@
+import argparse
+import csv
+from typing import List
+
+import numpy as np
+from wai.logging import LOGGING_WARNING
+
+from idc.api import ImageClassificationData
+from idc.metrics.api import ImagePairList, ImagePair, LabelEncoder, ScoreAccumulator, SCORES_KEY, CURVE_ROC, CURVES, curves_from_scores, to_batches
+from kasperl.api import StreamWriter
+from seppl.placeholders import placeholder_list, PlaceholderSupporter
+
+
+class CurvesCSVWriter(StreamWriter, PlaceholderSupporter):
+
+    def __init__(self, output_file: str = None, curve: str = None, score_key: str = None, classes: List[str] = None,
+                 logger_name: str = None, logging_level: str = LOGGING_WARNING):
+        """
+        Initializes the writer.
+
+        :param output_file: the file to write the curves to
+        :type output_file: str
+        :param curve: the type of curve to output (roc|pr)
+        :type curve: str
+        :param score_key: the meta-data key of the predictions with the per-class probabilities
+        :type score_key: str
+        :param classes: the fixed list of class labels to use, determined from the data if None
+        :type classes: list
+        :param logger_name: the name to use for the logger
+        :type logger_name: str
+        :param logging_level: the logging level to use
+        :type logging_level: str
+        """
+        super().__init__(logger_name=logger_name, logging_level=logging_level)
+        self.output_file = output_file
+        self.curve = curve
+        self.score_key = score_key
+        self.classes = classes
+        self._encoder = None
+        self._accumulator = None
+
+    def name(self) -> str:
+        """
+        Returns the name of the handler, used as sub-command.
+
+        :return: the name
+        :rtype: str
+        """
+        return "to-curves-ic"
+
+    def description(self) -> str:
+        """
+        Returns a description of the writer.
+
+        :return: the description
+        :rtype: str
+        """
+        return "Outputs the one-vs-rest ROC or precision-recall curves of all classes in CSV format, " \
+               "using the per-class scores of the predictions. ROC curves use the columns Class, Threshold, FPR and TPR, " \
+               "precision-recall curves the columns Class, Threshold, Precision and Recall."
+
+    def _create_argparser(self) -> argparse.ArgumentParser:
+        """
+        Creates an argument parser. Derived classes need to fill in the options.
+
+        :return: the parser
+        :rtype: argparse.ArgumentParser
+        """
+        parser = super()._create_argparser()
+        parser.add_argument("-o", "--output", type=str, help="The CSV file to store the curves in. " + placeholder_list(obj=self), required=True)
+        parser.add_argument("-t", "--curve", choices=CURVES, help="The type of curve to output.", required=False, default=CURVE_ROC)
+        parser.add_argument("-k", "--score_key", type=str, default=SCORES_KEY, help="The meta-data key of the predictions that contains the per-class probabilities (dictionary or JSON string of label -> probability).", required=False)
+        parser.add_argument("-c", "--classes", type=str, default=None, help="The fixed list of class labels to use, which determines their order; pairs with other labels get skipped. Determined from the data if not provided.", required=False, nargs="*")
+        return parser
+
+    def _apply_args(self, ns: argparse.Namespace):
+        """
+        Initializes the object with the arguments of the parsed namespace.
+
+        :param ns: the parsed arguments
+        :type ns: argparse.Namespace
+        """
+        super()._apply_args(ns)
+        self.output_file = ns.output
+        self.curve = ns.curve
+        self.score_key = ns.score_key
+        self.classes = ns.classes
+
+    def accepts(self) -> List:
+        """
+        Returns the list of classes that are accepted.
+
+        :return: the list of classes
+        :rtype: list
+        """
+        return [ImagePairList, ImagePair]
+
+    def initialize(self):
+        """
+        Initializes the processing, e.g., for opening files or databases.
+        """
+        super().initialize()
+
+        if self.output_file is None:
+            raise Exception("No output file specified!")
+        if self.curve is None:
+            self.curve = CURVE_ROC
+        if self.curve not in CURVES:
+            raise Exception("Unsupported curve: %s" % self.curve)
+        if self.score_key is None:
+            self.score_key = SCORES_KEY
+        if (self.classes is not None) and (len(self.classes) > 0):
+            self._encoder = LabelEncoder(classes=self.classes, fixed=True)
+        else:
+            self._encoder = LabelEncoder()
+        self._accumulator = ScoreAccumulator()
+
+    def write_stream(self, data):
+        """
+        Collects the label indices and scores of the pairs, the curves get written when finalizing.
+
+        :param data: the data to write (single record or iterable of records)
+        """
+        for batch in to_batches(data):
+            batch = [x for x in batch if isinstance(x.annotation, ImageClassificationData)]
+            anns, _, scores = self._encoder.encode_scores(batch, self.score_key)
+            self._accumulator.update(anns, scores)
+
+    def _write_curves(self):
+        """
+        Calculates the curves from the collected scores and writes them to the output file.
+        """
+        encoder = self._encoder
+        accumulator = self._accumulator
+        encoder.log(self.logger())
+        if accumulator.total == 0:
+            self.logger().warning("No labeled pairs to calculate curves for!")
+            return
+
+        order = np.arange(encoder.num_classes) if encoder.fixed else encoder.sort_order()
+        classes = encoder.classes
+        curves = curves_from_scores(accumulator.anns, accumulator.scores, curve=self.curve)
+        if self.curve == CURVE_ROC:
+            header = ["Class", "Threshold", "FPR", "TPR"]
+        else:
+            header = ["Class", "Threshold", "Precision", "Recall"]
+
+        path = self.session.expand_placeholders(self.output_file)
+        self.logger().info("Writing curves to: %s" % path)
+        with open(path, "w", newline="") as fp:
+            writer = csv.writer(fp, quoting=csv.QUOTE_MINIMAL)
+            writer.writerow(header)
+            for i in order:
+                x, y, thresholds = curves[i]
+                writer.writerows(zip([classes[i]] * len(thresholds), thresholds.tolist(), x.tolist(), y.tolist()))
+
+    def finalize(self):
+        """
+        Finishes the processing, e.g., for closing files or databases.
+        """
+        if self._accumulator is not None:
+            self._write_curves()
+            self._encoder = None
+            self._accumulator = None
+        super().finalize()
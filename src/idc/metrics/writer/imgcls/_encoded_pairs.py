@@ -0,0 +1,143 @@
+import argparse
+from typing import List
+
+from wai.logging import LOGGING_WARNING
+
+from idc.api import ImageClassificationData
+from idc.metrics.api import ImagePairList, ImagePair, LabelEncoder, EncodedPairsOutput, SCORES_KEY, measure
+from kasperl.api import StreamWriter, make_list
+from seppl.placeholders import placeholder_list, PlaceholderSupporter
+
+
+class EncodedPairsWriter(StreamWriter, PlaceholderSupporter):
+
+    def __init__(self, output_dir: str = None, classes: List[str] = None, scores: bool = False, score_key: str = None,
+                 logger_name: str = None, logging_level: str = LOGGING_WARNING):
+        """
+        Initializes the writer.
+
+        :param output_dir: the directory to write the encoded pairs to
+        :type output_dir: str
+        :param classes: the fixed list of class labels to use, determined from the data if None
+        :type classes: list
+        :param scores: whether to write the score matrix as well
+        :type scores: bool
+        :param score_key: the meta-data key of the predictions with the per-class probabilities
+        :type score_key: str
+        :param logger_name: the name to use for the logger
+        :type logger_name: str
+        :param logging_level: the logging level to use
+        :type logging_level: str
+        """
+        super().__init__(logger_name=logger_name, logging_level=logging_level)
+        self.output_dir = output_dir
+        self.classes = classes
+        self.scores = scores
+        self.score_key = score_key
+        self._encoder = None
+        self._output = None
+
+    def name(self) -> str:
+        """
+        Returns the name of the handler, used as sub-command.
+
+        :return: the name
+        :rtype: str
+        """
+        return "to-encoded-pairs-ic"
+
+    def description(self) -> str:
+        """
+        Returns a description of the writer.
+
+        :return: the description
+        :rtype: str
+        """
+        return "Writes the classification pairs in a compact binary format that can be memory-mapped (see load-encoded-pairs-ic) " \
+               "for re-computing statistics without re-running the sub-flows: class table, int32 label indices of " \
+               "annotations/predictions, optional float32 score matrix and the image names."
+
+    def _create_argparser(self) -> argparse.ArgumentParser:
+        """
+        Creates an argument parser. Derived classes need to fill in the options.
+
+        :return: the parser
+        :rtype: argparse.ArgumentParser
+        """
+        parser = super()._create_argparser()
+        parser.add_argument("-o", "--output", type=str, help="The directory to store the encoded pairs in. " + placeholder_list(obj=self), required=True)
+        parser.add_argument("-c", "--classes", type=str, default=None, help="The fixed list of class labels to use, which determines their order; pairs with other labels get skipped. Determined from the data if not provided.", required=False, nargs="*")
+        parser.add_argument("-s", "--scores", action="store_true", help="Whether to write the score matrix with the per-class probabilities as well.")
+        parser.add_argument("-k", "--score_key", type=str, default=SCORES_KEY, help="The meta-data key of the predictions that contains the per-class probabilities (dictionary or JSON string of label -> probability).", required=False)
+        return parser
+
+    def _apply_args(self, ns: argparse.Namespace):
+        """
+        Initializes the object with the arguments of the parsed namespace.
+
+        :param ns: the parsed arguments
+        :type ns: argparse.Namespace
+        """
+        super()._apply_args(ns)
+        self.output_dir = ns.output
+        self.classes = ns.classes
+        self.scores = ns.scores
+        self.score_key = ns.score_key
+
+    def accepts(self) -> List:
+        """
+        Returns the list of classes that are accepted.
+
+        :return: the list of classes
+        :rtype: list
+        """
+        return [ImagePairList, ImagePair]
+
+    def initialize(self):
+        """
+        Initializes the processing, e.g., for opening files or databases.
+        """
+        super().initialize()
+        if self.output_dir is None:
+            raise Exception("No output directory specified!")
+        if self.scores is None:
+            self.scores = False
+        if self.score_key is None:
+            self.score_key = SCORES_KEY
+        if (self.classes is not None) and (len(self.classes) > 0):
+            self._encoder = LabelEncoder(classes=self.classes, fixed=True)
+        else:
+            self._encoder = LabelEncoder()
+        self._output = None
+
+    def write_stream(self, data):
+        """
+        Saves the data one by one.
+
+        :param data: the data to write (single record or iterable of records)
+        """
+        if self._output is None:
+            path = self.session.expand_placeholders(self.output_dir)
+            self.logger().info("Writing encoded pairs to: %s" % path)
+            self._output = EncodedPairsOutput(path, with_scores=self.scores)
+            self._output.open()
+        for item in make_list(data):
+            if isinstance(item, ImagePair):
+                item = [item]
+            elif not isinstance(item, ImagePairList):
+                self.logger().warning("Unhandled data type: %s" % str(type(item)))
+                continue
+            with measure("%s/write" % self.name(), items=len(item)):
+                pairs = [pair for pair in item if isinstance(pair.annotation, ImageClassificationData)]
+                anns, preds, scores, rows = self._encoder.encode_rows(pairs, score_key=self.score_key if self.scores else None)
+                self._output.append([pairs[i].image_name for i in rows.tolist()], anns, preds, scores=scores)
+
+    def finalize(self):
+        """
+        Finishes the processing, e.g., for closing files or databases.
+        """
+        if self._output is not None:
+            self._output.close(self._encoder.classes, score_key=self.score_key if self.scores else None)
+            self._encoder.log(self.logger())
+            self._output = None
+        super().finalize()
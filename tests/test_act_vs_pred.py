@@ -0,0 +1,63 @@
+import csv
+import gzip
+import os
+import tempfile
+import unittest
+
+from idc.api import ImageClassificationData
+from idc.metrics.api import ImagePair, ImagePairList, start_profiling, stop_profiling
+from idc.metrics.writer.imgcls import ActualVsPredictedCSVWriter
+from kasperl.api import Session
+
+
+def pairs(indices) -> ImagePairList:
+    result = ImagePairList()
+    for i in indices:
+        name = "img%d.jpg" % i
+        prediction = ImageClassificationData(image_name=name, annotation="b", metadata={"score": i})
+        result.append(ImagePair(name, ImageClassificationData(image_name=name, annotation="a"), prediction))
+    return result
+
+
+class TestActualVsPredictedCSVWriter(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+        stop_profiling()
+
+    def _write(self, output: str, batches: list) -> list:
+        writer = ActualVsPredictedCSVWriter(output_file=os.path.join(self.tmp.name, output), metadata_columns=["score"])
+        writer.session = Session()
+        writer.initialize()
+        for batch in batches:
+            writer.write_stream(batch)
+        writer.finalize()
+        if output.endswith(".gz"):
+            with gzip.open(os.path.join(self.tmp.name, output), "rt") as fp:
+                return list(csv.reader(fp))
+        with open(os.path.join(self.tmp.name, output), "r") as fp:
+            return list(csv.reader(fp))
+
+    def test_rows(self):
+        rows = self._write("out.csv", [pairs(range(3)), pairs(range(3, 5)), pairs([5])[0]])
+        self.assertEqual(["Image", "Actual", "Predicted", "score"], rows[0])
+        self.assertEqual(7, len(rows))
+        self.assertEqual(["img5.jpg", "a", "b", "5"], rows[-1])
+
+    def test_gzip(self):
+        self.assertEqual(self._write("out.csv", [pairs(range(4))]), self._write("out.csv.gz", [pairs(range(4))]))
+
+    def test_batches(self):
+        profiler = start_profiling()
+        self._write("out.csv", [pairs(range(3)), pairs(range(3, 5))])
+        # one measurement (i.e., one writerows call) per batch
+        entry = profiler.entry("to-act-vs-pred-ic/write")
+        self.assertEqual(2, entry.calls)
+        self.assertEqual(5, entry.items)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+import os
+import tempfile
+import unittest
+
+from idc.api import ImageClassificationData, DepthData
+from idc.metrics.api import AnnotationCache, AnnotationCacheWriter
+
+
+class TestAnnotationCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache = AnnotationCache(os.path.join(self.tmp.name, "cache"))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_chunks(self):
+        items = [ImageClassificationData(image_name="img%d.jpg" % i, annotation=None if i == 3 else "c%d" % (i % 3),
+                                         metadata={"i": i} if i == 5 else None) for i in range(10)]
+        writer = AnnotationCacheWriter(self.cache, "key", chunk_size=4)
+        for item in items:
+            writer.append(item)
+        # only complete entries are available
+        self.assertIsNone(self.cache.iterate("key"))
+        writer.close()
+        loaded = list(self.cache.iterate("key"))
+        self.assertEqual([x.image_name for x in items], [x.image_name for x in loaded])
+        self.assertEqual([x.annotation for x in items], [x.annotation for x in loaded])
+        self.assertEqual({"i": 5}, loaded[5].get_metadata())
+
+    def test_pickled(self):
+        items = [DepthData(image_name="img%d.png" % i, image_size=(4, 3), annotation=None) for i in range(5)]
+        self.cache.store("key", items)
+        loaded = self.cache.load("key")
+        self.assertEqual(5, len(loaded))
+        self.assertEqual((4, 3), loaded[0].image_size)
+
+    def test_abort(self):
+        writer = self.cache.writer("key")
+        writer.append(ImageClassificationData(image_name="img.jpg", annotation="c"))
+        writer.abort()
+        self.assertIsNone(self.cache.load("key"))
+        self.assertEqual([], os.listdir(self.cache.cache_dir))
+
+    def test_mixed_types(self):
+        writer = self.cache.writer("key")
+        writer.append(ImageClassificationData(image_name="img.jpg", annotation="c"))
+        with self.assertRaises(Exception):
+            writer.append(DepthData(image_name="img.png", annotation=None))
+        writer.abort()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,154 @@
+import math
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from idc.api import ImageClassificationData
+from idc.metrics.api import ImagePair, ImagePairList, LabelEncoder, confusion_matrix, evaluate_classification
+from idc.metrics.api import bootstrap_confusion_matrices, bootstrap_interval, bootstrap_rows
+from idc.metrics.api import mcnemar_test, model_confusion_matrices, permutation_test_from_confusion
+from idc.metrics.statistic.imgcls import determine_classes
+
+ANNS = np.array([0, 0, 1, 1, 2])
+PREDS = np.array([0, 1, 1, 1, 0])
+
+
+def pairs(anns, preds) -> ImagePairList:
+    result = ImagePairList()
+    for i, (ann, pred) in enumerate(zip(anns, preds)):
+        name = "img%d.jpg" % i
+        result.append(ImagePair(name, ImageClassificationData(image_name=name, annotation=ann),
+                                ImageClassificationData(image_name=name, annotation=pred)))
+    return result
+
+
+def accuracy(matrices: np.ndarray) -> np.ndarray:
+    return np.trace(matrices, axis1=-2, axis2=-1) / matrices.sum(axis=(-2, -1))
+
+
+def mean(values: np.ndarray) -> float:
+    return float(values.mean())
+
+
+class TestDetermineClasses(unittest.TestCase):
+
+    def test_alphabetical(self):
+        anns, preds, lookup = determine_classes(pairs(["b", "a", "c"], ["a", "a", "b"]))
+        self.assertEqual({"a": 0, "b": 1, "c": 2}, lookup)
+        self.assertEqual([1, 0, 2], anns.tolist())
+        self.assertEqual([0, 0, 1], preds.tolist())
+
+    def test_encoder(self):
+        # the indices of the encoder stay stable across batches
+        encoder = LabelEncoder(classes=["c", "b", "a"])
+        anns, preds, lookup = determine_classes(pairs(["b", "a"], ["a", "c"]), encoder=encoder)
+        self.assertEqual({"c": 0, "b": 1, "a": 2}, lookup)
+        self.assertEqual([1, 2], anns.tolist())
+        self.assertEqual([2, 0], preds.tolist())
+
+    def test_empty(self):
+        self.assertEqual((None, None, None), determine_classes(ImagePairList()))
+
+
+class TestStatistics(unittest.TestCase):
+
+    def test_confusion_matrix(self):
+        self.assertEqual([[1, 1, 0], [0, 2, 0], [1, 0, 0]], confusion_matrix(ANNS, PREDS, 3).tolist())
+
+    def test_known_values(self):
+        result = evaluate_classification(ANNS, PREDS, statistics="accuracy-ic precision-ic -a macro recall-ic -a macro precision-ic -a none cohen-kappa-ic")
+        self.assertAlmostEqual(0.6, result[0][1])
+        self.assertAlmostEqual((0.5 + 2 / 3 + 0.0) / 3, result[1][1])
+        self.assertAlmostEqual((0.5 + 1.0 + 0.0) / 3, result[2][1])
+        np.testing.assert_allclose([0.5, 2 / 3, 0.0], result[3][1])
+        # observed agreement 0.6, expected agreement 0.4
+        self.assertAlmostEqual((0.6 - 0.4) / (1 - 0.4), result[4][1])
+
+    def test_string_labels(self):
+        result = evaluate_classification(np.array(["cat", "cat", "dog"]), np.array(["cat", "dog", "dog"]))
+        self.assertAlmostEqual(2 / 3, result[0][1])
+
+    def test_auroc(self):
+        anns = np.array([0, 0, 1, 1])
+        positive = np.array([0.1, 0.4, 0.35, 0.8])
+        scores = np.stack([1 - positive, positive], axis=1)
+        self.assertAlmostEqual(0.75, evaluate_classification(anns, scores=scores, statistics="auroc-ic -a macro")[0][1], places=6)
+
+    def test_backends(self):
+        rng = np.random.default_rng(1)
+        anns = rng.integers(0, 4, 200)
+        preds = np.where(rng.uniform(size=200) < 0.3, rng.integers(0, 4, 200), anns)
+        scores = rng.dirichlet(np.ones(4), 200)
+        scores[np.arange(200), anns] += 0.5
+        scores /= scores.sum(axis=1, keepdims=True)
+        for statistic in ["accuracy-ic", "accuracy-ic -a macro", "precision-ic -a macro", "recall-ic -a weighted",
+                          "cohen-kappa-ic", "auroc-ic -a macro", "average-precision-ic -a macro", "ece-ic"]:
+            numpy = evaluate_classification(anns, preds, scores=scores, statistics=statistic + " -b numpy")
+            torch = evaluate_classification(anns, preds, scores=scores, statistics=statistic + " -b torch")
+            self.assertAlmostEqual(numpy[0][1], torch[0][1], places=5, msg=statistic)
+
+
+class TestBootstrap(unittest.TestCase):
+
+    def test_confusion_matrices(self):
+        matrix = confusion_matrix(ANNS, PREDS, 3)
+        samples = bootstrap_confusion_matrices(matrix, 50, np.random.default_rng(1))
+        self.assertEqual((50, 3, 3), samples.shape)
+        self.assertTrue(np.all(samples.sum(axis=(1, 2)) == 5))
+        # cells without pairs never get drawn
+        self.assertTrue(np.all(samples[:, matrix == 0] == 0))
+        np.testing.assert_array_equal(samples, bootstrap_confusion_matrices(matrix, 50, np.random.default_rng(1)))
+
+    def test_interval(self):
+        mean_, lower, upper = bootstrap_interval(np.arange(101), confidence=0.9)
+        self.assertAlmostEqual(50.0, mean_)
+        self.assertAlmostEqual(5.0, lower)
+        self.assertAlmostEqual(95.0, upper)
+
+    def test_rows(self):
+        values = np.arange(20, dtype=np.float64)
+        sequential = bootstrap_rows(mean, (values,), 40, seed=1, num_chunks=4)
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            parallel = bootstrap_rows(mean, (values,), 40, seed=1, num_chunks=4, executor=executor)
+        self.assertEqual((40,), sequential.shape)
+        np.testing.assert_array_equal(sequential, parallel)
+        self.assertTrue(np.all((sequential >= 0) & (sequential <= 19)))
+
+
+class TestComparison(unittest.TestCase):
+
+    def test_model_confusion_matrices(self):
+        other = np.array([0, 0, 1, 2, 2])
+        matrices = model_confusion_matrices(ANNS, np.stack([PREDS, other]), 3)
+        np.testing.assert_array_equal(confusion_matrix(ANNS, PREDS, 3), matrices[0])
+        np.testing.assert_array_equal(confusion_matrix(ANNS, other, 3), matrices[1])
+
+    def test_mcnemar_exact(self):
+        # 10 pairs only correct for the first model, 2 only for the second
+        correct_a = np.array([True] * 10 + [False] * 2 + [True] * 5)
+        correct_b = np.array([False] * 10 + [True] * 2 + [True] * 5)
+        statistic, p_value = mcnemar_test(correct_a, correct_b)
+        self.assertAlmostEqual(49 / 12, statistic)
+        self.assertAlmostEqual(2 * (1 + 12 + 66) / 2 ** 12, p_value)
+
+    def test_mcnemar_chi_square(self):
+        correct_a = np.array([True] * 30 + [False] * 10)
+        statistic, p_value = mcnemar_test(correct_a, ~correct_a)
+        self.assertAlmostEqual(19 ** 2 / 40, statistic)
+        self.assertAlmostEqual(0.002664, p_value, places=5)
+        self.assertEqual((0.0, 1.0), mcnemar_test(correct_a, correct_a))
+
+    def test_permutation(self):
+        observed, p_value = permutation_test_from_confusion(accuracy, ANNS, PREDS, PREDS, 3, num_permutations=99, seed=1)
+        self.assertAlmostEqual(0.0, float(observed))
+        self.assertAlmostEqual(1.0, float(p_value))
+        anns = np.zeros(100, dtype=np.int64)
+        preds_b = np.ones(100, dtype=np.int64)
+        observed, p_value = permutation_test_from_confusion(accuracy, anns, anns, preds_b, 2, num_permutations=99, seed=1)
+        self.assertAlmostEqual(1.0, float(observed))
+        self.assertTrue(math.isclose(0.01, float(p_value)))
+
+
+if __name__ == '__main__':
+    unittest.main()
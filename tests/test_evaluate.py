@@ -0,0 +1,29 @@
+import unittest
+
+import numpy as np
+
+from idc.metrics.api import evaluate_classification, evaluate_detection, evaluate_segmentation, evaluate_depth
+
+
+class TestEvaluate(unittest.TestCase):
+
+    def test_classification(self):
+        result = dict(evaluate_classification(np.array([0, 1, 2, 1]), np.array([0, 1, 1, 1]), statistics="accuracy-ic"))
+        self.assertAlmostEqual(0.75, result["Accuracy"])
+
+    def test_empty(self):
+        empty = np.zeros((0,), dtype=np.int64)
+        with self.assertRaises(Exception):
+            evaluate_classification(empty, empty)
+        with self.assertRaises(Exception):
+            evaluate_detection(np.zeros((0, 4)), empty, empty, np.zeros((0, 4)), empty, empty)
+        with self.assertRaises(Exception):
+            evaluate_segmentation([], [])
+        with self.assertRaises(Exception):
+            evaluate_depth(np.zeros((0,)), np.zeros((0,)))
+        with self.assertRaises(Exception):
+            evaluate_depth([], [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+import unittest
+
+from idc.api import ImageClassificationData
+from idc.metrics.api import MATCH_AUTO, MATCH_HASH, MATCH_MERGE, NotSortedError, PairMatcher
+
+
+def items(names, label="a"):
+    return [ImageClassificationData(image_name=name, annotation=label) for name in names]
+
+
+class TestPairMatcher(unittest.TestCase):
+
+    def _names(self, result):
+        return [(x.annotation.image_name, x.prediction.image_name) for x in result.pairs]
+
+    def test_hash_unsorted(self):
+        result = PairMatcher(strategy=MATCH_HASH, report_names=True).match(
+            items(["c.jpg", "a.jpg", "d.jpg", "b.jpg"]), items(["b.jpg", "e.jpg", "c.jpg", "a.jpg"], "b"))
+        # in the order of the annotations
+        self.assertEqual([("c.jpg", "c.jpg"), ("a.jpg", "a.jpg"), ("b.jpg", "b.jpg")], self._names(result))
+        self.assertEqual(["d.jpg"], result.unmatched_annotations)
+        self.assertEqual(["e.jpg"], result.unmatched_predictions)
+        self.assertTrue(result.pairs.last)
+
+    def test_merge_equals_hash(self):
+        anns = items(["a.jpg", "b.jpg", "c.jpg", "d.jpg"])
+        preds = items(["b.jpg", "c.jpg", "d.jpg", "e.jpg"], "b")
+        merged = PairMatcher(strategy=MATCH_MERGE).match(anns, preds)
+        hashed = PairMatcher(strategy=MATCH_HASH).match(anns, preds)
+        self.assertEqual(self._names(hashed), self._names(merged))
+        self.assertEqual(1, merged.num_unmatched_annotations)
+        self.assertEqual(1, merged.num_unmatched_predictions)
+
+    def test_merge_unsorted(self):
+        with self.assertRaises(NotSortedError):
+            PairMatcher(strategy=MATCH_MERGE).match(items(["b.jpg", "a.jpg"]), items(["a.jpg", "b.jpg"], "b"))
+
+    def test_auto_unsorted(self):
+        # falls back to hash join
+        result = PairMatcher(strategy=MATCH_AUTO).match(items(["b.jpg", "a.jpg"]), items(["a.jpg", "b.jpg"], "b"))
+        self.assertEqual([("b.jpg", "b.jpg"), ("a.jpg", "a.jpg")], self._names(result))
+
+    def test_duplicates(self):
+        for strategy in [MATCH_HASH, MATCH_MERGE]:
+            result = PairMatcher(strategy=strategy).match(items(["a.jpg", "a.jpg", "b.jpg"]), items(["a.jpg", "b.jpg", "b.jpg"], "b"))
+            self.assertEqual([("a.jpg", "a.jpg"), ("b.jpg", "b.jpg")], self._names(result), msg=strategy)
+            self.assertEqual(1, result.num_duplicate_annotations, msg=strategy)
+            self.assertEqual(1, result.num_duplicate_predictions, msg=strategy)
+
+    def test_normalization(self):
+        matcher = PairMatcher(strategy=MATCH_HASH, strip_directory=True, strip_extension=True, ignore_case=True)
+        self.assertEqual("img", matcher.key("/some/dir/IMG.jpg"))
+        result = matcher.match(items(["/data/IMG.jpg", "other.jpg"]), items(["img.png"], "b"))
+        self.assertEqual([("/data/IMG.jpg", "img.png")], self._names(result))
+        # no normalization by default
+        self.assertEqual(0, len(PairMatcher(strategy=MATCH_HASH).match(items(["IMG.jpg"]), items(["img.png"], "b")).pairs))
+
+
+if __name__ == '__main__':
+    unittest.main()
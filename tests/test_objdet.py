@@ -0,0 +1,103 @@
+import contextlib
+import io
+import unittest
+
+import numpy as np
+
+from idc.metrics.api import DetectionArrays, DetectionEvaluator
+
+try:
+    from pycocotools.coco import COCO
+    from pycocotools.cocoeval import COCOeval
+except ImportError:
+    COCO = None
+
+
+def _generate(num_images: int, num_gt: int, dets_per_gt: int, num_classes: int, seed: int = 1):
+    """
+    Generates random ground truth boxes with jittered detections around them,
+    both in COCO format and as DetectionArrays.
+
+    :param num_images: the number of images
+    :type num_images: int
+    :param num_gt: the number of ground truth boxes per image and class
+    :type num_gt: int
+    :param dets_per_gt: the number of detections per ground truth box
+    :type dets_per_gt: int
+    :param num_classes: the number of classes
+    :type num_classes: int
+    :param seed: the seed for the random number generator
+    :type seed: int
+    :return: the tuple of COCO dataset, COCO detections and DetectionArrays
+    :rtype: tuple
+    """
+    rng = np.random.default_rng(seed)
+    images = []
+    anns = []
+    dets = []
+    gt_boxes, gt_labels, gt_images = [], [], []
+    det_boxes, det_labels, det_scores, det_images = [], [], [], []
+    for i in range(num_images):
+        images.append({"id": i + 1, "width": 500, "height": 500})
+        for c in range(num_classes):
+            for _ in range(num_gt):
+                x, y = rng.uniform(0, 400, 2)
+                w, h = rng.uniform(10, 100, 2)
+                anns.append({"id": len(anns) + 1, "image_id": i + 1, "category_id": c + 1,
+                             "bbox": [x, y, w, h], "area": w * h, "iscrowd": 0})
+                gt_boxes.append((x, y, x + w, y + h))
+                gt_labels.append(c)
+                gt_images.append(i)
+                for _ in range(dets_per_gt):
+                    dx, dy = rng.normal(0, 8, 2)
+                    score = float(rng.uniform())
+                    dets.append({"image_id": i + 1, "category_id": c + 1, "bbox": [x + dx, y + dy, w, h], "score": score})
+                    det_boxes.append((x + dx, y + dy, x + dx + w, y + dy + h))
+                    det_labels.append(c)
+                    det_scores.append(score)
+                    det_images.append(i)
+    dataset = {"images": images, "annotations": anns, "categories": [{"id": c + 1} for c in range(num_classes)]}
+    arrays = DetectionArrays(num_images,
+                             gt_boxes=np.array(gt_boxes), gt_labels=gt_labels, gt_images=gt_images,
+                             det_boxes=np.array(det_boxes), det_labels=det_labels, det_scores=det_scores, det_images=det_images)
+    return dataset, dets, arrays
+
+
+@unittest.skipIf(COCO is None, "pycocotools not available")
+class TestDetectionEvaluatorAgainstCOCOeval(unittest.TestCase):
+
+    def _compare(self, num_images: int, num_gt: int, dets_per_gt: int, num_classes: int):
+        dataset, dets, arrays = _generate(num_images, num_gt, dets_per_gt, num_classes)
+        with contextlib.redirect_stdout(io.StringIO()):
+            gt = COCO()
+            gt.dataset = dataset
+            gt.createIndex()
+            coco_eval = COCOeval(gt, gt.loadRes(dets), "bbox")
+            coco_eval.evaluate()
+            coco_eval.accumulate()
+            coco_eval.summarize()
+        evaluator = DetectionEvaluator()
+        evaluator.update(arrays)
+        evaluation = evaluator.compute(num_classes)
+
+        # area range "all", maxDets 100
+        precision = coco_eval.eval["precision"][:, :, :, 0, 2]
+        recall = coco_eval.eval["recall"][:, :, 0, 2]
+        np.testing.assert_allclose(evaluation.precision, precision, atol=1e-12)
+        np.testing.assert_allclose(evaluation.recall, recall, atol=1e-12)
+        self.assertAlmostEqual(float(evaluation.average_precision()), coco_eval.stats[0], places=12)
+        self.assertAlmostEqual(float(evaluation.average_recall()), coco_eval.stats[8], places=12)
+
+    def test_few_detections(self):
+        self._compare(20, 2, 3, 3)
+
+    def test_more_than_max_detections_per_image(self):
+        # 240 detections per image, 80 per class: the limit of 100 applies per image and category
+        self._compare(3, 10, 8, 3)
+
+    def test_more_than_max_detections_per_category(self):
+        self._compare(2, 30, 5, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+import os
+import tempfile
+import unittest
+
+from idc.metrics.reader import LoadMetricsPairsReader, LoadMetricsMultiPairsReader
+from idc.metrics.tool.server import EvaluationService
+from kasperl.api import Session
+
+ANNOTATIONS = "generate-synthetic-data -n 300"
+PREDICTIONS = "generate-synthetic-data -n 300 -p -e 0.2 --scores"
+PREDICTIONS2 = "generate-synthetic-data -n 300 -p -e 0.4 --scores -S 1"
+STATISTICS = "accuracy-ic precision-ic -a macro auroc-ic"
+
+
+def read(reader) -> list:
+    """
+    Executes the reader and returns the batches.
+
+    :param reader: the reader to execute
+    :return: the batches
+    :rtype: list
+    """
+    reader.session = Session()
+    reader.initialize()
+    return list(reader.read())
+
+
+class TestLoadMetricsPairs(unittest.TestCase):
+
+    def _names(self, **kwargs) -> list:
+        batches = read(LoadMetricsPairsReader(annotations_subflow=ANNOTATIONS, predictions_subflow=PREDICTIONS, **kwargs))
+        self.assertTrue(batches[-1].last)
+        for batch in batches[:-1]:
+            self.assertFalse(batch.last)
+        return [(pair.annotation.image_name, pair.prediction.image_name) for batch in batches for pair in batch]
+
+    def test_modes(self):
+        expected = self._names()
+        self.assertEqual(300, len(expected))
+        self.assertEqual(expected, self._names(parallel=True))
+        self.assertEqual(expected, self._names(match_strategy="merge"))
+        # streaming forwards the pairs in the order they are complete
+        for kwargs in [dict(), dict(parallel=True), dict(match_strategy="merge")]:
+            self.assertEqual(sorted(expected), sorted(self._names(stream=True, chunk_size=64, **kwargs)), msg=str(kwargs))
+
+    def test_shards(self):
+        expected = self._names()
+        shards = [self._names(shard="%d/3" % i) + self._names(shard="%d/3" % i, stream=True) for i in range(1, 4)]
+        for shard in shards:
+            self.assertGreater(len(shard), 0)
+        combined = [x for shard in shards for x in shard]
+        self.assertEqual(sorted(expected * 2), sorted(combined))
+
+    def test_multi_pairs(self):
+        batches = read(LoadMetricsMultiPairsReader(annotations_subflow=ANNOTATIONS, predictions_subflows=[PREDICTIONS, PREDICTIONS2],
+                                                   models=["a", "b"], shard="1/2"))
+        self.assertEqual(1, len(batches))
+        self.assertEqual(["a", "b"], batches[0].models)
+        self.assertEqual(sorted(self._names(shard="1/2")), sorted((x.image_name, x.image_name) for x in batches[0]))
+
+
+class TestPipelines(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.service = EvaluationService(allow_pipelines=True)
+        cls.tmp = tempfile.TemporaryDirectory()
+        cls.expected = cls._evaluate("load-metrics-pairs -a '%s' -p '%s' summary-statistics-ic -s '%s'" % (ANNOTATIONS, PREDICTIONS, STATISTICS))[-1]
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp.cleanup()
+
+    @classmethod
+    def _evaluate(cls, pipeline: str) -> list:
+        return cls.service.evaluate_pipeline(pipeline)["statistics"]
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.tmp.name, name)
+
+    def test_accumulate(self):
+        stats = self._evaluate("load-metrics-pairs -a '%s' -p '%s' -s -c 50 summary-statistics-ic -s '%s' -A -I 2"
+                               % (ANNOTATIONS, PREDICTIONS, STATISTICS))
+        # 2 snapshots and the final statistics
+        self.assertEqual(3, len(stats))
+        self.assertEqual(self.expected, stats[-1])
+
+    def test_merged_shards(self):
+        for i in range(1, 4):
+            self._evaluate("load-metrics-pairs -a '%s' -p '%s' --shard %d/3 summary-statistics-ic -s '%s' -A --save_state %s"
+                           % (ANNOTATIONS, PREDICTIONS, i, STATISTICS, self._path("shard%d.npz" % i)))
+        stats = self._evaluate("load-statistic-states -i '%s' summary-statistics-ic -s '%s' -A" % (self._path("shard*.npz"), STATISTICS))
+        self.assertEqual(self.expected, stats[-1])
+
+    def test_encoded_pairs(self):
+        self._evaluate("load-metrics-pairs -a '%s' -p '%s' to-encoded-pairs-ic -s -o %s" % (ANNOTATIONS, PREDICTIONS, self._path("encoded")))
+        stats = self._evaluate("load-encoded-pairs-ic -i %s summary-statistics-ic -s '%s' -A" % (self._path("encoded"), STATISTICS))
+        self.assertEqual(self.expected, stats[-1])
+
+    def test_bootstrap(self):
+        stats = dict(self._evaluate("load-metrics-pairs -a '%s' -p '%s' summary-statistics-ic -s accuracy-ic -B 200 -S 1"
+                                    % (ANNOTATIONS, PREDICTIONS))[-1])
+        self.assertEqual(dict(self.expected)["Accuracy"], stats["Accuracy"])
+        self.assertLess(stats["Accuracy (lower)"], stats["Accuracy"])
+        self.assertGreater(stats["Accuracy (upper)"], stats["Accuracy"])
+        self.assertAlmostEqual(stats["Accuracy"], stats["Accuracy (mean)"], delta=0.01)
+
+    def test_model_comparison(self):
+        other = dict(self._evaluate("load-metrics-pairs -a '%s' -p '%s' summary-statistics-ic -s accuracy-ic" % (ANNOTATIONS, PREDICTIONS2))[-1])
+        stats = dict(self._evaluate("load-metrics-multi-pairs -a '%s' -p '%s' '%s' -m a b model-comparison-ic -s accuracy-ic -S 1 -P 200"
+                                    % (ANNOTATIONS, PREDICTIONS, PREDICTIONS2))[-1])
+        self.assertEqual(dict(self.expected)["Accuracy"], stats["Accuracy [a]"])
+        self.assertEqual(other["Accuracy"], stats["Accuracy [b]"])
+        self.assertAlmostEqual(stats["Accuracy [a]"] - stats["Accuracy [b]"], stats["Accuracy [a vs b] (difference)"])
+        # the error rates differ considerably
+        self.assertLess(stats["McNemar [a vs b] (p-value)"], 0.01)
+        self.assertLess(stats["Accuracy [a vs b] (p-value)"], 0.01)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,133 @@
+import http.client
+import json
+import os
+import tempfile
+import threading
+import unittest
+
+from idc.metrics.api import active_profiler
+from idc.metrics.tool.server import EvaluationService, build_pipeline, create_server, request_evaluation
+
+ANNOTATIONS = "generate-synthetic-data -n 500"
+PREDICTIONS = "generate-synthetic-data -n 500 -p -e 0.2"
+STATISTICS = "accuracy-ic"
+TOKEN = "secret"
+
+
+class TestEvaluationService(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.service = EvaluationService(allow_pipelines=True)
+        cls.tmp = tempfile.TemporaryDirectory()
+        # the reference value and the inputs for the other request types
+        response = cls.service.evaluate({
+            "pipeline": "load-metrics-pairs -a '%s' -p '%s' summary-statistics-ic -s %s -A --save_state %s"
+                        % (ANNOTATIONS, PREDICTIONS, STATISTICS, os.path.join(cls.tmp.name, "state.npz"))})
+        cls.expected = response["statistics"][-1]
+        cls.service.evaluate({
+            "pipeline": "load-metrics-pairs -a '%s' -p '%s' to-encoded-pairs-ic -o %s"
+                        % (ANNOTATIONS, PREDICTIONS, os.path.join(cls.tmp.name, "encoded"))})
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp.cleanup()
+
+    def _evaluate(self, request: dict):
+        request = dict(request)
+        request["data_type"] = "ic"
+        request["statistics"] = STATISTICS
+        response = self.service.evaluate(request)
+        self.assertEqual(self.expected, response["statistics"][-1])
+        return response
+
+    def test_pairs(self):
+        self._evaluate({"annotations": ANNOTATIONS, "predictions": PREDICTIONS})
+        response = self._evaluate({"annotations": ANNOTATIONS, "predictions": PREDICTIONS})
+        self.assertTrue(response["cached"])
+
+    def test_encoded(self):
+        self._evaluate({"encoded": os.path.join(self.tmp.name, "encoded")})
+
+    def test_states(self):
+        self._evaluate({"states": [os.path.join(self.tmp.name, "state.npz")]})
+
+    def test_variables(self):
+        self._evaluate({"states": [os.path.join(self.tmp.name, "{NAME}.npz")], "variables": {"NAME": "state"}})
+
+    def test_duplicate_names(self):
+        response = self.service.evaluate({"data_type": "ic", "statistics": "accuracy-ic -a micro accuracy-ic -a macro",
+                                          "annotations": ANNOTATIONS, "predictions": PREDICTIONS})
+        stats = response["statistics"][-1]
+        self.assertEqual(2, len(stats))
+        self.assertEqual(stats[0][0], stats[1][0])
+
+    def test_profile(self):
+        items = []
+        for i in range(2):
+            response = self.service.evaluate({
+                "pipeline": "load-metrics-pairs -a '%s' -p '%s' summary-statistics-ic -s %s -A --profile"
+                            % (ANNOTATIONS, PREDICTIONS, STATISTICS)})
+            self.assertIsNone(active_profiler())
+            stats = dict(response["statistics"][-1])
+            items.append(stats["profile/summary-statistics-ic/batch/items"])
+        # the second run must not include the measurements of the first one
+        self.assertEqual(items[0], items[1])
+
+    def test_remote_host(self):
+        with self.assertRaises(Exception):
+            create_server(self.service, host="0.0.0.0", port=0, token=TOKEN)
+
+    def test_pipeline_not_allowed(self):
+        with self.assertRaises(Exception):
+            EvaluationService().evaluate({"pipeline": "load-statistic-states -i state.npz summary-statistics-ic -s accuracy-ic"})
+
+    def test_options(self):
+        request = {"data_type": "ic", "statistics": STATISTICS, "annotations": ANNOTATIONS, "predictions": PREDICTIONS}
+        self.assertTrue(build_pipeline(dict(request, options="-S 1 --profile")).endswith("--accumulate -S 1 --profile"))
+        for options in ["-A to-statistics-csv -o /tmp/out.csv", "-S 1 --unknown", "-k to-statistics-csv"]:
+            with self.assertRaises(Exception):
+                build_pipeline(dict(request, options=options))
+
+    def test_invalid(self):
+        for request in [{}, {"data_type": "xx"}, {"data_type": "ic"}, {"data_type": "ic", "statistics": STATISTICS}]:
+            with self.assertRaises(Exception):
+                build_pipeline(request)
+
+    def _post(self, port: int, headers: dict) -> int:
+        conn = http.client.HTTPConnection("127.0.0.1", port)
+        try:
+            conn.request("POST", "/clear", body=json.dumps({}), headers=headers)
+            response = conn.getresponse()
+            response.read()
+            return response.status
+        finally:
+            conn.close()
+
+    def test_http(self):
+        server = create_server(self.service, port=0, token=TOKEN)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            port = server.server_address[1]
+            response = request_evaluation({"data_type": "ic", "statistics": STATISTICS,
+                                           "annotations": ANNOTATIONS, "predictions": PREDICTIONS}, port=port, token=TOKEN)
+            self.assertEqual(self.expected, response["statistics"][-1])
+            with self.assertRaises(Exception):
+                request_evaluation({"data_type": "xx"}, port=port, token=TOKEN)
+            with self.assertRaises(Exception):
+                request_evaluation({"data_type": "ic", "statistics": STATISTICS, "annotations": ANNOTATIONS,
+                                    "predictions": PREDICTIONS}, port=port, token="wrong")
+            headers = {"Content-Type": "application/json", "Authorization": "Bearer " + TOKEN}
+            self.assertEqual(200, self._post(port, headers))
+            self.assertEqual(401, self._post(port, dict(headers, Authorization="Bearer wrong")))
+            self.assertEqual(415, self._post(port, dict(headers, **{"Content-Type": "text/plain"})))
+            self.assertEqual(403, self._post(port, dict(headers, Host="attacker.example.com:%d" % port)))
+            self.assertEqual(403, self._post(port, dict(headers, Origin="http://attacker.example.com")))
+        finally:
+            server.shutdown()
+            server.server_close()
+
+
+if __name__ == '__main__':
+    unittest.main()